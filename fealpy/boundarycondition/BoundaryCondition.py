@@ -1,6 +1,70 @@
 import numpy as np
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye
 
+from ..functionspace.assembly import CellLinearOperator
+
+
+class DirichletMask():
+    """ The entries of a CSR matrix which are changed by the Dirichlet
+    boundary condition
+
+    The mask only depends on the sparsity pattern and the Dirichlet dofs, so
+    it is built once and the boundary condition is applied to every matrix
+    with the same pattern by writing into its `data` array, which is
+    O(nnz) and allocates no new matrix.
+    """
+    def __init__(self, A, isBdDof):
+        A = A.tocsr()
+        N = A.shape[0]
+        i = np.repeat(np.arange(N, dtype=A.indices.dtype), np.diff(A.indptr))
+        j = A.indices
+        isRow = isBdDof[i]
+        isDiag = (i == j)
+
+        self.shape = A.shape
+        self.indptr = A.indptr
+        self.indices = A.indices
+        self.isBdDof = isBdDof
+        self.row, = np.nonzero(isRow & ~isDiag)
+        self.diag, = np.nonzero(isRow & isDiag)
+        # the entries in the columns of the Dirichlet dofs and the interior
+        # rows, they are moved to the right hand side by the lifting
+        self.col, = np.nonzero(isBdDof[j] & ~isRow)
+        self.colrow = i[self.col]
+        self.colcol = j[self.col]
+
+        if len(self.diag) != isBdDof.sum():
+            raise ValueError("Every Dirichlet dof needs a diagonal entry in the matrix!")
+
+    def match(self, A):
+        if A.shape != self.shape or A.nnz != len(self.indices):
+            return False
+        if (A.indices is self.indices) and (A.indptr is self.indptr):
+            return True
+        return np.array_equal(A.indptr, self.indptr) and \
+                np.array_equal(A.indices, self.indices)
+
+    def lift(self, A, x, b):
+        """ Move the known values `x` of the Dirichlet dofs to the right hand
+        side `b` of the interior rows, and put them into the Dirichlet rows
+        """
+        val = A.data[self.col]*x[self.colcol]
+        b -= np.bincount(self.colrow, weights=val, minlength=len(b))
+        b[self.isBdDof] = x[self.isBdDof]
+        return b
+
+    def apply(self, A, symmetric=True):
+        """ Replace the Dirichlet rows of `A` by the rows of the identity,
+        and zero the Dirichlet columns if `symmetric` is True
+        """
+        data = A.data
+        data[self.row] = 0
+        data[self.diag] = 1
+        if symmetric:
+            data[self.col] = 0
+        return A
+
+
 class DirichletBC:
     def __init__(self, V, g0, is_dirichlet_dof=None):
         self.V = V
@@ -13,10 +77,52 @@ class DirichletBC:
             isBdDof = is_dirichlet_dof(ipoints)
 
         self.isBdDof = isBdDof
+        self.mask = None
+
+    def get_mask(self, A):
+        """ Return the `DirichletMask` of the pattern of `A`, it is reused by
+        all the matrices with the same pattern
+        """
+        if (self.mask is None) or (not self.mask.match(A)):
+            self.mask = DirichletMask(A, self.isBdDof)
+        return self.mask
 
-    def apply(self, A, b):
+    def boundary_value(self):
+        g0 = self.g0
+        V = self.V
+        isBdDof = self.isBdDof
+        gdof = V.number_of_global_dofs()
+        x = np.zeros((gdof,), dtype=np.float)
+        ipoints = V.interpolation_points()
+        idx, = np.nonzero(isBdDof)
+        x[isBdDof] = g0(ipoints[idx])
+        return x
+
+    def apply(self, A, b, inplace=False, symmetric=True):
         """ Modify matrix A and b
+
+        Parameters
+        ----------
+        inplace : bool
+            if it is True, `A` must be a CSR matrix, its `data` array is
+            modified in place by the precomputed `DirichletMask` and `A` is
+            returned; the explicit zeros stay in the pattern, so the next
+            matrix assembled on the same pattern reuses the mask
+        symmetric : bool
+            only for `inplace`, zero the Dirichlet columns too and lift the
+            boundary values to the right hand side, which keeps `A`
+            symmetric
         """
+        if inplace:
+            mask = self.get_mask(A)
+            x = self.boundary_value()
+            if symmetric:
+                mask.lift(A, x, b)
+            else:
+                b[self.isBdDof] = x[self.isBdDof]
+            A = mask.apply(A, symmetric=symmetric)
+            return A, b
+
         g0 = self.g0
         V = self.V
         isBdDof = self.isBdDof
@@ -28,16 +134,30 @@ class DirichletBC:
         idx, = np.nonzero(isBdDof)
         x[isBdDof] = g0(ipoints[idx])
         b -= A@x
-        bdIdx = np.zeros(gdof, dtype=np.int)
-        bdIdx[isBdDof] = 1
-        Tbd = spdiags(bdIdx, 0, gdof, gdof)
-        T = spdiags(1-bdIdx, 0, gdof, gdof)
-        A = T@A@T + Tbd
+        if isinstance(A, CellLinearOperator):
+            A = A.apply_dirichlet(isBdDof)
+        else:
+            bdIdx = np.zeros(gdof, dtype=np.int)
+            bdIdx[isBdDof] = 1
+            Tbd = spdiags(bdIdx, 0, gdof, gdof)
+            T = spdiags(1-bdIdx, 0, gdof, gdof)
+            A = T@A@T + Tbd
 
         b[isBdDof] = x[isBdDof] 
         return A, b
 
-    def apply_on_matrix(self, A):
+    def apply_on_matrix(self, A, inplace=False, symmetric=True):
+        """
+
+        Notes
+        -----
+        With `inplace` the original `A` is lost, so call `apply_on_vector`
+        with it before.
+        """
+        if inplace:
+            return self.get_mask(A).apply(A, symmetric=symmetric)
+        if isinstance(A, CellLinearOperator):
+            return A.apply_dirichlet(self.isBdDof)
 
         V = self.V
         isBdDof = self.isBdDof
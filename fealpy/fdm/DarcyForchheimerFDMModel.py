@@ -5,6 +5,17 @@ from numpy import linalg as LA
 from ..fem.integral_alg import IntegralAlg
 from scipy.sparse.linalg import cg, inv, dsolve, spsolve 
 
+def diagonal_index(A, n):
+    """ The positions of the diagonal entries `A[i, i]`, `i < n`, in the
+    `data` array of the CSR matrix `A`
+    """
+    i = np.repeat(np.arange(A.shape[0]), np.diff(A.indptr))
+    idx, = np.nonzero((i == A.indices) & (i < n))
+    if len(idx) != n:
+        raise ValueError("The matrix needs the diagonal entries of the first n rows!")
+    return idx
+
+
 class DarcyForchheimerFDMModel():
     def __init__(self, pde, mesh):
         self.pde = pde
@@ -45,34 +56,23 @@ class DarcyForchheimerFDMModel():
         NE = mesh.number_of_edges()
         NC = mesh.number_of_cells()
 
-        isBDEdge = mesh.ds.boundary_edge_flag()
-        isYDEdge = mesh.ds.y_direction_edge_flag()
-        isXDEdge = mesh.ds.x_direction_edge_flag()
-
+        # the `(nx+1, ny)` and `(nx, ny+1)` views of the edge arrays, the
+        # boundary edges keep `C = 1`
         C = np.ones(NE, dtype=mesh.ftype)
-        edge2cell = mesh.ds.edge_to_cell()
-        cell2edge = mesh.ds.cell_to_edge()
-
-        flag = ~isBDEdge & isYDEdge
-        L = edge2cell[flag, 0]
-        R = edge2cell[flag, 1]
-        P1 = cell2edge[L, 0]# the 0 edge of the left cell
-        D1 = cell2edge[L, 2]# the 2 edge of the left cell
-        P2 = cell2edge[R, 0]# the 0 edge of the right cell
-        D2 = cell2edge[R, 2]# the 2 edge of the right cell
-
-        C[flag] = 1/4*(np.sqrt(uh0[flag]**2+uh0[P1]**2)+np.sqrt(uh0[flag]**2+uh0[D1]**2)\
-                +np.sqrt(uh0[flag]**2+uh0[P2]**2)+np.sqrt(uh0[flag]**2+uh0[D2]**2))
-
-        flag = ~isBDEdge & isXDEdge
-        L = edge2cell[flag, 0]
-        R = edge2cell[flag, 1]
-        P1 = cell2edge[L, 3]
-        D1 = cell2edge[L, 1]
-        P2 = cell2edge[R, 3]
-        D2 = cell2edge[R, 1]
-        C[flag] = 1/4*(np.sqrt(uh0[flag]**2+uh0[P1]**2)+np.sqrt(uh0[flag]**2+uh0[D1]**2)\
-                +np.sqrt(uh0[flag]**2+uh0[P2]**2)+np.sqrt(uh0[flag]**2+uh0[D2]**2))
+        u = mesh.ds.y_direction_edge_view(uh0)
+        v = mesh.ds.x_direction_edge_view(uh0)
+
+        # the 0 and 2 edges of the left and the right cells
+        c = mesh.ds.y_direction_edge_view(C)
+        u2 = u[1:-1]**2
+        c[1:-1] = 1/4*(np.sqrt(u2+v[:-1, :-1]**2)+np.sqrt(u2+v[:-1, 1:]**2)\
+                +np.sqrt(u2+v[1:, :-1]**2)+np.sqrt(u2+v[1:, 1:]**2))
+
+        # the 3 and 1 edges of the upper and the lower cells
+        c = mesh.ds.x_direction_edge_view(C)
+        v2 = v[:, 1:-1]**2
+        c[:, 1:-1] = 1/4*(np.sqrt(v2+u[:-1, 1:]**2)+np.sqrt(v2+u[1:, 1:]**2)\
+                +np.sqrt(v2+u[:-1, :-1]**2)+np.sqrt(v2+u[1:, :-1]**2))
         
         C = mu/k + rho*beta*C
 
@@ -88,39 +88,41 @@ class DarcyForchheimerFDMModel():
         itype = mesh.itype
         ftype = mesh.ftype
 
-        idx = np.arange(NE)
-        isBDEdge = mesh.ds.boundary_edge_flag()
-        isYDEdge = mesh.ds.y_direction_edge_flag()
-        isXDEdge = mesh.ds.x_direction_edge_flag()
-
         C = self.get_nonlinear_coef()
         A11 = spdiags(C,0,NE,NE)# correct
 
-        edge2cell = mesh.ds.edge_to_cell()
-        I, = np.nonzero(~isBDEdge & isYDEdge)
-        L = edge2cell[I, 0]
-        R = edge2cell[I, 1]
+        # the indices of the edges and the cells on the grid
+        edge = np.arange(NE)
+        yedge = mesh.ds.y_direction_edge_view(edge)
+        xedge = mesh.ds.x_direction_edge_view(edge)
+        cell = mesh.ds.cell_view(np.arange(NC))
+
+        # the interior y direction edges, `L` and `R` are the left and the
+        # right cells
+        I = yedge[1:-1].flatten()
+        L = cell[:-1].flatten()
+        R = cell[1:].flatten()
         data = np.ones(len(I), dtype=ftype)/mesh.hx
 
         A12 = coo_matrix((data, (I, R)), shape=(NE, NC))
         A12 += coo_matrix((-data, (I, L)), shape=(NE, NC))
 
-        I, = np.nonzero(~isBDEdge & isXDEdge)
-        L = edge2cell[I, 0]
-        R = edge2cell[I, 1]
+        # the interior x direction edges, `L` and `R` are the upper and the
+        # lower cells
+        I = xedge[:, 1:-1].flatten()
+        L = cell[:, 1:].flatten()
+        R = cell[:, :-1].flatten()
         data = np.ones(len(I), dtype=ftype)/mesh.hy
         A12 += coo_matrix((-data, (I, R)), shape=(NE, NC))
         A12 += coo_matrix((data, (I, L)), shape=(NE, NC))
         A12 = A12.tocsr()
 
-        
-        cell2edge = mesh.ds.cell_to_edge()
         I = np.arange(NC, dtype=itype)
         data = np.ones(NC, dtype=ftype)
-        A21 = coo_matrix((data/mesh.hx, (I, cell2edge[:, 1])), shape=(NC, NE), dtype=ftype)
-        A21 += coo_matrix((-data/mesh.hx, (I, cell2edge[:, 3])), shape=(NC, NE), dtype=ftype)
-        A21 += coo_matrix((data/mesh.hy, (I, cell2edge[:, 2])), shape=(NC, NE), dtype=ftype)
-        A21 += coo_matrix((-data/mesh.hy, (I, cell2edge[:, 0])), shape=(NC, NE), dtype=ftype)
+        A21 = coo_matrix((data/mesh.hx, (I, yedge[1:].flatten())), shape=(NC, NE), dtype=ftype)
+        A21 += coo_matrix((-data/mesh.hx, (I, yedge[:-1].flatten())), shape=(NC, NE), dtype=ftype)
+        A21 += coo_matrix((data/mesh.hy, (I, xedge[:, 1:].flatten())), shape=(NC, NE), dtype=ftype)
+        A21 += coo_matrix((-data/mesh.hy, (I, xedge[:, :-1].flatten())), shape=(NC, NE), dtype=ftype)
         A21 = A21.tocsr()
         A = bmat([(A11, A12), (A21, None)], format='csr', dtype=ftype)
         return A
@@ -129,14 +131,12 @@ class DarcyForchheimerFDMModel():
     def get_right_vector(self):
         pde = self.pde
         mesh = self.mesh
-        node = mesh.node
         itype = mesh.itype
         ftype = mesh.ftype
 
         NN = mesh.number_of_nodes()  
         NE = mesh.number_of_edges()
         NC = mesh.number_of_cells()
-        edge = mesh.entity('edge')
         isBDEdge = mesh.ds.boundary_edge_flag()
         isYDEdge = mesh.ds.y_direction_edge_flag()
         isXDEdge = mesh.ds.x_direction_edge_flag()
@@ -203,6 +203,17 @@ class DarcyForchheimerFDMModel():
         iterMax = 2000
         r = np.zeros((2,iterMax),dtype=ftype)
 
+        # Modify matrix: the row and the column of the dof `NE` are removed,
+        # so the interior block of `A` is the same as the one of
+        # `T@A@T + Tbd`. It is taken from `A` once, and only the diagonal of
+        # `A11`, the nonlinear coefficient, is changed in the loop
+        isFree = np.ones(A.shape[0], dtype=np.bool_)
+        isFree[NE] = False
+        idx2, = np.nonzero(isFree)
+        AF = A[idx2, :][:, idx2].tocsr()
+        d0 = diagonal_index(A, NE)
+        d1 = diagonal_index(AF, NE)
+
         while eu+ep > tol and count < iterMax:
 
             bnew = b
@@ -210,17 +221,7 @@ class DarcyForchheimerFDMModel():
             x = np.r_[self.uh, self.ph]#把self.uh,self.ph组合在一起
             bnew = bnew - A@x
 
-            # Modify matrix
-            bdIdx = np.zeros((A.shape[0],), dtype = itype)
-            bdIdx[NE] = 1
-
-            Tbd = spdiags(bdIdx, 0, A.shape[0], A.shape[1])
-            T = spdiags(1-bdIdx, 0, A.shape[0], A.shape[1])
-            AD = T@A@T + Tbd
-
-            idx1 = 1 - bdIdx
-            idx2, = np.nonzero(idx1)
-            x[idx2] = spsolve(AD[idx2,:][:,idx2], bnew[idx2])
+            x[idx2] = spsolve(AF, bnew[idx2])
             u1 = x[:NE]
             p1 = x[NE:]
 
@@ -235,18 +236,19 @@ class DarcyForchheimerFDMModel():
 
             self.uh0[:] = u1
             self.ph0[:] = p1
-            A = self.get_left_matrix()
-            A11 = A[:NE,:NE]
-            A12 = A[:NE,NE:NE+NC]
-            A21 = A[NE:NE+NC,:NE]
+            C = self.get_nonlinear_coef()
+            A.data[d0] = C
+            AF.data[d1] = C
+            # `f - A11@u1 - A12@p1` and `g - A21@u1`
+            res = b - A@np.r_[u1, p1]
             if LA.norm(f) == 0:
-                ru = LA.norm(f - A11@u1 - A12@p1)
+                ru = LA.norm(res[:NE])
             else:
-                ru = LA.norm(f - A11@u1 - A12@p1)/LA.norm(f)
+                ru = LA.norm(res[:NE])/LA.norm(f)
             if LA.norm(g) == 0:
-                rp = LA.norm(g - A21@u1)
+                rp = LA.norm(res[NE:])
             else:
-                rp = LA.norm(g - A21@u1)/LA.norm(g)
+                rp = LA.norm(res[NE:])/LA.norm(g)
 
 
             r[0,count] = rp
@@ -326,7 +328,6 @@ class DarcyForchheimerFDMModel():
         DpI[isYDEdge] = self.pde.grad_pressure_x(bc[isYDEdge])#modity
         DpI[isXDEdge] = self.pde.grad_pressure_y(bc[isXDEdge])
 
-        cell2edge = mesh.ds.cell_to_edge()
         b = self.get_right_vector()
         C = self.get_nonlinear_coef()
         Dph = b[:NE] - C*self.uh
@@ -352,21 +353,17 @@ class DarcyForchheimerFDMModel():
         isYDEdge = mesh.ds.y_direction_edge_flag()
         isXDEdge = mesh.ds.x_direction_edge_flag()
         isBDEdge = mesh.ds.boundary_edge_flag()
-        edge2cell = mesh.ds.edge_to_cell()
         Dph = np.zeros(NE, dtype=ftype)
         DpI = np.zeros(NE, dtype=mesh.ftype)
 
+        ph = mesh.ds.cell_view(self.ph)
         I, = np.nonzero(~isBDEdge & isYDEdge)
-        L = edge2cell[I, 0]
-        R = edge2cell[I, 1]
         DpI[I] = self.pde.grad_pressure_x(bc[I])
-        Dph[I] = (self.ph[R] - self.ph[L])/hx
+        mesh.ds.y_direction_edge_view(Dph)[1:-1] = (ph[1:] - ph[:-1])/hx
 
         J, = np.nonzero(~isBDEdge & isXDEdge)
-        L = edge2cell[J, 0]
-        R = edge2cell[J, 1]
         DpI[J] = self.pde.grad_pressure_y(bc[J])
-        Dph[J] = (self.ph[L] - self.ph[R])/hy
+        mesh.ds.x_direction_edge_view(Dph)[:, 1:-1] = (ph[:, 1:] - ph[:, :-1])/hy
 
         Dp1eL2 = np.sqrt(np.sum(hx*hy*(Dph[:] - DpI[:])**2))
 
@@ -9,6 +9,7 @@ from mpl_toolkits.mplot3d import Axes3D
 
 from ..functionspace.lagrange_fem_space import LagrangeFiniteElementSpace
 from ..solver.eigns import picard
+from ..solver.amg_manager import AMGManager
 from ..quadrature import FEMeshIntegralAlg
 from ..mesh.adaptive_tools import mark
 
@@ -28,6 +29,7 @@ class EllipticEignvalueFEMModel:
         self.numrefine = n
         self.resultdir = resultdir
         self.picard = False
+        self.amg = AMGManager()
 
     def residual_estimate(self, uh):
         mesh = uh.space.mesh
@@ -104,7 +106,7 @@ class EllipticEignvalueFEMModel:
     def eig(self, A, M):
         NN = A.shape[0]
         self.M = M
-        self.ml = self.ml = pyamg.ruge_stuben_solver(A)
+        self.ml = self.amg.hierarchy(A)
         P = LinearOperator((NN, NN), matvec=self.linear_operator)
         vals, vecs = eigs(P, k=1)
         return vecs.reshape(-1).real, 1/vals.real[0]
@@ -149,7 +151,7 @@ class EllipticEignvalueFEMModel:
         M = MH[isFreeHDof, :][:, isFreeHDof].tocsr()
 
         if self.picard is True:
-            uh[isFreeHDof], d = picard(A, M, np.ones(sum(isFreeHDof)), sigma=self.sigma)
+            uh[isFreeHDof], d = picard(A, M, np.ones(sum(isFreeHDof)), sigma=self.sigma, amg=self.amg)
         else:
             uh[isFreeHDof], d = self.eig(A, M)
 
@@ -201,13 +203,11 @@ class EllipticEignvalueFEMModel:
             isFreeDof = ~(space.boundary_dof())
             b = d*M@uh
             if self.sigma is None:
-                ml = pyamg.ruge_stuben_solver(A[isFreeDof, :][:, isFreeDof].tocsr())
-                uh[isFreeDof] = ml.solve(b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape((-1,))
+                uh[isFreeDof] = self.amg.solve(A[isFreeDof, :][:, isFreeDof].tocsr(), b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape((-1,))
             else:
                 K = A[isFreeDof, :][:, isFreeDof].tocsr() + self.sigma*M[isFreeDof, :][:, isFreeDof].tocsr()
                 b += self.sigma*M@uh
-                ml = pyamg.ruge_stuben_solver(K)
-                uh[isFreeDof] = ml.solve(b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape(-1)
+                uh[isFreeDof] = self.amg.solve(K, b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape(-1)
                 # uh[isFreeDof] = spsolve(A[isFreeDof, :][:, isFreeDof].tocsr(), b[isFreeDof])
             d = uh@A@uh/(uh@M@uh)
 
@@ -221,7 +221,7 @@ class EllipticEignvalueFEMModel:
         if self.multieigs is True:
             self.A = A[isFreeDof, :][:, isFreeDof].tocsr()
             self.M = M[isFreeDof, :][:, isFreeDof].tocsr()
-            self.ml = pyamg.ruge_stuben_solver(self.A)
+            self.ml = self.amg.hierarchy(self.A)
             self.eigs()
 
         uh = space.function(array=uh)
@@ -276,7 +276,7 @@ class EllipticEignvalueFEMModel:
             A = A[isFreeDof, :][:, isFreeDof].tocsr()
             M = M[isFreeDof, :][:, isFreeDof].tocsr()
             if self.picard is True:
-                uh[isFreeDof], d = picard(A, M, uh[isFreeDof], sigma=self.sigma)
+                uh[isFreeDof], d = picard(A, M, uh[isFreeDof], sigma=self.sigma, amg=self.amg)
             else:
                 uh[isFreeDof], d = self.eig(A, M)
 
@@ -312,7 +312,7 @@ class EllipticEignvalueFEMModel:
         if self.multieigs is True:
             self.A = A
             self.M = M
-            self.ml = pyamg.ruge_stuben_solver(self.A)
+            self.ml = self.amg.hierarchy(self.A)
             self.eigs()
 
         uh = space.function(array=uh)
@@ -366,9 +366,8 @@ class EllipticEignvalueFEMModel:
             M = M[isFreeDof, :][:, isFreeDof].tocsr()
 
             if self.sigma is None:
-                ml = pyamg.ruge_stuben_solver(A)
                 uh = space.function()
-                uh[isFreeDof] = ml.solve(b[isFreeDof], tol=1e-12, accel='cg').reshape((-1,))
+                uh[isFreeDof] = self.amg.solve(A, b[isFreeDof], tol=1e-12, accel='cg').reshape((-1,))
             else:
                 uh = space.function()
                 uh[isFreeDof] = spsolve(A, b[isFreeDof]).reshape(-1)
@@ -407,7 +406,7 @@ class EllipticEignvalueFEMModel:
 
         uh = IM@uh
         if self.picard is True:
-            uh[isFreeDof], d = picard(A, M, uh[isFreeDof], sigma=self.sigma)
+            uh[isFreeDof], d = picard(A, M, uh[isFreeDof], sigma=self.sigma, amg=self.amg)
         else:
             uh[isFreeDof], d = self.eig(A, M)
         end = timer()
@@ -415,7 +414,7 @@ class EllipticEignvalueFEMModel:
         if self.multieigs is True:
             self.A = A
             self.M = M
-            self.ml = pyamg.ruge_stuben_solver(self.A)
+            self.ml = self.amg.hierarchy(self.A)
             self.eigs()
 
         print("smallest eigns:", d, "with time: ", end - start)
@@ -458,7 +457,7 @@ class EllipticEignvalueFEMModel:
         A = AH[isFreeHDof, :][:, isFreeHDof].tocsr()
         M = MH[isFreeHDof, :][:, isFreeHDof].tocsr()
         if self.picard is True:
-            uH[isFreeHDof], d = picard(A, M, np.ones(sum(isFreeHDof)), sigma=self.sigma)
+            uH[isFreeHDof], d = picard(A, M, np.ones(sum(isFreeHDof)), sigma=self.sigma, amg=self.amg)
         else:
             uH[isFreeHDof], d = self.eig(A, M)
 
@@ -516,10 +515,9 @@ class EllipticEignvalueFEMModel:
             b = M@uH
 
             if self.sigma is None:
-                ml = pyamg.ruge_stuben_solver(A[isFreeDof, :][:, isFreeDof].tocsr())
                 uh = space.function()
                 uh[:] = uH
-                uh[isFreeDof] = ml.solve(b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape((-1,))
+                uh[isFreeDof] = self.amg.solve(A[isFreeDof, :][:, isFreeDof].tocsr(), b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape((-1,))
             else:
                 uh = space.function()
                 uh[isFreeDof] = spsolve(A[isFreeDof, :][:, isFreeDof].tocsr(), b[isFreeDof])
@@ -551,7 +549,7 @@ class EllipticEignvalueFEMModel:
         A = A[isFreeDof, :][:, isFreeDof].tocsr()
         M = M[isFreeDof, :][:, isFreeDof].tocsr()
         if self.picard is True:
-            uh[isFreeDof], d = picard(A, M, uh[isFreeDof], sigma=self.sigma)
+            uh[isFreeDof], d = picard(A, M, uh[isFreeDof], sigma=self.sigma, amg=self.amg)
         else:
             uh[isFreeDof], d = self.eig(A, M)
         end = timer()
@@ -559,7 +557,7 @@ class EllipticEignvalueFEMModel:
         if self.multieigs is True:
             self.A = A
             self.M = M
-            self.ml = pyamg.ruge_stuben_solver(self.A)
+            self.ml = self.amg.hierarchy(self.A)
             self.eigs()
 
         print("smallest eigns:", d, "with time: ", end - start)
@@ -605,7 +603,7 @@ class EllipticEignvalueFEMModel:
         A = AH[isFreeHDof, :][:, isFreeHDof].tocsr()
         M = MH[isFreeHDof, :][:, isFreeHDof].tocsr()
         if self.picard is True:
-            uH[isFreeHDof], d = picard(A, M, np.ones(sum(isFreeHDof)), sigma=self.sigma)
+            uH[isFreeHDof], d = picard(A, M, np.ones(sum(isFreeHDof)), sigma=self.sigma, amg=self.amg)
         else:
             uH[isFreeHDof], d = self.eig(A, M)
 
@@ -662,10 +660,9 @@ class EllipticEignvalueFEMModel:
             b = M@uH
 
             if self.sigma is None:
-                ml = pyamg.ruge_stuben_solver(A[isFreeDof, :][:, isFreeDof].tocsr())
                 uh = space.function()
                 uh[:] = uH
-                uh[isFreeDof] = ml.solve(b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape((-1,))
+                uh[isFreeDof] = self.amg.solve(A[isFreeDof, :][:, isFreeDof].tocsr(), b[isFreeDof], x0=uh[isFreeDof], tol=1e-12, accel='cg').reshape((-1,))
             else:
                 uh = space.function()
                 uh[isFreeDof] = spsolve(A[isFreeDof, :][:, isFreeDof].tocsr(),
@@ -677,7 +674,7 @@ class EllipticEignvalueFEMModel:
         if self.multieigs is True:
             self.A = A[isFreeDof, :][:, isFreeDof].tocsr()
             self.M = M[isFreeDof, :][:, isFreeDof].tocsr()
-            self.ml = pyamg.ruge_stuben_solver(self.A)
+            self.ml = self.amg.hierarchy(self.A)
             self.eigs()
 
         # 3. 把 uh 加入粗网格空间, 组装刚度和质量矩阵
@@ -699,7 +696,7 @@ class EllipticEignvalueFEMModel:
         A = AA[isFreeDof, :][:, isFreeDof].tocsr()
         M = MM[isFreeDof, :][:, isFreeDof].tocsr()
         if self.picard is True:
-            u[isFreeDof], d = picard(A, M, np.ones(sum(isFreeDof)), sigma=self.sigma)
+            u[isFreeDof], d = picard(A, M, np.ones(sum(isFreeDof)), sigma=self.sigma, amg=self.amg)
         else:
             u[isFreeDof], d = self.eig(A, M)
         end = timer()
@@ -3,20 +3,29 @@ from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye
 from timeit import default_timer as timer
 from itertools import combinations
 
-def stiff_matrix(space, qf, measure, cfun=None, barycenter=True):
+from ..functionspace.assembly import AssemblyPlan
+
+def assemble(space, A, out=None):
+    """ Assemble the element matrices `A` with the cached assembly plan of
+    `space`, if the space does not have one, build a plan for this call.
+    """
+    if hasattr(space, 'assembly_plan'):
+        plan = space.assembly_plan()
+    else:
+        plan = AssemblyPlan(
+                space.cell_to_dof(),
+                space.number_of_global_dofs())
+    return plan.assemble(A, out=out)
+
+def stiff_matrix(space, qf, measure, cfun=None, barycenter=True, out=None):
     bcs, ws = qf.quadpts, qf.weights
     gphi = space.grad_basis(bcs)
 
     # Compute the element sitffness matrix
     A = np.einsum('i, ijkm, ijpm, j->jkp', ws, gphi, gphi, measure, optimize=True)
-    cell2dof = space.cell_to_dof()
-    ldof = space.number_of_local_dofs()
-    I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
-    J = I.swapaxes(-1, -2)
-    gdof = space.number_of_global_dofs()
 
     # Construct the stiffness matrix
-    A = csr_matrix((A.flat, (I.flat, J.flat)), shape=(gdof, gdof))
+    A = assemble(space, A, out=out)
     return A
 
 def stiff_matrix_1(space, qf, measure):
@@ -36,7 +45,7 @@ def stiff_matrix_1(space, qf, measure):
     return A.tocsr() 
 
 
-def mass_matrix(space, qf, measure, cfun=None, barycenter=True):
+def mass_matrix(space, qf, measure, cfun=None, barycenter=True, out=None):
 
     bcs, ws = qf.quadpts, qf.weights
     phi = space.basis(bcs)
@@ -50,13 +59,7 @@ def mass_matrix(space, qf, measure, cfun=None, barycenter=True):
             val = cfun(pp)
         A = np.einsum('m, mi, mj, mk, i->ijk', ws, val, phi, phi, measure)
 
-    cell2dof = space.cell_to_dof()
-    ldof = space.number_of_local_dofs()
-    I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
-    J = I.swapaxes(-1, -2)
-
-    gdof = space.number_of_global_dofs()
-    A = csr_matrix((A.flat, (I.flat, J.flat)), shape=(gdof, gdof))
+    A = assemble(space, A, out=out)
     return A
 
 def source_vector(f, space, qf, measure, surface=None):
@@ -7,6 +7,7 @@ from ..quadrature import GaussLobattoQuadrature
 from ..quadrature import GaussLegendreQuadrature
 from ..quadrature import PolygonMeshIntegralAlg
 from .ScaledMonomialSpace2d import ScaledMonomialSpace2d
+from .cell_group import CellGroups, scatter_columns
 
 
 class CVEMDof2d():
@@ -14,6 +15,7 @@ class CVEMDof2d():
         self.p = p
         self.mesh = mesh
         self.cell2dof, self.cell2dofLocation = self.cell_to_dof()
+        self.cellgroups = CellGroups(self.cell2dofLocation)
 
     def boundary_dof(self):
         gdof = self.number_of_global_dofs()
@@ -155,13 +157,12 @@ class ConformingVirtualElementSpace2d():
         """
         Project a conforming vem function uh into polynomial space.
         """
-        p = self.p
         cell2dof = self.dof.cell2dof
-        cell2dofLocation = self.dof.cell2dofLocation
-        cd = np.hsplit(cell2dof, cell2dofLocation[1:-1])
-        g = lambda x: x[0]@uh[x[1]]
+        groups = self.dof.cellgroups
         S = self.smspace.function()
-        S[:] = np.concatenate(list(map(g, zip(self.PI1, cd))))
+        S0 = S.reshape(groups.NC, -1)
+        for (idx, loc), PI1 in zip(groups, groups.stack(self.PI1)):
+            S0[idx] = np.einsum('ijk, ik->ij', PI1, uh[cell2dof[loc]])
         return S
 
     def project(self, F, space1):
@@ -184,92 +185,67 @@ class ConformingVirtualElementSpace2d():
         return SS
 
     def stiff_matrix(self, cfun=None):
-        area = self.smspace.area
-
-        def f(x):
-            x[0, :] = 0
-            return x
+        """ The stiffness matrix
 
+        Notes
+        -----
+        The local matrices of the cells with the same number of vertices
+        are computed together by batched matrix products, and all of them
+        are assembled into the CSR matrix at once.
+        """
         p = self.p
         G = self.G
         D = self.D
         PI1 = self.PI1
 
-        cell2dof, cell2dofLocation = self.dof.cell2dof, self.dof.cell2dofLocation
-        NC = len(cell2dofLocation) - 1
-        cd = np.hsplit(cell2dof, cell2dofLocation[1:-1])
-        DD = np.vsplit(D, cell2dofLocation[1:-1])
+        cell2dof = self.dof.cell2dof
+        groups = self.dof.cellgroups
+        DD = groups.split(D)
+        PI1 = groups.stack(PI1)
 
         if p == 1:
             tG = np.array([(0, 0, 0), (0, 1, 0), (0, 0, 1)])
-            if cfun is None:
-                f1 = lambda x: x[1].T@tG@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1])
-                K = list(map(f1, zip(DD, PI1)))
-            else:
-                barycenter = V.smspace.barycenter
-                k = cfun(barycenter)
-                f1 = lambda x: (x[1].T@tG@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1]))*x[2]
-                K = list(map(f1, zip(DD, PI1, k)))
+            tG = [tG]*len(groups)
         else:
-            tG = list(map(f, G))
-            if cfun is None:
-                f1 = lambda x: x[1].T@x[2]@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1])
-                K = list(map(f1, zip(DD, PI1, tG)))
-            else:
-                barycenter = V.smspace.barycenter
-                k = cfun(barycenter)
-                f1 = lambda x: (x[1].T@x[2]@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1]))*x[3]
-                K = list(map(f1, zip(DD, PI1, tG, k)))
-
-        f2 = lambda x: np.repeat(x, x.shape[0])
-        f3 = lambda x: np.tile(x, x.shape[0])
-        f4 = lambda x: x.flatten()
-
-        I = np.concatenate(list(map(f2, cd)))
-        J = np.concatenate(list(map(f3, cd)))
-        val = np.concatenate(list(map(f4, K)))
+            tG = [g.copy() for g in groups.stack(G)]
+            for g in tG:
+                g[:, 0, :] = 0
+
+        if cfun is not None:
+            barycenter = self.smspace.barycenter
+            k = cfun(barycenter)
+
+        K = []
+        for (idx, loc), d, pi1, g in zip(groups, DD, PI1, tG):
+            R = np.eye(loc.shape[1]) - d@pi1
+            k0 = pi1.swapaxes(-1, -2)@g@pi1 + R.swapaxes(-1, -2)@R
+            if cfun is not None:
+                k0 *= k[idx].reshape(-1, 1, 1)
+            K.append(k0)
+
         gdof = self.number_of_global_dofs()
-        A = csr_matrix((val, (I, J)), shape=(gdof, gdof), dtype=np.float)
-        return A
+        return groups.assemble(cell2dof, K, (gdof, gdof))
 
     def mass_matrix(self, cfun=None):
         area = self.smspace.area
-        p = self.p
 
-        PI0 = self.PI0
-        D = self.D
+        cell2dof = self.dof.cell2dof
+        groups = self.dof.cellgroups
+        DD = groups.split(self.D)
+        PI0 = groups.stack(self.PI0)
         H = self.H
-        C = self.C
-
-        cell2dof, cell2dofLocation = self.dof.cell2dof, self.dof.cell2dofLocation
-        NC = len(cell2dofLocation) - 1
-        cd = np.hsplit(cell2dof, cell2dofLocation[1:-1])
-        DD = np.vsplit(D, cell2dofLocation[1:-1])
-
-        f1 = lambda x: x[0]@x[1]
-        PIS = list(map(f1, zip(DD, PI0)))
 
-        f1 = lambda x: x[0].T@x[1]@x[0] + x[3]*(np.eye(x[2].shape[1]) - x[2]).T@(np.eye(x[2].shape[1]) - x[2])
-        K = list(map(f1, zip(PI0, H, PIS, area)))
+        K = []
+        for (idx, loc), d, pi0 in zip(groups, DD, PI0):
+            R = np.eye(loc.shape[1]) - d@pi0
+            k0 = pi0.swapaxes(-1, -2)@H[idx]@pi0
+            k0 += area[idx].reshape(-1, 1, 1)*(R.swapaxes(-1, -2)@R)
+            K.append(k0)
 
-        f2 = lambda x: np.repeat(x, x.shape[0])
-        f3 = lambda x: np.tile(x, x.shape[0])
-        f4 = lambda x: x.flatten()
-
-        I = np.concatenate(list(map(f2, cd)))
-        J = np.concatenate(list(map(f3, cd)))
-        val = np.concatenate(list(map(f4, K)))
         gdof = self.number_of_global_dofs()
-        M = csr_matrix((val, (I, J)), shape=(gdof, gdof), dtype=np.float)
-        return M
+        return groups.assemble(cell2dof, K, (gdof, gdof))
 
     def cross_mass_matrix(self, wh):
-        p = self.p
-        mesh = self.mesh
-
-        area = self.smspace.area
-        PI0 = self.PI0
-
         phi = self.smspace.basis
         def u(x, cellidx):
             val = phi(x, cellidx=cellidx)
@@ -277,35 +253,28 @@ class ConformingVirtualElementSpace2d():
             return np.einsum('ij, ijm, ijn->ijmn', wval, val, val)
         H = self.integralalg.integral(u, celltype=True)
 
-        cell2dof, cell2dofLocation = self.dof.cell2dof, self.dof.cell2dofLocation
-        NC = len(cell2dofLocation) - 1
-        cd = np.hsplit(cell2dof, cell2dofLocation[1:-1])
-
-        f1 = lambda x: x[0].T@x[1]@x[0]
-        K = list(map(f1, zip(PI0, H)))
+        cell2dof = self.dof.cell2dof
+        groups = self.dof.cellgroups
+        PI0 = groups.stack(self.PI0)
 
-        f2 = lambda x: np.repeat(x, x.shape[0])
-        f3 = lambda x: np.tile(x, x.shape[0])
-        f4 = lambda x: x.flatten()
+        K = [pi0.swapaxes(-1, -2)@H[idx]@pi0
+                for (idx, loc), pi0 in zip(groups, PI0)]
 
-        I = np.concatenate(list(map(f2, cd)))
-        J = np.concatenate(list(map(f3, cd)))
-        val = np.concatenate(list(map(f4, K)))
         gdof = self.number_of_global_dofs()
-        M = csr_matrix((val, (I, J)), shape=(gdof, gdof), dtype=np.float)
-        return M
+        return groups.assemble(cell2dof, K, (gdof, gdof))
 
     def source_vector(self, f):
-        PI0 = self.PI0
         phi = self.smspace.basis
         def u(x, cellidx):
             return np.einsum('ij, ijm->ijm', f(x), phi(x, cellidx=cellidx))
         bb = self.integralalg.integral(u, celltype=True)
-        g = lambda x: x[0].T@x[1]
-        bb = np.concatenate(list(map(g, zip(PI0, bb))))
+
+        groups = self.dof.cellgroups
+        PI0 = groups.stack(self.PI0)
+        bb = [np.einsum('ijk, ij->ik', pi0, bb[idx])
+                for (idx, loc), pi0 in zip(groups, PI0)]
         gdof = self.number_of_global_dofs()
-        b = np.bincount(self.dof.cell2dof, weights=bb, minlength=gdof)
-        return b
+        return groups.assemble_vector(self.dof.cell2dof, bb, gdof)
 
     def cell_to_dof(self):
         return self.dof.cell2dof, self.dof.cell2dofLocation
@@ -491,7 +460,7 @@ class ConformingVirtualElementSpace2d():
             val = np.einsum('i, ijmk, jk->mji', ws, gphi0, nm, optimize=True)
             idx = cell2dofLocation[edge2cell[:, [0]]] + \
                     (edge2cell[:, [2]]*p + np.arange(p+1))%(NV[edge2cell[:, [0]]]*p)
-            np.add.at(B, (np.s_[:], idx), val)
+            B += scatter_columns(idx, val, B.shape[1])
 
 
             if isInEdge.sum() > 0:
@@ -499,7 +468,7 @@ class ConformingVirtualElementSpace2d():
                 idx = cell2dofLocation[edge2cell[isInEdge, 1]].reshape(-1, 1) + \
                         (edge2cell[isInEdge, 3].reshape(-1, 1)*p + np.arange(p+1)) \
                         %(NV[edge2cell[isInEdge, 1]].reshape(-1, 1)*p)
-                np.add.at(B, (np.s_[:], idx), val)
+                B += scatter_columns(idx, val, B.shape[1])
             return B
 
     def matrix_G(self, B, D):
@@ -507,44 +476,39 @@ class ConformingVirtualElementSpace2d():
         if p == 1:
             G = np.array([(1, 0, 0), (0, 1, 0), (0, 0, 1)])
         else:
-            cell2dof, cell2dofLocation = self.dof.cell2dof, self.dof.cell2dofLocation
-            BB = np.hsplit(B, cell2dofLocation[1:-1])
-            DD = np.vsplit(D, cell2dofLocation[1:-1])
-            g = lambda x: x[0]@x[1]
-            G = list(map(g, zip(BB, DD)))
+            groups = self.dof.cellgroups
+            G = groups.array([B[:, loc].swapaxes(0, 1)@D[loc]
+                for _, loc in groups])
         return G
 
     def matrix_C(self, H, PI1):
         p = self.p
 
-        smldof = self.smspace.number_of_local_dofs()
         idof = (p-1)*p//2
 
-        mesh = self.mesh
-        NV = mesh.number_of_vertices_of_cells()
-        d = lambda x: x[0]@x[1]
-        C = list(map(d, zip(H, PI1)))
-        if p == 1:
-            return C
-        else:
-            l = lambda x: np.r_[
-                    '0',
-                    np.r_['1', np.zeros((idof, p*x[0])), x[1]*np.eye(idof)],
-                    x[2][idof:, :]]
-            return list(map(l, zip(NV, self.smspace.area, C)))
+        groups = self.dof.cellgroups
+        area = self.smspace.area
+        C = []
+        for (idx, loc), pi1 in zip(groups, groups.stack(PI1)):
+            c = H[idx]@pi1
+            if p > 1:
+                ldof = loc.shape[1]
+                c[:, :idof, :] = 0
+                c[:, :idof, ldof-idof:] = area[idx].reshape(-1, 1, 1)*np.eye(idof)
+            C.append(c)
+        return groups.array(C)
 
     def matrix_PI_0(self, H, C):
-        cell2dof, cell2dofLocation = self.dof.cell2dof, self.dof.cell2dofLocation
-        pi0 = lambda x: inv(x[0])@x[1]
-        return list(map(pi0, zip(H, C)))
+        groups = self.dof.cellgroups
+        return groups.array([np.linalg.solve(H[idx], c)
+            for (idx, _), c in zip(groups, groups.stack(C))])
 
     def matrix_PI_1(self, G, B):
         p = self.p
-        cell2dof, cell2dofLocation = self.dof.cell2dof, self.dof.cell2dofLocation
+        groups = self.dof.cellgroups
+        BB = [B[:, loc].swapaxes(0, 1) for _, loc in groups]
         if p == 1:
-            return np.hsplit(B, cell2dofLocation[1:-1])
+            return groups.array(BB)
         else:
-            BB = np.hsplit(B, cell2dofLocation[1:-1])
-            g = lambda x: inv(x[0])@x[1]
-            return list(map(g, zip(G, BB)))
-
+            return groups.array([np.linalg.solve(g, b)
+                for g, b in zip(groups.stack(G), BB)])
@@ -1,5 +1,6 @@
 import numpy as np
 from numpy.linalg import inv
+from scipy.sparse import csr_matrix
 from .function import Function
 from ..quadrature import GaussLobattoQuadrature
 from ..quadrature import GaussLegendreQuadrature
@@ -299,10 +300,18 @@ class ScaledMonomialSpace2d():
         b = node[edge[isInEdge, 0]] - self.barycenter[edge2cell[isInEdge, 1]]
         H1 = np.einsum('ij, ij, ikm->ikm', b, -nm[isInEdge], H1)
 
+        # sum the edge integrals into the cells by sparse products, which is
+        # much faster than `np.add.at`
         ldof = self.number_of_local_dofs()
-        H = np.zeros((NC, ldof, ldof), dtype=np.float)
-        np.add.at(H, edge2cell[:, 0], H0)
-        np.add.at(H, edge2cell[isInEdge, 1], H1)
+        NE = len(edge2cell)
+        NIE = isInEdge.sum()
+        e2c = csr_matrix((np.ones(NE), (edge2cell[:, 0], range(NE))),
+                shape=(NC, NE))
+        H = e2c@H0.reshape(NE, ldof*ldof)
+        e2c = csr_matrix((np.ones(NIE), (edge2cell[isInEdge, 1], range(NIE))),
+                shape=(NC, NIE))
+        H += e2c@H1.reshape(NIE, ldof*ldof)
+        H = H.reshape(NC, ldof, ldof)
 
         multiIndex = self.dof.multiIndex
         q = np.sum(multiIndex, axis=1)
@@ -0,0 +1,486 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import LinearOperator
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .tabulation import tabulation
+
+
+def default_blocksize(ne):
+    """ The number of cells in one block, such that the element matrices of
+    the block have about `2**16` entries, where `ne` is the number of the
+    entries of one element matrix
+    """
+    return max(1, 2**16//ne)
+
+
+class AssemblyPlan():
+    """ The CSR sparsity pattern of a finite element matrix together with the
+    map which scatters the entries of the element matrices into the `data`
+    array of the CSR matrix.
+
+    The plan only depends on `cell2dof`, so it is built once for a fixed
+    space, and every re-assembly is a single `np.bincount` over the flat
+    element matrices instead of a COO to CSR conversion.
+
+    The pattern is built for blocks of rows at a time, and the scatter map
+    of the whole mesh is only built at the first use of `scatter`. The blocked
+    assembly computes the positions of one block by `block_data`, so its
+    memory is the one of the pattern and of one block.
+    """
+    def __init__(self, cell2dof, gdof, cell2dof1=None, gdof1=None,
+            blocksize=None):
+        """
+
+        Parameters
+        ----------
+        cell2dof : numpy.array
+            the row dofs of every cell with shape `(NC, ldof)`
+        gdof : int
+            the number of rows
+        cell2dof1 : numpy.array
+            the column dofs of every cell with shape `(NC, ldof1)`, default
+            is `cell2dof`
+        gdof1 : int
+            the number of columns, default is `gdof`
+        blocksize : int
+            the number of cells in one block of the construction, default is
+            `default_blocksize(ldof*ldof1)`
+        """
+        if cell2dof1 is None:
+            cell2dof1 = cell2dof
+            gdof1 = gdof
+
+        NC, ldof = cell2dof.shape
+        ldof1 = cell2dof1.shape[1]
+
+        self.cell2dof = cell2dof
+        self.cell2dof1 = cell2dof1
+        self.shape = (gdof, gdof1)
+        self.elshape = (ldof, ldof1)
+        self.NC = NC
+        if blocksize is None:
+            blocksize = default_blocksize(ldof*ldof1)
+        self.blocksize = blocksize
+
+        # the symbolic pass: the cells around every row dof are gathered from
+        # `cell2dof` sorted by the dofs, and the sorted keys `i*gdof1 + j` are
+        # built for a block of rows at a time, so the keys of the rows with
+        # about `blocksize*ldof` cells are alive besides the pattern
+        c2d = cell2dof.reshape(-1)
+        order = np.argsort(c2d, kind='stable')
+        start = np.zeros(gdof+1, dtype=np.int_)
+        np.cumsum(np.bincount(c2d, minlength=gdof), out=start[1:])
+        bound = np.searchsorted(start, np.arange(0, len(c2d), blocksize*ldof),
+                side='right') - 1
+        bound = np.unique(np.r_[0, bound, gdof])
+
+        key = []
+        number = np.zeros(gdof, dtype=np.int_)
+        for r0, r1 in zip(bound[:-1], bound[1:]):
+            slot = order[start[r0]:start[r1]]
+            I = c2d[slot].astype(np.int64)
+            k = np.unique(I[:, None]*gdof1 + cell2dof1[slot//ldof])
+            number[r0:r1] = np.bincount(k//gdof1 - r0, minlength=r1-r0)
+            key.append(k)
+        del order, slot
+        key = np.concatenate(key)
+
+        self.key = key
+        self.nnz = len(key)
+
+        itype = np.int32 if max(self.nnz, gdof, gdof1) < 2**31 else np.int64
+        self.indices = (key % gdof1).astype(itype)
+        self.indptr = np.zeros(gdof+1, dtype=itype)
+        np.cumsum(number, out=self.indptr[1:])
+        self._scatter = None
+
+    def number_of_cells(self):
+        return self.NC
+
+    def blocks(self, blocksize=None):
+        """ The slices of the cells in blocks of `blocksize`, default is the
+        one of the plan
+        """
+        blocksize = self.blocksize if blocksize is None else blocksize
+        return [slice(i, i+blocksize) for i in range(0, self.NC, blocksize)]
+
+    def block_key(self, index):
+        """ The keys `i*gdof1 + j` of the entries of the element matrices of
+        the cells `index`
+        """
+        I = self.cell2dof[index, :, None].astype(np.int64)
+        J = self.cell2dof1[index, None, :]
+        return (I*self.shape[1] + J).reshape(-1)
+
+    def block_data(self, index, val):
+        """ Sum the element matrices `val` of the cells `index` by their
+        positions in the `data` array
+
+        Returns
+        -------
+        pos : numpy.array
+            the sorted positions in the `data` array
+        data : numpy.array
+            the sums of the entries at `pos`, which are added to the `data`
+            array by `data[pos] += val`
+        """
+        key, inverse = np.unique(self.block_key(index), return_inverse=True)
+        pos = np.searchsorted(self.key, key)
+        return pos, np.bincount(inverse, weights=val.reshape(-1))
+
+    @property
+    def scatter(self):
+        """ The positions in the `data` array of all the entries of the flat
+        element matrices with shape `(NC*ldof*ldof1, )`, built at the first
+        use.
+        """
+        if self._scatter is None:
+            ne = self.elshape[0]*self.elshape[1]
+            scatter = np.empty(self.NC*ne, dtype=self.indices.dtype)
+            for index in self.blocks():
+                pos = np.searchsorted(self.key, self.block_key(index))
+                scatter[index.start*ne:index.start*ne+len(pos)] = pos
+            self._scatter = scatter
+        return self._scatter
+
+    def assemble_data(self, val, out=None):
+        """ Sum the element matrices `val` into the CSR `data` array
+
+        Parameters
+        ----------
+        val : numpy.array
+            the element matrices with shape `(NC, ldof, ldof1)`
+        out : numpy.array
+            a preallocated array of length `nnz` to hold the result
+
+        Returns
+        -------
+        data : numpy.array
+            the `data` array of the assembled CSR matrix
+        """
+        data = np.bincount(self.scatter, weights=val.reshape(-1),
+                minlength=self.nnz)
+        if out is None:
+            return data
+        else:
+            out[:] = data
+            return out
+
+    def assemble(self, val, out=None):
+        """ Assemble the element matrices `val` into a CSR matrix
+
+        Parameters
+        ----------
+        val : numpy.array
+            the element matrices with shape `(NC, ldof, ldof1)`
+        out : scipy.sparse.csr_matrix
+            a matrix created by this plan before; its `data` array is
+            overwritten in place and no new matrix is allocated
+
+        Returns
+        -------
+        A : scipy.sparse.csr_matrix
+        """
+        if out is not None:
+            self.assemble_data(val, out=out.data)
+            return out
+        data = self.assemble_data(val)
+        return csr_matrix(
+                (data, self.indices.copy(), self.indptr.copy()),
+                shape=self.shape)
+
+
+def reference_stiff_tensor(space, bcs, ws):
+    """ The stiffness tensor of the barycentric derivatives of the basis
+
+    Parameters
+    ----------
+    space : LagrangeFiniteElementSpace
+    bcs : numpy.array
+        the quadrature points with shape `(NQ, TD+1)`
+    ws : numpy.array
+        the quadrature weights with shape `(NQ, )`
+
+    Returns
+    -------
+    S : numpy.array
+        the tensor `S[k, p, i, j]` with shape `(ldof, ldof, TD+1, TD+1)`,
+        which only depends on `p`, `TD` and the quadrature, and is kept in
+        the cache `tabulation`.
+
+    Notes
+    -----
+    The element stiffness matrix on a straight simplex `K` is
+        A_K[k, p] = |K| sum_{i, j} S[k, p, i, j] (grad lambda_i . grad lambda_j).
+    """
+    def build():
+        R = space.barycentric_grad_basis(bcs)
+        return np.einsum('q, qki, qpj->kpij', ws, R, R)
+    return tabulation.get('stiff', space, (bcs, ws), build)
+
+
+def simplex_stiff_matrix(S, Dlambda, measure):
+    """ Compute all the element stiffness matrices by one GEMM of the
+    reference tensor `S` against the metric tensor of the cells
+
+    Parameters
+    ----------
+    S : numpy.array
+        the reference tensor with shape `(ldof, ldof, TD+1, TD+1)`
+    Dlambda : numpy.array
+        the gradients of the barycentric coordinates, `(NC, TD+1, GD)`
+    measure : numpy.array
+        the measure of the cells, `(NC, )`
+
+    Returns
+    -------
+    A : numpy.array
+        the element stiffness matrices with shape `(NC, ldof, ldof)`
+    """
+    NC = Dlambda.shape[0]
+    ldof = S.shape[0]
+    G = np.einsum('cim, cjm, c->cij', Dlambda, Dlambda, measure)
+    A = G.reshape(NC, -1)@S.reshape(ldof*ldof, -1).T
+    return A.reshape(NC, ldof, ldof)
+
+
+def thread_map(f, items, nthreads=None):
+    """ Yield `f(item)` for the items in their order
+
+    Parameters
+    ----------
+    f : function
+    items : list
+    nthreads : int
+        if it is not None, `f` is computed by a pool of `nthreads` threads,
+        with at most `2*nthreads` results waiting to be taken
+
+    Notes
+    -----
+    The results are taken in the order of `items` whatever `nthreads` is,
+    so the reductions over them are the same as the serial ones.
+    """
+    if nthreads is None:
+        for item in items:
+            yield f(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=nthreads) as executor:
+        futures = deque()
+        for item in items:
+            futures.append(executor.submit(f, item))
+            if len(futures) > 2*nthreads:
+                yield futures.popleft().result()
+        while len(futures) > 0:
+            yield futures.popleft().result()
+
+
+def cell_matrices(cellmatrix, NC, blocksize, nthreads=None):
+    """ Compute the element matrices of all the cells block by block
+
+    Parameters
+    ----------
+    cellmatrix : function
+        `cellmatrix(index)` returns the element matrices of the cells
+        `index` (a slice) with shape `(nb, ldof, ldof)`
+    NC : int
+        the number of cells
+    blocksize : int
+        the number of cells in one block
+    nthreads : int
+        if it is not None, the blocks are computed by a pool of `nthreads`
+        threads
+
+    Returns
+    -------
+    A : numpy.array
+        the element matrices with shape `(NC, ldof, ldof)`
+
+    Notes
+    -----
+    The blocks only depend on `blocksize`, and every block is written into
+    its slice of one preallocated array, so the result is bit-identical
+    for any `nthreads`. The heavy NumPy kernels (einsum, matmul) release the
+    GIL. Set the BLAS threads to 1 (e.g. `OMP_NUM_THREADS=1`) to avoid
+    oversubscription.
+    """
+    blocks = [slice(i, i+blocksize) for i in range(0, NC, blocksize)]
+
+    A0 = cellmatrix(blocks[0])
+    A = np.empty((NC, ) + A0.shape[1:], dtype=A0.dtype)
+    A[blocks[0]] = A0
+    del A0
+
+    def work(index):
+        A[index] = cellmatrix(index)
+
+    for _ in thread_map(work, blocks[1:], nthreads=nthreads):
+        pass
+    return A
+
+
+def block_assemble(cellmatrix, plan, blocksize, out=None, nthreads=None):
+    """ Assemble a matrix by streaming the cells in blocks
+
+    Parameters
+    ----------
+    cellmatrix : function
+        `cellmatrix(index)` returns the element matrices of the cells
+        `index` (a slice) with shape `(nb, ldof, ldof)`
+    plan : AssemblyPlan
+        the sparsity pattern of the matrix
+    blocksize : int
+        the number of cells in one block
+    out : scipy.sparse.csr_matrix
+        a matrix created by `plan` before, whose `data` array is
+        overwritten in place
+    nthreads : int
+        if it is not None, the blocks are computed by a pool of `nthreads`
+        threads
+
+    Returns
+    -------
+    A : scipy.sparse.csr_matrix
+
+    Notes
+    -----
+    The entries of every block are summed by their positions in the `data`
+    array (`plan.block_data`), and the sums of the blocks are added to the
+    `data` array in the order of the blocks, so the result is bit-identical
+    for any `nthreads`. Besides the pattern and the output only a few
+    blocks are alive at the same time, and the scatter map of the whole
+    mesh is never built.
+    """
+    def work(index):
+        return plan.block_data(index, cellmatrix(index))
+
+    data = np.zeros(plan.nnz, dtype=np.float64)
+    for pos, val in thread_map(work, plan.blocks(blocksize), nthreads=nthreads):
+        data[pos] += val
+
+    if out is not None:
+        out.data[:] = data
+        return out
+    return csr_matrix(
+            (data, plan.indices.copy(), plan.indptr.copy()),
+            shape=plan.shape)
+
+
+class CellLinearOperator(LinearOperator):
+    """ A symmetric finite element matrix given by its action, the global
+    matrix is never assembled.
+
+    `A@x` gathers `x[cell2dof]`, applies the element matrices to the local
+    vectors by `cellmatvec(index, xK)` block by block and scatters the
+    local results of all the blocks back with one `np.bincount`.
+    `diagonal()` is the diagonal of the assembled matrix, so the Jacobi
+    preconditioner `spdiags(1/A.diagonal(), ...)` works as for a sparse
+    matrix.
+    """
+    def __init__(self, cellmatvec, cell2dof, gdof, diag, blocksize=None,
+            isBdDof=None):
+        """
+
+        Parameters
+        ----------
+        cellmatvec : function
+            `cellmatvec(index, xK)` returns the products of the element
+            matrices of the cells `index` (a slice) and the local vectors
+            `xK` with shape `(nb, ldof)`
+        cell2dof : numpy.array
+            the dofs of every cell with shape `(NC, ldof)`
+        gdof : int
+            the number of global dofs
+        diag : numpy.array
+            the diagonal of the assembled matrix
+        blocksize : int
+            the number of cells in one block of the matrix-vector product,
+            default is `default_blocksize(ldof*ldof)`, so besides the local
+            vectors with shape `(NC, ldof)` the temporary arrays of a product
+            are bounded by the block
+        isBdDof : numpy.array
+            the Dirichlet dofs, whose rows and columns are replaced by the
+            ones of the identity, as `T@A@T + Tbd` does
+        """
+        super().__init__(dtype=np.float64, shape=(gdof, gdof))
+        NC, ldof = cell2dof.shape
+        if blocksize is None:
+            blocksize = default_blocksize(ldof*ldof)
+        self.cellmatvec = cellmatvec
+        self.cell2dof = cell2dof
+        self.gdof = gdof
+        self.diag = diag
+        self.blocksize = blocksize
+        self.isBdDof = isBdDof
+        self.blocks = [slice(i, i+blocksize) for i in range(0, NC, blocksize)]
+
+    def _matvec(self, x):
+        x = np.asarray(x).reshape(-1)
+        if self.isBdDof is not None:
+            x0 = x
+            x = x.copy()
+            x[self.isBdDof] = 0
+        yK = np.empty(self.cell2dof.shape, dtype=np.float64)
+        for index in self.blocks:
+            yK[index] = self.cellmatvec(index, x[self.cell2dof[index]])
+        y = np.bincount(self.cell2dof.flat, weights=yK.flat,
+                minlength=self.gdof)
+        if self.isBdDof is not None:
+            y[self.isBdDof] = x0[self.isBdDof]
+        return y
+
+    def _rmatvec(self, x):
+        return self._matvec(x)
+
+    def _adjoint(self):
+        return self
+
+    def diagonal(self):
+        d = self.diag.copy()
+        if self.isBdDof is not None:
+            d[self.isBdDof] = 1
+        return d
+
+    def apply_dirichlet(self, isBdDof):
+        """ The operator of `T@A@T + Tbd`, which shares the element data with
+        this one
+        """
+        return CellLinearOperator(self.cellmatvec, self.cell2dof, self.gdof,
+                self.diag, blocksize=self.blocksize, isBdDof=isBdDof)
+
+
+def cell_matrices_operator(cellmatrix, cell2dof, gdof, cache=True,
+        blocksize=None):
+    """ The `CellLinearOperator` of the element matrices `cellmatrix(index)`
+
+    Parameters
+    ----------
+    cache : bool
+        if it is True, the element matrices are computed once and kept,
+        otherwise they are computed block by block in every product and
+        only the diagonal is kept
+    blocksize : int
+        the number of cells in one block, default is
+        `default_blocksize(ldof*ldof)`
+    """
+    NC, ldof = cell2dof.shape
+    if blocksize is None:
+        blocksize = default_blocksize(ldof*ldof)
+    if cache:
+        A = cell_matrices(cellmatrix, NC, blocksize)
+        cellmatvec = lambda index, xK: np.einsum('cij, cj->ci', A[index], xK)
+        diag = np.bincount(cell2dof.flat,
+                weights=np.diagonal(A, axis1=1, axis2=2).flat, minlength=gdof)
+    else:
+        cellmatvec = lambda index, xK: np.einsum('cij, cj->ci',
+                cellmatrix(index), xK)
+        diag = np.zeros(gdof, dtype=np.float64)
+        for i in range(0, NC, blocksize):
+            index = slice(i, i+blocksize)
+            d = np.diagonal(cellmatrix(index), axis1=1, axis2=2)
+            diag += np.bincount(cell2dof[index].flat, weights=d.flat,
+                    minlength=gdof)
+    return CellLinearOperator(cellmatvec, cell2dof, gdof, diag,
+            blocksize=blocksize)
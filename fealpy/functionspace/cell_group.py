@@ -0,0 +1,132 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def scatter_columns(idx, val, n):
+    """ Sum the columns `val[:, i, j]` into the columns `idx[i, j]` of a
+    matrix with `n` columns, by a sparse product instead of `np.add.at`
+    """
+    m = val.shape[0]
+    N = idx.size
+    S = csr_matrix((np.ones(N), (range(N), idx.flat)), shape=(N, n))
+    return val.reshape(m, N)@S
+
+
+class CellGroups():
+    """ The cells of a polygon mesh grouped by their number of local dofs
+
+    The local matrices of the cells in one group have the same shape, so
+    they are stacked into one array and computed by batched `np.linalg`
+    and `einsum` calls instead of a Python loop over the cells.
+    """
+    def __init__(self, location):
+        """
+
+        Parameters
+        ----------
+        location : numpy.array
+            the start of the local dofs of every cell in the flat `cell2dof`
+            array, with length `NC + 1`
+        """
+        NC = len(location) - 1
+        ldof = np.diff(location)
+        self.NC = NC
+        self.location = location
+        self.group = []
+        self.cell2group = np.zeros(NC, dtype=np.int_)
+        self.cell2pos = np.zeros(NC, dtype=np.int_)
+        for i, l in enumerate(np.unique(ldof)):
+            idx, = np.nonzero(ldof == l)
+            loc = location[idx].reshape(-1, 1) + np.arange(l)
+            self.group.append((idx, loc))
+            self.cell2group[idx] = i
+            self.cell2pos[idx] = np.arange(len(idx))
+
+    def __len__(self):
+        return len(self.group)
+
+    def __iter__(self):
+        return iter(self.group)
+
+    def array(self, batch):
+        """ Wrap the stacked local matrices of the groups as a sequence of
+        the local matrices of the cells
+        """
+        return GroupedArray(self, batch)
+
+    def stack(self, val):
+        """ Stack the local matrices `val` of the cells group by group
+
+        Parameters
+        ----------
+        val : GroupedArray or sequence
+            the local matrices of the cells, `val[i]` is the matrix of the
+            `i`-th cell
+
+        Returns
+        -------
+        batch : list
+            the `g`-th array has shape `(len(idx), ...)`, where `idx` are
+            the cells in the `g`-th group
+        """
+        if isinstance(val, GroupedArray) and (val.groups is self or
+                np.array_equal(val.groups.location, self.location)):
+            return val.batch
+        return [np.array([val[i] for i in idx]) for idx, _ in self.group]
+
+    def split(self, D):
+        """ Split the rows of `D` by the local dofs of the cells
+
+        Returns
+        -------
+        batch : list
+            the `g`-th array with shape `(len(idx), ldof, ...)`
+        """
+        return [D[loc] for _, loc in self.group]
+
+    def assemble(self, cell2dof, K, shape):
+        """ Assemble the stacked local matrices `K` of all the groups into one
+        CSR matrix
+        """
+        I = []
+        J = []
+        val = []
+        for (idx, loc), k in zip(self.group, K):
+            cd = cell2dof[loc]
+            I.append(np.broadcast_to(cd[:, :, None], k.shape).reshape(-1))
+            J.append(np.broadcast_to(cd[:, None, :], k.shape).reshape(-1))
+            val.append(k.reshape(-1))
+        I = np.concatenate(I)
+        J = np.concatenate(J)
+        val = np.concatenate(val)
+        return csr_matrix((val, (I, J)), shape=shape, dtype=np.float)
+
+    def assemble_vector(self, cell2dof, b, gdof):
+        """ Assemble the stacked local vectors `b` of all the groups
+        """
+        I = np.concatenate([cell2dof[loc].reshape(-1) for _, loc in self.group])
+        val = np.concatenate([v.reshape(-1) for v in b])
+        return np.bincount(I, weights=val, minlength=gdof)
+
+
+class GroupedArray():
+    """ The local matrices of all the cells stored group by group
+
+    It behaves like the list of the local matrices in the order of the
+    cells, which is what the callers used to get, and keeps the stacked
+    arrays in `batch` for the batched computations.
+    """
+    def __init__(self, groups, batch):
+        self.groups = groups
+        self.batch = batch
+
+    def __len__(self):
+        return self.groups.NC
+
+    def __getitem__(self, i):
+        g = self.groups.cell2group[i]
+        return self.batch[g][self.groups.cell2pos[i]]
+
+    def __iter__(self):
+        for i in range(self.groups.NC):
+            yield self[i]
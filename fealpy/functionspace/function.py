@@ -37,6 +37,37 @@ class Function(np.ndarray):
         space = self.space
         return space.hessian_value(self, bc, cellidx=cellidx)
 
+    def probe(self, points, locator=None):
+        """ The values at the physical `points`, `nan` outside the mesh
+
+        Parameters
+        ----------
+        points : numpy.array
+            the points with shape `(N, GD)`
+        locator : PointLocator
+            default is the locator kept on the mesh, see `point_locator`
+        """
+        from ..mesh.point_location import point_locator
+        space = self.space
+        mesh = space.mesh
+        if locator is None:
+            locator = point_locator(mesh)
+        points = np.asarray(points)
+        cellidx, bc = locator.locate(points)
+        isFound = cellidx >= 0
+        cellidx = cellidx[isFound]
+
+        val = np.full((len(isFound), ) + self.shape[1:], np.nan, dtype=np.float)
+        if mesh.meshtype == 'polygon':
+            val[isFound] = space.value(self, bc[isFound], cellidx=cellidx)
+        elif mesh.meshtype in {'tri', 'tet'}:
+            phi = space.basis(bc[isFound])
+            cell2dof = space.cell_to_dof()
+            val[isFound] = np.einsum('ij, ij...->i...', phi, self[cell2dof[cellidx]])
+        else:
+            raise ValueError("We don't support probing the functions on the `{}` mesh!".format(mesh.meshtype))
+        return val
+
     def add_plot(self, plt):
         mesh = self.space.mesh
         if mesh.meshtype is 'tri':
@@ -3,6 +3,11 @@ from scipy.sparse import coo_matrix, csr_matrix, spdiags
 from .function import Function
 from .femdof import CPLFEMDof1d, CPLFEMDof2d, CPLFEMDof3d
 from .femdof import DPLFEMDof1d, DPLFEMDof2d, DPLFEMDof3d
+from .assembly import AssemblyPlan
+from .assembly import reference_stiff_tensor, simplex_stiff_matrix
+from .assembly import block_assemble, cell_matrices, default_blocksize
+from .assembly import CellLinearOperator, cell_matrices_operator
+from .tabulation import tabulation
 
 from ..quadrature import GaussLegendreQuadrature
 from ..quadrature import FEMeshIntegralAlg
@@ -11,7 +16,6 @@ from ..quadrature import FEMeshIntegralAlg
 class LagrangeFiniteElementSpace():
     def __init__(self, mesh, p=1, spacetype='C', q=None):
         self.mesh = mesh
-        self.cellmeasure = mesh.entity_measure('cell')
         self.p = p
         if spacetype is 'C':
             if mesh.meshtype is 'interval':
@@ -51,10 +55,16 @@ class LagrangeFiniteElementSpace():
         else:
             self.integrator = mesh.integrator(q)
 
-        self.integralalg = FEMeshIntegralAlg(
-                self.integrator,
-                self.mesh,
-                self.cellmeasure)
+        self.integralalg = FEMeshIntegralAlg(self.integrator, self.mesh)
+
+        self.assemblyplan = None
+
+    @property
+    def cellmeasure(self):
+        """ The measure of the cells, read from the geometry cache of the
+        mesh, so it follows the nodes when they are moved
+        """
+        return self.mesh.entity_measure('cell')
 
     def __str__(self):
         return "Lagrange finite element space!"
@@ -71,6 +81,16 @@ class LagrangeFiniteElementSpace():
     def cell_to_dof(self):
         return self.dof.cell2dof
 
+    def assembly_plan(self):
+        """ The sparsity pattern and scatter map shared by all the matrices
+        assembled on this space, built at the first call.
+        """
+        if self.assemblyplan is None:
+            cell2dof = self.cell_to_dof()
+            gdof = self.number_of_global_dofs()
+            self.assemblyplan = AssemblyPlan(cell2dof, gdof)
+        return self.assemblyplan
+
     def boundary_dof(self):
         if self.spacetype is 'C':
             return self.dof.boundary_dof()
@@ -140,39 +160,7 @@ class LagrangeFiniteElementSpace():
             bcs[idx, ..., nmap[lidx]] = bc[..., 1]
             bcs[idx, ..., pmap[lidx]] = bc[..., 0]
 
-        p = self.p   # the degree of polynomial basis function
-        TD = self.TD
-
-        multiIndex = self.dof.multiIndex
-
-        c = np.arange(1, p+1, dtype=self.itype)
-        P = 1.0/np.multiply.accumulate(c)
-
-        t = np.arange(0, p)
-        shape = bcs.shape[:-1]+(p+1, TD+1)
-        A = np.ones(shape, dtype=self.ftype)
-        A[..., 1:, :] = p*bcs[..., np.newaxis, :] - t.reshape(-1, 1)
-
-        FF = np.einsum('...jk, m->...kjm', A[..., 1:, :], np.ones(p))
-        FF[..., range(p), range(p)] = p
-        np.cumprod(FF, axis=-2, out=FF)
-        F = np.zeros(shape, dtype=self.ftype)
-        F[..., 1:, :] = np.sum(np.tril(FF), axis=-1).swapaxes(-1, -2)
-        F[..., 1:, :] *= P.reshape(-1, 1)
-
-        np.cumprod(A, axis=-2, out=A)
-        A[..., 1:, :] *= P.reshape(-1, 1)
-
-        Q = A[..., multiIndex, range(TD+1)]
-        M = F[..., multiIndex, range(TD+1)]
-        ldof = self.number_of_local_dofs()
-        shape = bcs.shape[:-1]+(ldof, TD+1)
-        R = np.zeros(shape, dtype=self.ftype)
-        for i in range(TD+1):
-            idx = list(range(TD+1))
-            idx.remove(i)
-            R[..., i] = M[..., i]*np.prod(Q[..., idx], axis=-1)
-
+        R = self.barycentric_grad_basis(bcs)
         Dlambda = self.mesh.grad_lambda()
         gphi = np.einsum('k...ij, kjm->k...im', R, Dlambda[cellidx, :, :])
         return gphi
@@ -195,7 +183,9 @@ class LagrangeFiniteElementSpace():
 
         Notes
         -----
-
+        The values at the quadrature points are kept in the cache
+        `tabulation` and shared by all the spaces of the same degree, so
+        they are read-only.
         """
         p = self.p   # the degree of polynomial basis function
 
@@ -205,6 +195,13 @@ class LagrangeFiniteElementSpace():
             else:
                 return np.ones((bc.shape[0], 1), dtype=self.ftype)
 
+        return tabulation.get('phi', self, (bc, ), lambda: self.tabulate_basis(bc))
+
+    def tabulate_basis(self, bc):
+        """ compute the basis function values at barycentric point bc
+        without the cache, see `basis`
+        """
+        p = self.p
         TD = self.TD
         multiIndex = self.dof.multiIndex
 
@@ -241,6 +238,42 @@ class LagrangeFiniteElementSpace():
         Notes
         -----
 
+        """
+        R = self.barycentric_grad_basis(bc)
+        Dlambda = self.mesh.grad_lambda()
+        if cellidx is None:
+            gphi = np.einsum('...ij, kjm->...kim', R, Dlambda)
+        else:
+            gphi = np.einsum('...ij, kjm->...kim', R, Dlambda[cellidx, :, :])
+        return gphi
+
+    def barycentric_grad_basis(self, bc):
+        """
+        compute the derivatives of the basis functions with respect to the
+        barycentric coordinates at barycentric point bc
+
+        Parameters
+        ----------
+        bc : numpy.array
+            the shape of `bc` can be `(tdim+1,)` or `(NQ, tdim+1)`
+
+        Returns
+        -------
+        R : numpy.array
+            the shape of `R` can be `(ldof, tdim+1)` or `(NQ, ldof, tdim+1)`
+
+        Notes
+        -----
+        The gradient of the basis functions on a cell is
+        `R@grad_lambda()[cell]`. The tables of the quadrature points are
+        kept in the cache `tabulation`, so they are read-only.
+        """
+        return tabulation.get('dphi', self, (bc, ),
+                lambda: self.tabulate_barycentric_grad_basis(bc))
+
+    def tabulate_barycentric_grad_basis(self, bc):
+        """ compute the derivatives of the basis functions with respect to
+        the barycentric coordinates without the cache
         """
         p = self.p   # the degree of polynomial basis function
         TD = self.TD
@@ -274,13 +307,7 @@ class LagrangeFiniteElementSpace():
             idx = list(range(TD+1))
             idx.remove(i)
             R[..., i] = M[..., i]*np.prod(Q[..., idx], axis=-1)
-
-        Dlambda = self.mesh.grad_lambda()
-        if cellidx is None:
-            gphi = np.einsum('...ij, kjm->...kim', R, Dlambda)
-        else:
-            gphi = np.einsum('...ij, kjm->...kim', R, Dlambda[cellidx, :, :])
-        return gphi
+        return R
 
     def value(self, uh, bc, cellidx=None):
         phi = self.basis(bc)
@@ -337,61 +364,235 @@ class LagrangeFiniteElementSpace():
             shape = (gdof, ) + dim
         return np.zeros(shape, dtype=self.ftype)
 
-    def stiff_matrix(self, cfun=None):
-        p = self.p
+    def cell_to_point(self, bc, cellidx=None):
+        """
+        map the barycentric point bc to the physical points on the cells
+        `cellidx`
+
+        Returns
+        -------
+        ps : numpy.array
+            the shape of `ps` can be `(NC, gdim)` or `(NQ, NC, gdim)`
+        """
+        if cellidx is None:
+            return self.mesh.bc_to_point(bc)
+        node = self.mesh.entity('node')
+        cell = self.mesh.entity('cell')
+        if len(node.shape) == 1:
+            return np.einsum('...j, ij->...i', bc, node[cell[cellidx]])
+        else:
+            return np.einsum('...j, ijk->...ik', bc, node[cell[cellidx]])
+
+    def cell_stiff_matrices(self, cfun=None, cellidx=None, Dlambda=None):
+        """
+        compute the element stiffness matrices on the cells `cellidx`
+
+        Parameters
+        ----------
+        Dlambda : numpy.array
+            `grad_lambda()` on the cells `cellidx`, computed here if it is
+            None
+
+        Returns
+        -------
+        A : numpy.array
+            the shape of `A` is `(NC, ldof, ldof)`
+        """
         GD = self.mesh.geo_dimension()
 
-        if p == 0:
-            raise ValueError('The space order is 0!')
+        index = slice(None) if cellidx is None else cellidx
+        measure = self.cellmeasure[index]
+        if Dlambda is None:
+            Dlambda = self.mesh.grad_lambda()[index]
 
         bcs, ws = self.integrator.get_quadrature_points_and_weights()
-        gphi = self.grad_basis(bcs)
-
-        if cfun is not None:
-            ps = self.mesh.bc_to_point(bcs)
+        if cfun is None:
+            d = 1.0
+        else:
+            ps = self.cell_to_point(bcs, cellidx=cellidx)
             d = cfun(ps)
 
-            if isinstance(d, (int, float)):
-                dgphi = d*gphi
-            elif len(d) == GD:
-                dgphi = np.einsum('m, ...im->...im', d, gphi)
-            elif isinstance(d, np.ndarray):
-                if len(d.shape) == 1:
-                    dgphi = np.einsum('i, ...imn->...imn', d, gphi)
-                elif len(d.shape) == 2:
-                    dgphi = np.einsum('...i, ...imn->...imn', d, gphi)
-                elif len(d.shape) == 3: #TODO:
-                    dgphi = np.einsum('...imn, ...in->...im', d, gphi)
-                elif len(d.shape) == 4: #TODO:
-                    dgphi = np.einsum('...imn, ...in->...im', d, gphi)
-                else:
-                    raise ValueError("The ndarray shape length should < 5!")
+        if isinstance(d, (int, float)):
+            # The gradients of the basis on a simplex are linear combinations
+            # of `grad_lambda`, so contract the reference tensor with the
+            # metric of every cell instead of evaluating `grad_basis`.
+            S = reference_stiff_tensor(self, bcs, ws)
+            A = simplex_stiff_matrix(S, Dlambda, measure)
+            if d != 1.0:
+                A *= d
+            return A
+
+        R = self.barycentric_grad_basis(bcs)
+        gphi = np.einsum('...ij, kjm->...kim', R, Dlambda)
+        if len(d) == GD:
+            dgphi = np.einsum('m, ...im->...im', d, gphi)
+        elif isinstance(d, np.ndarray):
+            if len(d.shape) == 1:
+                dgphi = np.einsum('i, ...imn->...imn', d, gphi)
+            elif len(d.shape) == 2:
+                dgphi = np.einsum('...i, ...imn->...imn', d, gphi)
+            elif len(d.shape) == 3: #TODO:
+                dgphi = np.einsum('...imn, ...in->...im', d, gphi)
+            elif len(d.shape) == 4: #TODO:
+                dgphi = np.einsum('...imn, ...in->...im', d, gphi)
             else:
-                raise ValueError(
-                        "The return of cfun is not a number or ndarray!"
-                        )
+                raise ValueError("The ndarray shape length should < 5!")
         else:
-            dgphi = gphi
+            raise ValueError(
+                    "The return of cfun is not a number or ndarray!"
+                    )
 
         # Compute the element sitffness matrix
-        A = np.einsum('i, ijkm, ijpm, j->jkp', ws, dgphi, gphi, self.cellmeasure, optimize=True)
-        cell2dof = self.cell_to_dof()
-        ldof = self.number_of_local_dofs()
-        I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
-        J = I.swapaxes(-1, -2)
-        gdof = self.number_of_global_dofs()
-
-        # Construct the stiffness matrix
-        A = csr_matrix((A.flat, (I.flat, J.flat)), shape=(gdof, gdof))
+        A = np.einsum('i, ijkm, ijpm, j->jkp', ws, dgphi, gphi, measure, optimize=True)
         return A
 
-    def mass_matrix(self, cfun=None, barycenter=False):
+    def stiff_matrix(self, cfun=None, out=None, blocksize=None, nthreads=None):
+        """
+        assemble the stiffness matrix
+
+        Parameters
+        ----------
+        cfun : function
+            the diffusion coefficient
+        out : scipy.sparse.csr_matrix
+            a matrix assembled on this space before, whose `data` array is
+            overwritten in place
+        blocksize : int
+            if it is not None, stream the cells in blocks of `blocksize`
+            through the local matrix computation, so the peak memory is
+            proportional to the block instead of the mesh
+        nthreads : int
+            if it is not None, compute the element matrices of the cell
+            blocks with a pool of `nthreads` threads, the result is
+            bit-identical to the serial one
+        """
         p = self.p
-        mesh = self.mesh
         if p == 0:
-            NC = mesh.number_of_cells()
-            M = spdiags(cellmeasure, 0, NC, NC)
-            return M
+            raise ValueError('The space order is 0!')
+
+        Dlambda = self.mesh.grad_lambda()
+        cellmatrix = lambda index: self.cell_stiff_matrices(
+                cfun=cfun, cellidx=index, Dlambda=Dlambda[index])
+        return self.assemble_cell_matrices(
+                cellmatrix, out=out, blocksize=blocksize, nthreads=nthreads)
+
+    def assemble_cell_matrices(self, cellmatrix, out=None, blocksize=None,
+            nthreads=None):
+        """
+        assemble the element matrices given by `cellmatrix(index)` on the
+        cells `index` in the way chosen by `blocksize` and `nthreads`
+
+        Without `blocksize` the element matrices are computed on the blocks
+        of the assembly plan, with or without threads, so the result does
+        not depend on `nthreads` bit by bit.
+        """
+        plan = self.assembly_plan()
+        if blocksize is not None:
+            return block_assemble(
+                    cellmatrix, plan, blocksize, out=out, nthreads=nthreads)
+        A = cell_matrices(
+                cellmatrix, plan.number_of_cells(), plan.blocksize,
+                nthreads=nthreads)
+        return plan.assemble(A, out=out)
+
+    def stiff_operator(self, cfun=None, cache=False, blocksize=None):
+        """
+        the stiffness matrix as a `LinearOperator`, which is never assembled
+
+        Parameters
+        ----------
+        cfun : function
+            the diffusion coefficient
+        cache : bool
+            keep the element matrices, the fastest product but the memory is
+            `NC*ldof**2`. Otherwise, for a constant coefficient only the
+            metric tensors `|K| grad lambda_i . grad lambda_j` of the cells
+            are kept and contracted with the reference stiffness tensor in
+            every product; for a variable coefficient the element matrices
+            are computed block by block in every product.
+        blocksize : int
+            the number of cells in one block of the product, default is
+            `default_blocksize(ldof*ldof)`, or `default_blocksize(ldof*m)`
+            with `m = (TD+1)**2` for the metric tensors
+
+        Returns
+        -------
+        A : CellLinearOperator
+            `A@x`, `A.diagonal()` and `A.apply_dirichlet(isBdDof)`
+        """
+        if self.p == 0:
+            raise ValueError('The space order is 0!')
+
+        cell2dof = self.cell_to_dof()
+        gdof = self.number_of_global_dofs()
+        Dlambda = self.mesh.grad_lambda()
+        if cache or (cfun is not None):
+            cellmatrix = lambda index: self.cell_stiff_matrices(
+                    cfun=cfun, cellidx=index, Dlambda=Dlambda[index])
+            return cell_matrices_operator(cellmatrix, cell2dof, gdof,
+                    cache=cache, blocksize=blocksize)
+
+        NC, ldof = cell2dof.shape
+        bcs, ws = self.integrator.get_quadrature_points_and_weights()
+        S = reference_stiff_tensor(self, bcs, ws)
+        m = S.shape[2]*S.shape[3]
+        G = np.einsum('cim, cjm, c->cij', Dlambda, Dlambda,
+                self.cellmeasure).reshape(NC, m)
+        # y[c, k] = sum_{p, ij} x[c, p] G[c, ij] S[k, p, ij]
+        S2 = S.reshape(ldof, ldof*m).T
+        if blocksize is None:
+            blocksize = default_blocksize(ldof*m)
+        def cellmatvec(index, xK):
+            W = xK[:, :, None]*G[index, None, :]
+            return W.reshape(len(W), -1)@S2
+        Sd = S[np.arange(ldof), np.arange(ldof)].reshape(ldof, m)
+        diag = np.bincount(cell2dof.flat, weights=(G@Sd.T).flat,
+                minlength=gdof)
+        return CellLinearOperator(cellmatvec, cell2dof, gdof, diag,
+                blocksize=blocksize)
+
+    def mass_operator(self, cfun=None, barycenter=False, cache=False,
+            blocksize=None):
+        """
+        the mass matrix as a `LinearOperator`, see `stiff_operator`
+
+        Notes
+        -----
+        Without a coefficient the element mass matrix of a simplex is
+        `|K|` times one reference matrix, so only the cell measures are used.
+        """
+        if self.p == 0:
+            raise ValueError('The space order is 0!')
+
+        cell2dof = self.cell_to_dof()
+        gdof = self.number_of_global_dofs()
+        if cache or (cfun is not None):
+            cellmatrix = lambda index: self.cell_mass_matrices(
+                    cfun=cfun, barycenter=barycenter, cellidx=index)
+            return cell_matrices_operator(cellmatrix, cell2dof, gdof,
+                    cache=cache, blocksize=blocksize)
+
+        bcs, ws = self.integrator.get_quadrature_points_and_weights()
+        phi = self.basis(bcs)
+        M = np.einsum('m, mj, mk->jk', ws, phi, phi)
+        measure = self.cellmeasure
+        cellmatvec = lambda index, xK: (xK@M.T)*measure[index, None]
+        diag = np.bincount(cell2dof.flat,
+                weights=np.outer(measure, np.diag(M)).flat, minlength=gdof)
+        return CellLinearOperator(cellmatvec, cell2dof, gdof, diag,
+                blocksize=blocksize)
+
+    def cell_mass_matrices(self, cfun=None, barycenter=False, cellidx=None):
+        """
+        compute the element mass matrices on the cells `cellidx`
+
+        Returns
+        -------
+        M : numpy.array
+            the shape of `M` is `(NC, ldof, ldof)`
+        """
+        index = slice(None) if cellidx is None else cellidx
+        measure = self.cellmeasure[index]
 
         bcs, ws = self.integrator.get_quadrature_points_and_weights()
         phi = self.basis(bcs)
@@ -399,8 +600,10 @@ class LagrangeFiniteElementSpace():
         if cfun is not None:
             if barycenter is True:
                 d = cfun(bcs)
+                if isinstance(d, np.ndarray):
+                    d = d[..., index]
             else:
-                ps = self.mesh.bc_to_point(bcs)
+                ps = self.cell_to_point(bcs, cellidx=cellidx)
                 d = cfun(ps)
 
             if isinstance(d, (int, float)):
@@ -422,40 +625,60 @@ class LagrangeFiniteElementSpace():
         if len(dphi.shape) == 2:
             M = np.einsum(
                     'm, mj, mk, i->ijk',
-                    ws, dphi, phi, cellmeasure,
+                    ws, dphi, phi, measure,
                     optimize=True)
         elif len(dphi.shape) == 3:
             M = np.einsum(
                     'm, mij, mk, i->ijk',
-                    ws, dphi, phi, self.cellmeasure,
+                    ws, dphi, phi, measure,
                     optimize=True)
+        return M
 
-        cell2dof = self.cell_to_dof()
-        ldof = self.number_of_local_dofs()
-        I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
-        J = I.swapaxes(-1, -2)
+    def mass_matrix(self, cfun=None, barycenter=False, out=None,
+            blocksize=None, nthreads=None):
+        p = self.p
+        mesh = self.mesh
+        if p == 0:
+            NC = mesh.number_of_cells()
+            M = spdiags(self.cellmeasure, 0, NC, NC)
+            return M
 
-        gdof = self.number_of_global_dofs()
-        M = csr_matrix((M.flat, (I.flat, J.flat)), shape=(gdof, gdof))
-        return M
+        cellmatrix = lambda index: self.cell_mass_matrices(
+                cfun=cfun, barycenter=barycenter, cellidx=index)
+        return self.assemble_cell_matrices(
+                cellmatrix, out=out, blocksize=blocksize, nthreads=nthreads)
 
-    def source_vector(self, f, surface=None):
+    def source_vector(self, f, surface=None, blocksize=None):
         p = self.p
+        NC = self.mesh.number_of_cells()
+        gdof = self.number_of_global_dofs()
+        cell2dof = self.dof.cell2dof
 
-        bcs, ws = self.integrator.get_quadrature_points_and_weights()
-        pp = self.mesh.bc_to_point(bcs)
-        if surface is not None:
-            pp, _ = surface.project(pp)
-        fval = f(pp)
+        if blocksize is None:
+            blocks = [None]
+        else:
+            blocks = [slice(i, i+blocksize) for i in range(0, NC, blocksize)]
 
+        bcs, ws = self.integrator.get_quadrature_points_and_weights()
         if p > 0:
             phi = self.basis(bcs)
-            bb = np.einsum('i, ik, i..., k->k...', ws, fval, phi, self.cellmeasure)
-            cell2dof = self.dof.cell2dof
-            gdof = self.number_of_global_dofs()
-            b = np.bincount(cell2dof.flat, weights=bb.flat, minlength=gdof)
+            b = np.zeros(gdof, dtype=self.ftype)
         else:
-            b = np.einsum('i, ik, k->k', ws, fval,  measure)
+            b = np.zeros(NC, dtype=self.ftype)
+
+        for cellidx in blocks:
+            index = slice(None) if cellidx is None else cellidx
+            pp = self.cell_to_point(bcs, cellidx=cellidx)
+            if surface is not None:
+                pp, _ = surface.project(pp)
+            fval = f(pp)
+
+            measure = self.cellmeasure[index]
+            if p > 0:
+                bb = np.einsum('i, ik, i..., k->k...', ws, fval, phi, measure)
+                b += np.bincount(cell2dof[index].flat, weights=bb.flat, minlength=gdof)
+            else:
+                b[index] = np.einsum('i, ik, k->k', ws, fval, measure)
         return b
 
 
@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class BasisTabulation():
+    """ The LRU cache of the reference tables of the Lagrange basis
+
+    The values of the basis functions and their derivatives with respect to
+    the barycentric coordinates only depend on the degree `p`, the
+    dimension `TD` and the points, so they are tabulated once for every
+    quadrature rule and shared by all the spaces and all the calls, e.g.
+    the assembly, `Function.value` and the error loops of every time step.
+    The physical gradients are then one product with `grad_lambda()`.
+
+    Only the point sets with at most `maxpoints` coordinates are cached,
+    the larger ones (located points, edge points of every cell) are
+    tabulated directly.
+    """
+    def __init__(self, maxsize=128, maxpoints=4096):
+        self.maxsize = maxsize
+        self.maxpoints = maxpoints
+        self.data = OrderedDict()
+        self.hit = 0
+        self.miss = 0
+        self.lock = threading.Lock()
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def get(self, name, space, arrays, build):
+        """ The table `name` of `space` at the points `arrays[0]`, built by
+        `build()` if it is not in the cache
+
+        Parameters
+        ----------
+        name : str
+            the kind of the table, e.g. 'phi' or 'dphi'
+        space : LagrangeFiniteElementSpace
+        arrays : tuple
+            the arrays the table depends on, the first one is the points
+        build : function
+            compute the table
+        """
+        arrays = tuple(np.asarray(a) for a in arrays)
+        if arrays[0].size > self.maxpoints:
+            return build()
+        key = (name, space.p, space.TD) + tuple(
+                (a.dtype.str, a.shape, a.tobytes()) for a in arrays)
+        with self.lock:
+            val = self.data.get(key)
+            if val is not None:
+                self.data.move_to_end(key)
+                self.hit += 1
+                return val
+        val = build()
+        # the tables are shared by all the callers
+        val.flags.writeable = False
+        with self.lock:
+            self.miss += 1
+            self.data[key] = val
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+        return val
+
+    def info(self):
+        """ Return `(hit, miss, size)`
+        """
+        return self.hit, self.miss, len(self.data)
+
+
+tabulation = BasisTabulation()
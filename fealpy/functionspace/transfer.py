@@ -0,0 +1,272 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import splu
+
+from ..mesh.point_location import point_locator
+
+
+def interpolation_matrix(space0, space1, locator=None):
+    """ The matrix of the interpolation from `space0` to `space1`, two
+    Lagrange spaces on unrelated meshes of the same domain
+
+    The row of a dof of `space1` holds the values of the basis functions of
+    `space0` at its interpolation point, which is located in the mesh of
+    `space0`. The points just outside the mesh of `space0` (e.g. near a
+    curved boundary) take the extrapolated values of the nearest cell.
+
+    Returns
+    -------
+    I : scipy.sparse.csr_matrix
+        the matrix with shape `(gdof1, gdof0)`
+    """
+    if locator is None:
+        locator = point_locator(space0.mesh)
+    ipoints = space1.interpolation_points()
+    cellidx, bc = locator.locate(ipoints, extrapolate=True)
+    return evaluation_matrix(space0, cellidx, bc)
+
+
+def evaluation_matrix(space, cellidx, bc):
+    """ The matrix of the values of the functions of `space` at the points
+    with the local coordinates `bc` in the cells `cellidx`, the rows of the
+    points not located (`cellidx < 0`) are zero
+    """
+    N = len(cellidx)
+    isFound = cellidx >= 0
+    phi = space.basis(bc[isFound])
+    cell2dof = space.cell_to_dof()
+    ldof = space.number_of_local_dofs()
+    I = np.repeat(np.arange(N)[isFound], ldof)
+    J = cell2dof[cellidx[isFound]]
+    shape = (N, space.number_of_global_dofs())
+    return csr_matrix((phi.flat, (I, J.flat)), shape=shape)
+
+
+def clip_polygons(poly, n, a, b):
+    """ Clip the convex polygons `poly[i, :n[i]]` by the half planes on the
+    left of the lines from `a[i]` to `b[i]` (Sutherland-Hodgman)
+
+    Returns
+    -------
+    poly : numpy.array
+        the clipped polygons with one more slot than the input
+    n : numpy.array
+        the number of the vertices of the clipped polygons
+    """
+    M, maxn, _ = poly.shape
+    k = np.arange(maxn)
+    isValid = k < n[:, None]
+    nxt = (k + 1)%np.maximum(n, 1)[:, None]
+    v0 = poly
+    v1 = poly[np.arange(M)[:, None], nxt]
+    e = (b - a)[:, None, :]
+    d0 = e[..., 0]*(v0[..., 1] - a[:, None, 1]) - e[..., 1]*(v0[..., 0] - a[:, None, 0])
+    d1 = e[..., 0]*(v1[..., 1] - a[:, None, 1]) - e[..., 1]*(v1[..., 0] - a[:, None, 0])
+    isIn = d0 >= 0
+    isCross = (isIn != (d1 >= 0)) & isValid
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(isCross, d0/(d0 - d1), 0)
+    p = v0 + t[..., None]*(v1 - v0)
+
+    # 每条边依次输出它的起点(若在内部)和它与直线的交点(若穿过直线)
+    cand = np.stack((v0, p), axis=2).reshape(M, 2*maxn, 2)
+    emit = np.stack((isIn & isValid, isCross), axis=2).reshape(M, 2*maxn)
+    pos = np.cumsum(emit, axis=1) - 1
+    out = np.zeros((M, maxn + 1, 2), dtype=poly.dtype)
+    row = np.broadcast_to(np.arange(M)[:, None], emit.shape)
+    out[row[emit], pos[emit]] = cand[emit]
+    return out, emit.sum(axis=1)
+
+
+def triangle_intersections(mesh0, mesh1, locator):
+    """ The intersections of the cells of two triangle meshes
+
+    Returns
+    -------
+    c0, c1 : numpy.array
+        the cells of `mesh0` and `mesh1` of every nonempty intersection
+    tri : numpy.array
+        the triangles `(NT, 3, 2)` of the fan triangulations of the
+        intersections
+    tidx : numpy.array
+        the intersection of every triangle
+    """
+    node0 = mesh0.entity('node')
+    node1 = mesh1.entity('node')
+    cell0 = mesh0.entity('cell')
+    cell1 = mesh1.entity('cell')
+    p1 = node1[cell1]
+    bmin = p1.min(axis=1)
+    bmax = p1.max(axis=1)
+    c1, c0 = locator.box_candidates(bmin, bmax)
+    v = node0[cell0[c0]]
+    # the pairs whose boxes do not overlap are dropped before clipping
+    isOverlap = np.all(
+            (v.min(axis=1) <= bmax[c1]) & (v.max(axis=1) >= bmin[c1]), axis=1)
+    c0 = c0[isOverlap]
+    c1 = c1[isOverlap]
+    v = v[isOverlap]
+
+    poly = p1[c1]
+    n = np.full(len(c1), 3)
+    # the cells of `mesh0` in the clockwise order are clipped by reversed edges
+    area = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+    v[area < 0] = v[area < 0][:, ::-1]
+    for i in range(3):
+        poly, n = clip_polygons(poly, n, v[:, i], v[:, (i+1)%3])
+        isNonEmpty = n >= 3
+        poly = poly[isNonEmpty]
+        n = n[isNonEmpty]
+        v = v[isNonEmpty]
+        c0 = c0[isNonEmpty]
+        c1 = c1[isNonEmpty]
+
+    tri = []
+    tidx = []
+    for k in range(1, poly.shape[1] - 1):
+        idx, = np.nonzero(k + 1 < n)
+        tri.append(np.stack((poly[idx, 0], poly[idx, k], poly[idx, k+1]), axis=1))
+        tidx.append(idx)
+    return c0, c1, np.concatenate(tri), np.concatenate(tidx)
+
+
+def barycentric(mesh, cellidx, points):
+    """ The barycentric coordinates of `points[..., i, :]` in the cells
+    `cellidx[i]` of a simplex mesh
+    """
+    node = mesh.entity('node')
+    cell = mesh.entity('cell')
+    Dlambda = mesh.grad_lambda()[cellidx]
+    bc = np.einsum('ijk, ...ik->...ij', Dlambda, points - node[cell[cellidx, 0]])
+    bc[..., 0] += 1
+    return bc
+
+
+class MeshTransfer():
+    """ Transfer the functions of a Lagrange space to another Lagrange space
+    on an unrelated mesh of the same domain, e.g. after `DistMesh2d`
+    retriangulates or between two remeshing phases
+
+    The transfer is built once as sparse matrices, so every field is then
+    transferred by one sparse product (and one solve with the factorized
+    mass matrix for the projection). The columns of a 2d array are
+    transferred together.
+
+    * 'interpolation' : `u1 = I u0`, see `interpolation_matrix`;
+    * 'projection' : the L2 projection `M1 u1 = B u0`, where
+      `B_ij = (phi1_i, phi0_j)`. On triangle meshes `B` is integrated
+      exactly on the intersections of the old and the new cells (a
+      supermesh), so the projection is conservative: if the constants are
+      in the new space, the integral of the function is kept up to the
+      rounding errors. On the other meshes `B` is integrated by the
+      quadrature of the new cells, whose points are located in the old
+      mesh, and the integral is kept up to the quadrature error of the
+      piecewise function `u0` on the new cells.
+    """
+    def __init__(self, space0, space1, method='interpolation', q=None,
+            locator=None):
+        """
+
+        Parameters
+        ----------
+        space0 : LagrangeFiniteElementSpace
+            the space of the old functions
+        space1 : LagrangeFiniteElementSpace
+            the space of the new functions
+        method : 'interpolation' or 'projection'
+        q : int
+            the index of the quadrature on the new cells for 'projection',
+            default is `space0.p + space1.p + 1`
+        """
+        self.space0 = space0
+        self.space1 = space1
+        self.method = method
+        if locator is None:
+            locator = point_locator(space0.mesh)
+
+        if method == 'interpolation':
+            self.matrix = interpolation_matrix(space0, space1, locator=locator)
+        elif method == 'projection':
+            self.matrix = self.projection_matrix(locator, q)
+            self.M = space1.mass_matrix()
+            self.solver = splu(self.M.tocsc())
+        else:
+            raise ValueError("We don't support the transfer method `{}`! ".format(method))
+
+    def projection_matrix(self, locator, q=None):
+        space0 = self.space0
+        space1 = self.space1
+        mesh = space1.mesh
+        if q is None:
+            q = space0.p + space1.p + 1
+        if (mesh.meshtype == 'tri') and (space0.mesh.meshtype == 'tri'):
+            return self.supermesh_projection_matrix(locator, q)
+        qf = mesh.integrator(q)
+        bcs, ws = qf.get_quadrature_points_and_weights()
+        NQ = len(ws)
+        NC = mesh.number_of_cells()
+        GD = mesh.geo_dimension()
+
+        # 新网格上的积分点在旧网格中的位置
+        pp = mesh.bc_to_point(bcs)
+        cellidx, bc = locator.locate(pp.reshape(-1, GD), extrapolate=True)
+        phi0 = evaluation_matrix(space0, cellidx, bc) # (NQ*NC, gdof0)
+
+        # 积分点的权重乘以新空间的基函数
+        phi1 = space1.basis(bcs) # (NQ, ldof1)
+        measure = mesh.entity_measure('cell')
+        W = np.einsum('q, qi, c->qci', ws, phi1, measure)
+        cell2dof = space1.cell_to_dof()
+        ldof = space1.number_of_local_dofs()
+        I = np.broadcast_to(cell2dof, (NQ, NC, ldof))
+        J = np.broadcast_to(np.arange(NQ*NC).reshape(NQ, NC, 1), (NQ, NC, ldof))
+        shape = (space1.number_of_global_dofs(), NQ*NC)
+        S = csr_matrix((W.flat, (I.flat, J.flat)), shape=shape)
+        return (S@phi0).tocsr()
+
+    def supermesh_projection_matrix(self, locator, q):
+        """ The matrix `B` integrated on the intersections of the cells of
+        two triangle meshes
+        """
+        space0 = self.space0
+        space1 = self.space1
+        mesh0 = space0.mesh
+        mesh1 = space1.mesh
+        c0, c1, tri, tidx = triangle_intersections(mesh0, mesh1, locator)
+        c0 = c0[tidx]
+        c1 = c1[tidx]
+
+        qf = mesh1.integrator(q)
+        bcs, ws = qf.get_quadrature_points_and_weights()
+        pp = np.einsum('qj, tjk->qtk', bcs, tri)
+        area = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])/2
+        phi0 = space0.basis(barycentric(mesh0, c0, pp)) # (NQ, NT, ldof0)
+        phi1 = space1.basis(barycentric(mesh1, c1, pp)) # (NQ, NT, ldof1)
+        phi1 = np.einsum('q, qti, t->qti', ws, phi1, np.abs(area))
+        B = np.einsum('qti, qtj->tij', phi1, phi0)
+
+        cell2dof0 = space0.cell_to_dof()
+        cell2dof1 = space1.cell_to_dof()
+        I = np.broadcast_to(cell2dof1[c1][:, :, None], B.shape)
+        J = np.broadcast_to(cell2dof0[c0][:, None, :], B.shape)
+        shape = (space1.number_of_global_dofs(), space0.number_of_global_dofs())
+        return csr_matrix((B.flat, (I.flat, J.flat)), shape=shape)
+
+    def transfer(self, uh):
+        """ Transfer `uh`, a function of `space0` or an array whose rows are
+        the dofs of `space0`
+
+        Returns
+        -------
+        uh1 : Function or numpy.array
+            a function of `space1` if `uh` is one vector, otherwise an array
+        """
+        u = self.matrix@np.asarray(uh)
+        if self.method == 'projection':
+            u = self.solver.solve(u)
+        if u.ndim == 1:
+            return self.space1.function(array=u)
+        return u
+
+    def __call__(self, uh):
+        return self.transfer(uh)
@@ -11,6 +11,7 @@ from .function import Function
 from ..quadrature import GaussLobattoQuadrature
 from ..quadrature import GaussLegendreQuadrature
 from .ScaledMonomialSpace2d import ScaledMonomialSpace2d
+from .cell_group import CellGroups
 
 
 class VEMDof2d():
@@ -18,6 +19,7 @@ class VEMDof2d():
         self.p = p
         self.mesh = mesh
         self.cell2dof, self.cell2dofLocation = self.cell_to_dof()
+        self.cellgroups = CellGroups(self.cell2dofLocation)
 
     def boundary_dof(self):
         gdof = self.number_of_global_dofs()
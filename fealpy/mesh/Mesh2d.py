@@ -1,13 +1,40 @@
 import numpy as np
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye, tril, triu
-from .mesh_tools import unique_row, find_node, find_entity, show_mesh_2d
+from .mesh_tools import unique_row, unique_entity, EntityTable, find_node, find_entity, show_mesh_2d
 from ..common import ranges
+from .relation_cache import RelationCache, cached_relation
+from .geometry_cache import GeometryCache, cached_geometry, nodeversions
 from types import ModuleType
 
 class Mesh2d():
     """ The base class of TriangleMesh and QuadrangleMesh
         The class is just a abstract class, and you can not use it directly.
     """
+    @property
+    def node(self):
+        return self._node
+
+    @node.setter
+    def node(self, node):
+        self._node = node
+        self.node_moved()
+
+    def node_moved(self):
+        """ Start a new geometry version and drop the cached geometric
+        arrays, it is called on every assignment of `node` and should be
+        called after the nodes are moved in place
+        """
+        self.nodeversion = next(nodeversions)
+        if getattr(self, 'geometrycache', None) is None:
+            self.geometrycache = GeometryCache()
+        else:
+            self.geometrycache.clear()
+
+    def geometry_cache_info(self):
+        """ The hit and miss counts of the cached geometric arrays
+        """
+        return self.geometrycache.info()
+
     def number_of_nodes(self):
         return self.ds.NN
 
@@ -48,6 +75,7 @@ class Mesh2d():
         else:
             raise ValueError("`entitytype` is wrong!")
 
+    @cached_geometry
     def entity_measure(self, etype=2, index=None):
         if etype in ['cell', 2]:
             return self.cell_area(index)
@@ -81,6 +109,7 @@ class Mesh2d():
             raise ValueError('the entity `{}` is not correct!'.format(entity)) 
         return bc
 
+    @cached_geometry
     def face_unit_normal(self, index=None):
         v = self.face_unit_tagent(index=index)
         w = np.array([(0,-1),(1,0)])
@@ -114,6 +143,7 @@ class Mesh2d():
             v = node[edge[index,1],:] - node[edge[index,0],:]
         return v
 
+    @cached_geometry
     def edge_length(self, index=None):
         node = self.entity('node')
         edge = self.entity('edge')
@@ -237,6 +267,7 @@ class Mesh2dDataStructure():
         self.NC = cell.shape[0]
         self.cell = cell
         self.itype = cell.dtype
+        self.relationcache = RelationCache()
         self.construct()
 
     def reinit(self, NN, cell):
@@ -245,9 +276,47 @@ class Mesh2dDataStructure():
         self.cell = cell
         self.construct()
 
+    def update(self, NN, cell, isChangedCell=None):
+        """ Update the topology after the cells `isChangedCell` are changed
+        and new cells are appended at the end of `cell`
+
+        Only the edges of the changed and new cells are touched, with the
+        `EntityTable` kept from the last update, so after the first update
+        the work is proportional to the changed and new cells. The edges
+        and `edge2cell` are the same as the ones of `reinit(NN, cell)` up to
+        the numbering of the edges, and the arrays are updated in place.
+        """
+        if isChangedCell is None:
+            changed = np.zeros(0, dtype=np.int_)
+        else:
+            changed, = np.nonzero(isChangedCell)
+
+        table = getattr(self, 'edgetable', None)
+        if (table is None) or (not table.is_current(self.edge, self.edge2cell)):
+            table = EntityTable(self.edge, self.edge2cell,
+                    self.cell_to_edge(), self.localEdge)
+        if not table.update(NN, cell, changed):
+            self.reinit(NN, cell)
+            return
+
+        self.relationcache.clear()
+        self.edgetable = table
+        self.NN = NN
+        self.NC = cell.shape[0]
+        self.cell = cell
+        self.edge = table.entity
+        self.edge2cell = table.entity2cell
+        self.NE = table.NE
+
     def clear(self):
         self.edge = None
         self.edge2cell = None
+        self.relationcache.clear()
+
+    def relation_cache_info(self):
+        """ The hit and miss counts of the cached topology relations
+        """
+        return self.relationcache.info()
 
     def number_of_nodes_of_cells(self):
         return self.V
@@ -276,14 +345,12 @@ class Mesh2dDataStructure():
     def construct(self):
         """ Construct edge and edge2cell from cell
         """
+        self.relationcache.clear()
         NC = self.NC
         E = self.E
 
         totalEdge = self.total_edge()
-        _, i0, j = np.unique(np.sort(totalEdge, axis=1),
-                return_index=True,
-                return_inverse=True,
-                axis=0)
+        i0, j = unique_entity(totalEdge, self.NN)
         NE = i0.shape[0]
         self.NE = NE
 
@@ -299,6 +366,7 @@ class Mesh2dDataStructure():
 
         self.edge = totalEdge[i0, :]
 
+    @cached_relation
     def cell_to_node(self):
         """ 
         """
@@ -313,6 +381,7 @@ class Mesh2dDataStructure():
         cell2node = csr_matrix((val, (I, cell.flatten())), shape=(NC, NN), dtype=np.bool)
         return cell2node
 
+    @cached_relation
     def cell_to_edge(self, sparse=False):
         """ The neighbor information of cell to edge
         """
@@ -336,6 +405,7 @@ class Mesh2dDataStructure():
                     shape=(NC, NE), dtype=np.bool)
             return cell2edge 
 
+    @cached_relation
     def cell_to_edge_sign(self, sparse=False):
         NC = self.NC
         E = self.E
@@ -351,6 +421,7 @@ class Mesh2dDataStructure():
                     shape=(NC, NE), dtype=np.bool)
         return cell2edgeSign
 
+    @cached_relation
     def cell_to_face(self, sparse=False):
         """ The neighbor information of cell to edge
         """
@@ -375,6 +446,7 @@ class Mesh2dDataStructure():
             return cell2edge 
 
 
+    @cached_relation
     def cell_to_cell(self, return_sparse=False, return_boundary=True, return_array=False):
         """ Consctruct the neighbor information of cells
         """
@@ -441,6 +513,7 @@ class Mesh2dDataStructure():
         edge2node = self.edge_to_node()
         return edge2node*edge2node.transpose()
 
+    @cached_relation
     def edge_to_edge(self):
         edge2node = self.edge_to_node(sparse=True)
         return edge2node*edge2node.transpose()
@@ -458,6 +531,7 @@ class Mesh2dDataStructure():
             face2cell = csr_matrix((val, (I, J)), shape=(NE, NC), dtype=np.bool)
             return face2cell 
 
+    @cached_relation
     def node_to_node(self, return_array=False):
         """ The neighbor information of nodes
         """
@@ -484,6 +558,7 @@ class Mesh2dDataStructure():
         node2node = csr_matrix((val, (I, J)), shape=(NN, NN), dtype=np.bool)
         return node2node
 
+    @cached_relation
     def node_to_edge(self):
         NN = self.NN
         NE = self.NE
@@ -495,6 +570,7 @@ class Mesh2dDataStructure():
         node2edge = csr_matrix((val, (I, J)), shape=(NN, NE), dtype=np.bool)
         return node2edge
 
+    @cached_relation
     def node_to_cell(self, localidx=False):
         """
         """
@@ -516,6 +592,7 @@ class Mesh2dDataStructure():
         return node2cell
 
 
+    @cached_relation
     def boundary_node_flag(self):
         NN = self.NN
         edge = self.edge
@@ -524,6 +601,7 @@ class Mesh2dDataStructure():
         isBdPoint[edge[isBdEdge,:]] = True
         return isBdPoint
 
+    @cached_relation
     def boundary_edge_flag(self):
         edge2cell = self.edge2cell
         return edge2cell[:, 0] == edge2cell[:, 1]
@@ -532,6 +610,7 @@ class Mesh2dDataStructure():
         edge = self.edge
         return edge[self.boundary_edge_index()]
 
+    @cached_relation
     def boundary_cell_flag(self):
         NC = self.NC
         edge2cell = self.edge2cell
@@ -540,16 +619,19 @@ class Mesh2dDataStructure():
         isBdCell[edge2cell[isBdEdge,0]] = True
         return isBdCell 
 
+    @cached_relation
     def boundary_node_index(self):
         isBdPoint = self.boundary_node_flag()
         idx, = np.nonzero(isBdPoint)
         return idx 
 
+    @cached_relation
     def boundary_edge_index(self):
         isBdEdge = self.boundary_edge_flag()
         idx, = np.nonzero(isBdEdge)
         return idx 
 
+    @cached_relation
     def boundary_cell_index(self):
         isBdCell = self.boundary_cell_flag()
         idx, = np.nonzero(isBdCell)
@@ -2,14 +2,41 @@ import numpy as np
 
 from types import ModuleType
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye, tril, triu
-from .mesh_tools import unique_row, find_entity, show_mesh_3d, find_node
+from .mesh_tools import unique_row, unique_entity, EntityTable, SharedEntityTable, find_entity, show_mesh_3d, find_node
 from ..common import ranges
+from .relation_cache import RelationCache, cached_relation
+from .geometry_cache import GeometryCache, cached_geometry, nodeversions
 
 
 class Mesh3d():
     def __init__(self):
         pass
 
+    @property
+    def node(self):
+        return self._node
+
+    @node.setter
+    def node(self, node):
+        self._node = node
+        self.node_moved()
+
+    def node_moved(self):
+        """ Start a new geometry version and drop the cached geometric
+        arrays, it is called on every assignment of `node` and should be
+        called after the nodes are moved in place
+        """
+        self.nodeversion = next(nodeversions)
+        if getattr(self, 'geometrycache', None) is None:
+            self.geometrycache = GeometryCache()
+        else:
+            self.geometrycache.clear()
+
+    def geometry_cache_info(self):
+        """ The hit and miss counts of the cached geometric arrays
+        """
+        return self.geometrycache.info()
+
     def number_of_nodes(self):
         return self.node.shape[0]
 
@@ -109,6 +136,7 @@ class Mesh3d():
         else:
             raise ValueError("`etype` is wrong!")
 
+    @cached_geometry
     def entity_measure(self, etype=3):
         if etype in ['cell', 3]:
             return self.cell_volume()
@@ -232,6 +260,7 @@ class Mesh3dDataStructure():
         self.NN = NN
         self.NC = cell.shape[0]
         self.cell = cell
+        self.relationcache = RelationCache()
         self.construct()
 
     def reinit(self, NN, cell):
@@ -240,11 +269,61 @@ class Mesh3dDataStructure():
         self.cell = cell
         self.construct()
 
+    def update(self, NN, cell, isChangedCell=None):
+        """ Update the topology after the cells `isChangedCell` are changed
+        and new cells are appended at the end of `cell`
+
+        Only the faces and the edges of the changed and new cells are
+        touched, with the `EntityTable` and the `SharedEntityTable` kept
+        from the last update, so after the first update the work is
+        proportional to the changed and new cells. The result is the same as
+        `reinit(NN, cell)` up to the numbering of the faces and the edges,
+        and the arrays are updated in place.
+        """
+        if isChangedCell is None:
+            changed = np.zeros(0, dtype=np.int_)
+        else:
+            changed, = np.nonzero(isChangedCell)
+
+        facetable = getattr(self, 'facetable', None)
+        if (facetable is None) or (
+                not facetable.is_current(self.face, self.face2cell)):
+            facetable = EntityTable(self.face, self.face2cell,
+                    self.cell_to_face(), self.localFace)
+        edgetable = getattr(self, 'edgetable', None)
+        if (edgetable is None) or (
+                not edgetable.is_current(self.edge, self.cell2edge)):
+            edgetable = SharedEntityTable(self.edge, self.cell2edge,
+                    self.localEdge)
+        if not (facetable.update(NN, cell, changed) and
+                edgetable.update(NN, cell, changed)):
+            self.reinit(NN, cell)
+            return
+
+        self.relationcache.clear()
+        self.facetable = facetable
+        self.edgetable = edgetable
+        self.NN = NN
+        self.NC = cell.shape[0]
+        self.cell = cell
+        self.face = facetable.entity
+        self.face2cell = facetable.entity2cell
+        self.NF = facetable.NE
+        self.edge = edgetable.entity
+        self.cell2edge = edgetable.cell2entity
+        self.NE = edgetable.NE
+
     def clear(self):
         self.face = None
         self.face2cell = None
         self.edge = None
         self.cell2edge = None
+        self.relationcache.clear()
+
+    def relation_cache_info(self):
+        """ The hit and miss counts of the cached topology relations
+        """
+        return self.relationcache.info()
 
     def number_of_nodes_of_cells(self):
         return self.V
@@ -268,15 +347,11 @@ class Mesh3dDataStructure():
         return totalFace
 
     def construct(self):
+        self.relationcache.clear()
         NC = self.NC
 
         totalFace = self.total_face()
-
-        _, i0, j = np.unique(
-                np.sort(totalFace, axis=1),
-                return_index=True,
-                return_inverse=True,
-                axis=0)
+        i0, j = unique_entity(totalFace, self.NN)
 
         self.face = totalFace[i0]
 
@@ -295,15 +370,13 @@ class Mesh3dDataStructure():
         self.face2cell[:, 3] = i1 % F
 
         totalEdge = self.total_edge()
-        self.edge, i2, j = np.unique(
-                np.sort(totalEdge, axis=1),
-                return_index=True,
-                return_inverse=True,
-                axis=0)
+        i2, j = unique_entity(totalEdge, self.NN)
+        self.edge = np.sort(totalEdge[i2], axis=1)
         E = self.E
         self.cell2edge = np.reshape(j, (NC, E))
         self.NE = self.edge.shape[0]
 
+    @cached_relation
     def cell_to_node(self):
         """
         """
@@ -322,6 +395,7 @@ class Mesh3dDataStructure():
                 ), shape=(NC, NN), dtype=np.bool)
         return cell2node
 
+    @cached_relation
     def cell_to_edge(self, sparse=False):
         """ The neighbor information of cell to edge
         """
@@ -351,6 +425,7 @@ class Mesh3dDataStructure():
             cell2edgeSign[:, i] = cell[:, j] < cell[:, k]
         return cell2edgeSign
 
+    @cached_relation
     def cell_to_face(self, sparse=False):
         NC = self.NC
         NF = self.NF
@@ -372,6 +447,7 @@ class Mesh3dDataStructure():
                     ), shape=(NC, NF), dtype=np.bool)
             return cell2face
 
+    @cached_relation
     def cell_to_cell(
             self, return_sparse=False,
             return_boundary=True, return_array=False):
@@ -423,6 +499,7 @@ class Mesh3dDataStructure():
                 adjLocation[1:] = np.cumsum(nn)
                 return adj.astype(np.int32), adjLocation
 
+    @cached_relation
     def face_to_node(self, return_sparse=False):
 
         face = self.face
@@ -442,6 +519,7 @@ class Mesh3dDataStructure():
                     ), shape=(NF, NN), dtype=np.bool)
             return face2node
 
+    @cached_relation
     def face_to_edge(self, return_sparse=False):
         cell2edge = self.cell2edge
         face2cell = self.face2cell
@@ -466,10 +544,12 @@ class Mesh3dDataStructure():
                     ), shape=(NF, NE), dtype=np.bool)
             return f2e
 
+    @cached_relation
     def face_to_face(self):
         face2edge = self.face_to_edge()
         return face2edge*face2edge.transpose()
 
+    @cached_relation
     def face_to_cell(self, return_sparse=False):
         if return_sparse is False:
             return self.face2cell
@@ -486,6 +566,7 @@ class Mesh3dDataStructure():
                     ), shape=(NF, NC), dtype=np.bool)
             return face2cell
 
+    @cached_relation
     def edge_to_node(self, return_sparse=False):
         NN = self.NN
         NE = self.NE
@@ -504,10 +585,12 @@ class Mesh3dDataStructure():
                     ), shape=(NE, NN), dtype=np.bool)
             return edge2node
 
+    @cached_relation
     def edge_to_edge(self):
         edge2node = self.edge_to_node()
         return edge2node*edge2node.transpose()
 
+    @cached_relation
     def edge_to_face(self):
         NF = self.NF
         NE = self.NE
@@ -523,6 +606,7 @@ class Mesh3dDataStructure():
                 ), shape=(NE, NF), dtype=np.bool)
         return edge2face
 
+    @cached_relation
     def edge_to_cell(self, localidx=False):
         NC = self.NC
         NE = self.NE
@@ -538,6 +622,7 @@ class Mesh3dDataStructure():
                 ), shape=(NE, NC), dtype=np.bool)
         return edge2cell
 
+    @cached_relation
     def node_to_node(self):
         """ The neighbor information of nodes
         """
@@ -554,6 +639,7 @@ class Mesh3dDataStructure():
                 ), shape=(NN, NN), dtype=np.bool)
         return node2node
 
+    @cached_relation
     def node_to_edge(self):
         NN = self.NN
         NE = self.NE
@@ -568,6 +654,7 @@ class Mesh3dDataStructure():
                 ), shape=(NE, NN), dtype=np.bool)
         return node2edge
 
+    @cached_relation
     def node_to_face(self):
         NN = self.NN
         NF = self.NF
@@ -584,6 +671,7 @@ class Mesh3dDataStructure():
                 ), shape=(NF, NN), dtype=np.bool)
         return node2face
 
+    @cached_relation
     def node_to_cell(self, return_local_index=False):
         """
         """
@@ -613,6 +701,7 @@ class Mesh3dDataStructure():
                     ), shape=(NN, NC), dtype=np.bool)
         return node2cell
 
+    @cached_relation
     def boundary_node_flag(self):
         NN = self.NN
         face = self.face
@@ -621,6 +710,7 @@ class Mesh3dDataStructure():
         isBdPoint[face[isBdFace, :]] = True
         return isBdPoint
 
+    @cached_relation
     def boundary_edge_flag(self):
         NE = self.NE
         face2edge = self.face_to_edge()
@@ -629,10 +719,12 @@ class Mesh3dDataStructure():
         isBdEdge[face2edge[isBdFace, :]] = True
         return isBdEdge
 
+    @cached_relation
     def boundary_face_flag(self):
         face2cell = self.face_to_cell()
         return face2cell[:, 0] == face2cell[:, 1]
 
+    @cached_relation
     def boundary_cell_flag(self):
         NC = self.NC
         face2cell = self.face_to_cell()
@@ -641,21 +733,25 @@ class Mesh3dDataStructure():
         isBdCell[face2cell[isBdFace, 0]] = True
         return isBdCell
 
+    @cached_relation
     def boundary_node_index(self):
         isBdNode = self.boundary_node_flag()
         idx, = np.nonzero(isBdNode)
         return idx
 
+    @cached_relation
     def boundary_edge_index(self):
         isBdEdge = self.boundary_edge_flag()
         idx, = np.nonzero(isBdEdge)
         return idx
 
+    @cached_relation
     def boundary_face_index(self):
         isBdFace = self.boundary_face_flag()
         idx, = np.nonzero(isBdFace)
         return idx
 
+    @cached_relation
     def boundary_cell_index(self):
         isBdCell = self.boundary_cell_flag()
         idx, = np.nonzero(isBdCell)
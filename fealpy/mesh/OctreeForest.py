@@ -1,5 +1,6 @@
 import numpy as np
 from .Mesh3d import Mesh3d, Mesh3dDataStructure
+from .PolyhedronMesh import PolyhedronMesh
 
 
 class OctreeMeshDataStructure(Mesh3dDataStructure):
@@ -116,3 +117,554 @@ class OctreeMesh(Mesh3d):
         print("Face2cell:\n", self.ds.face2cell)
 
 
+
+
+MORTON_MASKS = [np.uint64(m) for m in (
+    0x001F00000000FFFF, 0x001F0000FF0000FF, 0x100F00F00F00F00F,
+    0x10C30C30C30C30C3, 0x1249249249249249)]
+MORTON_SHIFTS = [np.uint64(s) for s in (32, 16, 8, 4, 2)]
+
+
+def spread_bits(v):
+    """ Put the lower 21 bits of `v` on every third bit of an uint64
+    """
+    v = np.asarray(v).astype(np.uint64) & np.uint64(0x1FFFFF)
+    for s, m in zip(MORTON_SHIFTS, MORTON_MASKS):
+        v = (v | (v << s)) & m
+    return v
+
+
+def compact_bits(v):
+    """ The inverse of `spread_bits`
+    """
+    v = np.asarray(v).astype(np.uint64) & MORTON_MASKS[-1]
+    masks = MORTON_MASKS[-2::-1] + [np.uint64(0x1FFFFF)]
+    for s, m in zip(MORTON_SHIFTS[::-1], masks):
+        v = (v | (v >> s)) & m
+    return v
+
+
+def morton_encode(x, y, z):
+    """ Interleave the bits of `x`, `y` and `z`, in the order c_zc_yc_x as
+    the corners of an octant
+    """
+    return (spread_bits(x) | (spread_bits(y) << np.uint64(1))
+            | (spread_bits(z) << np.uint64(2)))
+
+
+def morton_decode(code):
+    """ Return the integer coordinates `(x, y, z)` of the Morton codes
+    """
+    code = np.asarray(code, dtype=np.uint64)
+    return (compact_bits(code), compact_bits(code >> np.uint64(1)),
+            compact_bits(code >> np.uint64(2)))
+
+
+class OctreeForest():
+    """
+    A linear octree forest on a conforming hexahedral macro mesh
+    (`OctreeMesh`, corners in the order c_zc_yc_x), every cell of the macro
+    mesh is the root of one tree.
+
+    Only the leaves are stored, in three arrays sorted by the key
+    `tree << 3*maxdepth | code`:
+
+        tree : int32, the index of the macro cell of the leaf
+        code : uint64, the Morton code of the anchor (the corner 0) of the
+               leaf in the integer coordinates [0, 2**maxdepth)^3 of the tree
+        level : uint8, the depth of the leaf, the leaf has side
+                2**(maxdepth - level)
+
+    The eight children of a leaf follow it in the Morton order, so the
+    parent-child relation is kept by the order itself, the refinement and
+    the coarsening are one `np.repeat` or one mask, and the leaf containing
+    a point is found by one binary search.
+
+    The faces of a tree are 0, 1, 2, 3, 4, 5 for x=0, x=1, y=0, y=1, z=0,
+    z=1, the two coordinates on a face are the other two axes in order.
+    """
+    tangent = np.array([(1, 2), (0, 2), (0, 1)])
+
+    def __init__(self, mesh, maxdepth=16):
+        NT = mesh.number_of_cells()
+        if maxdepth > 21 or NT > 2**(64 - 3*maxdepth):
+            raise ValueError(
+                "We don't support {} trees of depth {}, the keys must fit "
+                "in 64 bits!".format(NT, maxdepth))
+        self.mesh = mesh
+        self.maxdepth = maxdepth
+        self.tree = np.arange(NT, dtype=np.int32)
+        self.code = np.zeros(NT, dtype=np.uint64)
+        self.level = np.zeros(NT, dtype=np.uint8)
+        self.init_connectivity()
+
+    def init_connectivity(self):
+        """ The neighbor `tree2tree[k, f]` of the tree `k` across its face
+        `f` and its face `tree2face[k, f]`, -1 on the boundary. The
+        coordinates `(u, v)` on the face `f` of `k` are
+        `N*treeorigin[k, f] + treemap[k, f]@(u, v)` on the face of the
+        neighbor, `N = 2**maxdepth`.
+        """
+        mesh = self.mesh
+        cell = mesh.ds.cell
+        localFace = mesh.ds.localFace
+        face2cell = mesh.ds.face_to_cell()
+        cell2face = mesh.ds.cell_to_face()
+
+        NT = self.number_of_trees()
+        k = np.arange(NT).reshape(-1, 1)
+        f = np.arange(6).reshape(1, -1)
+        f2c = face2cell[cell2face]
+        isFirst = (f2c[..., 0] == k) & (f2c[..., 2] == f)
+        self.tree2tree = np.where(isFirst, f2c[..., 1], f2c[..., 0])
+        self.tree2face = np.where(isFirst, f2c[..., 3], f2c[..., 2])
+        isBdFace = f2c[..., 0] == f2c[..., 1]
+        self.tree2tree[isBdFace] = -1
+        self.tree2face[isBdFace] = -1
+
+        # 面的前三个角点在相邻树的面上的位置, 给出面坐标的仿射变换
+        k1 = self.tree2tree[~isBdFace]
+        f1 = self.tree2face[~isBdFace]
+        P = cell[:, localFace][~isBdFace]
+        Q = cell[k1.reshape(-1, 1), localFace[f1]]
+        perm = np.argmax(Q[:, None, :] == P[:, :3, None], axis=-1)
+        c = np.array([(0, 0), (1, 0), (0, 1), (1, 1)])
+        O = c[perm[:, 0]]
+        self.treeorigin = np.zeros((NT, 6, 2), dtype=np.int64)
+        self.treemap = np.zeros((NT, 6, 2, 2), dtype=np.int64)
+        self.treeorigin[~isBdFace] = O
+        self.treemap[~isBdFace] = np.stack(
+                (c[perm[:, 1]] - O, c[perm[:, 2]] - O), axis=-1)
+
+    def number_of_trees(self):
+        return self.mesh.number_of_cells()
+
+    def number_of_leaves(self):
+        return len(self.code)
+
+    def keys(self, tree=None, code=None):
+        """ The sort keys `tree << 3*maxdepth | code` of the leaves
+        """
+        if tree is None:
+            tree, code = self.tree, self.code
+        shift = np.uint64(3*self.maxdepth)
+        return (np.asarray(tree).astype(np.uint64) << shift) | code
+
+    def octant(self, index=None):
+        """ The anchors `p` (NL, 3) and the sides `h` of the leaves in the
+        integer coordinates of their trees
+        """
+        index = np.s_[:] if index is None else index
+        p = np.stack(morton_decode(self.code[index]), axis=-1)
+        h = np.int64(1) << (self.maxdepth - self.level[index].astype(np.int64))
+        return p.astype(np.int64), h
+
+    def uniform_refine(self, n=1):
+        for i in range(n):
+            self.refine(np.ones(self.number_of_leaves(), dtype=np.bool_))
+
+    def refine(self, isMarked):
+        """ Split every marked leaf into its eight children
+
+        Parameters
+        ----------
+        isMarked : np.ndarray
+            bool array of the leaves
+
+        Returns
+        -------
+        child : np.ndarray
+            the indices of the children of the marked leaves in the new
+            leaves, eight for one marked leaf
+        """
+        L = self.maxdepth
+        isMarked = np.asarray(isMarked, dtype=np.bool_)
+        if np.any(self.level[isMarked] >= L):
+            raise ValueError(
+                "We don't support the refinement beyond the max depth {}!"
+                .format(L))
+        n = np.where(isMarked, 8, 1)
+        start = np.cumsum(n) - n
+        child = (start[isMarked].reshape(-1, 1) + np.arange(8)).reshape(-1)
+
+        self.tree = np.repeat(self.tree, n)
+        self.code = np.repeat(self.code, n)
+        self.level = np.repeat(self.level, n)
+
+        self.level[child] += np.uint8(1)
+        shift = 3*(L - self.level[child].astype(np.int64))
+        c = np.tile(np.arange(8, dtype=np.uint64), len(child)//8)
+        self.code[child] |= c << shift.astype(np.uint64)
+        return child
+
+    def coarsen(self, isMarked):
+        """ Merge the eight children of a parent, if they are all marked
+        leaves. The coarsening may break the 2:1 balance, see `balance()`.
+
+        Returns
+        -------
+        parent : np.ndarray
+            the indices of the merged parents in the new leaves
+        """
+        L = self.maxdepth
+        isMarked = np.asarray(isMarked, dtype=np.bool_)
+        NL = self.number_of_leaves()
+        tree = self.tree
+        code = self.code
+        level = self.level.astype(np.int64)
+
+        # 第一个孩子, 且八个兄弟都是标记的叶子
+        i = np.arange(NL - 7)
+        shift = (3*(L - level[i])).astype(np.uint64)
+        flag = (level[i] > 0) & isMarked[i]
+        flag &= ((code[i] >> shift) & np.uint64(7)) == 0
+        for c in range(1, 8):
+            flag &= isMarked[i + c] & (tree[i + c] == tree[i])
+            flag &= level[i + c] == level[i]
+            flag &= code[i + c] == (code[i] | (np.uint64(c) << shift))
+        first, = np.nonzero(flag)
+
+        isKept = np.ones(NL, dtype=np.bool_)
+        for c in range(1, 8):
+            isKept[first + c] = False
+        self.level[first] -= np.uint8(1)
+        self.tree = self.tree[isKept]
+        self.code = self.code[isKept]
+        self.level = self.level[isKept]
+        return first - 7*np.arange(len(first))
+
+    def leaf_index(self, tree, p):
+        """ The leaves containing the points `p` (n, 3) given in the integer
+        coordinates of the trees `tree`
+        """
+        key = self.keys()
+        q = self.keys(tree, morton_encode(p[:, 0], p[:, 1], p[:, 2]))
+        return np.searchsorted(key, q, side='right') - 1
+
+    def box_neighbor(self, f, tree, p, h, g=None):
+        """ The boxes of the sides `h` next to the faces `f` of the boxes
+        with the anchors `p` in the trees `tree`
+
+        Parameters
+        ----------
+        f : int or np.ndarray
+            the faces of the boxes
+        g : np.ndarray, optional
+            the faces of the boxes, they are given again in the trees of
+            the neighbor boxes
+
+        Returns
+        -------
+        (tree, p, back, g) : the trees (-1 out of the domain), the anchors
+            of the neighbor boxes, the faces of the neighbor boxes facing
+            the old boxes, and the faces `g` in the new trees
+        """
+        N = np.int64(1) << self.maxdepth
+        n = len(tree)
+        i = np.arange(n)
+        f = np.broadcast_to(f, (n, )).astype(np.int64)
+        a = f//2
+        p = p.copy()
+        p[i, a] += np.where(f % 2 == 1, h, -h)
+        isOut = (p[i, a] < 0) | (p[i, a] >= N)
+        tree = tree.copy()
+        back = f ^ 1
+        g = None if g is None else np.array(g, dtype=np.int64)
+
+        # 跨过宏单元的面, 换到相邻树的坐标
+        j, = np.nonzero(isOut)
+        k, fj, hj = tree[j], f[j], h[j]
+        k1 = self.tree2tree[k, fj]
+        f1 = self.tree2face[k, fj]
+        M = self.treemap[k, fj]
+        t = self.tangent[fj//2]
+        u = p[j.reshape(-1, 1), t]
+        q = N*self.treeorigin[k, fj] + np.einsum('nij, nj->ni', M, u)
+        q -= hj.reshape(-1, 1)*np.any(M < 0, axis=-1)
+        t1 = self.tangent[f1//2]
+        m = np.arange(len(j))
+        pj = np.zeros((len(j), 3), dtype=np.int64)
+        pj[m, t1[:, 0]] = q[:, 0]
+        pj[m, t1[:, 1]] = q[:, 1]
+        pj[m, f1//2] = np.where(f1 % 2 == 0, 0, N - hj)
+        p[j] = pj
+        tree[j] = k1
+        back[j] = f1
+
+        if g is not None:
+            # g 的方向在 f 的面坐标中的位置 r, 变换后的坐标轴 r1 和方向
+            gj = g[j]
+            r = (gj//2 == t[:, 1]).astype(np.int64)
+            col = M[m, :, r]
+            r1 = np.argmax(col != 0, axis=-1)
+            sign = col[m, r1]*np.where(gj % 2 == 1, 1, -1)
+            g[j] = 2*t1[m, r1] + (sign > 0)
+        isBd = tree < 0
+        p[isBd] = 0
+        back[isBd] = -1
+        return tree, p, back, g
+
+    def neighbor_box(self, f, index=None, g=None):
+        """ The box of the same size as the leaves next to their face `f`,
+        and then next to the face `g` of the box, if `g` is given
+        """
+        index = np.s_[:] if index is None else index
+        tree = self.tree[index].astype(np.int64)
+        p, h = self.octant(index)
+        if g is None:
+            tree, p, back, _ = self.box_neighbor(f, tree, p, h)
+            return tree, p, h, back
+        g = np.full(len(tree), g)
+        tree, p, back, g = self.box_neighbor(f, tree, p, h, g=g)
+        isIn = tree >= 0
+        t, q, b, _ = self.box_neighbor(g[isIn], tree[isIn], p[isIn], h[isIn])
+        tree[isIn] = t
+        p[isIn] = q
+        back[isIn] = b
+        return tree, p, h, back
+
+    def face_neighbor(self, f, index=None, g=None):
+        """ The leaves next to the face `f` of the leaves, or next to the
+        edge shared by the faces `f` and `g`, -1 out of the domain
+
+        The neighbor is the leaf containing the anchor of the box of the
+        same size, i.e. the only neighbor if it is not finer, and one of the
+        finer neighbors otherwise. The edge neighbors are found through the
+        face neighbor across `f`, so they are the ones of a macro edge
+        shared by four trees.
+        """
+        tree, p, h, _ = self.neighbor_box(f, index, g=g)
+        idx = -np.ones(len(tree), dtype=np.int64)
+        isIn = tree >= 0
+        idx[isIn] = self.leaf_index(tree[isIn], p[isIn])
+        return idx
+
+    def directions(self, edge=True):
+        """ The faces `(f, None)` and, if `edge` is True, the edges `(f, g)`
+        of a box
+        """
+        d = [(f, None) for f in range(6)]
+        if edge:
+            d += [(f, g) for f in range(6) for g in range(2*(f//2 + 1), 6)]
+        return d
+
+    def is_balanced(self, edge=True):
+        level = self.level.astype(np.int64)
+        for f, g in self.directions(edge):
+            idx = self.face_neighbor(f, g=g)
+            isIn = idx >= 0
+            if np.any(level[idx[isIn]] + 1 < level[isIn]):
+                return False
+        return True
+
+    def balance(self, edge=True):
+        """ Refine the leaves until the neighbors of every leaf across its
+        faces and, if `edge` is True, its edges differ by at most one level
+        (2:1 balance). `to_polyhedronmesh()` needs the edge balance.
+
+        After the first pass only the children of the refined leaves and the
+        leaves which asked for the refinement are checked again.
+        """
+        index = np.arange(self.number_of_leaves())
+        while len(index) > 0:
+            level = self.level.astype(np.int64)
+            isMarked = np.zeros(self.number_of_leaves(), dtype=np.bool_)
+            isFine = np.zeros(self.number_of_leaves(), dtype=np.bool_)
+            for f, g in self.directions(edge):
+                idx = self.face_neighbor(f, index, g=g)
+                isIn = idx >= 0
+                flag = level[idx[isIn]] + 1 < level[index[isIn]]
+                isMarked[idx[isIn][flag]] = True
+                isFine[index[isIn][flag]] = True
+            if not np.any(isMarked):
+                break
+            n = np.where(isMarked, 8, 1)
+            start = np.cumsum(n) - n
+            child = self.refine(isMarked)
+            index = np.unique(np.r_[child, start[isFine]])
+
+    def tree_to_point(self, tree, p):
+        """ The physical points of the integer coordinates `p` of the trees,
+        by the trilinear map of the macro cells
+        """
+        xi = np.asarray(p)/2**self.maxdepth
+        bits = np.array([(i & 1, (i >> 1) & 1, i >> 2) for i in range(8)])
+        phi = np.prod(np.where(bits, xi[:, None, :], 1 - xi[:, None, :]),
+                axis=-1)
+        node = self.mesh.node[self.mesh.ds.cell[tree]]
+        return np.einsum('ij, ijk->ik', phi, node)
+
+    def node_key(self, tree, p):
+        """ The unique key `(category, key)` of the points `p` of the trees,
+        the points shared by several trees get the same key
+
+            category 0 : the vertices of the macro mesh, the key is the
+                         index of the vertex
+            category 1 : the points in the interior of the macro edges,
+                         `e*2**maxdepth + t`, `t` is the coordinate along
+                         the direction of the edge `e`
+            category 2 : the points in the interior of the macro faces,
+                         `face*4**maxdepth + v*2**maxdepth + u`, `(u, v)`
+                         are the coordinates in the first cell of the face
+            category 3 : the points in the interior of the trees,
+                         `tree << 3*maxdepth | morton(x, y, z)`
+        """
+        L = self.maxdepth
+        N = np.int64(1) << L
+        ds = self.mesh.ds
+        cell = ds.cell
+        n = len(tree)
+
+        isBd = (p == 0) | (p == N)
+        nb = isBd.sum(axis=1)
+        cat = (3 - nb).astype(np.int8)
+        key = np.zeros(n, dtype=np.uint64)
+
+        flag = nb == 3
+        corner = (p[flag] == N) @ np.array([1, 2, 4])
+        key[flag] = cell[tree[flag], corner]
+
+        # 宏网格的边, 边上的另外两个坐标给出局部边的编号
+        flag, = np.nonzero(nb == 2)
+        k, q = tree[flag], p[flag]
+        a = np.argmin(isBd[flag], axis=1)
+        t = self.tangent[a]
+        m = np.arange(len(flag))
+        j = 4*a + (q[m, t[:, 0]] == N) + 2*(q[m, t[:, 1]] == N)
+        e = ds.cell_to_edge()[k, j]
+        s = q[m, a]
+        s = np.where(cell[k, ds.localEdge[j, 0]] != ds.edge[e, 0], N - s, s)
+        key[flag] = e.astype(np.uint64)*np.uint64(N) + s.astype(np.uint64)
+
+        # 宏网格的面, 换到面的第一个单元的面坐标
+        flag, = np.nonzero(nb == 1)
+        k, q = tree[flag], p[flag]
+        a = np.argmax(isBd[flag], axis=1)
+        f = 2*a + (q[np.arange(len(flag)), a] == N)
+        fid = ds.cell_to_face()[k, f]
+        u = q[np.arange(len(flag)).reshape(-1, 1), self.tangent[a]]
+        face2cell = ds.face_to_cell()
+        isOwner = (face2cell[fid, 0] == k) & (face2cell[fid, 2] == f)
+        k, f = k[~isOwner], f[~isOwner]
+        u[~isOwner] = N*self.treeorigin[k, f] + np.einsum(
+                'nij, nj->ni', self.treemap[k, f], u[~isOwner])
+        u = u.astype(np.uint64)
+        key[flag] = (fid.astype(np.uint64)*np.uint64(N) + u[:, 1])*np.uint64(N)
+        key[flag] += u[:, 0]
+
+        flag = nb == 0
+        q = p[flag]
+        key[flag] = self.keys(tree[flag],
+                morton_encode(q[:, 0], q[:, 1], q[:, 2]))
+        return cat, key
+
+    def leaf_nodes(self):
+        """ The nodes of the corners of the leaves
+
+        Returns
+        -------
+        node : np.ndarray
+            the physical coordinates of the nodes
+        cell : np.ndarray
+            (NL, 8) the nodes of the leaves, in the order c_zc_yc_x
+        nodekey : list
+            the sorted keys of the nodes of every category, see
+            `node_key()`, the nodes are numbered category after category
+        """
+        NL = self.number_of_leaves()
+        p, h = self.octant()
+        bits = np.array([(i & 1, (i >> 1) & 1, i >> 2) for i in range(8)])
+        tree = np.repeat(self.tree, 8)
+        p = (p[:, None, :] + h[:, None, None]*bits).reshape(-1, 3)
+        cat, key = self.node_key(tree, p)
+
+        nodekey = []
+        cell = np.zeros(8*NL, dtype=self.mesh.itype)
+        first = []
+        offset = 0
+        for c in range(4):
+            flag, = np.nonzero(cat == c)
+            k, i, j = np.unique(key[flag], return_index=True,
+                    return_inverse=True)
+            nodekey.append(k)
+            cell[flag] = offset + j
+            first.append(flag[i])
+            offset += len(k)
+        first = np.concatenate(first)
+        node = self.tree_to_point(tree[first], p[first])
+        return node, cell.reshape(-1, 8), nodekey
+
+    def to_polyhedronmesh(self):
+        """ The conforming `PolyhedronMesh` of the leaves
+
+        The face of a leaf next to finer leaves is split into their faces,
+        and the hanging nodes at the middle of the edges are vertices of the
+        faces. The forest should be 2:1 balanced across the faces and the
+        edges, see `balance()`.
+        """
+        node, cell, nodekey = self.leaf_nodes()
+        NL = self.number_of_leaves()
+        offset = np.cumsum([0] + [len(k) for k in nodekey])
+        level = self.level.astype(np.int64)
+        p, h = self.octant()
+        localFace = self.mesh.ds.localFace
+        # 外法向的逆时针顺序
+        ccw = localFace[:, [0, 1, 3, 2]]
+        ccw[[0, 3, 4]] = ccw[[0, 3, 4], ::-1]
+
+        leaf = np.arange(NL)
+        face = []
+        face2cell = []
+        for f in range(6):
+            tree, q, _, back = self.neighbor_box(f)
+            j = -np.ones(NL, dtype=np.int64)
+            isIn = tree >= 0
+            j[isIn] = self.leaf_index(tree[isIn], q[isIn])
+            # 较粗或者同样大小 (只取一次) 的邻居, 以及边界
+            flag = ~isIn | (level[j] < level) | ((level[j] == level) & (leaf < j))
+            i = leaf[flag]
+            c2 = np.zeros((len(i), 4), dtype=self.mesh.itype)
+            c2[:, 0] = i
+            c2[:, 1] = np.where(isIn[flag], j[flag], i)
+            c2[:, 2] = f
+            c2[:, 3] = np.where(isIn[flag], back[flag], f)
+            face2cell.append(c2)
+
+            # 四条边的中点
+            bits = np.array([(v & 1, (v >> 1) & 1, v >> 2) for v in ccw[f]])
+            d = h[flag]//2
+            k = np.repeat(self.tree[i], 4)
+            pm = p[i, None, :] + d[:, None, None]*(bits + np.roll(bits, -1, 0))
+            cat, key = self.node_key(k, pm.reshape(-1, 3))
+            mid = -np.ones(4*len(i), dtype=self.mesh.itype)
+            for c in range(4):
+                idx, = np.nonzero((cat == c) & (np.repeat(d, 4) > 0))
+                nk = nodekey[c]
+                if len(nk) == 0:
+                    continue
+                m = np.searchsorted(nk, key[idx])
+                m[m == len(nk)] = 0
+                isNode = nk[m] == key[idx]
+                mid[idx[isNode]] = offset[c] + m[isNode]
+
+            polygon = np.zeros((len(i), 8), dtype=self.mesh.itype)
+            polygon[:, 0::2] = cell[i][:, ccw[f]]
+            polygon[:, 1::2] = mid.reshape(-1, 4)
+            face.append(polygon)
+
+        face = np.concatenate(face)
+        face2cell = np.concatenate(face2cell)
+        isVertex = face >= 0
+        faceLocation = np.zeros(len(face) + 1, dtype=self.mesh.itype)
+        faceLocation[1:] = np.cumsum(isVertex.sum(axis=1))
+        return PolyhedronMesh(node, face[isVertex], faceLocation, face2cell,
+                NC=NL)
+
+    def print(self):
+        NT = self.number_of_trees()
+        start = np.searchsorted(self.tree, np.arange(NT + 1))
+        for j in range(NT):
+            s = np.s_[start[j]:start[j+1]]
+            print("The {0}-th tree:\n".format(j))
+            print("levels:\n", self.level[s])
+            print([bin(x)[2:].zfill(64) for x in self.code[s]])
@@ -325,7 +325,7 @@ class Quadtree(QuadrangleMesh):
             self.node = np.concatenate((node, edgeCenter, cellCenter), axis=0)
             self.parent = np.concatenate((parent, newParent), axis=0)
             self.child = np.concatenate((child, newChild), axis=0)
-            self.ds.reinit(N + NEC + NCC, cell)
+            self.ds.update(N + NEC + NCC, cell)
 
     def coarsen_1(self, isMarkedCell=None, options={'disp': True}):
         """ marker will marke the leaf cells which will be coarsen
@@ -542,7 +542,7 @@ class Quadtree(QuadrangleMesh):
             self.node = np.concatenate((node, edgeCenter, cellCenter), axis=0)
             self.parent = np.concatenate((parent, newParent), axis=0)
             self.child = np.concatenate((child, newChild), axis=0)
-            self.ds.reinit(N + NEC + NCC, cell)
+            self.ds.update(N + NEC + NCC, cell)
 
     def adaptive_coarsen(self, estimator, data=None):
         i = 0
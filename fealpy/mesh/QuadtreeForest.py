@@ -1,5 +1,48 @@
 import numpy as np
 from .Mesh2d import Mesh2d, Mesh2dDataStructure
+from .QuadrangleMesh import QuadrangleMesh
+from .PolygonMesh import PolygonMesh
+
+
+MORTON_MASKS = [np.uint64(m) for m in (
+    0x0000FFFF0000FFFF, 0x00FF00FF00FF00FF, 0x0F0F0F0F0F0F0F0F,
+    0x3333333333333333, 0x5555555555555555)]
+MORTON_SHIFTS = [np.uint64(s) for s in (16, 8, 4, 2, 1)]
+
+
+def spread_bits(v):
+    """ Put the lower 32 bits of `v` on the even bits of an uint64
+    """
+    v = np.asarray(v).astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for s, m in zip(MORTON_SHIFTS, MORTON_MASKS):
+        v = (v | (v << s)) & m
+    return v
+
+
+def compact_bits(v):
+    """ The inverse of `spread_bits`
+    """
+    v = np.asarray(v).astype(np.uint64) & MORTON_MASKS[-1]
+    masks = MORTON_MASKS[-2::-1] + [np.uint64(0xFFFFFFFF)]
+    for s, m in zip(MORTON_SHIFTS[::-1], masks):
+        v = (v | (v >> s)) & m
+    return v
+
+
+def morton_encode(x, y):
+    """ Interleave the bits of `x` and `y`, the bits of `x` are on the even
+    positions
+
+    (4, 2) --> (0100, 0010)--> 00011000
+    """
+    return spread_bits(x) | (spread_bits(y) << np.uint64(1))
+
+
+def morton_decode(code):
+    """ Return the integer coordinates `(x, y)` of the Morton codes
+    """
+    code = np.asarray(code, dtype=np.uint64)
+    return compact_bits(code), compact_bits(code >> np.uint64(1))
 
 
 class QuadtreeMeshDataStructure(Mesh2dDataStructure):
@@ -100,6 +143,8 @@ class QuadtreeMesh(Mesh2d):
 
 class QuadtreeForest():
     """
+    A linear quadtree forest on a conforming quadrilateral macro mesh, every
+    cell of the macro mesh is the root of one tree.
 
     leaf node:
     interior node:
@@ -111,7 +156,7 @@ class QuadtreeForest():
 
     linear octrees:
         + It has lower storage costs than other representations.
-        + The other representations use pointers, which add synchronization 
+        + The other representations use pointers, which add synchronization
           and communication overhead for parallel implementations.
 
     Morton encoding:
@@ -119,68 +164,394 @@ class QuadtreeForest():
             by specifying one of its vertices
 
     (4, 2) --> (0100, 0010)--> from right to left interleave 00011000
+
+    Only the leaves are stored, in three arrays sorted by the key
+    `tree << 2*maxdepth | code`:
+
+        tree : the index of the macro cell of the leaf
+        code : the Morton code of the anchor (the lower left vertex) of the
+               leaf in the integer coordinates [0, 2**maxdepth)^2 of the tree
+        level : the depth of the leaf, the leaf has side 2**(maxdepth - level)
+
+    that is 13 bytes for one leaf. The children of a leaf follow it in the
+    Morton order, so the refinement and the coarsening keep the order, and
+    the leaf containing a point is found by one binary search.
+
+    The vertices of the macro cells are in z-order as in `QuadtreeMesh`.
     """
-    def __init__(self, mesh, maxdepth=32):
+    def __init__(self, mesh, maxdepth=24):
+        NT = mesh.number_of_cells()
+        if maxdepth > 31 or NT > 2**(64 - 2*maxdepth):
+            raise ValueError(
+                "We don't support {} trees of depth {}, the keys must fit "
+                "in 64 bits!".format(NT, maxdepth))
         self.mesh = mesh
         self.maxdepth = maxdepth
-        NC = self.mesh.number_of_cells()
-        self.levels = np.empty(NC, dtype=np.ndarray)
-        self.forest = np.empty(NC, dtype=np.ndarray)
+        self.tree = np.arange(NT, dtype=np.int32)
+        self.code = np.zeros(NT, dtype=np.uint64)
+        self.level = np.zeros(NT, dtype=np.uint8)
+        self.init_connectivity()
+
+    def init_connectivity(self):
+        """ The neighbor `tree2tree[k, f]` of the tree `k` across its face
+        `f`, its face `tree2face[k, f]`, and `treeflip[k, f]` is True if the
+        two trees go along the shared face in opposite directions. The
+        neighbors of the boundary faces are -1.
+        """
+        mesh = self.mesh
+        cell = mesh.ds.cell
+        localEdge = mesh.ds.localEdge
+        edge2cell = mesh.ds.edge_to_cell()
+        cell2edge = mesh.ds.cell_to_edge()
 
-        self.forest.fill(np.zeros(1, dtype=np.uint64))
-        self.levels.fill(np.zeros(1, dtype=np.uint8))
+        NT = self.number_of_trees()
+        k = np.arange(NT).reshape(-1, 1)
+        f = np.arange(4).reshape(1, -1)
+        e2c = edge2cell[cell2edge]
+        isFirst = (e2c[..., 0] == k) & (e2c[..., 2] == f)
+        self.tree2tree = np.where(isFirst, e2c[..., 1], e2c[..., 0])
+        self.tree2face = np.where(isFirst, e2c[..., 3], e2c[..., 2])
+        isBdFace = e2c[..., 0] == e2c[..., 1]
+        self.tree2tree[isBdFace] = -1
+        self.tree2face[isBdFace] = -1
+
+        # 两棵树的面的起点不同, 切向坐标反向
+        k1 = self.tree2tree[~isBdFace]
+        f1 = self.tree2face[~isBdFace]
+        v0 = cell[:, localEdge[:, 0]][~isBdFace]
+        self.treeflip = np.zeros((NT, 4), dtype=np.bool_)
+        self.treeflip[~isBdFace] = v0 != cell[k1, localEdge[f1, 0]]
 
     def number_of_trees(self):
-        return self.forest.shape[0]
+        return self.mesh.number_of_cells()
+
+    def number_of_leaves(self):
+        return len(self.code)
+
+    def keys(self, tree=None, code=None):
+        """ The sort keys `tree << 2*maxdepth | code` of the leaves
+        """
+        if tree is None:
+            tree, code = self.tree, self.code
+        shift = np.uint64(2*self.maxdepth)
+        return (np.asarray(tree).astype(np.uint64) << shift) | code
+
+    def octant(self, index=None):
+        """ The anchors `(x, y)` and the sides `h` of the leaves in the
+        integer coordinates of their trees
+        """
+        index = np.s_[:] if index is None else index
+        x, y = morton_decode(self.code[index])
+        h = np.int64(1) << (self.maxdepth - self.level[index].astype(np.int64))
+        return x.astype(np.int64), y.astype(np.int64), h
 
     def uniform_refine(self, n=1):
-        NT = self.number_of_trees();
         for i in range(n):
-            for j in range(NT):
-                NL = len(self.forest[j])
-                level = np.repeat(self.levels[j], 4)
-                tree = np.repeat(self.forest[j], 4)
-                child = np.tile(np.array([0, 2, 1, 3], dtype=np.uint64), NL)
-                self.forest[j] = tree + np.left_shift(child, 2*level)
-                self.levels[j] = level + np.uint8(1)
-
-    def octant(self):
-        NT = self.number_of_trees();
-        maxdepth = self.maxdepth
-        for j in range(NT):
-            tree = self.forest[j]
-            NL = len(tree)
-            a = np.unpackbits(tree.view(np.uint8)).reshape(-1, 64)
-            print(a)
-            x = np.zeros((NL, 32), dtype=np.uint8)
-            y = np.zeros((NL, 32), dtype=np.uint8)
-            x = a[:, 0::2]
-            y = a[:, 1::2]
-            print(a)
-            print(x)
-            print(y)
-            x = np.packbits(x.flat).view(np.uint32)
-            y = np.packbits(y.flat).view(np.uint32)
+            self.refine(np.ones(self.number_of_leaves(), dtype=np.bool_))
+
+    def refine(self, isMarked):
+        """ Split every marked leaf into its four children
+
+        Parameters
+        ----------
+        isMarked : np.ndarray
+            bool array of the leaves
+
+        Returns
+        -------
+        child : np.ndarray
+            the indices of the children of the marked leaves in the new
+            leaves, four for one marked leaf
+        """
+        L = self.maxdepth
+        isMarked = np.asarray(isMarked, dtype=np.bool_)
+        if np.any(self.level[isMarked] >= L):
+            raise ValueError(
+                "We don't support the refinement beyond the max depth {}!"
+                .format(L))
+        n = np.where(isMarked, 4, 1)
+        start = np.cumsum(n) - n
+        child = (start[isMarked].reshape(-1, 1) + np.arange(4)).reshape(-1)
+
+        self.tree = np.repeat(self.tree, n)
+        self.code = np.repeat(self.code, n)
+        self.level = np.repeat(self.level, n)
+
+        self.level[child] += np.uint8(1)
+        shift = 2*(L - self.level[child].astype(np.int64))
+        c = np.tile(np.arange(4, dtype=np.uint64), len(child)//4)
+        self.code[child] |= c << shift.astype(np.uint64)
+        return child
+
+    def coarsen(self, isMarked):
+        """ Merge the four children of a parent, if they are all marked
+        leaves. The coarsening may break the 2:1 balance, see `balance()`.
+
+        Returns
+        -------
+        parent : np.ndarray
+            the indices of the merged parents in the new leaves
+        """
+        L = self.maxdepth
+        isMarked = np.asarray(isMarked, dtype=np.bool_)
+        NL = self.number_of_leaves()
+        tree = self.tree
+        code = self.code
+        level = self.level.astype(np.int64)
+
+        # 第一个孩子, 且四个兄弟都是标记的叶子
+        i = np.arange(NL - 3)
+        shift = (2*(L - level[i])).astype(np.uint64)
+        flag = (level[i] > 0) & isMarked[i]
+        flag &= ((code[i] >> shift) & np.uint64(3)) == 0
+        for c in range(1, 4):
+            flag &= isMarked[i + c] & (tree[i + c] == tree[i])
+            flag &= level[i + c] == level[i]
+            flag &= code[i + c] == (code[i] | (np.uint64(c) << shift))
+        first, = np.nonzero(flag)
+
+        isKept = np.ones(NL, dtype=np.bool_)
+        for c in range(1, 4):
+            isKept[first + c] = False
+        self.level[first] -= np.uint8(1)
+        self.tree = self.tree[isKept]
+        self.code = self.code[isKept]
+        self.level = self.level[isKept]
+        return first - 3*np.arange(len(first))
+
+    def leaf_index(self, tree, x, y):
+        """ The leaves containing the points `(x, y)` given in the integer
+        coordinates of the trees `tree`
+        """
+        key = self.keys()
+        q = self.keys(tree, morton_encode(x, y))
+        return np.searchsorted(key, q, side='right') - 1
 
+    def neighbor_box(self, f, index=None):
+        """ The box of the same size as the leaves next to their face `f`
+
+        Returns
+        -------
+        (tree, x, y, h) : the tree and the anchor of the box, and the side,
+            the tree is -1 if the face is on the boundary of the domain
+        """
+        index = np.s_[:] if index is None else index
+        N = np.int64(1) << self.maxdepth
+        tree = self.tree[index]
+        x, y, h = self.octant(index)
+        # 面 0, 1, 2, 3 分别为 x=0, x=1, y=0, y=1
+        a, s = divmod(f, 2)
+        n, t = (x, y) if a == 0 else (y, x)
+        n = n + h if s == 1 else n - h
+        isIn = (n >= 0) & (n < N)
+
+        # 跨过宏单元的面, 换到相邻树的坐标
+        k1 = self.tree2tree[tree, f]
+        f1 = self.tree2face[tree, f]
+        t1 = np.where(self.treeflip[tree, f], N - t - h, t)
+        n1 = np.where(f1 % 2 == 0, 0, N - h)
+        x1 = np.where(f1 < 2, n1, t1)
+        y1 = np.where(f1 < 2, t1, n1)
+
+        n, t = (n, t) if a == 0 else (t, n)
+        x = np.where(isIn, n, x1)
+        y = np.where(isIn, t, y1)
+        tree = np.where(isIn, tree, k1)
+        return tree, x, y, h
+
+    def face_neighbor(self, f, index=None):
+        """ The leaves next to the face `f` of the leaves, -1 on the boundary
+        of the domain
+
+        The neighbor is the leaf containing the anchor of the box of the
+        same size next to the face, i.e. the only neighbor if it is not
+        finer, and one of the finer neighbors otherwise.
+        """
+        tree, x, y, h = self.neighbor_box(f, index)
+        idx = -np.ones(len(tree), dtype=np.int64)
+        isIn = tree >= 0
+        idx[isIn] = self.leaf_index(tree[isIn], x[isIn], y[isIn])
+        return idx
+
+    def is_balanced(self):
+        for f in range(4):
+            idx = self.face_neighbor(f)
+            isIn = idx >= 0
+            level = self.level.astype(np.int64)
+            if np.any(level[idx[isIn]] + 1 < level[isIn]):
+                return False
+        return True
+
+    def balance(self):
+        """ Refine the leaves until the face neighbors of every leaf differ
+        by at most one level (2:1 balance)
+
+        After the first pass only the children of the refined leaves and the
+        leaves which asked for the refinement are checked again, the
+        refinement makes no other leaf violate the balance.
+        """
+        index = np.arange(self.number_of_leaves())
+        while len(index) > 0:
+            level = self.level.astype(np.int64)
+            isMarked = np.zeros(self.number_of_leaves(), dtype=np.bool_)
+            isFine = np.zeros(self.number_of_leaves(), dtype=np.bool_)
+            for f in range(4):
+                idx = self.face_neighbor(f, index)
+                isIn = idx >= 0
+                flag = level[idx[isIn]] + 1 < level[index[isIn]]
+                isMarked[idx[isIn][flag]] = True
+                isFine[index[isIn][flag]] = True
+            if not np.any(isMarked):
+                break
+            n = np.where(isMarked, 4, 1)
+            start = np.cumsum(n) - n
+            child = self.refine(isMarked)
+            index = np.unique(np.r_[child, start[isFine]])
+
+    def tree_to_point(self, tree, x, y):
+        """ The physical points of the integer coordinates `(x, y)` of the
+        trees, by the bilinear map of the macro cells
+        """
+        N = 2**self.maxdepth
+        xi = np.asarray(x)/N
+        eta = np.asarray(y)/N
+        phi = np.array([
+            (1 - xi)*(1 - eta), xi*(1 - eta), (1 - xi)*eta, xi*eta]).T
+        node = self.mesh.node[self.mesh.ds.cell[tree]]
+        return np.einsum('ij, ijk->ik', phi, node)
+
+    def node_key(self, tree, x, y):
+        """ The unique key `(category, key)` of the points `(x, y)` of the
+        trees, the points shared by several trees get the same key
+
+            category 0 : the vertices of the macro mesh, the key is the
+                         index of the vertex
+            category 1 : the points in the interior of the macro edges,
+                         `e*2**maxdepth + t`, `t` is the coordinate along
+                         the direction of the edge `e`
+            category 2 : the points in the interior of the trees,
+                         `tree << 2*maxdepth | morton(x, y)`
+        """
+        L = self.maxdepth
+        N = np.int64(1) << L
+        cell = self.mesh.ds.cell
+        edge = self.mesh.ds.edge
+        localEdge = self.mesh.ds.localEdge
+        cell2edge = self.mesh.ds.cell_to_edge()
+
+        cat = np.full(len(tree), 2, dtype=np.int8)
+        key = np.zeros(len(tree), dtype=np.uint64)
+        isX = (x == 0) | (x == N)
+        isY = (y == 0) | (y == N)
+
+        flag = isX & isY
+        cat[flag] = 0
+        key[flag] = cell[tree[flag], 2*(y[flag] == N) + (x[flag] == N)]
+
+        flag = isX ^ isY
+        cat[flag] = 1
+        t0, x0, y0 = tree[flag], x[flag], y[flag]
+        f = np.where(x0 == 0, 0, np.where(x0 == N, 1, np.where(y0 == 0, 2, 3)))
+        t = np.where(f < 2, y0, x0)
+        e = cell2edge[t0, f]
+        t = np.where(cell[t0, localEdge[f, 0]] != edge[e, 0], N - t, t)
+        key[flag] = e.astype(np.uint64)*np.uint64(N) + t.astype(np.uint64)
+
+        flag = ~(isX | isY)
+        key[flag] = self.keys(tree[flag], morton_encode(x[flag], y[flag]))
+        return cat, key
+
+    def leaf_nodes(self):
+        """ The nodes of the corners of the leaves
+
+        Returns
+        -------
+        node : np.ndarray
+            the physical coordinates of the nodes
+        cell : np.ndarray
+            (NL, 4) the nodes of the leaves, in z-order
+        nodekey : list
+            the sorted keys of the nodes of every category, see
+            `node_key()`, the nodes are numbered category after category
+        """
+        NL = self.number_of_leaves()
+        x, y, h = self.octant()
+        tree = np.repeat(self.tree, 4)
+        x = (x.reshape(-1, 1) + h.reshape(-1, 1)*[0, 1, 0, 1]).reshape(-1)
+        y = (y.reshape(-1, 1) + h.reshape(-1, 1)*[0, 0, 1, 1]).reshape(-1)
+        cat, key = self.node_key(tree, x, y)
+
+        nodekey = []
+        cell = np.zeros(4*NL, dtype=self.mesh.itype)
+        first = []
+        offset = 0
+        for c in range(3):
+            flag, = np.nonzero(cat == c)
+            k, i, j = np.unique(key[flag], return_index=True,
+                    return_inverse=True)
+            nodekey.append(k)
+            cell[flag] = offset + j
+            first.append(flag[i])
+            offset += len(k)
+        first = np.concatenate(first)
+        node = self.tree_to_point(tree[first], x[first], y[first])
+        return node, cell.reshape(-1, 4), nodekey
+
+    def to_quadmesh(self):
+        """ The `QuadrangleMesh` of the leaves, the hanging nodes are only
+        the corners of the finer leaves
+        """
+        node, cell, _ = self.leaf_nodes()
+        return QuadrangleMesh(node, cell[:, [0, 1, 3, 2]])
+
+    def to_polygonmesh(self):
+        """ The conforming `PolygonMesh` of the leaves, the hanging nodes at
+        the middle of the sides of the coarser leaves are vertices of their
+        polygons. The forest should be 2:1 balanced, see `balance()`.
+        """
+        node, cell, nodekey = self.leaf_nodes()
+        NL = self.number_of_leaves()
+        offset = np.cumsum([0] + [len(k) for k in nodekey])
+
+        # 逆时针的四条边的中点
+        x, y, h = self.octant()
+        tree = np.repeat(self.tree, 4)
+        d = h.reshape(-1, 1)//2
+        x = (x.reshape(-1, 1) + d*[1, 2, 1, 0]).reshape(-1)
+        y = (y.reshape(-1, 1) + d*[0, 1, 2, 1]).reshape(-1)
+        cat, key = self.node_key(tree, x, y)
+        mid = -np.ones(4*NL, dtype=self.mesh.itype)
+        for c in range(3):
+            flag, = np.nonzero((cat == c) & (np.repeat(h, 4) > 1))
+            k = nodekey[c]
+            if len(k) == 0:
+                continue
+            i = np.searchsorted(k, key[flag])
+            i[i == len(k)] = 0
+            isNode = k[i] == key[flag]
+            mid[flag[isNode]] = offset[c] + i[isNode]
+
+        polygon = np.zeros((NL, 8), dtype=self.mesh.itype)
+        polygon[:, 0::2] = cell[:, [0, 1, 3, 2]]
+        polygon[:, 1::2] = mid.reshape(-1, 4)
+        isVertex = polygon >= 0
+        cellLocation = np.zeros(NL + 1, dtype=self.mesh.itype)
+        cellLocation[1:] = np.cumsum(isVertex.sum(axis=1))
+        return PolygonMesh(node, polygon[isVertex], cellLocation)
 
     def print(self):
         NT = self.number_of_trees()
+        start = np.searchsorted(self.tree, np.arange(NT + 1))
         for j in range(NT):
+            s = np.s_[start[j]:start[j+1]]
             print("The {0}-th tree:\n".format(j))
-            print("levels:\n", self.levels[j])
-            print([bin(x)[2:].zfill(64) for x in self.forest[j]])
+            print("levels:\n", self.level[s])
+            print([bin(x)[2:].zfill(64) for x in self.code[s]])
 
     def add_plot(self, plt):
-        mesh = self.mesh
-        maxdepth = self.maxdepth
-
-        qmesh = QuadtreeMesh(mesh.node.copy(), mesh.ds.cell.copy())
-        qmesh.uniform_refine(maxdepth)
-        qmesh.node *= 2**maxdepth
+        mesh = self.to_quadmesh()
         fig = plt.figure()
         axes = fig.gca()
-        qmesh.add_plot(axes, showaxis=True, cellcolor='lightgray', edgecolor='gray', linewidths=1)
-        plt.xticks(np.arange(2**maxdepth+1))
-        plt.yticks(np.arange(2**maxdepth+1))
-
-
+        mesh.add_plot(axes, cellcolor='lightgray', edgecolor='gray',
+                linewidths=1)
+        return axes
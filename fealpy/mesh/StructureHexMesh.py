@@ -1,5 +1,6 @@
 import numpy as np
 from .Mesh3d import Mesh3d 
+from .relation_cache import RelationCache, cached_relation, readonly
 
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix
 from scipy.sparse import spdiags, eye, tril, triu, diags, kron
@@ -10,29 +11,41 @@ class StructureHexMesh(Mesh3d):
         self.box = box
         self.h = (box[1] - box[0])/nx
         self.ds = StructureHexMeshDataStructure(nx, ny, nz)
+        self._node = None
     
     @property
     def node(self):
-        NN = self.ds.NN
-        box = self.box
-        nx = self.ds.nx
-        ny = self.ds.ny
-        nz = self.ds.nz
-        node = np.zeros((NN, 3), dtype=np.float)
-        X, Y, Z = np.mgrid[
-                box[0]:box[1]:complex(0, nx+1), 
-                box[2]:box[3]:complex(0, ny+1),
-                box[4]:box[5]:complex(0, nz+1)
-                ]
-        node[:, 0] = X.flatten()
-        node[:, 1] = Y.flatten()
-        node[:, 2] = Z.flatten()
-
-        return node
+        """ The nodes are built once on the first access
+
+        Notes
+        -----
+        The node `(i, j, k)` of the grid is `(i*(ny+1) + j)*(nz+1) + k`, use
+        `self.ds.node_view(node)` to get the `(nx+1, ny+1, nz+1, 3)` view.
+        """
+        if self._node is None:
+            NN = self.ds.NN
+            box = self.box
+            nx = self.ds.nx
+            ny = self.ds.ny
+            nz = self.ds.nz
+            node = np.zeros((NN, 3), dtype=np.float)
+            X, Y, Z = np.mgrid[
+                    box[0]:box[1]:complex(0, nx+1), 
+                    box[2]:box[3]:complex(0, ny+1),
+                    box[4]:box[5]:complex(0, nz+1)
+                    ]
+            node[:, 0] = X.flatten()
+            node[:, 1] = Y.flatten()
+            node[:, 2] = Z.flatten()
+            self._node = readonly(node)
+        return self._node
 
     def number_of_nodes(self):
         return self.ds.NN
 
+    def geo_dimension(self):
+        return 3
+
     def laplace_operator(self):
         NX = self.ds.nx + 1
         h = self.h
@@ -75,8 +88,35 @@ class StructureHexMeshDataStructure():
         self.NE = nz*(ny+1)*(nx+1) + ny*(nx+1)*(nz+1) + nx*(ny+1)*(nz+1)
         self.NF = 3*nx*ny*nz + nx*ny + ny*nz + nz*nx
         self.NC = nx*ny*nz
+        self.relationcache = RelationCache()
+
+    def node_view(self, a):
+        """ The `(nx+1, ny+1, nz+1, ...)` view of an array `a` on the nodes
+        """
+        return a.reshape((self.nx+1, self.ny+1, self.nz+1) + a.shape[1:])
+
+    def cell_view(self, a):
+        """ The `(nx, ny, nz, ...)` view of an array `a` on the cells
+        """
+        return a.reshape((self.nx, self.ny, self.nz) + a.shape[1:])
+
+    def face_views(self, a):
+        """ The views of an array `a` on the faces in the x, y and z
+        directions, their shapes are `(nx+1, ny, nz, ...)`, `(ny+1, nz, nx,
+        ...)` and `(nz+1, nx, ny, ...)`
+        """
+        nx = self.nx
+        ny = self.ny
+        nz = self.nz
+        NF0 = (nx+1)*ny*nz
+        NF1 = NF0 + (ny+1)*nz*nx
+        s = a.shape[1:]
+        return (a[:NF0].reshape((nx+1, ny, nz) + s),
+                a[NF0:NF1].reshape((ny+1, nz, nx) + s),
+                a[NF1:].reshape((nz+1, nx, ny) + s))
 
     @property
+    @cached_relation
     def cell(self):
         NN = self.NN
         nx = self.nx
@@ -98,6 +138,7 @@ class StructureHexMeshDataStructure():
         return cell
 
     @property
+    @cached_relation
     def face(self):
         NN = self.NN
         NF = self.NF
@@ -137,6 +178,7 @@ class StructureHexMeshDataStructure():
         return face
 
     @property
+    @cached_relation
     def face2cell(self):
         NN = self.NN
         NF = self.NF
@@ -202,6 +244,7 @@ class StructureHexMeshDataStructure():
 
 
     @property
+    @cached_relation
     def edge(self):
         NN = self.NN
         nx = self.nx
@@ -234,6 +277,7 @@ class StructureHexMeshDataStructure():
         return edge
 
     @property
+    @cached_relation
     def cell2edge(self):
         NN = self.NN
         NE = self.NE
@@ -252,6 +296,7 @@ class StructureHexMeshDataStructure():
         totalEdge = cell[:, localEdge].reshape(-1, localEdge.shape[1])
         return np.sort(totalEdge, axis=1)
 
+    @cached_relation
     def cell_to_node(self):
         """ 
         """
@@ -263,9 +308,10 @@ class StructureHexMeshDataStructure():
 
         I = np.repeat(range(NC), V)
         val = np.ones(self.V*NC, dtype=np.bool)
-        cell2node = csr_matrix((val, (I, cell.flatten())), shape=(NC, N), dtype=np.bool)
+        cell2node = csr_matrix((val, (I, cell.flatten())), shape=(NC, NN), dtype=np.bool)
         return cell2node
 
+    @cached_relation
     def cell_to_edge(self, sparse=False):
         """ The neighbor information of cell to edge
         """
@@ -290,6 +336,7 @@ class StructureHexMeshDataStructure():
             cell2edgeSign[:, i] = cell[:, j] < cell[:, k] 
         return cell2edgeSign
 
+    @cached_relation
     def cell_to_face(self, sparse=False):
         NC = self.NC
         NF = self.NF
@@ -307,6 +354,7 @@ class StructureHexMeshDataStructure():
             cell2face = csr_matrix((val, (I, J)), shape=(NC, NF), dtype=np.bool)
             return cell2face
 
+    @cached_relation
     def cell_to_cell(self, return_sparse=False, 
             return_boundary=True, return_array=False):
         """ Get the adjacency information of cells
@@ -359,13 +407,14 @@ class StructureHexMeshDataStructure():
         if return_sparse == False:
             return face
         else:
-            N = self.N
+            NN = self.NN
             NF = self.NF
             I = np.repeat(range(NF), FE)
             val = np.ones(FE*NF, dtype=np.bool)
-            face2node = csr_matrix((val, (I, face)), shape=(NF, N), dtype=np.bool)
+            face2node = csr_matrix((val, (I, face)), shape=(NF, NN), dtype=np.bool)
             return face2node
 
+    @cached_relation
     def face_to_edge(self, return_sparse=False):
         cell2edge = self.cell2edge
         face2cell = self.face2cell
@@ -400,7 +449,7 @@ class StructureHexMeshDataStructure():
             return face2cell 
 
     def edge_to_node(self, return_sparse=False):
-        N = self.N
+        NN = self.NN
         NE = self.NE
         edge = self.edge
         if return_sparse == False:
@@ -410,7 +459,7 @@ class StructureHexMeshDataStructure():
             I = np.repeat(range(NE), 2)
             J = edge.flatten()
             val = np.ones(2*NE, dtype=np.bool)
-            edge2node = csr_matrix((val, (I, J)), shape=(NE, N), dtype=np.bool)
+            edge2node = csr_matrix((val, (I, J)), shape=(NE, NN), dtype=np.bool)
             return edge2node
 
     def edge_to_edge(self):
@@ -425,7 +474,7 @@ class StructureHexMeshDataStructure():
         I = face2edge.flatten()
         J = np.repeat(range(NF), FE)
         val = np.ones(FE*NF, dtype=np.bool)
-        edge2face = csr_matrix((val, (I, J)), shap=(NE, NF), dtype=np.bool)
+        edge2face = csr_matrix((val, (I, J)), shape=(NE, NF), dtype=np.bool)
         return edge2face
 
     def edge_to_cell(self, localidx=False):
@@ -439,31 +488,34 @@ class StructureHexMeshDataStructure():
         edge2cell = csr_matrix((val, (I, J)), shape=(NE, NC), dtype=np.bool)
         return edge2cell
 
+    @cached_relation
     def node_to_node(self):
         """ The neighbor information of nodes
         """
-        N = self.N
+        NN = self.NN
         NE = self.NE
         edge = self.edge
         I = edge.flatten()
         J = edge[:,[1,0]].flatten()
         val = np.ones((2*NE,), dtype=np.bool)
-        node2node = csr_matrix((val, (I, J)), shape=(N, N),dtype=np.bool)
+        node2node = csr_matrix((val, (I, J)), shape=(NN, NN),dtype=np.bool)
         return node2node
 
+    @cached_relation
     def node_to_edge(self):
-        N = self.N
+        NN = self.NN
         NE = self.NE
         
         edge = self.edge
         I = edge.flatten()
         J = np.repeat(range(NE), 2)
         val = np.ones(2*NE, dtype=np.bool)
-        node2edge = csr_matrix((val, (I, J)), shape=(NE, N), dtype=np.bool)
+        node2edge = csr_matrix((val, (I, J)), shape=(NE, NN), dtype=np.bool)
         return node2edge
 
+    @cached_relation
     def node_to_face(self):
-        N = self.N
+        NN = self.NN
         NF = self.NF
 
         face = self.face
@@ -472,13 +524,14 @@ class StructureHexMeshDataStructure():
         I = face.flatten()
         J = np.repeat(range(NF), FV)
         val = np.ones(FV*NF, dtype=np.bool)
-        node2face = csr_matrix((val, (I, J)), shape=(NF, N), dtype=np.bool)
+        node2face = csr_matrix((val, (I, J)), shape=(NF, NN), dtype=np.bool)
         return node2face
 
+    @cached_relation
     def node_to_cell(self, return_local_index=False):
         """
         """
-        N = self.N
+        NN = self.NN
         NC = self.NC
         V = self.V
 
@@ -489,20 +542,23 @@ class StructureHexMeshDataStructure():
 
         if return_local_index == True:
             val = ranges(V*np.ones(NC, dtype=np.int), start=1) 
-            node2cell = csr_matrix((val, (I, J)), shape=(N, NC), dtype=np.int)
+            node2cell = csr_matrix((val, (I, J)), shape=(NN, NC), dtype=np.int)
         else:
             val = np.ones(V*NC, dtype=np.bool)
-            node2cell = csr_matrix((val, (I, J)), shape=(N, NC), dtype=np.bool)
+            node2cell = csr_matrix((val, (I, J)), shape=(NN, NC), dtype=np.bool)
         return node2cell
 
+    @cached_relation
     def boundary_node_flag(self):
         NN = self.NN
-        face = self.face
-        isBdFace = self.boundary_face_flag()
         isBdPoint = np.zeros((NN,), dtype=np.bool)
-        isBdPoint[face[isBdFace,:]] = True 
+        flag = self.node_view(isBdPoint)
+        flag[[0, -1], :, :] = True
+        flag[:, [0, -1], :] = True
+        flag[:, :, [0, -1]] = True
         return isBdPoint 
 
+    @cached_relation
     def boundary_edge_flag(self):
         NE = self.NE
         face2edge = self.face_to_edge()
@@ -511,17 +567,22 @@ class StructureHexMeshDataStructure():
         isBdEdge[face2edge[isBdFace, :]] = True
         return isBdEdge 
 
+    @cached_relation
     def boundary_face_flag(self):
         NF = self.NF
-        face2cell = self.face_to_cell()
-        return face2cell[:, 0] == face2cell[:, 1] 
+        isBdFace = np.zeros((NF,), dtype=np.bool)
+        for flag in self.face_views(isBdFace):
+            flag[[0, -1]] = True
+        return isBdFace 
 
+    @cached_relation
     def boundary_cell_flag(self):
         NC = self.NC
-        face2cell = self.face_to_cell()
-        isBdFace = self.boundary_face_flag()
         isBdCell = np.zeros((NC,),dtype=np.bool)
-        isBdCell[face2cell[isBdFace, 0]] = True
+        flag = self.cell_view(isBdCell)
+        flag[[0, -1], :, :] = True
+        flag[:, [0, -1], :] = True
+        flag[:, :, [0, -1]] = True
         return isBdCell 
 
     def boundary_node_index(self):
@@ -531,7 +592,7 @@ class StructureHexMeshDataStructure():
 
     def boundary_edge_index(self):
         isBdEdge = self.boundary_edge_flag()
-        idx, = np.nonzero(isBdPoint)
+        idx, = np.nonzero(isBdEdge)
         return idx
 
     def boundary_face_index(self):
@@ -3,6 +3,7 @@ import numpy as np
 from scipy.sparse import coo_matrix, csr_matrix
 from scipy.sparse import triu, tril, diags, kron, eye
 from .Mesh2d import Mesh2d
+from .relation_cache import RelationCache, cached_relation, readonly
 
 class StructureQuadMesh(Mesh2d):
     def __init__(self, box, nx, ny, itype=np.int32, ftype=np.float):
@@ -15,21 +16,41 @@ class StructureQuadMesh(Mesh2d):
 
         self.itype = itype
         self.ftype = ftype
+        self._node = None
 
     @property
     def node(self):
-        NN = self.ds.NN
+        """ The nodes are built once on the first access
+
+        Notes
+        -----
+        The node `(i, j)` of the grid is `i*(ny+1) + j`, use
+        `self.ds.node_view(node)` to get the `(nx+1, ny+1, 2)` view.
+        """
+        if self._node is None:
+            NN = self.ds.NN
+            nx = self.ds.nx
+            ny = self.ds.ny
+            box = self.box
+
+            X, Y = np.mgrid[
+                    box[0]:box[1]:complex(0, nx+1),
+                    box[2]:box[3]:complex(0, ny+1)]
+            node = np.zeros((NN, 2), dtype=self.ftype)
+            node[:, 0] = X.flat
+            node[:, 1] = Y.flat
+            self._node = readonly(node)
+        return self._node
+
+    def coordinates(self):
+        """ The coordinates of the grid lines in the x and y directions
+        """
         nx = self.ds.nx
         ny = self.ds.ny
         box = self.box
-
-        X, Y = np.mgrid[
-                box[0]:box[1]:complex(0, nx+1),
-                box[2]:box[3]:complex(0, ny+1)]
-        node = np.zeros((NN, 2), dtype=self.ftype)
-        node[:, 0] = X.flat
-        node[:, 1] = Y.flat
-        return node
+        x = np.linspace(box[0], box[1], nx+1, dtype=self.ftype)
+        y = np.linspace(box[2], box[3], ny+1, dtype=self.ftype)
+        return x, y
 
     def number_of_nodes(self):
         return self.ds.NN
@@ -41,7 +62,54 @@ class StructureQuadMesh(Mesh2d):
         return self.ds.NC
 
     def geo_dimension(self):
-        return self.node.shape[1]
+        return 2
+
+    def entity_measure(self, etype=2, index=None):
+        """ The measures of the entities by the mesh sizes `hx` and `hy`
+        """
+        if etype in ['cell', 2]:
+            NC = self.ds.NC
+            m = np.full(NC, self.hx*self.hy, dtype=self.ftype)
+        elif etype in ['edge', 'face', 1]:
+            nx = self.ds.nx
+            ny = self.ds.ny
+            m = np.zeros(self.ds.NE, dtype=self.ftype)
+            m[:ny*(nx+1)] = self.hy
+            m[ny*(nx+1):] = self.hx
+        elif etype in ['node', 0]:
+            return 0
+        else:
+            raise ValueError("`entitytype` is wrong!")
+        return m if index is None else m[index]
+
+    def entity_barycenter(self, etype=2, index=None):
+        """ The barycenters of the entities by the grid coordinates, the
+        `cell` and `edge` arrays are not needed.
+        """
+        if etype in ['node', 0]:
+            bc = self.node
+            return bc if index is None else bc[index]
+
+        x, y = self.coordinates()
+        xc = (x[:-1] + x[1:])/2
+        yc = (y[:-1] + y[1:])/2
+        ds = self.ds
+        if etype in ['cell', 2]:
+            bc = np.zeros((ds.NC, 2), dtype=self.ftype)
+            v = ds.cell_view(bc)
+            v[..., 0] = xc[:, None]
+            v[..., 1] = yc[None, :]
+        elif etype in ['edge', 'face', 1]:
+            bc = np.zeros((ds.NE, 2), dtype=self.ftype)
+            v = ds.y_direction_edge_view(bc)
+            v[..., 0] = x[:, None]
+            v[..., 1] = yc[None, :]
+            v = ds.x_direction_edge_view(bc)
+            v[..., 0] = xc[:, None]
+            v[..., 1] = y[None, :]
+        else:
+            raise ValueError('the entity `{}` is not correct!'.format(etype))
+        return bc if index is None else bc[index]
 
     def laplace_operator(self):
         n0 = self.ds.ny + 1
@@ -74,9 +142,34 @@ class StructureQuadMeshDataStructure:
         self.NE = ny*(nx+1) + nx*(ny+1)
         self.NC = nx*ny
         self.itype = itype
+        self.relationcache = RelationCache()
+
+    def node_view(self, a):
+        """ The `(nx+1, ny+1, ...)` view of an array `a` on the nodes
+        """
+        return a.reshape((self.nx+1, self.ny+1) + a.shape[1:])
+
+    def cell_view(self, a):
+        """ The `(nx, ny, ...)` view of an array `a` on the cells
+        """
+        return a.reshape((self.nx, self.ny) + a.shape[1:])
+
+    def y_direction_edge_view(self, a):
+        """ The `(nx+1, ny, ...)` view of an array `a` on the edges, the
+        y direction edge `(i, j)` is between the cells `(i-1, j)` and `(i, j)`
+        """
+        NE0 = self.ny*(self.nx+1)
+        return a[:NE0].reshape((self.nx+1, self.ny) + a.shape[1:])
+
+    def x_direction_edge_view(self, a):
+        """ The `(nx, ny+1, ...)` view of an array `a` on the edges, the
+        x direction edge `(i, j)` is between the cells `(i, j-1)` and `(i, j)`
+        """
+        NE0 = self.ny*(self.nx+1)
+        return a[NE0:].reshape((self.nx, self.ny+1) + a.shape[1:])
 
-    
     @property
+    @cached_relation
     def cell(self):
 
         nx = self.nx
@@ -94,6 +187,7 @@ class StructureQuadMeshDataStructure:
         return cell
 
     @property
+    @cached_relation
     def edge(self):
         nx = self.nx
         ny = self.ny
@@ -118,6 +212,7 @@ class StructureQuadMeshDataStructure:
         return edge
 
     @property
+    @cached_relation
     def edge2cell(self):
 
         nx = self.nx
@@ -162,6 +257,7 @@ class StructureQuadMeshDataStructure:
 
         return edge2cell
 
+    @cached_relation
     def cell_to_node(self):
         """ 
         """
@@ -176,6 +272,7 @@ class StructureQuadMeshDataStructure:
         cell2node = csr_matrix((val, (I, cell.flatten())), shape=(NC, NN), dtype=np.bool)
         return cell2node
 
+    @cached_relation
     def cell_to_edge(self, sparse=False):
         """ The neighbor information of cell to edge
         """
@@ -183,16 +280,21 @@ class StructureQuadMeshDataStructure:
         NC = self.NC
         E = self.E
 
-        edge2cell = self.edge2cell
-
         if sparse == False:
+            nx = self.nx
+            ny = self.ny
+            idx = np.arange(NE, dtype=self.itype)
+            yidx = self.y_direction_edge_view(idx)
+            xidx = self.x_direction_edge_view(idx)
             cell2edge = np.zeros((NC, E), dtype=self.itype)
-            cell2edge[edge2cell[:, 0], edge2cell[:, 2]] = np.arange(NE,
-                    dtype=self.itype)
-            cell2edge[edge2cell[:, 1], edge2cell[:, 3]] = np.arange(NE,
-                    dtype=self.itype)
+            c2e = self.cell_view(cell2edge)
+            c2e[..., 0] = xidx[:, :-1]
+            c2e[..., 1] = yidx[1:]
+            c2e[..., 2] = xidx[:, 1:]
+            c2e[..., 3] = yidx[:-1]
             return cell2edge
         else:
+            edge2cell = self.edge2cell
             val = np.ones(2*NE, dtype=np.bool)
             I = edge2cell[:, [0, 1]].flatten()
             J = np.repeat(range(NE), 2)
@@ -201,6 +303,7 @@ class StructureQuadMeshDataStructure:
                     shape=(NC, NE), dtype=np.bool)
             return cell2edge 
 
+    @cached_relation
     def cell_to_edge_sign(self, sparse=False):
         NC = self.NC
         E = self.E
@@ -216,6 +319,7 @@ class StructureQuadMeshDataStructure:
                     shape=(NC, NE), dtype=np.bool)
         return cell2edgeSign
 
+    @cached_relation
     def cell_to_cell(self, return_sparse=False, return_boundary=True, return_array=False):
         """ Consctruct the neighbor information of cells
         """
@@ -225,13 +329,18 @@ class StructureQuadMeshDataStructure:
  
         NC = self.NC
         E = self.E
-        edge2cell = self.edge2cell
         if (return_sparse == False) & (return_array == False):
-            E = self.E
+            # 边界上的邻居是单元自己
+            idx = self.cell_view(np.arange(NC))
             cell2cell = np.zeros((NC, E), dtype=np.int)
-            cell2cell[edge2cell[:, 0], edge2cell[:, 2]] = edge2cell[:, 1]
-            cell2cell[edge2cell[:, 1], edge2cell[:, 3]] = edge2cell[:, 0]
+            c2c = self.cell_view(cell2cell)
+            c2c[:] = idx[..., None]
+            c2c[:, 1:, 0] = idx[:, :-1]
+            c2c[:-1, :, 1] = idx[1:]
+            c2c[:, :-1, 2] = idx[:, 1:]
+            c2c[1:, :, 3] = idx[:-1]
             return cell2cell
+        edge2cell = self.edge2cell
         NE = self.NE
         val = np.ones((NE,), dtype=np.bool)
         if return_boundary:
@@ -291,6 +400,7 @@ class StructureQuadMeshDataStructure:
             face2cell = csr_matrix((val, (I, J)), shape=(NE, NC), dtype=np.bool)
             return face2cell 
 
+    @cached_relation
     def node_to_node(self):
         """ The neighbor information of nodes
         """
@@ -303,6 +413,7 @@ class StructureQuadMeshDataStructure:
         node2node = csr_matrix((val, (I, J)), shape=(NN, NN),dtype=np.bool)
         return node2node
 
+    @cached_relation
     def node_to_edge(self):
         NN = self.NN
         NE = self.NE
@@ -314,6 +425,7 @@ class StructureQuadMeshDataStructure:
         node2edge = csr_matrix((val, (I, J)), shape=(NE, NN), dtype=np.bool)
         return node2edge
 
+    @cached_relation
     def node_to_cell(self, localidx=False):
         """
         """
@@ -335,18 +447,24 @@ class StructureQuadMeshDataStructure:
         return node2cell
 
 
+    @cached_relation
     def boundary_node_flag(self):
         NN = self.NN
-        edge = self.edge
-        isBdEdge = self.boundary_edge_flag()
         isBdPoint = np.zeros((NN,), dtype=np.bool)
-        isBdPoint[edge[isBdEdge,:]] = True
+        flag = self.node_view(isBdPoint)
+        flag[[0, -1], :] = True
+        flag[:, [0, -1]] = True
         return isBdPoint
 
+    @cached_relation
     def boundary_edge_flag(self):
-        edge2cell = self.edge2cell
-        return edge2cell[:, 0] == edge2cell[:, 1]
+        NE = self.NE
+        isBdEdge = np.zeros((NE,), dtype=np.bool)
+        self.y_direction_edge_view(isBdEdge)[[0, -1], :] = True
+        self.x_direction_edge_view(isBdEdge)[:, [0, -1]] = True
+        return isBdEdge
 
+    @cached_relation
     def boundary_cell_flag(self, bctype=None):
         """
         Parameters
@@ -354,28 +472,34 @@ class StructureQuadMeshDataStructure:
         bctype : None or 0, 1, 2 ,3
         """
         NC = self.NC
-
+        isBdCell = np.zeros((NC,), dtype=np.bool)
+        flag = self.cell_view(isBdCell)
         if bctype is None:
-            edge2cell = self.edge2cell
-            isBdCell = np.zeros((NC,), dtype=np.bool)
-            isBdEdge = self.boundary_edge_flag()
-            isBdCell[edge2cell[isBdEdge,0]] = True
-
-        else:
-            cell2cell = self.cell_to_cell()
-            isBdCell = cell2cell[:, bctype] == np.arange(NC)
+            flag[[0, -1], :] = True
+            flag[:, [0, -1]] = True
+        elif bctype == 0:
+            flag[:, 0] = True
+        elif bctype == 1:
+            flag[-1, :] = True
+        elif bctype == 2:
+            flag[:, -1] = True
+        elif bctype == 3:
+            flag[0, :] = True
         return isBdCell 
 
+    @cached_relation
     def boundary_node_index(self):
         isBdPoint = self.boundary_node_flag()
         idx, = np.nonzero(isBdPoint)
         return idx 
 
+    @cached_relation
     def boundary_edge_index(self):
         isBdEdge = self.boundary_edge_flag()
         idx, = np.nonzero(isBdEdge)
         return idx 
 
+    @cached_relation
     def boundary_cell_index(self, bctype=None):
         isBdCell = self.boundary_cell_flag(bctype)
         idx, = np.nonzero(isBdCell)
@@ -1,8 +1,9 @@
 import numpy as np
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix
 from scipy.sparse import spdiags, eye, tril, triu, bmat
-from .mesh_tools import unique_row
+from .mesh_tools import unique_row, entity_key, grow_array, EdgeMidpointTable
 from .Mesh3d import Mesh3d, Mesh3dDataStructure
+from .geometry_cache import cached_geometry
 from ..quadrature import TetrahedronQuadrature
 
 class TetrahedronMeshDataStructure(Mesh3dDataStructure):
@@ -108,6 +109,7 @@ class TetrahedronMesh(Mesh3d):
         nv = np.cross(v01, v02)
         return nv
 
+    @cached_geometry
     def face_unit_normal(self):
         face = self.ds.face
         node = self.node
@@ -135,6 +137,7 @@ class TetrahedronMesh(Mesh3d):
         area = np.sqrt(np.square(nv).sum(axis=1))/2.0
         return area
 
+    @cached_geometry
     def edge_length(self):
         edge = self.ds.edge
         node = self.node
@@ -157,6 +160,7 @@ class TetrahedronMesh(Mesh3d):
         return np.array(angle).T
 
 
+    @cached_geometry
     def bc_to_point(self, bc):
         node = self.node
         cell = self.ds.cell
@@ -239,6 +243,7 @@ class TetrahedronMesh(Mesh3d):
 
         return grad/wgt.reshape(-1, 1)
 
+    @cached_geometry
     def grad_lambda(self):
         localFace = self.ds.localFace
         node = self.node
@@ -283,28 +288,31 @@ class TetrahedronMesh(Mesh3d):
         length = np.sum(
                 (node[totalEdge[:, 1]] - node[totalEdge[:, 0]])**2,
                 axis = -1)
-        length += 0.1*np.random.rand(NE)*length
-        cellEdgeLength = length.reshape(NC, 6)
-        lidx = np.argmax(cellEdgeLength, axis=-1)
+        # 长度相同的边按端点编号排序, 使得一个面在两侧单元中的最长边相同,
+        # 否则两侧会用不同的对角线二分这个面, 加密后的网格不协调
+        key = entity_key(totalEdge, 2**31)
+        rank = np.zeros(NE, dtype=np.int64)
+        rank[np.lexsort((key, length))] = np.arange(NE)
+        lidx = np.argmax(rank.reshape(NC, 6), axis=-1)
 
         flag = (lidx == 1)
-        if  sum(flag) > 0:
+        if np.any(flag):
             cell[cellidx[flag], :] = cell[cellidx[flag]][:, [2, 0, 1, 3]]
 
         flag = (lidx == 2)
-        if sum(flag) > 0:
+        if np.any(flag):
             cell[cellidx[flag], :] = cell[cellidx[flag]][:, [0, 3, 1, 2]]
 
         flag = (lidx == 3)
-        if sum(flag) > 0:
+        if np.any(flag):
             cell[cellidx[flag], :] = cell[cellidx[flag]][:, [1, 2, 0, 3]]
 
         flag = (lidx == 4)
-        if sum(flag) > 0:
+        if np.any(flag):
             cell[cellidx[flag], :] = cell[cellidx[flag]][:, [1, 3, 2, 0]]
 
         flag = (lidx == 5)
-        if sum(flag) > 0:
+        if np.any(flag):
             cell[cellidx[flag], :] = cell[cellidx[flag]][:, [3, 2, 1, 0]]
 
         if rflag == True:
@@ -316,32 +324,43 @@ class TetrahedronMesh(Mesh3d):
             self.bisect()
 
     def bisect(self, isMarkedCell=None, data=None, returnim=False):
-
+        """ Bisect the marked cells by their longest edges, and the cells
+        with hanging nodes until the mesh is conforming
+
+        Parameters
+        ----------
+        isMarkedCell : numpy.array
+            the flags of the marked cells, all the cells are refined if it
+            is None
+        returnim : bool
+            if it is True, return the interpolation matrix from the old
+            nodes to the new nodes
+
+        Notes
+        -----
+        The midpoints of the cut edges are kept in an `EdgeMidpointTable`,
+        so the midpoint of an edge is found by one `searchsorted` of its
+        key. The cut edges which are still the edges of some cells are
+        active, and the cells with an active edge are the non-conforming
+        cells bisected in the next round. The node and cell arrays grow
+        by doubling.
+        """
         NN = self.number_of_nodes()
         NC = self.number_of_cells()
+        NC0 = NC
 
         if isMarkedCell is None: # 加密所有的单元
             markedCell = np.arange(NC, dtype=self.itype)
         else:
             markedCell, = np.nonzero(isMarkedCell)
 
-        # allocate new memory for node and cell
-        node = np.zeros((9*NN, 3), dtype=self.ftype)
-        cell = np.zeros((4*NC, 4), dtype=self.itype)
-
-        node[:NN] = self.entity('node')
-        cell[:NC] = self.entity('cell')
-        # 用于存储网格节点的代数，初始所有节点都为第 0 代
-        generation = np.zeros(NN + 6*NC, dtype=np.uint8)
-
-        # 用于记录被二分的边及其中点编号
-        cutEdge = np.zeros((8*NN, 3), dtype=self.itype)
+        node = grow_array(self.entity('node').copy(), NN + len(markedCell))
+        cell = grow_array(self.entity('cell').copy(), NC + len(markedCell))
+        localEdge = self.ds.localEdge
 
-        # 当前的二分边的数目
-        nCut = 0
+        # 被二分的边及其中点
+        table = EdgeMidpointTable(self.itype)
 
-        # 非协调边的标记数组 
-        nonConforming = np.ones(8*NN, dtype=np.bool)
         IM = eye(NN)
         while len(markedCell) != 0:
             # 标记最长边
@@ -353,78 +372,35 @@ class TetrahedronMesh(Mesh3d):
             p2 = cell[markedCell, 2]
             p3 = cell[markedCell, 3]
 
-            # 找到新的二分边和新的中点 
-            nMarked = len(markedCell)
-            p4 = np.zeros(nMarked, dtype=self.itype)
-
-            if nCut == 0: # 如果是第一次循环 
-                idx = np.arange(nMarked) # cells introduce new cut edges
-            else:
-                # all non-conforming edges
-                ncEdge = np.nonzero(nonConforming[:nCut])
-                NE = len(ncEdge)
-                I = cutEdge[ncEdge][:, [2, 2]].reshape(-1)
-                J = cutEdge[ncEdge][:, [0, 1]].reshape(-1)
-                val = np.ones(len(I), dtype=np.bool)
-                nv2v = csr_matrix(
-                        (val, (I, J)),
-                        shape=(NN, NN))
-                i, j =  np.nonzero(nv2v[:, p0].multiply(nv2v[:, p1]))
-                p4[j] = i
-                idx, = np.nonzero(p4 == 0)
-
-            if len(idx) != 0:
-                # 把需要二分的边唯一化 
-                NE = len(idx)
-                cellCutEdge = np.array([p0[idx], p1[idx]])
-                cellCutEdge.sort(axis=0)
-                s = csr_matrix(
-                    (
-                        np.ones(NE, dtype=np.bool),
-                        (
-                            cellCutEdge[0, ...],
-                            cellCutEdge[1, ...]
-                        )
-                    ), shape=(NN, NN), dtype=np.bool)
-                # 获得唯一的边 
-                i, j = s.nonzero()
-                nNew = len(i)
-                newCutEdge = np.arange(nCut, nCut+nNew)
-                cutEdge[newCutEdge, 0] = i
-                cutEdge[newCutEdge, 1] = j
-                cutEdge[newCutEdge, 2] = range(NN, NN+nNew)
-                node[NN:NN+nNew, :] = (node[i, :] + node[j, :])/2.0
+            # 已有的中点, 以及新的二分边和新的中点
+            key = table.edge_key(p0, p1)
+            k = table.find(key)
+            isNew = k < 0
+            p4 = np.zeros(len(markedCell), dtype=self.itype)
+            p4[~isNew] = table.midpoint[k[~isNew]]
+            if np.any(isNew):
+                newKey, j = np.unique(key[isNew], return_inverse=True)
+                nNew = len(newKey)
+                i0 = newKey//table.K
+                i1 = newKey%table.K
+                node = grow_array(node, NN + nNew)
+                node[NN:NN+nNew] = (node[i0] + node[i1])/2.0
                 if returnim is True:
                     val = np.full(nNew, 0.5)
                     I = coo_matrix(
-                            (val, (range(nNew), i)), shape=(nNew, NN),
+                            (val, (range(nNew), i0)), shape=(nNew, NN),
                             dtype=self.ftype)
                     I += coo_matrix(
-                            (val, (range(nNew), j)), shape=(nNew, NN),
+                            (val, (range(nNew), i1)), shape=(nNew, NN),
                             dtype=self.ftype)
                     I = bmat([[eye(NN)], [I]], format='csr')
                     IM = I@IM
-
-                nCut += nNew
+                p4[isNew] = NN + j
+                table.add(newKey, np.arange(NN, NN + nNew, dtype=self.itype))
                 NN += nNew
 
-                # 新点和旧点的邻接矩阵 
-                I = cutEdge[newCutEdge][:, [2, 2]].reshape(-1)
-                J = cutEdge[newCutEdge][:, [0, 1]].reshape(-1)
-                val = np.ones(len(I), dtype=np.bool)
-                nv2v = csr_matrix(
-                        (val, (I, J)),
-                        shape=(NN, NN))
-                i, j =  np.nonzero(nv2v[:, p0].multiply(nv2v[:, p1]))
-                p4[j] = i
-
-            # 如果新点的代数仍然为 0
-            idx = (generation[p4] == 0)
-            cellGeneration = np.max(
-                    generation[cell[markedCell[idx]]],
-                    axis=-1)
-            # 第几代点 
-            generation[p4[idx]] = cellGeneration + 1
+            nMarked = len(markedCell)
+            cell = grow_array(cell, NC + nMarked)
             cell[markedCell, 0] = p3
             cell[markedCell, 1] = p0
             cell[markedCell, 2] = p2
@@ -434,33 +410,31 @@ class TetrahedronMesh(Mesh3d):
             cell[NC:NC+nMarked, 2] = p3
             cell[NC:NC+nMarked, 3] = p4
             NC = NC + nMarked
-            del cellGeneration, p0, p1, p2, p3, p4
-
-            # 找到非协调的单元 
-            checkEdge, = np.nonzero(nonConforming[:nCut])
-            isCheckNode = np.zeros(NN, dtype=np.bool)
-            isCheckNode[cutEdge[checkEdge]] = True
-            isCheckCell = np.sum(
-                    isCheckNode[cell[:NC]],
-                    axis= -1) > 0
-            # 找到所有包含检查节点的单元编号 
-            checkCell, = np.nonzero(isCheckCell)
-            I = np.repeat(checkCell, 4)
-            J = cell[checkCell].reshape(-1)
-            val = np.ones(len(I), dtype=np.bool)
-            cell2node = csr_matrix((val, (I, J)), shape=(NC, NN))
-            i, j = np.nonzero(
-                    cell2node[:, cutEdge[checkEdge, 0]].multiply(
-                        cell2node[:, cutEdge[checkEdge, 1]]
-                        ))
-            markedCell = np.unique(i)
-            nonConforming[checkEdge] = False
-            nonConforming[checkEdge[j]] = True;
-
-
-        self.node = node[:NN]
-        cell = cell[:NC]
-        self.ds.reinit(NN, cell)
+            del p0, p1, p2, p3, p4
+
+            # 找到非协调的单元: 含有活跃二分边的单元
+            edge = table.edge()[table.active]
+            isCheckNode = np.zeros(NN, dtype=np.bool_)
+            isCheckNode[edge] = True
+            # 至少有两个检查节点的单元才可能含有活跃的二分边
+            checkCell, = np.nonzero(
+                    np.sum(isCheckNode[cell[:NC]], axis=-1) > 1)
+            totalEdge = cell[checkCell][:, localEdge]
+            isCut = np.all(isCheckNode[totalEdge], axis=-1)
+            totalEdge = totalEdge[isCut]
+            k = table.find(table.edge_key(totalEdge[:, 0], totalEdge[:, 1]),
+                    isActive=True)
+            isCut[isCut] = k >= 0
+            k = k[k >= 0]
+            markedCell = checkCell[np.any(isCut, axis=-1)]
+            active = np.zeros(len(table), dtype=np.bool_)
+            active[k] = True
+            table.active = active
+
+        self.node = node[:NN].copy()
+        cell = cell[:NC].copy()
+        isChangedCell = np.any(cell[:NC0] != self.ds.cell, axis=1)
+        self.ds.update(NN, cell, isChangedCell)
 
         if returnim is True:
             return IM
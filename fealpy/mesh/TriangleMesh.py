@@ -1,6 +1,7 @@
 import numpy as np
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, bmat, eye
 from .Mesh2d import Mesh2d, Mesh2dDataStructure
+from .geometry_cache import cached_geometry
 from ..quadrature import TriangleQuadrature
 
 
@@ -578,6 +579,7 @@ class TriangleMesh(Mesh2d):
 
 
 
+    @cached_geometry
     def grad_lambda(self):
         node = self.node
         cell = self.ds.cell
@@ -674,6 +676,7 @@ class TriangleMesh(Mesh2d):
             a = np.sqrt(np.square(nv).sum(axis=1))/2.0
         return a
 
+    @cached_geometry
     def bc_to_point(self, bc):
         node = self.node
         cell = self.ds.cell
@@ -317,7 +317,7 @@ class Tritree(TriangleMesh):
             cell = np.r_['0', cell, cell4]
             self.parent = np.r_['0', self.parent, parent4]
             self.child = np.r_['0', self.child, child4]
-            self.ds.reinit(NN + NNN, cell)
+            self.ds.update(NN + NNN, cell)
 
     def coarsen_1(self, isMarkedCell=None, options={'disp': True}):
 
@@ -537,7 +537,7 @@ class Tritree(TriangleMesh):
             cell = np.r_['0', cell, cell4]
             self.parent = np.r_['0', self.parent, parent4]
             self.child = np.r_['0', self.child, child4]
-            self.ds.reinit(NN + NNN, cell)
+            self.ds.update(NN + NNN, cell)
 
     def adaptive_coarsen(self, estimator, surface=None, data=None):
 
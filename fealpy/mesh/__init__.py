@@ -23,6 +23,7 @@ from .Quadtree import Quadtree
 from .Octree import Octree
 
 from .QuadtreeForest import QuadtreeMesh, QuadtreeForest
+from .OctreeForest import OctreeMesh, OctreeForest
 
 from .simple_mesh_generator import *
 
@@ -37,3 +38,5 @@ from .sizing_function import huniform
 from .mesh_tools import *
 
 from .meshio import load_mat_mesh
+
+from .point_location import PointLocator, point_locator
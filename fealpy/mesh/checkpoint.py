@@ -0,0 +1,162 @@
+"""Native checkpoint of meshes, trees and functions
+
+A checkpoint is a directory with a small `header.json` and one raw `.npy`
+file for every array, so it can be reopened by `np.load(mmap_mode='r')`
+without reading the arrays and without reconstructing the topology.
+"""
+import os
+import sys
+import json
+import importlib
+import numpy as np
+
+from .relation_cache import RelationCache
+
+
+def class_name(obj):
+    cls = type(obj)
+    return cls.__module__ + '.' + cls.__name__
+
+
+def find_class(name):
+    module, cls = name.rsplit('.', 1)
+    return getattr(importlib.import_module(module), cls)
+
+
+def save_object(path, prefix, obj):
+    """ Save the attributes of `obj`: the arrays go into `.npy` files and
+    the small values into the returned header
+
+    Returns
+    -------
+    header : dict
+    """
+    header = {'class': class_name(obj), 'arrays': [], 'values': {},
+            'dicts': {}, 'objects': {}, 'relationcache': False}
+    for key, val in obj.__dict__.items():
+        if isinstance(val, np.ndarray):
+            np.save(os.path.join(path, prefix + key + '.npy'),
+                    np.asarray(val))
+            header['arrays'].append(key)
+        elif isinstance(val, np.dtype):
+            header['values'][key] = {'dtype': val.str}
+        elif isinstance(val, np.generic):
+            header['values'][key] = val.item()
+        elif isinstance(val, (bool, int, float, str, type(None))):
+            header['values'][key] = val
+        elif isinstance(val, RelationCache):
+            header['relationcache'] = True
+        elif key == 'ds':
+            header['objects'][key] = save_object(path, prefix + key + '.', val)
+        elif isinstance(val, dict) and all(isinstance(v, np.ndarray) for v in val.values()):
+            names = []
+            for k, v in val.items():
+                np.save(os.path.join(path, prefix + key + '.' + k + '.npy'), v)
+                names.append(k)
+            header['dicts'][key] = names
+        # the other attributes (e.g. plotters) are not saved
+    return header
+
+
+def load_object(path, prefix, header, mmap_mode):
+    cls = find_class(header['class'])
+    obj = cls.__new__(cls)
+    for key in header['arrays']:
+        val = np.load(os.path.join(path, prefix + key + '.npy'),
+                mmap_mode=mmap_mode)
+        setattr(obj, key, val)
+    for key, val in header['values'].items():
+        if isinstance(val, dict) and 'dtype' in val:
+            val = np.dtype(val['dtype'])
+        elif isinstance(val, str):
+            # the mesh types are compared by `is` in many places
+            val = sys.intern(val)
+        setattr(obj, key, val)
+    for key, names in header['dicts'].items():
+        setattr(obj, key, {k: np.load(os.path.join(path, prefix + key + '.' + k + '.npy'),
+            mmap_mode=mmap_mode) for k in names})
+    for key, h in header['objects'].items():
+        setattr(obj, key, load_object(path, prefix + key + '.', h, mmap_mode))
+    if header['relationcache']:
+        obj.relationcache = RelationCache()
+    if 'nodeversion' in header['values']:
+        # a new geometry version with an empty geometry cache
+        obj.node_moved()
+    return obj
+
+
+def save_checkpoint(path, mesh, functions=None, meta=None):
+    """ Save a mesh (or a tree) with its topology and some functions
+
+    Parameters
+    ----------
+    path : str
+        the checkpoint directory, it is created if it does not exist
+    mesh : mesh object
+        all the arrays of the mesh and of `mesh.ds` are saved, e.g. `node`,
+        `cell`, `edge`, `edge2cell`, `parent`, `child`, `celldata`
+    functions : dict
+        `{name: Function}`, the arrays and the spaces (class and degree)
+    meta : dict
+        any JSON data of the user, e.g. the time step or the iteration
+    """
+    os.makedirs(path, exist_ok=True)
+    header = {'version': 1, 'mesh': save_object(path, 'mesh.', mesh),
+            'functions': {}, 'meta': {} if meta is None else meta}
+    if functions is not None:
+        for name, f in functions.items():
+            np.save(os.path.join(path, 'function.' + name + '.npy'),
+                    np.asarray(f))
+            info = {}
+            space = getattr(f, 'space', None)
+            if space is not None:
+                info['space'] = class_name(space)
+                info['p'] = getattr(space, 'p', None)
+                info['spacetype'] = getattr(space, 'spacetype', None)
+            header['functions'][name] = info
+
+    with open(os.path.join(path, 'header.json'), 'w') as f:
+        json.dump(header, f, indent=1)
+
+
+def load_checkpoint(path, mmap_mode='r', spaces=True):
+    """ Load a checkpoint saved by `save_checkpoint`
+
+    Parameters
+    ----------
+    mmap_mode : None, 'r', 'c' or 'r+'
+        passed to `np.load`; the default maps the files read-only and reads
+        nothing until the arrays are used. Use 'c' (copy on write) to refine
+        the loaded mesh further and None to read everything into memory.
+    spaces : bool
+        if it is True, the spaces of the functions are rebuilt on the loaded
+        mesh and the functions are returned as `Function`, otherwise as
+        arrays
+
+    Returns
+    -------
+    mesh : mesh object
+    functions : dict
+    meta : dict
+    """
+    with open(os.path.join(path, 'header.json')) as f:
+        header = json.load(f)
+
+    mesh = load_object(path, 'mesh.', header['mesh'], mmap_mode)
+
+    functions = {}
+    cache = {}
+    for name, info in header['functions'].items():
+        val = np.load(os.path.join(path, 'function.' + name + '.npy'),
+                mmap_mode=mmap_mode)
+        if spaces and ('space' in info):
+            key = (info['space'], info['p'], info['spacetype'])
+            if key not in cache:
+                cls = find_class(info['space'])
+                kwargs = {}
+                if info['spacetype'] is not None:
+                    kwargs['spacetype'] = sys.intern(info['spacetype'])
+                cache[key] = cls(mesh, info['p'], **kwargs)
+            val = cache[key].function(array=val)
+        functions[name] = val
+    return mesh, functions, header['meta']
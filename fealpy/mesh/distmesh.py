@@ -79,6 +79,7 @@ class DistMesh2d():
         dgrady = (fd(p[idx, :]+depsy, *args) - d[idx])/self.deps
         p[idx, 0] = p[idx, 0] - d[idx]*dgradx
         p[idx, 1] = p[idx, 1] - d[idx]*dgrady
+        self.mesh.node_moved()
         self.maxmove = np.max(np.sqrt(np.sum(dt*dxdt[d < -self.geps,:]**2, axis=1))/h)
         self.time_elapsed += dt
 
@@ -207,6 +208,7 @@ class DistMesh3d:
         p[idx, 0] = p[idx, 0] - d[idx]*dgradx
         p[idx, 1] = p[idx, 1] - d[idx]*dgrady
         p[idx, 2] = p[idx, 2] - d[idx]*dgradz
+        self.mesh.node_moved()
         self.maxmove = np.max(np.sqrt(np.sum(dt*dxdt[d < -self.geps,:]**2, axis=1)))
         self.time_elapsed += dt
         if self.maxmove > ttol*h:
@@ -0,0 +1,111 @@
+import inspect
+import functools
+import itertools
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from .relation_cache import readonly
+
+# every assignment of nodes gets a new version, never reused by any mesh
+nodeversions = itertools.count(1)
+
+
+class GeometryCache():
+    """ The cache of the geometric arrays of a mesh, e.g. `grad_lambda()`,
+    `entity_measure('cell')` and `bc_to_point(bcs)`
+
+    The arrays are kept for one geometry version `(nodeversion, topology
+    version)` of the mesh and dropped as soon as the nodes are assigned,
+    `node_moved()` is called or the topology is rebuilt. At most `maxsize`
+    arrays are kept, the least recently used ones are dropped first.
+    """
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.version = None
+        self.data = OrderedDict()
+        self.hit = {}
+        self.miss = {}
+        self.lock = threading.Lock()
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def get(self, name, key, version, build):
+        with self.lock:
+            if version != self.version:
+                self.data.clear()
+                self.version = version
+            val = self.data.get(key)
+            if val is not None:
+                self.hit[name] = self.hit.get(name, 0) + 1
+                self.data.move_to_end(key)
+                return val
+            self.miss[name] = self.miss.get(name, 0) + 1
+        val = readonly(build())
+        with self.lock:
+            if version == self.version:
+                self.data[key] = val
+                while len(self.data) > self.maxsize:
+                    self.data.popitem(last=False)
+        return val
+
+    def info(self):
+        """ Return `{name: (hit, miss)}` of every cached method
+        """
+        names = set(self.hit) | set(self.miss)
+        return {name: (self.hit.get(name, 0), self.miss.get(name, 0))
+                for name in names}
+
+
+def geometry_version(mesh):
+    """ The version of the nodes and the topology of `mesh`, None if the
+    data structure of `mesh` does not keep a topology version
+    """
+    relationcache = getattr(mesh.ds, 'relationcache', None)
+    if relationcache is None:
+        return None
+    return (mesh.nodeversion, relationcache.version)
+
+
+def argument_key(val, maxsize=4096):
+    """ The hashable key of an argument, the small arrays (quadrature points,
+    index arrays) are keyed by their bytes, None for the large ones
+    """
+    if isinstance(val, np.ndarray):
+        if val.size > maxsize:
+            return None
+        return (val.dtype.str, val.shape, val.tobytes())
+    try:
+        hash(val)
+    except TypeError:
+        return None
+    return val
+
+
+def cached_geometry(method):
+    """ Memoize a geometric method of a mesh in its `geometrycache`, the key
+    is the method name and all its arguments with the defaults filled in.
+    The calls with large or unhashable arguments are not cached.
+    """
+    signature = inspect.signature(method)
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = getattr(self, 'geometrycache', None)
+        version = None if cache is None else geometry_version(self)
+        if version is None:
+            return method(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = [name]
+        for arg, val in tuple(bound.arguments.items())[1:]:
+            val = argument_key(val)
+            if val is None and bound.arguments[arg] is not None:
+                return method(self, *args, **kwargs)
+            key.append((arg, val))
+        return cache.get(name, tuple(key), version,
+                lambda: method(self, *args, **kwargs))
+    return wrapper
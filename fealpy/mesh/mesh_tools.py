@@ -266,6 +266,410 @@ def unique_row(a):
     return (b, i, j)
 
 
+def entity_key(entity, NN):
+    """ Encode every row of `entity`, as a set of nodes, into one int64 key
+
+    The order of the keys is the lexicographic order of the sorted rows.
+    Return None if the key can overflow.
+    """
+    m = entity.shape[1]
+    if m == 2:
+        key = np.minimum(entity[:, 0], entity[:, 1]).astype(np.int64)
+        key *= NN
+        key += np.maximum(entity[:, 0], entity[:, 1])
+    elif int(NN)**m <= 2**63:
+        sortedEntity = np.sort(entity, axis=1)
+        key = sortedEntity[:, 0].astype(np.int64)
+        for i in range(1, m):
+            key *= NN
+            key += sortedEntity[:, i]
+    else:
+        key = None
+    return key
+
+
+def unique_entity(totalEntity, NN):
+    """ Find the unique entities in `totalEntity`, two rows are the same
+    entity if they have the same nodes in any order.
+
+    Parameters
+    ----------
+    totalEntity : numpy.array
+        the node indices of the entities, with shape `(M, m)`
+    NN : int
+        the number of nodes
+
+    Returns
+    -------
+    i0 : numpy.array
+        the index of the first occurrence of every unique entity
+    j : numpy.array
+        the index of the unique entity of every row
+
+    Notes
+    -----
+    The result is the same as
+
+        np.unique(np.sort(totalEntity, axis=1), axis=0,
+            return_index=True, return_inverse=True)
+
+    but every sorted row is encoded into one int64 key, so only a 1d
+    array is sorted instead of a lexicographic sort of the rows. If the
+    key can overflow, the rows are sorted with `np.lexsort`.
+    """
+    key = entity_key(totalEntity, NN)
+    if key is None:
+        sortedEntity = np.sort(totalEntity, axis=1)
+        idx = np.lexsort(sortedEntity.T[::-1])
+        sortedEntity = sortedEntity[idx]
+        isFirst = np.ones(len(idx), dtype=np.bool_)
+        isFirst[1:] = np.any(sortedEntity[1:] != sortedEntity[:-1], axis=1)
+        i0 = idx[isFirst]
+        j = np.zeros(len(idx), dtype=np.int64)
+        j[idx] = np.cumsum(isFirst) - 1
+        return i0, j
+
+    _, i0, j = np.unique(key, return_index=True, return_inverse=True)
+    return i0, j
+
+
+def grow_array(a, n):
+    """ Return `a` if it has at least `n` rows, otherwise a copy of `a` with
+    room for `max(n, 2*len(a))` rows, so appending row by row costs
+    amortized linear time
+    """
+    if len(a) >= n:
+        return a
+    b = np.empty((max(n, 2*len(a)), ) + a.shape[1:], dtype=a.dtype)
+    b[:len(a)] = a
+    return b
+
+
+class EdgeMidpointTable():
+    """ The midpoints of the bisected edges, looked up by the int64 key
+    `min(i, j)*K + max(i, j)` of the edge `(i, j)`
+
+    The keys are kept sorted, so a batch of edges is looked up by one
+    `np.searchsorted`. Every edge also has a flag `active`, e.g. whether
+    it is still an edge of some cell.
+    """
+    def __init__(self, itype, K=2**31):
+        self.K = K
+        self.key = np.zeros(0, dtype=np.int64)
+        self.midpoint = np.zeros(0, dtype=itype)
+        self.active = np.zeros(0, dtype=np.bool_)
+
+    def __len__(self):
+        return len(self.key)
+
+    def edge_key(self, i, j):
+        key = np.minimum(i, j).astype(np.int64)
+        key *= self.K
+        key += np.maximum(i, j)
+        return key
+
+    def edge(self):
+        """ The edges `(NE, 2)` in the order of the keys
+        """
+        return np.stack((self.key//self.K, self.key%self.K), axis=1)
+
+    def find(self, key, isActive=False):
+        """ The positions of the keys in the table, -1 for the keys not in
+        the table; only the active edges are searched if `isActive` is True
+        """
+        if isActive:
+            index, = np.nonzero(self.active)
+            table = self.key[index]
+        else:
+            table = self.key
+        n = len(table)
+        if n == 0:
+            return np.full(len(key), -1, dtype=np.int64)
+        k = np.searchsorted(table, key)
+        k[k == n] = 0
+        isFound = table[k] == key
+        if isActive:
+            k = index[k]
+        k[~isFound] = -1
+        return k
+
+    def add(self, key, midpoint):
+        """ Add the new sorted unique keys `key` and their midpoints, the new
+        edges are active
+        """
+        k = np.searchsorted(self.key, key)
+        self.key = np.insert(self.key, k, key)
+        self.midpoint = np.insert(self.midpoint, k, midpoint)
+        self.active = np.insert(self.active, k, True)
+
+
+class KeyIndex():
+    """ The entity of every int64 key, with the keys kept in sorted runs
+
+    A batch of keys is looked up by one `np.searchsorted` in every run. New
+    keys go into a new run, and the last two runs are merged while the last
+    one is at least half as long as the one before, so there are O(log N)
+    runs and every key is merged O(log N) times. A removed key keeps its
+    place with the entity -1 until its run is merged.
+    """
+    def __init__(self, key, idx):
+        self.runs = []
+        self.add(key, idx)
+
+    def find(self, key):
+        """ The entities of the keys, -1 for the keys not in the index
+        """
+        result = np.full(len(key), -1, dtype=np.int_)
+        for k, i in self.runs:
+            pos = np.searchsorted(k, key)
+            pos[pos == len(k)] = 0
+            isFound = (k[pos] == key) & (i[pos] >= 0)
+            result[isFound] = i[pos[isFound]]
+        return result
+
+    def set(self, key, idx):
+        """ Set the entities of the keys in the index, -1 removes the keys
+        """
+        for k, i in self.runs:
+            pos = np.searchsorted(k, key)
+            pos[pos == len(k)] = 0
+            isFound = (k[pos] == key) & (i[pos] >= 0)
+            i[pos[isFound]] = idx[isFound]
+
+    def add(self, key, idx):
+        """ Add the new keys `key` of the entities `idx`
+        """
+        if len(key) == 0:
+            return
+        order = np.argsort(key)
+        self.runs.append((key[order], idx[order].astype(np.int_)))
+        while (len(self.runs) > 1) and (
+                2*len(self.runs[-1][0]) >= len(self.runs[-2][0])):
+            k1, i1 = self.runs.pop()
+            k0, i0 = self.runs.pop()
+            k = np.r_[k0, k1]
+            i = np.r_[i0, i1]
+            isLive = i >= 0
+            k = k[isLive]
+            i = i[isLive]
+            order = np.argsort(k, kind='mergesort')
+            self.runs.append((k[order], i[order]))
+
+
+class EntityTable():
+    """ The entities (edges in 2d, faces in 3d) of a mesh, every one of
+    which is shared by at most two cells, kept between the incremental
+    updates of the topology
+
+    `entity`, `entity2cell` and `cell2entity` are views of arrays with
+    room to grow, and an update only touches the entities of the changed
+    and new cells. They are found by `cell2entity` and by the keys of the
+    entities in a `KeyIndex`. The new entities take the places of the
+    removed ones first and are appended after that, so the numbering is
+    not the sorted one of `unique_entity`, but every entity is oriented as
+    in its first cell and `entity2cell` is the same as the one built from
+    scratch.
+    """
+    def __init__(self, entity, entity2cell, cell2entity, localEntity):
+        self.localEntity = localEntity
+        self.K = 2**(63//entity.shape[1])
+        self.NE = len(entity)
+        self.NC = len(cell2entity)
+        self.entitybuf = np.array(entity)
+        self.entity2cellbuf = np.array(entity2cell)
+        self.cell2entitybuf = np.array(cell2entity)
+        self.entity = self.entitybuf[:self.NE]
+        self.entity2cell = self.entity2cellbuf[:self.NE]
+        self.cell2entity = self.cell2entitybuf[:self.NC]
+        key = entity_key(self.entity, self.K)
+        self.index = KeyIndex(key, np.arange(self.NE))
+
+    def is_current(self, entity, entity2cell):
+        return (entity is self.entity) and (entity2cell is self.entity2cell)
+
+    def update(self, NN, cell, changed):
+        """ Update the entities after the old cells `changed` (sorted
+        indices) are changed and new cells are appended at the end of `cell`
+
+        Return False if the keys of the entities can overflow.
+        """
+        if NN > self.K:
+            return False
+        F, m = self.localEntity.shape
+        NC0 = self.NC
+        NC = len(cell)
+        NE = self.NE
+        itype = self.entity2cellbuf.dtype
+
+        # the old entities of the changed cells and the entities of the
+        # changed and new cells after the change
+        cidx = np.r_[changed, np.arange(NC0, NC)].astype(np.int_)
+        oldId = self.cell2entity[changed].reshape(-1)
+        newKey = entity_key(
+                cell[cidx][:, self.localEntity].reshape(-1, m), self.K)
+        newCode = (cidx.reshape(-1, 1)*F + np.arange(F)).reshape(-1)
+        foundId = self.index.find(newKey)
+        tid = np.unique(np.r_[oldId, foundId[foundId >= 0]])
+
+        # the occurrences of the touched entities in the unchanged cells
+        e2c = self.entity2cell[tid]
+        c0 = e2c[:, 0].astype(np.int_)*F + e2c[:, 2]
+        c1 = e2c[:, 1].astype(np.int_)*F + e2c[:, 3]
+        k0 = ~np.isin(e2c[:, 0], changed)
+        k1 = ~np.isin(e2c[:, 1], changed) & (c1 != c0)
+        tkey = entity_key(self.entity[tid], self.K)
+        key = np.r_[tkey[k0], tkey[k1], newKey]
+        code = np.r_[c0[k0], c1[k1], newCode]
+        idx = np.lexsort((code, key))
+        key = key[idx]
+        code = code[idx]
+
+        isFirst = np.ones(len(key), dtype=np.bool_)
+        np.not_equal(key[1:], key[:-1], out=isFirst[1:])
+        isLast = np.roll(isFirst, -1)
+        key = key[isFirst]
+        i0 = code[isFirst]
+        i1 = code[isLast]
+
+        # the touched entities which are kept, removed or new
+        order = np.argsort(tkey)
+        pos = np.searchsorted(tkey[order], key)
+        pos[pos == len(tid)] = 0
+        isOld = np.zeros(len(key), dtype=np.bool_)
+        if len(tid) > 0:
+            isOld = tkey[order[pos]] == key
+        eid = np.zeros(len(key), dtype=np.int_)
+        eid[isOld] = tid[order[pos[isOld]]]
+        isRemoved = np.ones(len(tid), dtype=np.bool_)
+        isRemoved[order[pos[isOld]]] = False
+        hole = tid[isRemoved]
+
+        nNew = len(key) - np.sum(isOld)
+        nHole = len(hole)
+        eid[~isOld] = np.r_[hole[:nNew], np.arange(NE, NE + nNew - nHole)]
+        NE1 = NE + max(nNew - nHole, 0)
+
+        self.entitybuf = grow_array(self.entitybuf, NE1)
+        self.entity2cellbuf = grow_array(self.entity2cellbuf, NE1)
+        self.cell2entitybuf = grow_array(self.cell2entitybuf, NC)
+        entity = self.entitybuf
+        entity2cell = self.entity2cellbuf
+        cell2entity = self.cell2entitybuf
+
+        entity[eid] = cell[(i0//F).reshape(-1, 1), self.localEntity[i0%F]]
+        entity2cell[eid, 0] = i0//F
+        entity2cell[eid, 1] = i1//F
+        entity2cell[eid, 2] = i0%F
+        entity2cell[eid, 3] = i1%F
+        cell2entity[i0//F, i0%F] = eid
+        cell2entity[i1//F, i1%F] = eid
+
+        self.index.set(tkey[isRemoved], np.full(nHole, -1))
+        self.index.add(key[~isOld], eid[~isOld])
+
+        # the last entities are moved into the holes left
+        if nHole > nNew:
+            NE1 = NE - (nHole - nNew)
+            hole = hole[nNew:]
+            isHole = np.zeros(NE - NE1, dtype=np.bool_)
+            isHole[hole[hole >= NE1] - NE1] = True
+            hole = hole[hole < NE1]
+            last = NE1 + np.nonzero(~isHole)[0]
+            entity[hole] = entity[last]
+            entity2cell[hole] = entity2cell[last]
+            e2c = entity2cell[hole]
+            cell2entity[e2c[:, 0], e2c[:, 2]] = hole
+            cell2entity[e2c[:, 1], e2c[:, 3]] = hole
+            self.index.set(entity_key(entity[hole], self.K), hole)
+
+        self.NE = NE1
+        self.NC = NC
+        self.entity = entity[:NE1]
+        self.entity2cell = entity2cell[:NE1]
+        self.cell2entity = cell2entity[:NC]
+        return True
+
+
+class SharedEntityTable():
+    """ The edges of a 3d mesh, which are shared by any number of cells,
+    kept between the incremental updates of the topology
+
+    `entity`, `cell2entity` and the number of the cells around every
+    entity are views of arrays with room to grow. The new entities take
+    the places of the removed ones first and are appended after that, and
+    every entity is sorted as in `Mesh3dDataStructure.construct`.
+    """
+    def __init__(self, entity, cell2entity, localEntity):
+        self.localEntity = localEntity
+        self.K = 2**(63//entity.shape[1])
+        self.NE = len(entity)
+        self.NC = len(cell2entity)
+        self.entitybuf = np.array(entity)
+        self.cell2entitybuf = np.array(cell2entity)
+        self.countbuf = np.bincount(cell2entity.reshape(-1),
+                minlength=self.NE)
+        self.entity = self.entitybuf[:self.NE]
+        self.cell2entity = self.cell2entitybuf[:self.NC]
+        key = entity_key(self.entity, self.K)
+        self.index = KeyIndex(key, np.arange(self.NE))
+
+    def is_current(self, entity, cell2entity):
+        return (entity is self.entity) and (cell2entity is self.cell2entity)
+
+    def update(self, NN, cell, changed):
+        """ Update the entities after the old cells `changed` (sorted
+        indices) are changed and new cells are appended at the end of `cell`
+
+        Return False if the keys of the entities can overflow, or more
+        entities are removed than added, as the cells of an entity are not
+        kept to move it into a hole.
+        """
+        if NN > self.K:
+            return False
+        m = self.localEntity.shape[1]
+        NC0 = self.NC
+        NC = len(cell)
+        NE = self.NE
+        count = self.countbuf
+
+        cidx = np.r_[changed, np.arange(NC0, NC)].astype(np.int_)
+        oldId, n = np.unique(self.cell2entity[changed], return_counts=True)
+        count[oldId] -= n
+        key, j = np.unique(entity_key(
+            cell[cidx][:, self.localEntity].reshape(-1, m), self.K),
+            return_inverse=True)
+        n = np.bincount(j, minlength=len(key))
+        eid = self.index.find(key)
+        isOld = eid >= 0
+        count[eid[isOld]] += n[isOld]
+
+        hole = oldId[count[oldId] == 0]
+        nNew = len(key) - np.sum(isOld)
+        nHole = len(hole)
+        if nHole > nNew:
+            return False
+        holeKey = entity_key(self.entity[hole], self.K)
+        eid[~isOld] = np.r_[hole, np.arange(NE, NE + nNew - nHole)]
+        NE1 = NE + nNew - nHole
+
+        self.entitybuf = grow_array(self.entitybuf, NE1)
+        self.cell2entitybuf = grow_array(self.cell2entitybuf, NC)
+        self.countbuf = grow_array(count, NE1)
+        self.entitybuf[eid[~isOld], 0] = key[~isOld]//self.K
+        self.entitybuf[eid[~isOld], 1] = key[~isOld]%self.K
+        self.cell2entitybuf[cidx] = eid[j].reshape(len(cidx), -1)
+        self.countbuf[eid[~isOld]] = n[~isOld]
+
+        self.index.set(holeKey, np.full(nHole, -1))
+        self.index.add(key[~isOld], eid[~isOld])
+
+        self.NE = NE1
+        self.NC = NC
+        self.entity = self.entitybuf[:NE1]
+        self.cell2entity = self.cell2entitybuf[:NC]
+        return True
+
+
 def show_point(axes, point):
     axes.plot(point[:, 0], point[:, 1], 'ro')
 
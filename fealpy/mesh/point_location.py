@@ -0,0 +1,386 @@
+"""Locate physical points in the cells of a mesh
+
+`PointLocator` maps a batch of points to the cells containing them and to
+their local coordinates in these cells. The cells are registered in a
+uniform grid of bins by their bounding boxes, so the candidate cells of a
+point are the cells of its bin. If a guess of the cells is known (e.g. the
+cells of the points at the last time step), the points can walk from the
+guess through the neighbors given by `cell_to_cell`, the bins are the
+fallback of the walk.
+"""
+import numpy as np
+
+
+def expand(count):
+    """ Enumerate the entries of ragged rows with `count` entries
+
+    Returns
+    -------
+    row : numpy.array
+        the row of every entry
+    k : numpy.array
+        the position of every entry in its row
+    """
+    row = np.repeat(np.arange(len(count)), count)
+    start = np.cumsum(count) - count
+    k = np.arange(len(row)) - start[row]
+    return row, k
+
+
+class PointLocator():
+    """ A point-location index of a `TriangleMesh`, a `TetrahedronMesh`, a
+    `QuadrangleMesh` or a `PolygonMesh`
+
+    The local coordinates returned by `locate` are
+
+    * the barycentric coordinates `(N, TD+1)` on the simplex meshes;
+    * the values of the four bilinear shape functions `(N, 4)` on the
+      quadrangle meshes, the same weights as in `QuadrangleMesh.bc_to_point`;
+    * the points themselves `(N, 2)` on the polygon meshes, the spaces on
+      polygons evaluate their functions at physical points.
+    """
+    def __init__(self, mesh, nbin=None, eps=1e-10, batchsize=2**16):
+        """
+
+        Parameters
+        ----------
+        mesh : mesh object
+        nbin : int or tuple
+            the number of the bins in every direction, default gives about
+            one cell for every bin
+        eps : float
+            the tolerance of the inclusion test, relative to the cell size
+        batchsize : int
+            the number of the points located at the same time, it bounds the
+            memory of the (point, candidate cell) pairs
+        """
+        self.mesh = mesh
+        self.meshtype = mesh.meshtype
+        self.eps = eps
+        self.batchsize = batchsize
+        self.key = locator_key(mesh)
+
+        node = mesh.entity('node')
+        GD = node.shape[1]
+        self.GD = GD
+        if self.meshtype in {'tri', 'tet'}:
+            cell = mesh.entity('cell')
+            self.v0 = node[cell[:, 0]]
+            self.Dlambda = mesh.grad_lambda()
+            pp = node[cell]
+            cmin = pp.min(axis=1)
+            cmax = pp.max(axis=1)
+        elif self.meshtype == 'quad':
+            cell = mesh.entity('cell')
+            self.cellnode = node[cell]
+            cmin = self.cellnode.min(axis=1)
+            cmax = self.cellnode.max(axis=1)
+        elif self.meshtype == 'polygon':
+            self.cell = mesh.ds.cell
+            self.cellLocation = mesh.ds.cellLocation
+            pp = node[self.cell]
+            cmin = np.minimum.reduceat(pp, self.cellLocation[:-1], axis=0)
+            cmax = np.maximum.reduceat(pp, self.cellLocation[:-1], axis=0)
+            self.h = np.sqrt(np.sum((cmax - cmin)**2, axis=1))
+        else:
+            raise ValueError("We don't support point location on the `{}` mesh!".format(self.meshtype))
+
+        NC = cmin.shape[0]
+        self.NC = NC
+        self.lo = node.min(axis=0)
+        L = node.max(axis=0) - self.lo
+        if nbin is None:
+            h = (np.prod(L)/NC)**(1/GD)
+            nbin = np.ceil(L/h)
+        self.nbin = np.maximum(np.broadcast_to(nbin, (GD, )), 1).astype(np.int_)
+        self.binsize = L/self.nbin
+
+        # 把每个单元放入它的包围盒覆盖的所有 bin
+        cidx, b = self.box_bins(cmin, cmax)
+        NB = np.prod(self.nbin)
+        self.bincell = cidx[np.argsort(b, kind='mergesort')]
+        self.binptr = np.zeros(NB + 1, dtype=np.int_)
+        self.binptr[1:] = np.cumsum(np.bincount(b, minlength=NB))
+
+    def bin_index(self, p):
+        idx = np.floor((p - self.lo)/self.binsize).astype(np.int_)
+        return np.clip(idx, 0, self.nbin - 1)
+
+    def box_bins(self, bmin, bmax):
+        """ The bins overlapped by the boxes `[bmin[i], bmax[i]]`
+
+        Returns
+        -------
+        idx : numpy.array
+            the box of every (box, bin) pair
+        b : numpy.array
+            the bin of every pair
+        """
+        i0 = self.bin_index(bmin)
+        n = self.bin_index(bmax) - i0 + 1
+        idx, k = expand(np.prod(n, axis=1))
+        b = np.zeros(len(idx), dtype=np.int_)
+        stride = 1
+        for d in range(self.GD):
+            nd = n[idx, d]
+            b += (i0[idx, d] + k%nd)*stride
+            k //= nd
+            stride *= self.nbin[d]
+        return idx, b
+
+    def box_candidates(self, bmin, bmax):
+        """ The cells registered in the bins overlapped by the boxes, every
+        (box, cell) pair is given once
+
+        Returns
+        -------
+        idx : numpy.array
+            the box of every pair
+        cellidx : numpy.array
+            the cell of every pair
+        """
+        idx, b = self.box_bins(bmin, bmax)
+        count = self.binptr[b+1] - self.binptr[b]
+        pidx, k = expand(count)
+        idx = idx[pidx]
+        cellidx = self.bincell[self.binptr[b[pidx]] + k]
+        key = np.unique(idx*self.NC + cellidx)
+        return key//self.NC, key%self.NC
+
+    def local_coordinates(self, points, cellidx):
+        """ The local coordinates of `points[i]` in the cell `cellidx[i]`
+
+        Returns
+        -------
+        score : numpy.array
+            it is not negative if and only if the point is in the cell, and
+            the larger the deeper inside
+        bc : numpy.array
+        """
+        if self.meshtype in {'tri', 'tet'}:
+            bc = np.einsum('ijk, ik->ij', self.Dlambda[cellidx],
+                    points - self.v0[cellidx])
+            bc[:, 0] += 1
+            return bc.min(axis=1), bc
+        elif self.meshtype == 'quad':
+            xi, isConverged = self.quad_coordinates(points, cellidx)
+            score = np.minimum(xi, 1 - xi).min(axis=1)
+            score[~isConverged] = -np.inf
+            x, y = xi[:, 0], xi[:, 1]
+            bc = np.array([(1-x)*(1-y), x*(1-y), x*y, (1-x)*y]).T
+            return score, bc
+        else:
+            return self.polygon_score(points, cellidx), points
+
+    def quad_coordinates(self, points, cellidx, maxit=20):
+        """ Invert the bilinear map of the quadrangles by Newton iterations
+
+        Returns
+        -------
+        xi : numpy.array
+            the reference coordinates in `[0, 1]^2`
+        isConverged : numpy.array
+            Newton may not converge for the points far from the cells
+        """
+        v = self.cellnode[cellidx]
+        a = v[:, 1] - v[:, 0]
+        b = v[:, 3] - v[:, 0]
+        c = v[:, 0] - v[:, 1] + v[:, 2] - v[:, 3]
+        d = points - v[:, 0]
+        xi = np.full(points.shape, 0.5)
+        for it in range(maxit):
+            x = xi[:, [0]]
+            y = xi[:, [1]]
+            F = x*a + y*b + x*y*c - d
+            J0 = a + y*c
+            J1 = b + x*c
+            det = J0[:, 0]*J1[:, 1] - J0[:, 1]*J1[:, 0]
+            dx = (F[:, 0]*J1[:, 1] - F[:, 1]*J1[:, 0])/det
+            dy = (J0[:, 0]*F[:, 1] - J0[:, 1]*F[:, 0])/det
+            xi[:, 0] -= dx
+            xi[:, 1] -= dy
+            if np.all(np.abs(dx) + np.abs(dy) < 1e-14):
+                break
+        x = xi[:, [0]]
+        y = xi[:, [1]]
+        F = x*a + y*b + x*y*c - d
+        h = np.sum(np.abs(a) + np.abs(b), axis=1)
+        isConverged = np.sum(np.abs(F), axis=1) <= 1e-10*h
+        return xi, isConverged
+
+    def polygon_score(self, points, cellidx):
+        """ The crossing number test of the points in the polygons, the
+        score of the outside points is minus their scaled distance to the
+        polygon boundary
+        """
+        cell = self.cell
+        location = self.cellLocation
+        node = self.mesh.entity('node')
+        NV = np.diff(location)[cellidx]
+        pidx, k = expand(NV)
+        start = location[cellidx[pidx]]
+        p0 = node[cell[start + k]]
+        p1 = node[cell[start + (k + 1)%NV[pidx]]]
+        p = points[pidx]
+
+        isCross = (p0[:, 1] > p[:, 1]) != (p1[:, 1] > p[:, 1])
+        e = p1 - p0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = p0[:, 0] + (p[:, 1] - p0[:, 1])*e[:, 0]/e[:, 1]
+        isCross &= (p[:, 0] < x)
+        isIn = np.bincount(pidx, weights=isCross, minlength=len(cellidx))%2 == 1
+
+        # the distance to the edges
+        t = np.clip(np.sum((p - p0)*e, axis=1)/np.sum(e**2, axis=1), 0, 1)
+        dist = np.sqrt(np.sum((p0 + t[:, None]*e - p)**2, axis=1))
+        dmin = np.minimum.reduceat(dist, np.cumsum(NV) - NV)
+        return np.where(isIn, 1.0, -dmin/self.h[cellidx])
+
+    def walk(self, points, cellidx, maxit=100):
+        """ Walk from the cells `cellidx` to the cells containing `points`
+
+        In every step a point not in its cell moves to the neighbor across
+        the face with the most negative local coordinate.
+
+        Returns
+        -------
+        cellidx : numpy.array
+            the cells containing the points, -1 if a point leaves the mesh
+            or is not reached in `maxit` steps
+        bc : numpy.array
+        """
+        if self.meshtype == 'polygon':
+            raise ValueError("We don't support the walk on polygon meshes!")
+        points = np.asarray(points)
+        N = points.shape[0]
+        cell2cell = self.mesh.ds.cell_to_cell()
+        c = np.array(cellidx, dtype=np.int_)
+        found = np.full(N, -1, dtype=np.int_)
+        bc = np.zeros((N, cell2cell.shape[1]), dtype=points.dtype)
+        active = np.arange(N)
+        for it in range(maxit):
+            if len(active) == 0:
+                break
+            score, lbc = self.local_coordinates(points[active], c[active])
+            isIn = score >= -self.eps
+            found[active[isIn]] = c[active[isIn]]
+            bc[active[isIn]] = lbc[isIn]
+
+            active = active[~isIn]
+            lbc = lbc[~isIn]
+            if self.meshtype == 'quad':
+                # the edges 0, 1, 2, 3 are on y = 0, x = 1, y = 1, x = 0
+                x, _ = self.quad_coordinates(points[active], c[active])
+                lbc = np.array([x[:, 1], 1 - x[:, 0], 1 - x[:, 1], x[:, 0]]).T
+            nxt = cell2cell[c[active], np.argmin(lbc, axis=1)]
+            # 边界上的邻居是单元自身, 点在网格外
+            isOut = nxt == c[active]
+            active = active[~isOut]
+            c[active] = nxt[~isOut]
+        return found, bc
+
+    def search(self, points, extrapolate=False):
+        """ Find the cells containing `points` among the cells of their bins
+        """
+        N, GD = points.shape
+        b = np.zeros(N, dtype=np.int_)
+        stride = 1
+        idx = self.bin_index(points)
+        for d in range(GD):
+            b += idx[:, d]*stride
+            stride *= self.nbin[d]
+        isInBox = np.all((points >= self.lo - self.eps*self.binsize) &
+                (points <= self.lo + (self.nbin + self.eps)*self.binsize), axis=1)
+        count = self.binptr[b+1] - self.binptr[b]
+        if not extrapolate:
+            count[~isInBox] = 0
+
+        pidx, k = expand(count)
+        cand = self.bincell[self.binptr[b[pidx]] + k]
+        score, lbc = self.local_coordinates(points[pidx], cand)
+
+        # the candidate with the largest score of every point, the pairs of
+        # a point are contiguous
+        isNonEmpty = count > 0
+        smax = np.full(N, -np.inf)
+        if len(pidx) > 0:
+            smax[isNonEmpty] = np.maximum.reduceat(score, (np.cumsum(count) - count)[isNonEmpty])
+        best, = np.nonzero(score == smax[pidx])
+        isFirst = np.ones(len(best), dtype=np.bool_)
+        isFirst[1:] = pidx[best[1:]] != pidx[best[:-1]]
+        best = best[isFirst]
+        if not extrapolate:
+            best = best[score[best] >= -self.eps]
+
+        cellidx = np.full(N, -1, dtype=np.int_)
+        cellidx[pidx[best]] = cand[best]
+        bc = np.zeros((N, lbc.shape[1]), dtype=points.dtype)
+        bc[pidx[best]] = lbc[best]
+        return cellidx, bc
+
+    def locate(self, points, start=None, extrapolate=False):
+        """ Locate the points
+
+        Parameters
+        ----------
+        points : numpy.array
+            the points with shape `(N, GD)`
+        start : numpy.array
+            the guess of the cells containing the points, the points walk
+            from these cells first
+        extrapolate : bool
+            if it is True, a point outside the mesh is given the nearest
+            candidate cell of its (clipped) bin and the local coordinates
+            extrapolated to it, e.g. for the points just outside a curved
+            boundary
+
+        Returns
+        -------
+        cellidx : numpy.array
+            the cells containing the points, -1 for the points outside the
+            mesh
+        bc : numpy.array
+            the local coordinates of the points in their cells
+        """
+        points = np.asarray(points, dtype=self.mesh.ftype).reshape(-1, self.GD)
+        N = points.shape[0]
+        if start is not None:
+            cellidx, bc = self.walk(points, start)
+            rest, = np.nonzero(cellidx < 0)
+        else:
+            cellidx = np.full(N, -1, dtype=np.int_)
+            bc = None
+            rest = np.arange(N)
+
+        for i in range(0, len(rest), self.batchsize):
+            idx = rest[i:i+self.batchsize]
+            c, b = self.search(points[idx], extrapolate=extrapolate)
+            if bc is None:
+                bc = np.zeros((N, b.shape[1]), dtype=points.dtype)
+            cellidx[idx] = c
+            bc[idx] = b
+        if bc is None:
+            bc = np.zeros((N, self.GD), dtype=points.dtype)
+        return cellidx, bc
+
+
+def locator_key(mesh):
+    """ The nodes and the cells a locator is built for, the locator is
+    rebuilt when they are replaced (e.g. by a refinement) or moved (see
+    `node_moved`)
+    """
+    node = mesh.entity('node')
+    cell = mesh.ds.cell
+    return (id(node), node.shape, id(cell), cell.shape,
+            getattr(mesh, 'nodeversion', None))
+
+
+def point_locator(mesh):
+    """ The `PointLocator` of `mesh`, built at the first call and kept on the
+    mesh
+    """
+    locator = getattr(mesh, 'pointlocator', None)
+    if (locator is None) or (locator.key != locator_key(mesh)):
+        locator = PointLocator(mesh)
+        mesh.pointlocator = locator
+    return locator
@@ -0,0 +1,103 @@
+import copy
+import inspect
+import functools
+import itertools
+import numpy as np
+from scipy.sparse import issparse
+
+
+class RelationCache():
+    """ The cache of the topology relations of a mesh data structure
+
+    Every relation is built at most once for a topology version. The
+    version is increased, and all the relations are dropped, whenever the
+    data structure is (re)constructed. The versions are unique over all the
+    caches, so a new data structure never repeats the version of an old one.
+    """
+    versions = itertools.count(1)
+
+    def __init__(self):
+        self.version = next(self.versions)
+        self.data = {}
+        self.hit = {}
+        self.miss = {}
+
+    def clear(self):
+        self.data.clear()
+        self.version = next(self.versions)
+
+    def get(self, name, key, build):
+        if key in self.data:
+            self.hit[name] = self.hit.get(name, 0) + 1
+            return share(self.data[key])
+        self.miss[name] = self.miss.get(name, 0) + 1
+        val = readonly(build())
+        self.data[key] = val
+        return share(val)
+
+    def info(self):
+        """ Return `{name: (hit, miss)}` of every relation
+        """
+        names = set(self.hit) | set(self.miss)
+        return {name: (self.hit.get(name, 0), self.miss.get(name, 0))
+                for name in names}
+
+
+def readonly(val):
+    """ The cached arrays are shared by all the callers, so hand out
+    read-only views of them. A sparse matrix becomes a shallow copy over
+    read-only views of its arrays, and a sparse format without index arrays
+    (e.g. `lil`, `dok`) a deep copy.
+    """
+    if isinstance(val, np.ndarray):
+        val = val.view()
+        val.flags.writeable = False
+    elif issparse(val):
+        if val.format in ('csr', 'csc', 'bsr', 'coo', 'dia'):
+            val = copy.copy(val)
+            for name in ['data', 'indices', 'indptr', 'row', 'col',
+                    'offsets']:
+                a = val.__dict__.get(name)
+                if isinstance(a, np.ndarray):
+                    setattr(val, name, readonly(a))
+        else:
+            val = val.copy()
+    elif isinstance(val, tuple):
+        val = tuple(readonly(v) for v in val)
+    return val
+
+
+def share(val):
+    """ A cached value as it is handed out: the read-only arrays are
+    shared, and every caller gets its own sparse matrix, so replacing an
+    array of it (e.g. `A.data = ...`) does not change the cache.
+    """
+    if issparse(val):
+        return readonly(val)
+    elif isinstance(val, tuple):
+        return tuple(share(v) for v in val)
+    return val
+
+
+def cached_relation(method):
+    """ Memoize a topology relation method of a mesh data structure in its
+    `relationcache`, the key is the method name and all its arguments with
+    the defaults filled in.
+    """
+    signature = inspect.signature(method)
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = getattr(self, 'relationcache', None)
+        if cache is None:
+            return method(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = (name, ) + tuple(bound.arguments.items())[1:]
+        try:
+            hash(key)
+        except TypeError:
+            return method(self, *args, **kwargs)
+        return cache.get(name, key, lambda: method(self, *args, **kwargs))
+    return wrapper
@@ -107,3 +107,52 @@ class CSRMatrixCommToplogy(CommToplogy):
     def get_local_idx(self):
         rank = self.comm.Get_rank()
         return np.arange(self.location[rank], self.location[rank+1], dtype='i')
+
+class MeshCommToplogy(CommToplogy):
+    """MeshCommToplogy
+
+    Note
+    ----
+    网格上分布式自由度的通信拓扑数据结构。每个进程的局部自由度编号中, 自己拥有的
+    自由度在前, 幽灵自由度在后, 幽灵自由度的值从拥有它的进程接收。
+
+    `sds[r]` 是要发送给进程 `r` 的自己拥有的自由度的局部编号, `rds[r]` 是要从进
+    程 `r` 接收的幽灵自由度的局部编号, 两者的顺序都按全局编号排列, 所以发送和接
+    收的数据是一一对应的。
+    """
+    def __init__(self, comm, gidx, owner, NO):
+        """__init__
+
+        :param comm: 通信子
+        :param gidx: 局部自由度的全局编号, 前 `NO` 个是自己拥有的, 按全局编号排序
+        :param owner: 局部自由度所在的进程编号
+        :param NO: 自己拥有的自由度个数
+        """
+        super(MeshCommToplogy, self).__init__(comm)
+        self.create_comm_toplogy(gidx, owner, NO)
+
+    def create_comm_toplogy(self, gidx, owner, NO):
+        comm = self.comm
+        size = comm.Get_size()
+
+        ghost = NO + np.argsort(gidx[NO:], kind='mergesort')
+        gowner = owner[ghost]
+
+        # 向拥有者发送需要接收的自由度的全局编号
+        request = [np.zeros(0, dtype=gidx.dtype) for r in range(size)]
+        for r in np.unique(gowner):
+            self.rds[int(r)] = ghost[gowner == r]
+            request[r] = gidx[self.rds[int(r)]]
+        request = comm.alltoall(request)
+
+        # 其它进程需要的自己拥有的自由度
+        for r, idx in enumerate(request):
+            if len(idx) > 0:
+                self.sds[r] = np.searchsorted(gidx[:NO], idx)
+
+        self.neighbor = set(self.sds) | set(self.rds)
+        for r in self.neighbor:
+            if r not in self.sds:
+                self.sds[r] = np.zeros(0, dtype=np.int_)
+            if r not in self.rds:
+                self.rds[r] = np.zeros(0, dtype=np.int_)
@@ -1,5 +1,90 @@
 import numpy as np
 
+try:
+    from mpi4py import MPI
+except ImportError:
+    MPI = None
+
+
+class HaloExchange():
+    """
+    幽灵数据交换引擎
+
+    The send and receive buffers of every neighbor are allocated once and
+    bound to MPI persistent requests (`Send_init`/`Recv_init`). An exchange
+    packs the send buffers, starts all the requests at once by `Startall`
+    and later completes them by `Waitall`, so all the messages are in flight
+    at the same time and nothing is allocated per exchange.
+
+    The exchange is split into `begin` and `end`: the computations which do
+    not need the ghost values can be done in between, while the messages
+    are on the way.
+    """
+    def __init__(self, commtop, dtype=np.float64, shape=()):
+        """
+
+        Parameters
+        ----------
+        commtop : CommToplogy
+            `sds[r]` and `rds[r]` are the local indices to send to and to
+            receive from the neighbor `r`
+        dtype : numpy.dtype
+            the type of the exchanged arrays
+        shape : tuple
+            the trailing shape of the exchanged arrays, e.g. `(GD, )` for
+            vector valued data
+        """
+        self.commtop = commtop
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+
+        comm = commtop.comm
+        rank = comm.Get_rank()
+        self.neighbor = sorted(commtop.neighbor)
+        self.sds = [commtop.sds[r] for r in self.neighbor]
+        self.rds = [commtop.rds[r] for r in self.neighbor]
+        self.sbuf = [np.empty((len(i), ) + self.shape, dtype=self.dtype) for i in self.sds]
+        self.rbuf = [np.empty((len(i), ) + self.shape, dtype=self.dtype) for i in self.rds]
+
+        self.requests = []
+        for r, buf in zip(self.neighbor, self.rbuf):
+            self.requests.append(comm.Recv_init(buf, source=r, tag=r))
+        for r, buf in zip(self.neighbor, self.sbuf):
+            self.requests.append(comm.Send_init(buf, dest=r, tag=rank))
+        self.active = False
+
+    def begin(self, array):
+        """ Pack the owned data of `array` and start all the messages
+        """
+        if self.active:
+            raise ValueError("The last exchange is not finished!")
+        for idx, buf in zip(self.sds, self.sbuf):
+            # faster than `np.take(..., out=buf)`, which buffers the output
+            buf[:] = array[idx]
+        if len(self.requests) > 0:
+            MPI.Prequest.Startall(self.requests)
+        self.active = True
+
+    def end(self, array):
+        """ Wait for all the messages and unpack the ghost data into `array`
+        """
+        if len(self.requests) > 0:
+            MPI.Request.Waitall(self.requests)
+        self.active = False
+        for idx, buf in zip(self.rds, self.rbuf):
+            array[idx] = buf
+        return array
+
+    def exchange(self, array):
+        self.begin(array)
+        return self.end(array)
+
+    def free(self):
+        for req in self.requests:
+            req.Free()
+        self.requests = []
+
+
 class NumCompComponent():
     """
     并行计算构件， 负责局部计算和通信
@@ -17,21 +102,29 @@ class NumCompComponent():
 
         Note
         ----
+        每一种数组类型和形状在第一次通信时建立一个 `HaloExchange`, 以后重复使用
+        它的缓存和持久通信请求。
         """
         self.commtop = commtop
+        self.engines = {}
+
+    def engine(self, array):
+        key = (array.dtype.str, array.shape[1:])
+        if key not in self.engines:
+            self.engines[key] = HaloExchange(
+                    self.commtop, dtype=array.dtype, shape=array.shape[1:])
+        return self.engines[key]
 
+    def begin(self, array):
+        self.engine(array).begin(array)
+
+    def end(self, array):
+        return self.engine(array).end(array)
 
     def communicating(self, array):
-        ct = self.commtop
-        comm = ct.comm
-        rank = comm.Get_rank()
-        for r in ct.neighbor: 
-            data = array[ct.sds[r]]
-            print("rank: ", rank, "data: ", len(ct.sds[r]), len(ct.rds[r]), "r: ", r)
-            comm.Isend(data, dest=r, tag=rank) 
-
-        for r in ct.neighbor:  
-            data = np.zeros(len(ct.rds[r]), dtype=array.dtype)
-            req = comm.Irecv(data, source=r, tag=r)
-            req.Wait()
-            array[ct.rds[r]] = data
+        return self.engine(array).exchange(array)
+
+    def free(self):
+        for e in self.engines.values():
+            e.free()
+        self.engines = {}
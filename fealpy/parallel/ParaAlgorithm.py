@@ -1,9 +1,118 @@
 import numpy as np
+from timeit import default_timer as timer
 
+from .NumCompComponent import NumCompComponent
+from ..solver.amg import AMGSolver
+
+
+class ParaCSRMatrix():
+    """
+    按行分布的稀疏矩阵
+
+    The process stores its owned rows `A` with shape `(NO, NO + NG)`, the
+    columns are the owned dofs followed by the ghost dofs of `commtop`. The
+    product with a distributed vector starts the exchange of the ghost
+    entries, multiplies the owned block while the messages are on the way,
+    and adds the product of the ghost block at the end.
+    """
+    def __init__(self, A, commtop):
+        self.A = A
+        self.commtop = commtop
+        self.component = NumCompComponent(commtop)
+        self.NO = A.shape[0]
+        self.Ao = A[:, :self.NO] # 内部块
+        self.Ag = A[:, self.NO:] # 幽灵块
+        self.x = np.zeros(A.shape[1], dtype=A.dtype)
+        self.commtime = 0.0
+
+    def __matmul__(self, x):
+        return self.matvec(x)
+
+    def matvec(self, x):
+        NO = self.NO
+        self.x[:NO] = x
+        self.component.begin(self.x)
+        y = self.Ao@x
+        start = timer()
+        self.component.end(self.x)
+        self.commtime += timer() - start
+        y += self.Ag@self.x[NO:]
+        return y
+
+    def diagonal(self):
+        return self.A.diagonal()
+
+    def jacobi(self):
+        """ The Jacobi preconditioner
+        """
+        d = 1/self.diagonal()
+        return lambda r: d*r
+
+    def block_amg(self, **kwargs):
+        """ The block Jacobi preconditioner with one V-cycle of `AMGSolver`
+        on the owned diagonal block of every process
+        """
+        amg = AMGSolver(**kwargs).setup(self.Ao)
+        return lambda r: amg.vcycle(r)
 
 
 class ParaAlgorithm():
     """
+    并行 Krylov 子空间算法, 向量只存储当前进程拥有的部分
     """
-    def __init__(self):
-        pass
+    def __init__(self, comm):
+        self.comm = comm
+
+    def dot(self, x, y):
+        return self.comm.allreduce(np.dot(x, y))
+
+    def norm(self, x):
+        return np.sqrt(self.dot(x, x))
+
+    def cg(self, A, b, x0=None, M=None, tol=1e-8, maxit=1000, residuals=None):
+        """ The preconditioned conjugate gradient method
+
+        Parameters
+        ----------
+        A : ParaCSRMatrix
+        b : numpy.array
+            the owned entries of the right-hand side
+        M : function
+            the preconditioner, `M(r)` returns the owned entries of the
+            preconditioned residual, e.g. `A.jacobi()` or `A.block_amg()`
+        tol : float
+            the tolerance of the relative residual
+
+        Returns
+        -------
+        x : numpy.array
+        niter : int
+            the number of iterations
+        """
+        x = np.zeros_like(b) if x0 is None else x0.copy()
+        r = b - A@x
+        normb = self.norm(b)
+        normb = 1.0 if normb == 0 else normb
+        z = r if M is None else M(r)
+        p = z.copy()
+        rr, rz = self.comm.allreduce(np.array([np.dot(r, r), np.dot(r, z)]))
+        normr = np.sqrt(rr)
+        if residuals is not None:
+            residuals.append(normr)
+        for k in range(maxit):
+            if normr < tol*normb:
+                return x, k
+            Ap = A@p
+            alpha = rz/self.dot(p, Ap)
+            x += alpha*p
+            r -= alpha*Ap
+            z = r if M is None else M(r)
+            rz0 = rz
+            # 两个内积只做一次全局归约
+            rr, rz = self.comm.allreduce(np.array([np.dot(r, r), np.dot(r, z)]))
+            normr = np.sqrt(rr)
+            if residuals is not None:
+                residuals.append(normr)
+            p *= rz/rz0
+            p += z
+        return x, maxit
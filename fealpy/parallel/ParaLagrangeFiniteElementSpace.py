@@ -0,0 +1,214 @@
+import numpy as np
+from scipy.sparse import spdiags
+
+from ..functionspace import LagrangeFiniteElementSpace
+from .CommToplogy import MeshCommToplogy
+from .ParaAlgorithm import ParaCSRMatrix
+
+
+class ParaLagrangeFiniteElementSpace():
+    """
+    分布式的 Lagrange 有限元空间
+
+    A dof is owned by the process with the smallest number among the cells
+    containing it. On every process the space of the local submesh of a
+    `ParaMesh` assembles the complete rows of the owned dofs; the columns
+    of these rows are the owned dofs and the ghost dofs, which are numbered
+    after the owned ones:
+
+        local index : [0, NO) owned, [NO, NO + NG) ghost
+
+    The global dofs are numbered process by process, the owned dofs of the
+    process `r` are `[offset_r, offset_r + NO_r)`. The setup only works on
+    the local submesh: a dof is identified across the processes by its key,
+    the global numbers of the vertices of its entity repeated by its
+    multi-index, and only the keys of the ghost dofs are exchanged. So the
+    global numbering is not the one of the Lagrange space of the global
+    mesh.
+
+    A distributed vector only stores its owned entries, the ghost entries
+    are exchanged by `commtop` when they are needed (see `ParaCSRMatrix`).
+    """
+    def __init__(self, pmesh, p=1, q=None):
+        """
+
+        Parameters
+        ----------
+        pmesh : ParaMesh
+        p : int
+            the degree of the space
+        """
+        self.pmesh = pmesh
+        self.comm = pmesh.comm
+        self.p = p
+        comm = self.comm
+        rank = comm.Get_rank()
+        size = comm.Get_size()
+
+        self.space = LagrangeFiniteElementSpace(pmesh.mesh, p, q=q)
+        cell2dof = self.space.cell_to_dof()
+        ldof = self.space.number_of_global_dofs()
+        key = self.dof_key()
+
+        # 自己单元上的自由度, 包含它们的单元都在局部网格中, 所以拥有者和边界
+        # 标记可以在局部确定
+        part = pmesh.part[pmesh.cellidx]
+        owner = np.full(ldof, size, dtype=np.int_)
+        np.minimum.at(owner, cell2dof, part.reshape(-1, 1))
+        isBdDof = self.space.boundary_dof()
+
+        # 自己拥有的自由度按关键字排序, 并按进程依次编号
+        own, = np.nonzero(owner == rank)
+        own = own[np.argsort(key[own], kind='mergesort')]
+        self.NO = len(own)
+        offset = comm.exscan(self.NO)
+        offset = 0 if offset is None else offset
+        self.gdof = comm.allreduce(self.NO)
+
+        # 与自己拥有的自由度相邻的幽灵自由度
+        isNeeded = np.zeros(ldof, dtype=np.bool_)
+        isNeeded[cell2dof[np.any(owner[cell2dof] == rank, axis=1)]] = True
+        isNeeded[own] = False
+        ghost, = np.nonzero(isNeeded)
+
+        # 幽灵自由度在局部的拥有者 `owner[ghost]` 的单元中, 它知道真正的拥有
+        # 者; 然后从真正的拥有者那里得到全局编号
+        isInOwnedCell = np.zeros(ldof, dtype=np.bool_)
+        isInOwnedCell[cell2dof[:pmesh.NOC]] = True
+        known, = np.nonzero(isInOwnedCell)
+        gowner = self.exchange(key, ghost, owner[ghost],
+                key[known], owner[known])
+        ggidx = self.exchange(key, ghost, gowner,
+                key[own], offset + np.arange(self.NO))
+        gbd = self.exchange(key, ghost, gowner,
+                key[own], isBdDof[own])
+
+        order = np.argsort(ggidx, kind='mergesort')
+        ghost = ghost[order]
+        self.NG = len(ghost)
+        self.dofidx = np.r_[own, ghost] # 在局部空间中的编号
+        self.gidx = np.r_[offset + np.arange(self.NO), ggidx[order]] # 全局编号
+        self.isBdDof = np.r_[isBdDof[own], gbd[order].astype(np.bool_)]
+        owner = np.r_[np.full(self.NO, rank, dtype=np.int_), gowner[order]]
+
+        self.commtop = MeshCommToplogy(self.comm, self.gidx, owner, self.NO)
+
+    def dof_key(self):
+        """ The key of every dof of the local space, which is the same on all
+        the processes
+
+        The dof with the multi-index `m` in a cell is identified by the
+        global numbers of the vertices of the cell, the `i`-th one repeated
+        `m[i]` times and sorted. The keys are packed into a void dtype, so
+        they can be sorted and searched.
+        """
+        p = self.p
+        pmesh = self.pmesh
+        cell = pmesh.mesh.entity('cell')
+        cell2dof = self.space.cell_to_dof()
+        multiIndex = self.space.dof.multiIndex
+        ldof = self.space.number_of_global_dofs()
+
+        gcell = pmesh.nodeidx[cell].astype(np.int64)
+        k = np.zeros((ldof, p), dtype=np.int64)
+        for i, m in enumerate(multiIndex):
+            k[cell2dof[:, i]] = np.sort(np.repeat(gcell, m, axis=1), axis=1)
+        return np.ascontiguousarray(k).view(np.dtype((np.void, 8*p))).reshape(-1)
+
+    def exchange(self, key, idx, dest, okey, oval):
+        """ Ask the process `dest[i]` for the value of the dof `idx[i]`
+
+        Every process answers with `oval[j]` of its dof with the key
+        `okey[j]`, the keys of all the asked dofs must be in `okey`.
+        """
+        comm = self.comm
+        size = comm.Get_size()
+        request = [key[idx[dest == r]] for r in range(size)]
+        request = comm.alltoall(request)
+
+        order = np.argsort(okey, kind='mergesort')
+        okey = okey[order]
+        oval = oval[order]
+        answer = [oval[np.searchsorted(okey, k)] for k in request]
+        answer = comm.alltoall(answer)
+
+        val = np.zeros(len(idx), dtype=oval.dtype)
+        for r in range(size):
+            val[dest == r] = answer[r]
+        return val
+
+    def __str__(self):
+        return "Distributed Lagrange finite element space!"
+
+    def number_of_global_dofs(self):
+        return self.gdof
+
+    def number_of_owned_dofs(self):
+        return self.NO
+
+    def number_of_ghost_dofs(self):
+        return self.NG
+
+    def interpolation_points(self):
+        """ The interpolation points of the owned and the ghost dofs
+        """
+        return self.space.interpolation_points()[self.dofidx]
+
+    def interpolation(self, u):
+        """ The owned values of the interpolation of `u`
+        """
+        return u(self.interpolation_points()[:self.NO])
+
+    def assemble(self, A):
+        """ Take the owned rows of the matrix `A` of the local space and
+        renumber its columns
+        """
+        A = A.tocsr()[self.dofidx[:self.NO]]
+        return A[:, self.dofidx]
+
+    def stiff_matrix(self, cfun=None):
+        """ The owned rows of the stiffness matrix
+
+        Returns
+        -------
+        A : scipy.sparse.csr_matrix
+            the matrix with shape `(NO, NO + NG)`
+        """
+        return self.assemble(self.space.stiff_matrix(cfun=cfun))
+
+    def mass_matrix(self, cfun=None, barycenter=False):
+        return self.assemble(self.space.mass_matrix(cfun=cfun, barycenter=barycenter))
+
+    def source_vector(self, f):
+        """ The owned entries of the load vector
+        """
+        return self.space.source_vector(f)[self.dofidx[:self.NO]]
+
+    def set_dirichlet_bc(self, A, b, g):
+        """ Apply the Dirichlet condition `g` on the owned rows
+
+        The columns of the boundary dofs are eliminated as well, so the
+        global matrix stays symmetric. The ghost boundary values are
+        evaluated locally, no communication is needed.
+
+        Returns
+        -------
+        A : ParaCSRMatrix
+        b : numpy.array
+        x : numpy.array
+            the initial guess with the owned boundary values
+        """
+        NO = self.NO
+        isBdDof = self.isBdDof
+        ipoints = self.interpolation_points()
+
+        x = np.zeros(NO + self.NG, dtype=np.float)
+        x[isBdDof] = g(ipoints[isBdDof])
+        b = b - A@x
+        b[isBdDof[:NO]] = x[:NO][isBdDof[:NO]]
+
+        N = NO + self.NG
+        T = spdiags(1 - isBdDof, 0, N, N)
+        D = spdiags(isBdDof, 0, NO, N)
+        A = T.tocsr()[:NO, :NO]@A@T + D
+        return ParaCSRMatrix(A.tocsr(), self.commtop), b, x[:NO]
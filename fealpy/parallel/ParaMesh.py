@@ -0,0 +1,136 @@
+import numpy as np
+
+try:
+    from ..graph import metis
+except (ImportError, RuntimeError):
+    # the METIS dll can not be found
+    metis = None
+
+
+def rcb_partition(point, nparts):
+    """ Recursive coordinate bisection of the points
+
+    The points are split along the longest side of their bounding box, the
+    sizes of the two halves are proportional to the number of the parts on
+    each side, so any `nparts` is supported.
+
+    Returns
+    -------
+    part : numpy.array
+        the part number of every point
+    """
+    N = point.shape[0]
+    part = np.zeros(N, dtype=np.int_)
+    stack = [(np.arange(N), 0, nparts)]
+    while len(stack) > 0:
+        idx, start, n = stack.pop()
+        if n == 1:
+            part[idx] = start
+            continue
+        p = point[idx]
+        axis = np.argmax(p.max(axis=0) - p.min(axis=0))
+        n0 = n//2
+        m = len(idx)*n0//n
+        order = np.argsort(p[:, axis], kind='mergesort')
+        stack.append((idx[order[:m]], start, n0))
+        stack.append((idx[order[m:]], start + n0, n - n0))
+    return part
+
+
+def partition_mesh(mesh, nparts, method='metis'):
+    """ Partition the cells of `mesh` into `nparts` parts
+
+    Parameters
+    ----------
+    method : 'metis' or 'rcb'
+        'metis' uses `fealpy.graph.metis.part_mesh` on the cell graph, if the
+        METIS library can not be loaded it falls back to 'rcb', the
+        recursive coordinate bisection of the cell barycenters
+
+    Returns
+    -------
+    part : numpy.array
+        the part number of every cell
+    """
+    if nparts == 1:
+        return np.zeros(mesh.number_of_cells(), dtype=np.int_)
+    if (method == 'metis') and (metis is not None):
+        edgecuts, part = metis.part_mesh(mesh, nparts=nparts, entity='cell')
+        return np.array(part, dtype=np.int_)
+    elif method in {'metis', 'rcb'}:
+        return rcb_partition(mesh.entity_barycenter('cell'), nparts)
+    else:
+        raise ValueError("We don't support partition method `{}`! ".format(method))
+
+
+class ParaMesh():
+    """
+    分布式网格, 每个进程拥有一部分单元和一层幽灵(ghost)单元
+
+    The global mesh is known by every process (it is generated or read in
+    the same way on all the processes), the cells are partitioned on the
+    process 0 and the partition is broadcast. Each process then builds its
+    local submesh from its owned cells and the ghost cells, the cells of the
+    other processes which share a node with an owned cell. The owned cells
+    come first in the local submesh.
+
+    With one layer of ghost cells every cell containing a dof of an owned
+    cell is local, so the rows of these dofs are assembled completely on the
+    local submesh without any communication.
+    """
+    def __init__(self, comm, mesh, part=None, method='metis'):
+        """
+
+        Parameters
+        ----------
+        comm : mpi4py.MPI.Comm
+        mesh : mesh object
+            the global mesh, a `TriangleMesh` or a `TetrahedronMesh`
+        part : numpy.array
+            the part number of every cell, default is computed by
+            `partition_mesh(mesh, comm.Get_size(), method)`
+        """
+        self.comm = comm
+        rank = comm.Get_rank()
+        size = comm.Get_size()
+        if part is None:
+            if rank == 0:
+                part = partition_mesh(mesh, size, method=method)
+            part = comm.bcast(part, root=0)
+
+        self.gmesh = mesh
+        self.part = part
+
+        NN = mesh.number_of_nodes()
+        cell = mesh.entity('cell')
+
+        isOwnedCell = (part == rank)
+        isLocalNode = np.zeros(NN, dtype=np.bool_)
+        isLocalNode[cell[isOwnedCell]] = True
+        isGhostCell = ~isOwnedCell & np.any(isLocalNode[cell], axis=1)
+
+        # 局部单元的全局编号, 自己的单元在前, 幽灵单元在后
+        ocell, = np.nonzero(isOwnedCell)
+        gcell, = np.nonzero(isGhostCell)
+        self.cellidx = np.r_[ocell, gcell]
+        self.NOC = len(ocell)
+
+        # 局部节点的全局编号
+        lcell = cell[self.cellidx]
+        self.nodeidx = np.unique(lcell)
+        g2l = np.zeros(NN, dtype=mesh.itype)
+        g2l[self.nodeidx] = np.arange(len(self.nodeidx))
+
+        node = mesh.entity('node')
+        self.mesh = type(mesh)(node[self.nodeidx], g2l[lcell])
+
+    def number_of_owned_cells(self):
+        return self.NOC
+
+    def owned_cell_flag(self):
+        isOwnedCell = np.zeros(len(self.cellidx), dtype=np.bool_)
+        isOwnedCell[:self.NOC] = True
+        return isOwnedCell
+
+    def number_of_global_cells(self):
+        return self.gmesh.number_of_cells()
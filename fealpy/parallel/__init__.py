@@ -2,4 +2,9 @@
 from .CommToplogy import CommToplogy
 from .CommToplogy import CSRMatrixCommToplogy
 
-from .NumCompComponent import NumCompComponent
+from .NumCompComponent import NumCompComponent, HaloExchange
+from .CommToplogy import MeshCommToplogy
+
+from .ParaMesh import ParaMesh, partition_mesh
+from .ParaAlgorithm import ParaCSRMatrix, ParaAlgorithm
+from .ParaLagrangeFiniteElementSpace import ParaLagrangeFiniteElementSpace
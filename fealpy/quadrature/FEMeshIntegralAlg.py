@@ -5,10 +5,15 @@ class FEMeshIntegralAlg():
     def __init__(self, integrator, mesh, measure=None):
         self.mesh = mesh
         self.integrator = integrator
-        if measure is None:
-            self.measure = mesh.entity_measure()
-        else:
-            self.measure = measure
+        self._measure = measure
+
+    @property
+    def measure(self):
+        """ The given measure of the cells, or the current one of the mesh
+        """
+        if self._measure is None:
+            return self.mesh.entity_measure()
+        return self._measure
 
     def integral(self, u, celltype=False):
         qf = self.integrator
@@ -1,5 +1,5 @@
 import numpy as np
-from scipy.sparse import csr_matrix
+from scipy.sparse import csr_matrix, spdiags
 from fealpy.quadrature import TriangleQuadrature
 
 def scaleCoor(realp):
@@ -14,6 +14,78 @@ def scaleCoor(realp):
     return refp, center, h
 
 
+def group_patch(patch):
+    """ Group the patches of the same size
+
+    Parameters
+    ----------
+    patch : scipy.sparse.csr_matrix
+        the `i`-th row gives the members of the patch of node `i`
+
+    Returns
+    -------
+    A generator of `(idx, member)`, where `idx` are the nodes whose patches
+    have `m` members, and `member` with shape `(len(idx), m)` are the sorted
+    members of these patches.
+    """
+    patch = patch.tocsr()
+    patch.sort_indices()
+    indptr = patch.indptr
+    size = np.diff(indptr)
+    for m in np.unique(size):
+        idx, = np.nonzero(size == m)
+        if m == 0:
+            continue
+        member = patch.indices[indptr[idx].reshape(-1, 1) + np.arange(m)]
+        yield idx, member
+
+
+def scale_patch(x):
+    """ The batched version of `scaleCoor`
+
+    Parameters
+    ----------
+    x : numpy.array
+        the points of the patches with shape `(NP, m, 2)`
+
+    Returns
+    -------
+    refx : numpy.array
+        the scaled points, `(x - center)/h`
+    center : numpy.array
+        the centers of the patches with shape `(NP, 2)`
+    h : numpy.array
+        the sizes of the patches with shape `(NP, )`
+    """
+    center = np.mean(x, axis=1)
+    diff = x - center[:, None, :]
+    h = np.max(np.sqrt(np.sum(diff**2, axis=-1)), axis=-1)
+    return diff/h[:, None, None], center, h
+
+
+def patch_fit(X, f):
+    """ Solve the local least squares problems of all the patches of one
+    size by the normal equations, in a batch
+
+    Parameters
+    ----------
+    X : numpy.array
+        the design matrices with shape `(NP, m, k)`
+    f : numpy.array
+        the data with shape `(NP, m)` or `(NP, m, d)`
+
+    Returns
+    -------
+    c : numpy.array
+        the coefficients with shape `(NP, k)` or `(NP, k, d)`
+    """
+    XT = X.swapaxes(-1, -2)
+    if f.ndim == 2:
+        return np.linalg.solve(XT@X, XT@f[..., None])[..., 0]
+    else:
+        return np.linalg.solve(XT@X, XT@f)
+
+
 class FEMFunctionRecoveryAlg():
     def __init__(self):
         pass
@@ -122,194 +194,187 @@ class FEMFunctionRecoveryAlg():
         return rguh
 
 
-    def SCR(self,uh):
+    def patch_matrix(self, mesh):
+        """ The node to cell and the node to node (with itself) relations of
+        the cells sharing a node, as sparse matrices
+        """
+        NC = mesh.number_of_cells()
+        NN = mesh.number_of_nodes()
+        cell = mesh.entity('cell')
+        NV = cell.shape[1]
+
+        row = np.arange(NC).repeat(NV)
+        col = cell.flatten()
+        data = np.ones(NC*NV, dtype=np.bool)
+        t2p = csr_matrix((data, (row, col)), shape=(NC, NN))
+        p2t = t2p.T.tocsr()
+        p2p = (p2t@t2p).tocsr()
+        return p2t, p2p
+
+    def SCR(self, uh):
+        """ The superconvergent cluster recovery
+
+        Notes
+        -----
+        A linear function is fitted to `uh` on the nodes of the patch of
+        every node. The patches are stored as a sparse matrix and grouped by
+        their sizes, and all the local least squares problems of the same
+        size are solved by one batched `np.linalg.solve`.
+        """
         space = uh.space
         mesh = space.mesh
         GD = mesh.geo_dimension()
         rguh = space.function(dim=GD)
-          
-        cell = mesh.ds.cell
-        node = mesh.node
-        
-        NC = mesh.number_of_cells()
-        NN = mesh.number_of_nodes()
-        
-        row = np.arange(NC).repeat(3)
-        col = cell.flatten()
-        data = np.ones(NC*3)
-        t2p = csr_matrix((data, (row, col)), shape=(NC,NN)).toarray()
-        p2t = t2p.T
-        p2p = p2t@t2p
-        
-        for i in range(NN):
-            np1, =np.nonzero(p2p[:,i]) 
-            temp0 = node[np1,:]
-            #调用scaleCoor()
-            tempx,_,h = scaleCoor(temp0)
-
-
-            tempp = uh[np1]
-            tempn = tempx.shape[0]
-            X = np.ones((tempn,3))
-            X[:,1:3] = tempx
-            
-            coefficient = np.linalg.solve(X.T@X,X.T@tempp)        
-                    
-            rguh[i,0] = coefficient[1]/h
-            rguh[i,1] = coefficient[2]/h
+
+        node = mesh.entity('node')
+        _, p2p = self.patch_matrix(mesh)
+
+        for idx, np1 in group_patch(p2p):
+            tempx, _, h = scale_patch(node[np1])
+            X = np.ones(np1.shape + (3, ), dtype=mesh.ftype)
+            X[..., 1:3] = tempx
+            c = patch_fit(X, uh[np1])
+            rguh[idx] = c[:, 1:3]/h[:, None]
         return rguh
 
     def ZZ(self, uh):
+        """ The Zienkiewicz-Zhu recovery
+
+        Notes
+        -----
+        A linear function is fitted to the gradient of `uh` at the
+        barycenters of the cells around every interior node, and is
+        evaluated at the node. The value at a boundary node is the average
+        of the fits of its interior neighbors, or the average of the
+        gradients on its cells if it has no interior neighbor.
+        """
         space = uh.space
         mesh = space.mesh
         GD = mesh.geo_dimension()
+        NN = mesh.number_of_nodes()
         rguh = space.function(dim=GD)
-       
-          
-
-        cell = mesh.ds.cell
-        node = mesh.node
 
-        NC = mesh.number_of_cells()
-        NN = mesh.number_of_nodes()
+        node = mesh.entity('node')
+        isBdNode = mesh.ds.boundary_node_flag()
+        xnode = mesh.entity_barycenter('cell')
+        p2t, p2p = self.patch_matrix(mesh)
 
-        isBdNodes = mesh.ds.boundary_node_flag()
-        xnode = mesh.barycenter()
+        bc = np.array([1/3]*3, dtype=mesh.ftype)
+        guh = uh.grad_value(bc)
 
-        row = np.arange(NC).repeat(3)
-        col = cell.flatten()
-        data = np.ones(NC*3)
-        t2p = csr_matrix((data, (row, col)), shape=(NC, NN)).toarray()
-        p2t = t2p.T
-        p2p = p2t@t2p
-        
-        bc = np.array([1/3]*3, dtype=np.float)
-        guh = uh.grad_value(bc) 
-        
-        for i in range(NN):
-            if isBdNodes[i]:
-                np1, = np.nonzero(p2p[:, i])
-                ip = np1[~isBdNodes[np1]]
-                ipn = ip.shape[0]
-                if ipn == 0:
-                    ne, = np.nonzero(t2p[:, i])
-                    tempp = guh[ne, :]
-                    rguh[i, :] = np.mean(tempp, axis=0)
-                    #rguh[i, :] = rguh[i, :]
-                else:
-                    for k in range(ipn):
-                        np2, = np.nonzero(t2p[:, ip[k]])
-                        temp0 = xnode[np2,:]
-                        tempx, center, h = scaleCoor(temp0)
-                        tempp = guh[np2, :]
-                        tempn = tempx.shape[0]
-                        X = np.ones((tempn, 3))
-                        X[:, 1:3] = tempx
-                        coefficient1 = np.linalg.solve(X.T@X,X.T@tempp[:,0])
-                        rguh[i,0] = rguh[i,0] + node[i,:]@coefficient1[1:3]/h + coefficient1[0] - center@coefficient1[1:3]/h
-                        coefficient2 = np.linalg.solve(X.T@X,X.T@tempp[:,1])
-                        rguh[i,1] = rguh[i,1] + node[i,:]@coefficient2[1:3]/h + coefficient2[0] - center@coefficient2[1:3]/h
-                    rguh[i, :] = rguh[i, :]/ipn
-            else:
-                ne, = np.nonzero(t2p[:, i])
-                temp0 =xnode[ne, :]
-                tempx,center,h = scaleCoor(temp0)
-                tempp = guh[ne, :]
-                tempn = tempx.shape[0]
-                X = np.ones((tempn, 3))
-                X[:, 1:3] = tempx
-                coefficient3 = np.linalg.solve(X.T@X,X.T@tempp[:,0])
-                rguh[i,0] = node[i,:]@coefficient3[1:3]/h + coefficient3[0] - center@coefficient3[1:3]/h
-                coefficient4 =  np.linalg.solve(X.T@X,X.T@tempp[:,1])
-                rguh[i,1] = node[i,:]@coefficient4[1:3]/h + coefficient4[0] - center@coefficient4[1:3]/h
+        # the linear fits of the interior nodes
+        isInNode = ~isBdNode
+        coef = np.zeros((NN, 3, GD), dtype=mesh.ftype)
+        center = np.zeros((NN, GD), dtype=mesh.ftype)
+        h = np.ones(NN, dtype=mesh.ftype)
+        for idx, ne in group_patch(p2t[isInNode]):
+            tempx, c0, h0 = scale_patch(xnode[ne])
+            X = np.ones(ne.shape + (3, ), dtype=mesh.ftype)
+            X[..., 1:3] = tempx
+            idx = np.nonzero(isInNode)[0][idx]
+            coef[idx] = patch_fit(X, guh[ne])
+            center[idx] = c0
+            h[idx] = h0
+
+        def evaluate(k, i):
+            # the fit of the node `k` at the node `i`
+            x = (node[i] - center[k])/h[k, None]
+            return coef[k, 0] + np.einsum('ij, ijk->ik', x, coef[k, 1:3])
+
+        rguh[isInNode] = evaluate(isInNode, isInNode)
+
+        # the boundary nodes with interior neighbors
+        i, k = p2p[isBdNode].nonzero()
+        i = np.nonzero(isBdNode)[0][i]
+        flag = isInNode[k]
+        i = i[flag]
+        k = k[flag]
+        ipn = np.bincount(i, minlength=NN)
+        val = evaluate(k, i)
+        for d in range(GD):
+            val0 = np.bincount(i, weights=val[:, d], minlength=NN)
+            rguh[ipn > 0, d] = val0[ipn > 0]/ipn[ipn > 0]
+
+        # the boundary nodes without interior neighbor
+        flag = isBdNode & (ipn == 0)
+        valence = np.asarray(p2t[flag].sum(axis=1)).reshape(-1, 1)
+        rguh[flag] = (p2t[flag]@guh)/valence
         return rguh
 
-
-    def PPR(self,uh):
+    def PPR(self, uh):
+        """ The polynomial preserving recovery
+
+        Notes
+        -----
+        A quadratic function is fitted to `uh` on a patch of nodes around
+        every node and is differentiated at the node. The patch of an
+        interior node is its neighbors, extended by the neighbors of its
+        cells if it has less than 6 nodes. The patch of a boundary node is
+        extended by the patch of its first interior neighbor, or to the
+        second ring of nodes if it has no interior neighbor or less than 6
+        nodes.
+
+        All the patches are built by sparse matrix products, grouped by
+        their sizes, and the local least squares problems of the same size
+        are solved by one batched `np.linalg.solve`.
+        """
         space = uh.space
         mesh = space.mesh
         GD = mesh.geo_dimension()
         rguh = space.function(dim=GD)
-        
-        cell = mesh.ds.cell
-        node = mesh.node
-        
-        NC = mesh.number_of_cells()
+
+        node = mesh.entity('node')
+        cell = mesh.entity('cell')
         NN = mesh.number_of_nodes()
-        coefficient = np.zeros((NN,6))
-        
-        isBdNodes = mesh.ds.boundary_node_flag()
-        neighbor = mesh.ds.cell_to_cell()
-        
-        row = np.arange(NC).repeat(3)
-        col = cell.flatten()
-        data = np.ones(NC*3)
-        t2p = csr_matrix((data, (row, col)), shape=(NC,NN)).toarray()
-        p2t = t2p.T
-        p2p = p2t@t2p
-        
-        for i in range(NN):
-            #np1 = [j for (j,val) in enumerate(p2p[i,:]) if val>0]
-            np1, = np.nonzero(p2p[i,:])
-
-            npn = np1.shape[0]
-            if isBdNodes[i]:
-                ip = np1[~isBdNodes[np1]]
-                ipn = ip.shape[0]
-                if ipn == 0:
-                    for k in range(npn):
-                        #cp = [j for (j,val) in enumerate(p2p[np1[k],:]) if val>0]
-                        cp, = np.nonzero(p2p[np1[k], :])
-                        np1 = np.hstack((np1,cp))
-                    np1 = np.unique(np1)
-                else:
-                    #cp = [j for (j,val) in enumerate(p2p[ip[0],:]) if val>0]
-                    cp, = np.nonzero(p2p[ip[0],:])
-                    p = np.hstack((np1,cp))
-                    np2 = np.unique(p)
-                    if np1.shape[0] < 6:
-                        for k in range(npn):
-                           # cp = [j for (j,val) in enumerate(p2p[np1[k],:]) if val>0]
-                            cp, = np.nonzero(p2p[np1[k],:])
-                            np1 = np.hstack((np1,cp))
-                        np2 = np.unique(np1)
-                    np1 = np2
-            else:
-                if npn < 6:
-                    ne, =np.nonzero(p2t[i,:]) 
-         #           ne = [j for (j,val) in enumerate(p2t[i,:]) if val>0]
-                    n1 = neighbor[ne,0]
-                    n2 = neighbor[ne,1]
-                    n3 = neighbor[ne,2]
-                    e = np.hstack((ne,n1,n2,n3))
-                    e = np.unique(e)
-                    p = cell[e, :]
-                   # p = p[:]
-                    np1 = np.unique(p)
-            temp0 = node[np1,:]
-            tempp = uh[np1]
-            tempx,center,h = scaleCoor(temp0)
-            tempn = tempx.shape[0]
-            X = np.ones((tempn,6))
-            X[:,1:3] = tempx
-            X[:,3] = tempx[:,0]*tempx[:,1]
-            X[:,4:6] = tempx**2
-            cc = np.linalg.solve(X.T@X,X.T@tempp) 
-            c1 = center[0]
-            c2 = center[1]
-            
-            coefficient[i,0] = cc[0] - cc[1]*c1/h - cc[2]*c2/h +cc[3]*c1*c2/h/h
-            + cc[4]*c1*c1/h/h + cc[5]*c2*c2/h/h
-            coefficient[i,1] = cc[1]/h - cc[3]*c2/h/h - 2*cc[4]*c1/h/h 
-            coefficient[i,2] = cc[2]/h - cc[3]*c1/h/h - 2*cc[5]*c2/h/h
-            coefficient[i,3] = cc[3]/h/h
-            coefficient[i,4] = cc[4]/h/h
-            coefficient[i,5] = cc[5]/h/h   
-
-
-        rguh[:,0] = coefficient[:,1]+coefficient[:,3]*node[:,1]+2*coefficient[:,4]*node[:,0]
-        rguh[:,1] = coefficient[:,2]+coefficient[:,3]*node[:,0]+2*coefficient[:,5]*node[:,1]
+        NC = mesh.number_of_cells()
 
+        isBdNode = mesh.ds.boundary_node_flag()
+        p2t, p2p = self.patch_matrix(mesh)
+        npn = np.diff(p2p.indptr)
+
+        # the first interior neighbor of every node
+        i, j = p2p.nonzero()
+        flag = ~isBdNode[j]
+        i = i[flag]
+        j = j[flag]
+        ip0 = np.full(NN, NN, dtype=mesh.itype)
+        np.minimum.at(ip0, i, j)
+        hasIn = ip0 < NN
+
+        isTwoRing = isBdNode & (~hasIn | (npn < 6))
+        isIn = isBdNode & hasIn & (npn >= 6)
+        isCell = ~isBdNode & (npn < 6)
+        isOne = ~isBdNode & (npn >= 6)
+
+        def select(flag):
+            return spdiags(flag.astype(np.int), 0, NN, NN, format='csr')
+
+        patch = select(isOne)@p2p
+        patch += select(isTwoRing)@(p2p@p2p)
+        k, = np.nonzero(isIn)
+        s = csr_matrix((np.ones(len(k), dtype=np.bool), (k, ip0[k])),
+                shape=(NN, NN))
+        patch += select(isIn)@p2p + s@p2p
+        # the nodes of the cells around the node and their neighbors
+        neighbor = mesh.ds.cell_to_cell()
+        NV = neighbor.shape[1]
+        row = np.arange(NC).repeat(NV+1)
+        col = np.c_[np.arange(NC), neighbor].flatten()
+        t2t = csr_matrix((np.ones(len(row), dtype=np.bool), (row, col)),
+                shape=(NC, NC))
+        patch += select(isCell)@p2t@t2t@p2t.T
+        patch = patch.tocsr()
+        patch.eliminate_zeros()
+
+        for idx, np1 in group_patch(patch):
+            tempx, center, h = scale_patch(node[np1])
+            X = np.ones(np1.shape + (6, ), dtype=mesh.ftype)
+            X[..., 1:3] = tempx
+            X[..., 3] = tempx[..., 0]*tempx[..., 1]
+            X[..., 4:6] = tempx**2
+            cc = patch_fit(X, uh[np1])
+            # the gradient of the fitted quadratic at the node
+            x = (node[idx] - center)/h[:, None]
+            rguh[idx, 0] = (cc[:, 1] + cc[:, 3]*x[:, 1] + 2*cc[:, 4]*x[:, 0])/h
+            rguh[idx, 1] = (cc[:, 2] + cc[:, 3]*x[:, 0] + 2*cc[:, 5]*x[:, 1])/h
         return rguh
-
-
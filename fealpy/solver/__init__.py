@@ -1,3 +1,4 @@
 
 from .solve import solve, active_set_solver 
 from .amg import AMGSolver
+from .amg_manager import AMGManager
@@ -1,9 +1,147 @@
 import numpy as np
-from scipy.sparse.linalg import cg, inv, dsolve, spsolve
-from scipy.sparse import spdiags, csr_matrix
+from scipy.sparse.linalg import cg, inv, dsolve, spsolve, splu, LinearOperator
+from scipy.sparse import spdiags, csr_matrix, tril
 from timeit import default_timer as timer
 
 
+def strength_graph(A, theta):
+    """ The strong connections of the matrix `A`
+
+    The node `j` strongly influences the node `i` if
+        -a_ij/sqrt(a_ii a_jj) > theta.
+
+    Returns
+    -------
+    (i, j) : (numpy.array, numpy.array)
+        the rows and the columns of all the off-diagonal entries of `A`
+    val : numpy.array
+        the values of the off-diagonal entries
+    isStrong : numpy.array
+        the flag of the strong connections in `(i, j)`
+    """
+    N = A.shape[0]
+    i = np.repeat(np.arange(N), np.diff(A.indptr))
+    j = A.indices
+    isOffDiag = (i != j)
+    i = i[isOffDiag]
+    j = j[isOffDiag]
+    val = A.data[isOffDiag]
+    d = 1/np.sqrt(np.abs(A.diagonal()))
+    isStrong = -val*d[i]*d[j] > theta
+    return (i, j), val, isStrong
+
+
+def maximal_independent_set(N, i, j, w, isU=None):
+    """ A maximal independent set of the graph `(i, j)` found in a vectorized
+    way like `randomcoloring`: in every round all the undecided nodes whose
+    weight is the largest in their undecided neighborhood are selected at
+    the same time, and their undecided neighbors are excluded.
+
+    Parameters
+    ----------
+    N : int
+        the number of nodes
+    i, j : numpy.array
+        the edges of a symmetric graph, every edge is given in both directions
+    w : numpy.array
+        the weights of the nodes, ties are broken by the node numbers
+    isU : numpy.array
+        the flag of the candidate nodes, default is all the nodes
+
+    Returns
+    -------
+    isC : numpy.array
+        the flag of the nodes in the independent set
+    """
+    # make the weights distinct, so two neighbors are never both selected
+    order = np.lexsort((np.arange(N), w))
+    rank = np.zeros(N, dtype=np.int_)
+    rank[order] = np.arange(N)
+
+    isC = np.zeros(N, dtype=np.bool_)
+    isU = np.ones(N, dtype=np.bool_) if isU is None else isU.copy()
+    while np.any(isU):
+        isEdge = isU[i] & isU[j]
+        i0 = i[isEdge]
+        j0 = j[isEdge]
+        # the nodes with an undecided neighbor of a larger rank
+        isLess = np.zeros(N, dtype=np.bool_)
+        isLess[i0[rank[i0] < rank[j0]]] = True
+        isNew = isU & ~isLess
+        isC[isNew] = True
+        isU[isNew] = False
+        isU[j[isNew[i]]] = False
+    return isC
+
+
+def direct_interpolation(N, ij, val, isStrong, isC, diag):
+    """ The direct interpolation from the coarse nodes `isC`
+
+    An F node `i` takes the values of its strongly connected C nodes `C_i`
+    with the weights
+        p_ij = -alpha_i a_ij/a_ii, alpha_i = sum_{k != i} a_ik / sum_{j in C_i} a_ij,
+    so the constant is reproduced when the row sum of `A` is zero.
+
+    Returns
+    -------
+    P : scipy.sparse.csr_matrix
+        the prolongation matrix with shape `(N, Nc)`
+    """
+    i, j = ij
+    NC = isC.sum()
+    coarse = np.zeros(N, dtype=np.int_)
+    coarse[isC] = np.arange(NC)
+
+    isInterp = isStrong & isC[j] & ~isC[i]
+    rowSum = np.bincount(i, weights=val, minlength=N)
+    cSum = np.bincount(i[isInterp], weights=val[isInterp], minlength=N)
+    isF = ~isC & (cSum != 0)
+    alpha = np.zeros(N, dtype=np.float)
+    alpha[isF] = rowSum[isF]/cSum[isF]
+
+    i0 = i[isInterp]
+    w = -alpha[i0]*val[isInterp]/diag[i0]
+
+    cidx, = np.nonzero(isC)
+    I = np.r_[cidx, i0]
+    J = np.r_[coarse[cidx], coarse[j[isInterp]]]
+    V = np.r_[np.ones(NC, dtype=np.float), w]
+    return csr_matrix((V, (I, J)), shape=(N, NC))
+
+
+class AMGLevel():
+    """ One level of the AMG hierarchy with its symmetric Gauss-Seidel smoother
+    """
+    def __init__(self, A, smoother='gs', omega=2/3):
+        self.A = A
+        self.smoother = smoother
+        self.P = None
+        self.R = None
+        if smoother == 'gs':
+            # the LU factors of a triangular matrix without pivoting have no
+            # fill in, so every sweep is a sparse triangular solve. `A` is
+            # symmetric, the backward sweep solves with the transpose.
+            self.L = splu(tril(A).tocsc(), permc_spec='NATURAL',
+                    diag_pivot_thresh=0, options={'SymmetricMode': True})
+        elif smoother == 'jacobi':
+            self.D = omega/A.diagonal()
+        else:
+            raise ValueError("We don't support smoother `{}`! ".format(smoother))
+
+    def presmooth(self, x, b):
+        if self.smoother == 'gs':
+            x += self.L.solve(b - self.A@x)
+        else:
+            x += self.D*(b - self.A@x)
+        return x
+
+    def postsmooth(self, x, b):
+        if self.smoother == 'gs':
+            x += self.L.solve(b - self.A@x, trans='T')
+        else:
+            x += self.D*(b - self.A@x)
+        return x
+
 
 class AMGSolver():
     """
@@ -12,54 +150,169 @@ class AMGSolver():
     Ax = b
 
     要从 A 图结构中生成一个抽象的网格。
+
+    The setup only works on the CSR arrays of the matrices: the strong
+    connections are a mask on the off-diagonal entries, the C/F splitting is
+    a vectorized maximal independent set of the strength graph, the
+    interpolation weights are `np.bincount` reductions over the rows, and
+    the coarse matrices are the sparse Galerkin products `R A P`.
     """
-    def __init__(self):
-        pass
+    def __init__(self, theta=0.025, maxlevel=20, coarsesize=500,
+            smoother='gs', nsmooth=1):
+        self.theta = theta
+        self.maxlevel = maxlevel
+        self.coarsesize = coarsesize
+        self.smoother = smoother
+        self.nsmooth = nsmooth
+        self.levels = []
+        self.setuptime = 0.0
+        self.cycletime = 0.0
+        self.ncycle = 0
 
     def setup(self, A):
+        start = timer()
+        A = csr_matrix(A)
+        A.sum_duplicates()
         self.A = A
+        self.levels = []
+        for k in range(self.maxlevel - 1):
+            N = A.shape[0]
+            if N <= self.coarsesize:
+                break
+            level = AMGLevel(A, smoother=self.smoother)
+            isC, ij, val, isStrong = self.coarsen_rs(A, self.theta)
+            NC = isC.sum()
+            if (NC == 0) or (NC >= N):
+                break
+            P = direct_interpolation(N, ij, val, isStrong, isC, A.diagonal())
+            R = P.T.tocsr()
+            level.P = P
+            level.R = R
+            self.levels.append(level)
+            A = (R@A@P).tocsr()
+            A.sum_duplicates()
+        self.coarseA = A
+        self.coarsesolver = splu(A.tocsc())
+        end = timer()
+        self.setuptime = end - start
+        return self
 
-    def solve(self, b):
-        pass
+    def coarsen_rs(self, A=None, theta=None):
+        """ Split the nodes into the coarse (C) and the fine (F) ones
 
-    def coarsen_rs(self, theta=0.025):
-        A = self.A
+        Returns
+        -------
+        isC : numpy.array
+            the flag of the coarse nodes
+        ij, val, isStrong :
+            the off-diagonal entries of `A` and their strong connection flags,
+            see `strength_graph`
+        """
+        A = self.A if A is None else A
+        theta = self.theta if theta is None else theta
         N = A.shape[0]
 
-        D = A.min(axis=1).toarray()# 最小的副对角线的值， 绝对值是是最大的
-        D = spdiags(1/D.reshape(-1), 0, N, N)
-        Am = D@A
-
-        # 删除弱连通关系
-        i, j = Am.nonzero()
-        val = np.asarray(Am[i, j]).reshape(-1)
-
-        idx = (-val > theta)
-        data = np.ones(idx.sum(), dtype=np.int)
-        As = csr_matrix( # 有向图的非对称矩阵
-                (data, (i[idx], j[idx])), shape=(N, N), dtype=np.int)
-        Am = csr_matrix(
-                (val[idx], (i[idx], j[idx])), shape=(N, N), dtype=A.dtype)
-        Ass = (As + As.T)/2 # 无向图的对称矩阵
-
-        # 把孤立点放到 F 集合
-        isF = np.zeros(N, dtype=np.bool) # 细点
-        dgIn = np.asarray(As.sum(axis=1)).reshape(-1) # 接入强联接顶点的数目
-        isF[digIn == 0] = True # 孤立点是细点
-
-        # 发现一个逼近的极大独立集做为粗点
-        isC = np.zeros(N, dtype=np.bool) # C: coarse node
-        U = np.arange(N)                 # U: undecided node 
-        degFin = np.zeros(N, dtype=np.int) # number of F nodes strong connected to
-
-        while isC.sum() < N/2 and U.shape[0] > 20:
-            # S: selected set, changing in the coarsening
-            isS = np.zeros(N, dtype=np.bool)
-            degInAll = digIn + degFin
-            flag = (np.randdom.rand(N) < 0.85*degInAll/degInAll.mean()) & \
-                    (degInAll > 0)
-            isS[flag] = True
-            S, = isS.nonzero()
-
-            
+        ij, val, isStrong = strength_graph(A, theta)
+        i = ij[0][isStrong]
+        j = ij[1][isStrong]
+
+        # 孤立点放到 F 集合, 其余点上找一个极大独立集做为粗点。
+        # 强影响别人越多的点越优先成为粗点
+        degIn = np.bincount(j, minlength=N)
+        deg = degIn + np.bincount(i, minlength=N)
+        w = degIn + np.random.rand(N)
+        # the graph of the symmetrized strong connections
+        isC = maximal_independent_set(N, np.r_[i, j], np.r_[j, i], w,
+                isU=(deg > 0))
+        return isC, ij, val, isStrong
+
+    def vcycle(self, b, x=None):
+        """ One V-cycle for `A x = b` with the initial guess `x`
+        """
+        x = np.zeros_like(b) if x is None else x.copy()
+        return self.cycle(0, x, b)
+
+    def cycle(self, k, x, b):
+        if k == len(self.levels):
+            return x + self.coarsesolver.solve(b - self.coarseA@x)
+        level = self.levels[k]
+        for i in range(self.nsmooth):
+            level.presmooth(x, b)
+        r = level.R@(b - level.A@x)
+        x += level.P@self.cycle(k+1, np.zeros_like(r), r)
+        for i in range(self.nsmooth):
+            level.postsmooth(x, b)
+        return x
+
+    def aspreconditioner(self):
+        """ One V-cycle from zero as a symmetric positive definite
+        `LinearOperator`, for `cg` and `minres`
+        """
+        N = self.A.shape[0]
+        def matvec(b):
+            start = timer()
+            x = self.vcycle(np.asarray(b).reshape(-1))
+            self.cycletime += timer() - start
+            self.ncycle += 1
+            return x
+        return LinearOperator((N, N), matvec=matvec, dtype=self.A.dtype)
+
+    def solve(self, b, x0=None, tol=1e-8, maxit=200, accel=None,
+            residuals=None):
+        """ Solve `A x = b` by V-cycles or by a Krylov method with V-cycle
+        preconditioner
+
+        Parameters
+        ----------
+        accel : None, 'cg' or 'minres'
+
+        Returns
+        -------
+        x : numpy.array
+        """
+        b = np.asarray(b).reshape(-1)
+        normb = np.linalg.norm(b)
+        normb = 1.0 if normb == 0 else normb
+        if accel is None:
+            x = np.zeros_like(b) if x0 is None else np.array(x0, dtype=np.float).reshape(-1)
+            r = np.linalg.norm(b - self.A@x)
+            if residuals is not None:
+                residuals.append(r)
+            for k in range(maxit):
+                if r < tol*normb:
+                    break
+                start = timer()
+                x = self.vcycle(b, x)
+                self.cycletime += timer() - start
+                self.ncycle += 1
+                r = np.linalg.norm(b - self.A@x)
+                if residuals is not None:
+                    residuals.append(r)
+            return x
+
+        if accel == 'cg':
+            krylov = cg
+        elif accel == 'minres':
+            from scipy.sparse.linalg import minres as krylov
+        else:
+            raise ValueError("We don't support accel `{}`! ".format(accel))
+
+        callback = None
+        if residuals is not None:
+            callback = lambda xk: residuals.append(np.linalg.norm(b - self.A@xk))
+        x, info = krylov(self.A, b, x0=x0, tol=tol, maxiter=maxit,
+                M=self.aspreconditioner(), callback=callback)
+        return x
+
+    def operator_complexity(self):
+        nnz = sum(level.A.nnz for level in self.levels) + self.coarseA.nnz
+        return nnz/self.A.nnz
 
+    def __str__(self):
+        s = "AMGSolver with {} levels\n".format(len(self.levels) + 1)
+        for k, A in enumerate([l.A for l in self.levels] + [self.coarseA]):
+            s += "  level {}: N = {}, nnz = {}\n".format(k, A.shape[0], A.nnz)
+        s += "operator complexity: {:.3f}\n".format(self.operator_complexity())
+        s += "setup time: {:.4f}s, {} cycles in {:.4f}s".format(
+                self.setuptime, self.ncycle, self.cycletime)
+        return s
@@ -0,0 +1,190 @@
+import copy
+import numpy as np
+from collections import OrderedDict
+from timeit import default_timer as timer
+import pyamg
+
+
+def matrix_pattern(A):
+    """ The key of the sparsity pattern of a CSR matrix
+
+    Two matrices with the same key have the same shape and the same
+    `indptr` and `indices` arrays, so a hierarchy built for one of them is a
+    valid preconditioner of the other.
+    """
+    return (A.shape, A.nnz, hash(A.indptr.tobytes()), hash(A.indices.tobytes()))
+
+
+class AMGEntry():
+    """ A cached AMG hierarchy and the statistics of its solves
+    """
+    def __init__(self, A, ml, setuptime):
+        self.A = A
+        self.ml = ml
+        self.setuptime = setuptime
+        self.solvetime = 0.0
+        self.nsolve = 0
+        self.nreuse = 0
+        self.iters = None # the number of iterations of the first solve
+        self.lastiters = None
+        self.swapped = False # the finest level is not the one of the setup
+
+
+class AMGManager():
+    """ Build the AMG hierarchies once and reuse them for many solves
+
+    The hierarchies are cached by the sparsity pattern of the matrix. A
+    solve with the same matrix (only the right-hand side changes) reuses the
+    hierarchy as it is, otherwise the hierarchy is rebuilt.
+
+    With `reuse=True` a matrix of the same pattern but with other values (a
+    new time step, a shift in a Picard iteration) gets a copy of the old
+    hierarchy with the new finest level operator and the old coarse levels,
+    so the old hierarchy becomes a preconditioner of the new matrix. The
+    hierarchies handed out before are never changed. If such a solve does
+    not converge, or its number of iterations grows by more than the factor
+    `growth` compared with the first solve of the hierarchy, the hierarchy
+    is rebuilt and the system is solved again.
+
+    A manager is owned by its caller, who decides whether the systems it
+    solves are close enough to share the coarse levels.
+    """
+    def __init__(self, maxsize=4, reuse=False, growth=2.0,
+            builder=pyamg.ruge_stuben_solver, **kwargs):
+        """
+
+        Parameters
+        ----------
+        maxsize : int
+            the maximal number of the cached hierarchies, the least recently
+            used one is dropped first
+        reuse : bool
+            if it is True, the coarse levels are reused for the matrices of
+            the same pattern with other values, otherwise a hierarchy is
+            only reused for the same matrix and rebuilt as soon as the
+            values change
+        growth : float or None
+            the rebuild trigger of the iteration count, None means never
+            rebuild
+        builder : function
+            `builder(A, **kwargs)` returns a pyamg multilevel solver
+        """
+        self.maxsize = maxsize
+        self.reuse = reuse
+        self.growth = growth
+        self.builder = builder
+        self.kwargs = kwargs
+        self.cache = OrderedDict()
+        self.setuptime = 0.0
+        self.solvetime = 0.0
+        self.nsetup = 0
+        self.nsolve = 0
+        self.nreuse = 0
+
+    def clear(self):
+        self.cache.clear()
+
+    def setup(self, A, key):
+        start = timer()
+        ml = self.builder(A, **self.kwargs)
+        end = timer()
+        self.setuptime += end - start
+        self.nsetup += 1
+        entry = AMGEntry(A, ml, end - start)
+        self.cache[key] = entry
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return entry
+
+    def entry(self, A):
+        """ Get the cache entry of the matrix `A`, build it if needed
+        """
+        A = A.tocsr()
+        key = matrix_pattern(A)
+        entry = self.cache.get(key)
+        if entry is None:
+            return self.setup(A, key)
+
+        self.cache.move_to_end(key)
+        if (entry.A is not A) and (not np.array_equal(entry.A.data, A.data)):
+            if (not self.reuse) or (len(entry.ml.levels) == 1):
+                return self.setup(A, key)
+            entry.A = A
+            entry.ml = finest_level_swapped(entry.ml, A)
+            entry.swapped = True
+        entry.nreuse += 1
+        self.nreuse += 1
+        return entry
+
+    def hierarchy(self, A):
+        """ Return the multilevel solver of the matrix `A`
+        """
+        return self.entry(A).ml
+
+    def solve(self, A, b, x0=None, tol=1e-12, accel='cg', maxiter=100,
+            cycle='V'):
+        """ Solve `A x = b` with the (cached) AMG hierarchy of `A`
+
+        Returns
+        -------
+        x : numpy.array
+            the solution with the same shape as `b`
+        """
+        entry = self.entry(A)
+        x, it, converged = self._solve(entry, b, x0, tol, accel, maxiter,
+                cycle)
+        if entry.iters is None:
+            entry.iters = it
+        elif entry.swapped and ((not converged) or ((self.growth is not None)
+                and (it > self.growth*entry.iters))):
+            # the old coarse levels are not good enough for the new values
+            entry = self.setup(entry.A, matrix_pattern(entry.A))
+            x, it, _ = self._solve(entry, b, x0, tol, accel, maxiter, cycle)
+            entry.iters = it
+        return x.reshape(b.shape)
+
+    def _solve(self, entry, b, x0, tol, accel, maxiter, cycle):
+        residuals = []
+        start = timer()
+        x = entry.ml.solve(b, x0=x0, tol=tol, accel=accel, maxiter=maxiter,
+                cycle=cycle, residuals=residuals)
+        end = timer()
+
+        entry.solvetime += end - start
+        entry.nsolve += 1
+        self.solvetime += end - start
+        self.nsolve += 1
+
+        it = max(len(residuals) - 1, 1)
+        entry.lastiters = it
+        converged = residuals[-1] <= tol*max(residuals[0], np.linalg.norm(b))
+        return x, it, converged
+
+    def info(self):
+        """ Return the setup and solve statistics of the manager
+        """
+        return {
+                'nsetup': self.nsetup,
+                'nreuse': self.nreuse,
+                'nsolve': self.nsolve,
+                'setuptime': self.setuptime,
+                'solvetime': self.solvetime,
+                'iters': [e.lastiters for e in self.cache.values()]}
+
+    def __str__(self):
+        s = "AMG setup: {} times, {:.4f}s; ".format(self.nsetup, self.setuptime)
+        s += "reused: {} times; ".format(self.nreuse)
+        s += "solve: {} times, {:.4f}s".format(self.nsolve, self.solvetime)
+        return s
+
+
+def finest_level_swapped(ml, A):
+    """ A copy of the multilevel solver `ml` with the finest level operator
+    `A`, which shares the coarse levels with `ml` and leaves `ml` unchanged
+    """
+    ml = copy.copy(ml)
+    ml.levels = list(ml.levels)
+    ml.levels[0] = copy.copy(ml.levels[0])
+    ml.levels[0].A = A
+    return ml
@@ -2,20 +2,37 @@ import numpy as np
 from numpy.linalg import norm
 import pyamg
 
+from .amg_manager import AMGManager
 
-def picard(A, M, u0, tol=1e-12, atol = 1e-12, ml=None, sigma=None):
+
+def picard(A, M, u0, tol=1e-12, atol = 1e-12, ml=None, sigma=None, amg=None):
+    """
+
+    Parameters
+    ----------
+    ml : pyamg multilevel solver
+        a hierarchy of the (shifted) matrix `A` built by the caller
+    amg : AMGManager
+        the manager which keeps the hierarchy of `A`, so it is built once
+        and reused by all the Picard iterations and by the next call with a
+        matrix of the same sparsity pattern
+    """
     if sigma is not None:
         A += sigma*M
 
     if ml is None:
-        ml = pyamg.ruge_stuben_solver(A)
+        if amg is None:
+            amg = AMGManager(maxsize=1)
     else:
         if sigma is not None:
             print('Please make sure that you have shift matrix A!')
 
     d0 = (u0@A@u0)/(u0@M@u0)
     while True:
-        u1 = ml.solve(d0*M@u0, x0=u0, tol=1e-12, accel='cg').reshape(-1)
+        if ml is None:
+            u1 = amg.solve(A, d0*M@u0, x0=u0, tol=1e-12, accel='cg').reshape(-1)
+        else:
+            u1 = ml.solve(d0*M@u0, x0=u0, tol=1e-12, accel='cg').reshape(-1)
         u1 /= np.max(np.abs(u1))
         L0 = u1@M@u1
         L1 = u1@A@u1
@@ -4,13 +4,24 @@ from scipy.sparse import spdiags, eye, bmat, tril, triu
 from scipy.sparse.linalg import cg, spsolve, LinearOperator
 from timeit import default_timer as timer
 import pyamg
+from .amg_manager import AMGManager
 from ..functionspace.lagrange_fem_space import LagrangeFiniteElementSpace
 from ..femmodel.doperator import stiff_matrix
 
 
 class HOFEMFastSovler():
-    def __init__(self, A, space, integrator, measure):
+    def __init__(self, A, space, integrator, measure, amg=None):
+        """
+
+        Parameters
+        ----------
+        amg : AMGManager
+            the manager of the AMG hierarchy of the linear element matrix;
+            pass the same manager to the solvers of all the time steps or
+            iterations on one mesh to build the hierarchy only once
+        """
         self.A = A
+        self.amg = AMGManager(maxsize=1) if amg is None else amg
 
 
         self.DL = tril(A).tocsr()
@@ -29,7 +40,8 @@ class HOFEMFastSovler():
         Tbd = spdiags(bdIdx, 0, A1.shape[0], A1.shape[0])
         T = spdiags(1-bdIdx, 0, A1.shape[0], A1.shape[0])
         A1 = T@A1@T + Tbd
-        self.ml = pyamg.ruge_stuben_solver(A1)  
+        self.A1 = A1.tocsr()
+        self.ml = self.amg.hierarchy(self.A1)
 
         # Get interpolation matrix 
         NC = space.mesh.number_of_cells()
@@ -60,7 +72,7 @@ class HOFEMFastSovler():
             u[:] = spsolve(self.DL, r - self.U@u, permc_spec="NATURAL") 
 
         r0 = r - (self.DL@u + self.U@u)
-        u0 = self.ml.solve(self.PI.transpose()@r0, tol=1e-13, accel='cg')
+        u0 = self.amg.solve(self.A1, self.PI.transpose()@r0, tol=1e-13, accel='cg')
 
         u += self.PI@u0
         for i in range(6):
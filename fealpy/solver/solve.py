@@ -8,7 +8,9 @@ from scipy.sparse import spdiags
 from timeit import default_timer as timer
 import pyamg
 
-def solve1(a, L, uh, dirichlet=None, neuman=None, solver='cg'):
+from .amg_manager import AMGManager
+
+def solve1(a, L, uh, dirichlet=None, neuman=None, solver='cg', amg=None):
     space = a.space
 
     start = timer()
@@ -36,10 +38,10 @@ def solve1(a, L, uh, dirichlet=None, neuman=None, solver='cg'):
         print(info)
     elif solver is 'amg':
         start = timer()
-        ml = pyamg.ruge_stuben_solver(AD)  
-        uh[:] = ml.solve(b, tol=1e-12, accel='cg').reshape((-1,))
+        amg = AMGManager() if amg is None else amg
+        uh[:] = amg.solve(AD, b, tol=1e-12, accel='cg').reshape(-1)
         end = timer()
-        print(ml)
+        print(amg)
     elif solver is 'direct':
         start = timer()
         uh[:] = spsolve(AD, b)
@@ -51,7 +53,7 @@ def solve1(a, L, uh, dirichlet=None, neuman=None, solver='cg'):
 
     return A 
 
-def solve(dmodel, uh, dirichlet=None, solver='direct'):
+def solve(dmodel, uh, dirichlet=None, solver='direct', amg=None):
     space = uh.space
     start = timer()
     A = dmodel.get_left_matrix()
@@ -74,10 +76,10 @@ def solve(dmodel, uh, dirichlet=None, solver='direct'):
         print(info)
     elif solver is 'amg':
         start = timer()
-        ml = pyamg.ruge_stuben_solver(AD)  
-        uh[:] = ml.solve(b, tol=1e-12, accel='cg').reshape(-1)
+        amg = AMGManager() if amg is None else amg
+        uh[:] = amg.solve(AD, b, tol=1e-12, accel='cg').reshape(-1)
         end = timer()
-        print(ml)
+        print(amg)
     elif solver is 'direct':
         start = timer()
         uh[:] = spsolve(AD, b)
@@ -91,7 +93,7 @@ def solve(dmodel, uh, dirichlet=None, solver='direct'):
 
 
 def active_set_solver(dmodel, uh, gh, maxit=5000, dirichlet=None,
-        solver='direct'):
+        solver='direct', amg=None):
     space = uh.space
     start = timer()
     A = dmodel.get_left_matrix()
@@ -129,11 +131,14 @@ def active_set_solver(dmodel, uh, gh, maxit=5000, dirichlet=None,
         if solver is 'direct':
             uh[:] = spsolve(M.tocsr(), F)
         elif solver is 'amg':
-            ml = pyamg.ruge_stuben_solver(M.tocsr())  
-            uh[:] = ml.solve(F, tol=1e-12, accel='cg').reshape(-1)
+            amg = AMGManager() if amg is None else amg
+            uh[:] = amg.solve(M.tocsr(), F, x0=np.array(uh), tol=1e-12,
+                    accel='cg').reshape(-1)
         lam[:] = AD@uh - b
     end = timer()
     print("Solve time:", end-start)
+    if solver is 'amg':
+        print(amg)
     return A, b
 
 
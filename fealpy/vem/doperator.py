@@ -2,6 +2,7 @@ import numpy as np
 from ..quadrature import GaussLobattoQuadrature, GaussLegendreQuadrature
 from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, spdiags, eye
 from numpy.linalg import inv
+from ..functionspace.cell_group import CellGroups, scatter_columns
 
 
 class BasicMatrix():
@@ -19,11 +20,15 @@ class BasicMatrix():
 def basic_matrix(V, area):
     return BasicMatrix(V, area)
 
-def stiff_matrix(V, area, cfun=None, mat=None):
+def cell_groups(V):
+    """ The cells of the space `V` grouped by their number of local dofs
+    """
+    groups = getattr(V.dof, 'cellgroups', None)
+    if groups is None:
+        groups = CellGroups(V.dof.cell2dofLocation)
+    return groups
 
-    def f(x):
-        x[0, :] = 0
-        return x
+def stiff_matrix(V, area, cfun=None, mat=None):
 
     p = V.p
     if mat is None:
@@ -33,42 +38,33 @@ def stiff_matrix(V, area, cfun=None, mat=None):
         PI1 = mat.PI1
         D = mat.D
 
-    cell2dof, cell2dofLocation = V.dof.cell2dof, V.dof.cell2dofLocation
-    NC = len(cell2dofLocation) - 1
-    cd = np.hsplit(cell2dof, cell2dofLocation[1:-1])
-    DD = np.vsplit(D, cell2dofLocation[1:-1])
+    cell2dof = V.dof.cell2dof
+    groups = cell_groups(V)
+    DD = groups.split(D)
+    PI1 = groups.stack(PI1)
 
     if p == 1:
         tG = np.array([(0, 0, 0), (0, 1, 0), (0, 0, 1)])
-        if cfun is None:
-            f1 = lambda x: x[1].T@tG@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1])
-            K = list(map(f1, zip(DD, PI1)))
-        else:
-            barycenter = V.smspace.barycenter
-            k = cfun(barycenter)
-            f1 = lambda x: (x[1].T@tG@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1]))*x[2]
-            K = list(map(f1, zip(DD, PI1, k)))
+        tG = [tG]*len(groups)
     else:
-        tG = list(map(f, G))
-        if cfun is None:
-            f1 = lambda x: x[1].T@x[2]@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1])
-            K = list(map(f1, zip(DD, PI1, tG)))
-        else:
-            barycenter = V.smspace.barycenter
-            k = cfun(barycenter)
-            f1 = lambda x: (x[1].T@x[2]@x[1] + (np.eye(x[1].shape[1]) - x[0]@x[1]).T@(np.eye(x[1].shape[1]) - x[0]@x[1]))*x[3]
-            K = list(map(f1, zip(DD, PI1, tG, k)))
-
-    f2 = lambda x: np.repeat(x, x.shape[0])
-    f3 = lambda x: np.tile(x, x.shape[0])
-    f4 = lambda x: x.flatten()
-
-    I = np.concatenate(list(map(f2, cd)))
-    J = np.concatenate(list(map(f3, cd)))
-    val = np.concatenate(list(map(f4, K)))
+        tG = [g.copy() for g in groups.stack(G)]
+        for g in tG:
+            g[:, 0, :] = 0
+
+    if cfun is not None:
+        barycenter = V.smspace.barycenter
+        k = cfun(barycenter)
+
+    K = []
+    for (idx, loc), d, pi1, g in zip(groups, DD, PI1, tG):
+        R = np.eye(loc.shape[1]) - d@pi1
+        k0 = pi1.swapaxes(-1, -2)@g@pi1 + R.swapaxes(-1, -2)@R
+        if cfun is not None:
+            k0 *= k[idx].reshape(-1, 1, 1)
+        K.append(k0)
+
     gdof = V.number_of_global_dofs()
-    A = csr_matrix((val, (I, J)), shape=(gdof, gdof), dtype=np.float)
-    return A
+    return groups.assemble(cell2dof, K, (gdof, gdof))
 
 def mass_matrix(V, area, cfun=None, mat=None):
     p = V.p
@@ -80,27 +76,20 @@ def mass_matrix(V, area, cfun=None, mat=None):
         H = mat.H
         C = mat.C
 
-    cell2dof, cell2dofLocation = V.dof.cell2dof, V.dof.cell2dofLocation
-    NC = len(cell2dofLocation) - 1
-    cd = np.hsplit(cell2dof, cell2dofLocation[1:-1])
-    DD = np.vsplit(D, cell2dofLocation[1:-1])
+    cell2dof = V.dof.cell2dof
+    groups = cell_groups(V)
+    DD = groups.split(D)
+    PI0 = groups.stack(PI0)
 
-    f1 = lambda x: x[0]@x[1]
-    PIS = list(map(f1, zip(DD, PI0)))
+    K = []
+    for (idx, loc), d, pi0 in zip(groups, DD, PI0):
+        R = np.eye(loc.shape[1]) - d@pi0
+        k0 = pi0.swapaxes(-1, -2)@H[idx]@pi0
+        k0 += area[idx].reshape(-1, 1, 1)*(R.swapaxes(-1, -2)@R)
+        K.append(k0)
 
-    f1 = lambda x: x[0].T@x[1]@x[0] + x[3]*(np.eye(x[2].shape[1]) - x[2]).T@(np.eye(x[2].shape[1]) - x[2])
-    K = list(map(f1, zip(PI0, H, PIS, area)))
-
-    f2 = lambda x: np.repeat(x, x.shape[0])
-    f3 = lambda x: np.tile(x, x.shape[0])
-    f4 = lambda x: x.flatten()
-
-    I = np.concatenate(list(map(f2, cd)))
-    J = np.concatenate(list(map(f3, cd)))
-    val = np.concatenate(list(map(f4, K)))
     gdof = V.number_of_global_dofs()
-    M = csr_matrix((val, (I, J)), shape=(gdof, gdof), dtype=np.float)
-    return M
+    return groups.assemble(cell2dof, K, (gdof, gdof))
 
 def cross_mass_matrix(integral, wh, vemspace, area, PI0):
     p = vemspace.p
@@ -111,34 +100,27 @@ def cross_mass_matrix(integral, wh, vemspace, area, PI0):
         return np.einsum('ij, ijm, ijn->ijmn', wval, val, val)
     H = integral(u, celltype=True)
 
-    cell2dof, cell2dofLocation = vemspace.dof.cell2dof, vemspace.dof.cell2dofLocation
-    NC = len(cell2dofLocation) - 1
-    cd = np.hsplit(cell2dof, cell2dofLocation[1:-1])
+    cell2dof = vemspace.dof.cell2dof
+    groups = cell_groups(vemspace)
+    PI0 = groups.stack(PI0)
 
-    f1 = lambda x: x[0].T@x[1]@x[0]
-    K = list(map(f1, zip(PI0, H)))
+    K = [pi0.swapaxes(-1, -2)@H[idx]@pi0
+            for (idx, loc), pi0 in zip(groups, PI0)]
 
-    f2 = lambda x: np.repeat(x, x.shape[0])
-    f3 = lambda x: np.tile(x, x.shape[0])
-    f4 = lambda x: x.flatten()
-
-    I = np.concatenate(list(map(f2, cd)))
-    J = np.concatenate(list(map(f3, cd)))
-    val = np.concatenate(list(map(f4, K)))
     gdof = vemspace.number_of_global_dofs()
-    M = csr_matrix((val, (I, J)), shape=(gdof, gdof), dtype=np.float)
-    return M
+    return groups.assemble(cell2dof, K, (gdof, gdof))
 
 def source_vector(integral, f, vemspace, PI0):
     phi = vemspace.smspace.basis
     def u(x, cellidx):
         return np.einsum('ij, ijm->ijm', f(x), phi(x, cellidx=cellidx))
     bb = integral(u, celltype=True)
-    g = lambda x: x[0].T@x[1]
-    bb = np.concatenate(list(map(g, zip(PI0, bb))))
+    groups = cell_groups(vemspace)
+    PI0 = groups.stack(PI0)
+    bb = [np.einsum('ijk, ij->ik', pi0, bb[idx])
+            for (idx, loc), pi0 in zip(groups, PI0)]
     gdof = vemspace.number_of_global_dofs()
-    b = np.bincount(vemspace.dof.cell2dof, weights=bb, minlength=gdof)
-    #print(b)
+    b = groups.assemble_vector(vemspace.dof.cell2dof, bb, gdof)
     return b
 
 #def source_vector(f, V, area, vem=None):
@@ -287,27 +269,17 @@ def matrix_B(V):
         gphi1 = V.smspace.grad_basis(ps[-1::-1, isInEdge, :], cellidx=edge2cell[isInEdge, 1])
         nm = mesh.edge_normal()
 
-        val = np.einsum('ijmk, jk->jmi', gphi0, nm)
-        val = np.einsum('i, jmi->jmi', ws, val)
-
-        #TODO: vectorize
-        NE = mesh.number_of_edges()
-        for i in range(NE):
-            idx0 = edge2cell[i, 0]
-            idx1 = cell2dofLocation[idx0] + (edge2cell[i, 2]*p + np.arange(p+1))%(NV[idx0]*p)
-            B[:, idx1] += val[i]
-
-        val = np.einsum('ijmk, jk->jmi', gphi1, -nm[isInEdge])
-        val = np.einsum('i, jmi->jmi', ws, val)
-
-        #TODO: vectorize
-        j = 0
-        for i in range(NE):
-            if isInEdge[i]:
-                idx0 = edge2cell[i, 1]
-                idx1 = cell2dofLocation[idx0] + (edge2cell[i, 3]*p + np.arange(p+1))%(NV[idx0]*p)
-                B[:, idx1] += val[j]
-                j += 1
+        val = np.einsum('i, ijmk, jk->mji', ws, gphi0, nm, optimize=True)
+        idx = cell2dofLocation[edge2cell[:, [0]]] + \
+                (edge2cell[:, [2]]*p + np.arange(p+1))%(NV[edge2cell[:, [0]]]*p)
+        B += scatter_columns(idx, val, B.shape[1])
+
+        if isInEdge.sum() > 0:
+            val = np.einsum('i, ijmk, jk->mji', ws, gphi1, -nm[isInEdge], optimize=True)
+            idx = cell2dofLocation[edge2cell[isInEdge, 1]].reshape(-1, 1) + \
+                    (edge2cell[isInEdge, 3].reshape(-1, 1)*p + np.arange(p+1)) \
+                    %(NV[edge2cell[isInEdge, 1]].reshape(-1, 1)*p)
+            B += scatter_columns(idx, val, B.shape[1])
         return B
 
 def matrix_G(V, B, D):
@@ -315,11 +287,9 @@ def matrix_G(V, B, D):
     if p == 1:
         G = np.array([(1, 0, 0), (0, 1, 0), (0, 0, 1)])
     else:
-        cell2dof, cell2dofLocation = V.dof.cell2dof, V.dof.cell2dofLocation
-        BB = np.hsplit(B, cell2dofLocation[1:-1])
-        DD = np.vsplit(D, cell2dofLocation[1:-1])
-        g = lambda x: x[0]@x[1]
-        G = list(map(g, zip(BB, DD)))
+        groups = cell_groups(V)
+        G = groups.array([B[:, loc].swapaxes(0, 1)@D[loc]
+            for _, loc in groups])
     return G
 
 def matrix_G_test(V, vem=None):
@@ -336,41 +306,32 @@ def matrix_G_test(V, vem=None):
 def matrix_C(V, B, D, H, area):
     p = V.p
 
-    smldof = V.smspace.number_of_local_dofs()
     idof = (p-1)*p//2
 
-    mesh = V.mesh
-    NV = mesh.number_of_vertices_of_cells()
-    cell2dof, cell2dofLocation = V.dof.cell2dof, V.dof.cell2dofLocation
-    BB = np.hsplit(B, cell2dofLocation[1:-1])
-    DD = np.vsplit(D, cell2dofLocation[1:-1])
-    g = lambda x: x[0]@x[1]
-    G = list(map(g, zip(BB, DD)))
-    d = lambda x: x[0]@inv(x[1])@x[2]
-    C = list(map(d, zip(H, G, BB)))
-    if p == 1:
-        return C
-    else:
-        l = lambda x: np.r_[
-                '0',
-                np.r_['1', np.zeros((idof, p*x[0])), x[1]*np.eye(idof)],
-                x[2][idof:, :]]
-        return list(map(l, zip(NV, area, C)))
+    groups = cell_groups(V)
+    C = []
+    for idx, loc in groups:
+        BB = B[:, loc].swapaxes(0, 1)
+        G = BB@D[loc]
+        c = H[idx]@np.linalg.solve(G, BB)
+        if p > 1:
+            ldof = loc.shape[1]
+            c[:, :idof, :] = 0
+            c[:, :idof, ldof-idof:] = area[idx].reshape(-1, 1, 1)*np.eye(idof)
+        C.append(c)
+    return groups.array(C)
 
 def matrix_PI_0(V, H, C):
-    cell2dof, cell2dofLocation = V.dof.cell2dof, V.dof.cell2dofLocation
-    pi0 = lambda x: inv(x[0])@x[1]
-    return list(map(pi0, zip(H, C)))
-        
+    groups = cell_groups(V)
+    return groups.array([np.linalg.solve(H[idx], c)
+        for (idx, _), c in zip(groups, groups.stack(C))])
+
 def matrix_PI_1(V, G, B):
     p = V.p
+    groups = cell_groups(V)
+    BB = [B[:, loc].swapaxes(0, 1) for _, loc in groups]
     if p == 1:
-        cell2dof, cell2dofLocation = V.dof.cell2dof, V.dof.cell2dofLocation
-        return np.hsplit(B, cell2dofLocation[1:-1])
+        return groups.array(BB)
     else:
-        cell2dof, cell2dofLocation = V.dof.cell2dof, V.dof.cell2dofLocation
-        BB = np.hsplit(B, cell2dofLocation[1:-1])
-        g = lambda x: inv(x[0])@x[1]
-        return list(map(g, zip(G, BB)))
-
-
+        return groups.array([np.linalg.solve(g, b)
+            for g, b in zip(groups.stack(G), BB)])
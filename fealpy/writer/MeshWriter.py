@@ -1,6 +1,4 @@
 import numpy as np
-import vtk
-import vtk.util.numpy_support as vnp
 
 import multiprocessing
 import time
@@ -13,6 +11,9 @@ class MeshWriter:
             meshdata=None, 
             simulation=None):
 
+        import vtk
+        import vtk.util.numpy_support as vnp
+
         NN = node.shape[1]
         NC = cell.shape[0]
         points = vtk.vtkPoints()
@@ -29,20 +30,29 @@ class MeshWriter:
                 args=(self.queue, ))
 
     def run(self, fname='test.vtk'):
+        """
+
+        Notes
+        -----
+        For a transient simulation use `TimeSeriesWriter`, which writes
+        every step from a background thread.
+        """
+        import vtk
+        import vtk.util.numpy_support as vnp
+
         self.process.start()
         pdata = self.mesh.GetPointData()
         while True:
-            if not self.queue.empty():
-                data = self.queue.get()
-                if data is not -1:
-                    for key, val in data.items():
-                        d = vnp.numpy_to_vtk(val)
-                        d.SetName(key)
-                        pdata.AddArray(d)
-                else:
-                    print('exit program!')
-                    self.process.join()
-                    break
+            data = self.queue.get() # block until the simulation sends data
+            if not (isinstance(data, int) and data == -1):
+                for key, val in data.items():
+                    d = vnp.numpy_to_vtk(val)
+                    d.SetName(key)
+                    pdata.AddArray(d)
+            else:
+                print('exit program!')
+                self.process.join()
+                break
         writer = vtk.vtkUnstructuredGridWriter()
         writer.SetFileName(fname)
         writer.SetInputData(self.mesh)
@@ -0,0 +1,322 @@
+import os
+import queue
+import threading
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+
+# VTK cell type : (XDMF topology type, number of nodes of a cell)
+XDMFTopology = {
+        3: ('Polyline', 2),
+        5: ('Triangle', 3),
+        9: ('Quadrilateral', 4),
+        10: ('Tetrahedron', 4),
+        12: ('Hexahedron', 8),
+        13: ('Wedge', 6),
+        }
+
+VTKType = {
+        np.dtype(np.float64): 'Float64',
+        np.dtype(np.float32): 'Float32',
+        np.dtype(np.int64): 'Int64',
+        np.dtype(np.int32): 'Int32',
+        np.dtype(np.uint8): 'UInt8',
+        }
+
+
+def vtk_cell_type(mesh):
+    if hasattr(mesh, 'vtk_cell_type'):
+        return mesh.vtk_cell_type()
+    cell = mesh.entity('cell')
+    TD = mesh.top_dimension() if hasattr(mesh, 'top_dimension') else None
+    NV = cell.shape[1]
+    if NV == 2:
+        return 3
+    elif NV == 3:
+        return 5
+    elif NV == 4:
+        return 9 if TD == 2 else 10
+    elif NV == 8:
+        return 12
+    raise ValueError("Can not find the VTK cell type of the mesh!")
+
+
+class BufferPool():
+    """ A fixed number of preallocated buffers for the data of the time steps
+
+    A step is copied into a free buffer by the solver and handed to the
+    writer thread, which gives the buffer back after the step is on disk.
+    If all the buffers are in flight, `acquire` blocks, so the depth of the
+    queue and the memory are bounded.
+    """
+    def __init__(self, nslot):
+        self.nslot = nslot
+        self.slots = [{} for i in range(nslot)]
+        self.free = queue.Queue()
+        for i in range(nslot):
+            self.free.put(i)
+
+    def acquire(self, data, block=True):
+        try:
+            i = self.free.get(block=block)
+        except queue.Empty:
+            return None
+        slot = self.slots[i]
+        for key, val in data.items():
+            val = np.asarray(val)
+            buf = slot.get(key)
+            if (buf is None) or (buf.shape != val.shape) or (buf.dtype != val.dtype):
+                buf = np.empty_like(val)
+                slot[key] = buf
+            np.copyto(buf, val)
+        return i, {key: slot[key] for key in data}
+
+    def release(self, i):
+        self.free.put(i)
+
+
+class TimeSeriesWriter():
+    """ Write the data of a transient simulation step by step from a
+    background thread
+
+    The mesh is written once. Every call of `write` copies the nodal and
+    cell data into a preallocated buffer and returns at once; a thread
+    appends the step to the container:
+
+    * `*.pvd` : one `.vtu` file (raw appended binary) for every step and a
+      `.pvd` collection, the encoded mesh block is reused by all the steps;
+    * `*.xdmf` : one HDF5 file holding the mesh and the data of all the steps,
+      and an XDMF temporal collection (needs `h5py`).
+
+    The data are shared with the thread through memory, nothing is pickled,
+    and NumPy and h5py release the GIL in the file I/O.
+    """
+    def __init__(self, mesh, fname, maxsize=2, block=True):
+        """
+
+        Parameters
+        ----------
+        mesh : mesh object
+        fname : str
+            the name of the `.pvd` or `.xdmf` file
+        maxsize : int
+            the maximal number of the steps waiting to be written
+        block : bool
+            if all the buffers are in flight, wait for the writer (True) or
+            drop the step (False)
+        """
+        self.fname = fname
+        self.base, ext = os.path.splitext(fname)
+        if ext == '.pvd':
+            self.fmt = 'vtu'
+        elif ext == '.xdmf':
+            if h5py is None:
+                raise ImportError("The XDMF writer needs h5py!")
+            self.fmt = 'xdmf'
+        else:
+            raise ValueError("We don't support the file type `{}`! ".format(ext))
+
+        node = mesh.entity('node')
+        cell = mesh.entity('cell')
+        NN = node.shape[0]
+        if node.ndim == 1:
+            node = node.reshape(-1, 1)
+        if node.shape[1] < 3:
+            node = np.c_[node, np.zeros((NN, 3 - node.shape[1]))]
+        self.node = np.ascontiguousarray(node, dtype=np.float64)
+        self.cell = np.ascontiguousarray(cell, dtype=np.int64)
+        self.celltype = vtk_cell_type(mesh)
+
+        self.block = block
+        self.steps = []
+        self.ndrop = 0
+        self.error = None
+        self.pool = BufferPool(maxsize)
+        self.queue = queue.Queue()
+
+        if self.fmt == 'vtu':
+            self.init_vtu()
+        else:
+            self.init_xdmf()
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, t, nodedata=None, celldata=None):
+        """ Queue the data of the time `t`
+
+        Parameters
+        ----------
+        nodedata : dict
+            `{name: array}` of the arrays with `NN` rows
+        celldata : dict
+            `{name: array}` of the arrays with `NC` rows
+
+        Returns
+        -------
+        flag : bool
+            False if the step is dropped
+        """
+        if self.error is not None:
+            raise self.error
+        nodedata = {} if nodedata is None else nodedata
+        celldata = {} if celldata is None else celldata
+        data = {('node', k): v for k, v in nodedata.items()}
+        data.update({('cell', k): v for k, v in celldata.items()})
+        slot = self.pool.acquire(data, block=self.block)
+        if slot is None:
+            self.ndrop += 1
+            return False
+        self.queue.put((t, ) + slot)
+        return True
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            t, i, data = item
+            try:
+                if self.error is None:
+                    if self.fmt == 'vtu':
+                        self.write_vtu(t, data)
+                    else:
+                        self.write_xdmf(t, data)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.pool.release(i)
+        if self.fmt == 'xdmf':
+            self.h5.close()
+
+    def init_vtu(self):
+        NC, NV = self.cell.shape
+        offsets = np.arange(NV, NV*NC+1, NV, dtype=np.int64)
+        types = np.full(NC, self.celltype, dtype=np.uint8)
+        self.mesharrays = [
+                ('Points', None, self.node),
+                ('Cells', 'connectivity', self.cell),
+                ('Cells', 'offsets', offsets),
+                ('Cells', 'types', types)]
+
+    def write_vtu(self, t, data):
+        k = len(self.steps)
+        name = "{}_{:06d}.vtu".format(self.base, k)
+
+        arrays = []
+        for (loc, key), val in data.items():
+            arrays.append(('PointData' if loc == 'node' else 'CellData', key, val))
+        arrays += self.mesharrays
+
+        offset = 0
+        xml = {'PointData': [], 'CellData': [], 'Points': [], 'Cells': []}
+        for loc, key, val in arrays:
+            ncomp = 1 if val.ndim == 1 else val[0].size
+            attr = ' Name="{}"'.format(key) if key is not None else ''
+            xml[loc].append(
+                    '<DataArray type="{}"{} NumberOfComponents="{}" '
+                    'format="appended" offset="{}"/>'.format(
+                        VTKType[val.dtype], attr, ncomp, offset))
+            offset += 8 + val.nbytes
+
+        NN = self.node.shape[0]
+        NC = self.cell.shape[0]
+        head = ['<?xml version="1.0"?>',
+                '<VTKFile type="UnstructuredGrid" version="1.0" '
+                'byte_order="LittleEndian" header_type="UInt64">',
+                '<UnstructuredGrid>',
+                '<Piece NumberOfPoints="{}" NumberOfCells="{}">'.format(NN, NC)]
+        for loc in ['PointData', 'CellData', 'Points', 'Cells']:
+            head += ['<{}>'.format(loc)] + xml[loc] + ['</{}>'.format(loc)]
+        head += ['</Piece>', '</UnstructuredGrid>',
+                '<AppendedData encoding="raw">']
+
+        with open(name, 'wb') as f:
+            f.write(('\n'.join(head) + '\n_').encode())
+            for loc, key, val in arrays:
+                val = np.ascontiguousarray(val)
+                f.write(np.uint64(val.nbytes).tobytes())
+                f.write(val.astype(val.dtype.newbyteorder('<'), copy=False).data)
+            f.write(b'\n</AppendedData>\n</VTKFile>\n')
+
+        self.steps.append((t, os.path.basename(name)))
+        self.write_pvd()
+
+    def write_pvd(self):
+        lines = ['<?xml version="1.0"?>',
+                '<VTKFile type="Collection" version="0.1" byte_order="LittleEndian">',
+                '<Collection>']
+        for t, name in self.steps:
+            lines.append('<DataSet timestep="{!r}" part="0" file="{}"/>'.format(t, name))
+        lines += ['</Collection>', '</VTKFile>']
+        with open(self.fname, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def init_xdmf(self):
+        self.h5name = self.base + '.h5'
+        self.h5 = h5py.File(self.h5name, 'w')
+        self.h5.create_dataset('mesh/node', data=self.node)
+        self.h5.create_dataset('mesh/cell', data=self.cell)
+
+    def write_xdmf(self, t, data):
+        k = len(self.steps)
+        names = []
+        for (loc, key), val in data.items():
+            path = 'step{}/{}/{}'.format(k, loc, key)
+            self.h5.create_dataset(path, data=val)
+            names.append((loc, key, path, val.shape, val.dtype))
+        self.h5.flush()
+        self.steps.append((t, names))
+        self.write_xdmf_file()
+
+    def write_xdmf_file(self):
+        h5 = os.path.basename(self.h5name)
+        NN = self.node.shape[0]
+        NC, NV = self.cell.shape
+        topology, nv = XDMFTopology[self.celltype]
+        mesh = [
+            '<Topology TopologyType="{}" NumberOfElements="{}" NodesPerElement="{}">'.format(topology, NC, nv),
+            '<DataItem Dimensions="{} {}" NumberType="Int" Precision="8" Format="HDF">{}:/mesh/cell</DataItem>'.format(NC, NV, h5),
+            '</Topology>',
+            '<Geometry GeometryType="XYZ">',
+            '<DataItem Dimensions="{} 3" NumberType="Float" Precision="8" Format="HDF">{}:/mesh/node</DataItem>'.format(NN, h5),
+            '</Geometry>']
+        lines = ['<?xml version="1.0"?>',
+                '<Xdmf Version="3.0">',
+                '<Domain>',
+                '<Grid Name="TimeSeries" GridType="Collection" CollectionType="Temporal">']
+        for i, (t, names) in enumerate(self.steps):
+            lines.append('<Grid Name="step{}" GridType="Uniform">'.format(i))
+            lines.append('<Time Value="{!r}"/>'.format(t))
+            # every step refers to the same mesh datasets in the HDF5 file
+            lines += mesh
+            for loc, key, path, shape, dtype in names:
+                center = 'Node' if loc == 'node' else 'Cell'
+                atype = 'Scalar' if len(shape) == 1 else 'Vector'
+                ntype = 'Float' if dtype.kind == 'f' else 'Int'
+                lines += [
+                    '<Attribute Name="{}" AttributeType="{}" Center="{}">'.format(key, atype, center),
+                    '<DataItem Dimensions="{}" NumberType="{}" Precision="{}" Format="HDF">{}:/{}</DataItem>'.format(
+                        ' '.join(map(str, shape)), ntype, dtype.itemsize, h5, path),
+                    '</Attribute>']
+            lines.append('</Grid>')
+        lines += ['</Grid>', '</Domain>', '</Xdmf>']
+        with open(self.fname, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
@@ -1 +1,2 @@
 from .MeshWriter import MeshWriter
+from .TimeSeriesWriter import TimeSeriesWriter
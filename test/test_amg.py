@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+import pyamg
+from scipy.sparse.linalg import minres
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.solver import AMGSolver
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+
+for pde, n in [(CosCosData(), n), (CosCosCosData(), n-3)]:
+    mesh = pde.init_mesh(n)
+    for p in [1, 2]:
+        space = LagrangeFiniteElementSpace(mesh, p)
+        isFreeDof = ~space.boundary_dof()
+        A = space.stiff_matrix()[isFreeDof, :][:, isFreeDof].tocsr()
+        b = np.ones(A.shape[0])
+
+        amg = AMGSolver().setup(A)
+        res = []
+        x = amg.solve(b, tol=1e-10, accel='cg', residuals=res)
+        assert np.linalg.norm(b - A@x) < 1e-8*np.linalg.norm(b)
+        print(amg)
+
+        P = amg.aspreconditioner()
+        x, info = minres(A, b, M=P, tol=1e-10)
+        assert info == 0
+
+        t0 = timer()
+        ml = pyamg.ruge_stuben_solver(A)
+        t1 = timer()
+        res0 = []
+        x = ml.solve(b, tol=1e-10, accel='cg', residuals=res0)
+        t2 = timer()
+        print("TD:", space.TD, "p:", p, "N:", A.shape[0])
+        print("fealpy amg: setup:", amg.setuptime, "iters:", len(res),
+                "time per cycle:", amg.cycletime/amg.ncycle)
+        print("pyamg: setup:", t1 - t0, "iters:", len(res0),
+                "solve:", t2 - t1)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+import pyamg
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.solver import AMGManager
+from fealpy.solver.eigns import picard
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+nt = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+pde = CosCosData()
+mesh = pde.init_mesh(n)
+space = LagrangeFiniteElementSpace(mesh, 1)
+isFreeDof = ~space.boundary_dof()
+K = space.stiff_matrix()[isFreeDof, :][:, isFreeDof].tocsr()
+M = space.mass_matrix()[isFreeDof, :][:, isFreeDof].tocsr()
+u = np.ones(K.shape[0])
+
+# time steps with a varying step size: the pattern of `M + dt*K` is fixed,
+# so the coarse levels are reused across the values
+amg = AMGManager(reuse=True)
+setuptime = 0
+solvetime = 0
+for i in range(nt):
+    dt = 0.01*(1 + 0.1*i)
+    A = M + dt*K
+    b = M@u
+
+    t0 = timer()
+    ml = pyamg.ruge_stuben_solver(A)
+    t1 = timer()
+    u0 = ml.solve(b, x0=u, tol=1e-12, accel='cg')
+    t2 = timer()
+    setuptime += t1 - t0
+    solvetime += t2 - t1
+
+    u = amg.solve(A, b, x0=u, tol=1e-12, accel='cg')
+    assert np.max(np.abs(u - u0)) < 1e-8*np.max(np.abs(u0))
+
+print("rebuild every step: setup:", setuptime, "solve:", solvetime)
+print("manager:", amg)
+assert amg.nsetup < nt
+
+# without reuse, a hierarchy handed out is never changed by a later solve
+amg = AMGManager()
+A = M + 0.01*K
+ml = amg.hierarchy(A)
+amg.solve(M + 0.02*K, M@u)
+assert ml.levels[0].A is A
+assert amg.nsetup == 2
+amg = AMGManager(reuse=True)
+ml = amg.hierarchy(A)
+amg.solve(M + 0.02*K, M@u)
+assert ml.levels[0].A is A
+assert amg.nsetup == 1
+
+# the same matrix is solved again and again: the hierarchy is built once
+amg = AMGManager()
+u, d = picard(K, M, np.ones(K.shape[0]), amg=amg)
+u, d = picard(K, M, np.ones(K.shape[0]), amg=amg)
+print("picard:", d, amg)
+assert amg.nsetup == 1
+
+# a matrix with other values and a much worse condition triggers a rebuild
+# and a second solve, so the solution is still accurate
+amg = AMGManager(reuse=True, growth=1.5)
+b = M@np.ones(K.shape[0])
+amg.solve(M + 1e-6*K, b)
+for i in range(3):
+    x = amg.solve(1e-6*M + K, b)
+    r = b - (1e-6*M + K)@x
+    assert np.linalg.norm(r) < 1e-10*np.linalg.norm(b)
+print("rebuild:", amg, amg.info()['iters'])
+assert amg.nsetup == 2
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from scipy.sparse import csr_matrix
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.fem import doperator
+from fealpy.functionspace.assembly import AssemblyPlan
+
+p = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+n = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+
+pde = CosCosData()
+mesh = pde.init_mesh(n)
+space = LagrangeFiniteElementSpace(mesh, p)
+
+# the old COO path
+bcs, ws = space.integrator.get_quadrature_points_and_weights()
+gphi = space.grad_basis(bcs)
+A0 = np.einsum('i, ijkm, ijpm, j->jkp', ws, gphi, gphi, space.cellmeasure)
+cell2dof = space.cell_to_dof()
+ldof = space.number_of_local_dofs()
+gdof = space.number_of_global_dofs()
+I = np.einsum('k, ij->ijk', np.ones(ldof), cell2dof)
+J = I.swapaxes(-1, -2)
+t0 = timer()
+A0 = csr_matrix((A0.flat, (I.flat, J.flat)), shape=(gdof, gdof))
+t1 = timer()
+print("COO to CSR assembly time:", t1 - t0)
+
+t0 = timer()
+plan = space.assembly_plan()
+t1 = timer()
+print("Build the assembly plan time:", t1 - t0)
+
+A = space.stiff_matrix()
+assert abs(A - A0).max() < 1e-12
+assert np.all(A.indptr == A0.indptr) and np.all(A.indices == A0.indices)
+
+# the pattern and the scatter map do not depend on the blocks of the plan
+plan1 = AssemblyPlan(cell2dof, gdof, blocksize=7)
+assert np.all(plan1.indptr == plan.indptr)
+assert np.all(plan1.indices == plan.indices)
+assert np.all(plan1.scatter == plan.scatter)
+pos, val = plan1.block_data(slice(7, 14), np.ones((7, ldof, ldof)))
+assert np.all(np.bincount(plan.scatter[7*ldof*ldof:14*ldof*ldof],
+    minlength=plan.nnz)[pos] == val)
+
+# re-assembly with a new coefficient into the same matrix
+t0 = timer()
+space.stiff_matrix(cfun=lambda p: 2.0 + 0*p[..., 0], out=A)
+t1 = timer()
+print("Re-assembly with the plan time:", t1 - t0)
+assert abs(A - 2*A0).max() < 1e-12
+
+M = space.mass_matrix()
+M0 = doperator.mass_matrix(space, space.integrator, space.cellmeasure)
+assert abs(M - M0).max() < 1e-12
+print("nnz:", plan.nnz)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.functionspace.tabulation import tabulation, BasisTabulation
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+maxit = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+for pde, mesh in [(CosCosData(), CosCosData().init_mesh(n)),
+        (CosCosCosData(), CosCosCosData().init_mesh(2))]:
+    for p in range(1, 4):
+        space = LagrangeFiniteElementSpace(mesh, p)
+        bcs, ws = space.integrator.get_quadrature_points_and_weights()
+
+        # the cached tables are the ones computed directly, and read-only
+        hit, miss, _ = tabulation.info()
+        phi = space.basis(bcs)
+        R = space.barycentric_grad_basis(bcs)
+        assert np.all(phi == space.tabulate_basis(bcs))
+        assert np.all(R == space.tabulate_barycentric_grad_basis(bcs))
+        assert not phi.flags.writeable
+        assert space.basis(bcs) is phi
+        assert space.barycentric_grad_basis(bcs.copy()) is R
+        assert tabulation.info()[0] >= hit + 2
+
+        # one more space of the same degree shares the tables
+        other = LagrangeFiniteElementSpace(mesh, p)
+        assert other.basis(bcs) is phi
+
+        gphi = space.grad_basis(bcs)
+        Dlambda = mesh.grad_lambda()
+        assert np.allclose(gphi, np.einsum('qij, cjm->qcim', R, Dlambda))
+
+# LRU bound
+cache = BasisTabulation(maxsize=2)
+for i in range(3):
+    bc = np.array([[i, 1 - i, 0.0]])
+    cache.get('phi', space, (bc, ), lambda: bc + 0.0)
+assert cache.info() == (0, 3, 2)
+
+# the evaluations of every time step on a coarse mesh, where the
+# tabulation is a large part of the work
+pde = CosCosData()
+mesh = pde.init_mesh(2)
+space = LagrangeFiniteElementSpace(mesh, 4)
+bcs, ws = space.integrator.get_quadrature_points_and_weights()
+uh = space.interpolation(pde.solution)
+for size in [0, 128]:
+    tabulation.clear()
+    tabulation.maxsize = size
+    start = timer()
+    for i in range(maxit):
+        uh.value(bcs)
+        uh.grad_value(bcs)
+        space.mass_matrix()
+    print("maxsize: {} time: {:.4f}s".format(size, timer() - start))
+tabulation.maxsize = 128
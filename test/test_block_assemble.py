@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+#
+import sys
+import tracemalloc
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+
+p = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+n = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+blocksize = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+
+pde = CosCosCosData()
+mesh = pde.init_mesh(n)
+space = LagrangeFiniteElementSpace(mesh, p)
+NC = mesh.number_of_cells()
+ldof = space.number_of_local_dofs()
+print("NC:", NC, "gdof:", space.number_of_global_dofs())
+print("element matrices: %.1f MB"%(NC*ldof*ldof*8/2**20))
+
+def run(f, *args, **kwargs):
+    tracemalloc.start()
+    t0 = timer()
+    r = f(*args, **kwargs)
+    t1 = timer()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return r, t1 - t0, peak/2**20
+
+cfun = lambda x: 1 + x[..., 0]**2
+cases = [
+        ('stiff_matrix', space.stiff_matrix, ()),
+        ('stiff_matrix with cfun', space.stiff_matrix, (cfun, )),
+        ('mass_matrix', space.mass_matrix, ()),
+        ('source_vector', space.source_vector, (pde.source, ))]
+
+# the blocked calls go first, so the sparsity pattern of the space is built
+# in the first one and is part of its peak memory
+blocked = [run(f, *args, blocksize=blocksize) for _, f, args in cases]
+assert space.assembly_plan()._scatter is None
+for (name, f, args), (B, t1, m1) in zip(cases, blocked):
+    A, t0, m0 = run(f, *args)
+    print(name)
+    print("    whole mesh: time %.3f s, peak memory %.1f MB"%(t0, m0))
+    print("    blocksize %d: time %.3f s, peak memory %.1f MB"%(blocksize, t1, m1))
+    assert abs(A - B).max() < 1e-10
+
+# the blocks dealt out to threads, and the data array of a matrix reused
+A = space.stiff_matrix()
+B = space.stiff_matrix(blocksize=blocksize, nthreads=3)
+assert abs(A - B).max() < 1e-10
+B.data[:] = 0
+C = space.stiff_matrix(blocksize=blocksize, out=B)
+assert C is B and abs(A - C).max() < 1e-10
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+#
+import sys
+import tempfile
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.mesh.Tritree import Tritree
+from fealpy.mesh.Quadtree import Quadtree
+from fealpy.mesh.checkpoint import save_checkpoint, load_checkpoint
+from fealpy.functionspace import LagrangeFiniteElementSpace
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+
+
+def check(mesh, mesh0):
+    assert type(mesh) is type(mesh0)
+    assert np.all(mesh.entity('node') == mesh0.entity('node'))
+    for etype in ['cell', 'edge']:
+        assert np.all(mesh.entity(etype) == mesh0.entity(etype))
+    for key in ['parent', 'child']:
+        if hasattr(mesh0, key):
+            assert np.all(getattr(mesh, key) == getattr(mesh0, key))
+    assert mesh.number_of_edges() == mesh0.number_of_edges()
+    assert np.all(mesh.ds.cell_to_edge() == mesh0.ds.cell_to_edge())
+
+
+pde = CosCosData()
+mesh = pde.init_mesh(n)
+tree = Tritree(mesh.entity('node'), mesh.entity('cell'))
+bc = tree.entity_barycenter('cell')
+tree.refine(np.sum(bc**2, axis=1) < 0.1)
+
+node = np.array([(0, 0), (1, 0), (1, 1), (0, 1)], dtype=np.float)
+cell = np.array([(0, 1, 2, 3)], dtype=np.int)
+qtree = Quadtree(node, cell)
+qtree.uniform_refine(n-2)
+
+tmesh = CosCosCosData().init_mesh(n-4)
+
+with tempfile.TemporaryDirectory() as d:
+    for i, mesh in enumerate([tree, qtree, tmesh]):
+        path = d + '/mesh{}'.format(i)
+        save_checkpoint(path, mesh, meta={'step': i})
+        t0 = timer()
+        mesh0, _, meta = load_checkpoint(path)
+        t1 = timer()
+        print(type(mesh).__name__, "NC:", mesh.number_of_cells(),
+                "load time:", t1 - t0)
+        check(mesh0, mesh)
+        assert meta['step'] == i
+
+    # a refinement of the loaded tree gives the same tree as the original
+    path = d + '/mesh0'
+    mesh0, _, _ = load_checkpoint(path, mmap_mode='c')
+    bc = tree.entity_barycenter('cell')
+    isMarkedCell = tree.is_leaf_cell() & (np.sum(bc**2, axis=1) < 0.01)
+    tree.refine(isMarkedCell)
+    mesh0.refine(isMarkedCell)
+    check(mesh0, tree)
+
+    mesh = tmesh
+    space = LagrangeFiniteElementSpace(mesh, 2)
+    uh = space.interpolation(CosCosCosData().solution)
+    save_checkpoint(d + '/fun', mesh, functions={'uh': uh})
+    mesh0, functions, _ = load_checkpoint(d + '/fun')
+    uh0 = functions['uh']
+    assert uh0.space.p == 2
+    assert np.all(uh0 == uh)
+    bcs = np.array([0.25, 0.25, 0.25, 0.25])
+    assert np.max(np.abs(uh0(bcs) - uh(bcs))) < 1e-14
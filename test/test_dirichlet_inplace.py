@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from scipy.sparse.linalg import spsolve
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.boundarycondition import DirichletBC
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+
+pde = CosCosData()
+mesh = pde.init_mesh(n)
+for p in range(1, 4):
+    space = LagrangeFiniteElementSpace(mesh, p)
+    bc = DirichletBC(space, pde.dirichlet)
+    A = space.stiff_matrix()
+    b = space.source_vector(pde.source)
+
+    t0 = timer()
+    A0, b0 = bc.apply(A, b.copy())
+    t1 = timer()
+    A1, b1 = bc.apply(A.copy(), b.copy(), inplace=True)
+    t2 = timer()
+    A2, b2 = bc.apply(A.copy(), b.copy(), inplace=True)
+    t3 = timer()
+    print("p:", p, "T@A@T + Tbd:", t1 - t0, "in place:", t2 - t1,
+            "in place with the cached mask:", t3 - t2)
+
+    assert abs(A0 - A1).max() < 1e-14
+    assert np.max(np.abs(b0 - b1)) < 1e-12
+    assert A2.nnz == A.nnz
+
+    # without the lifting the rows are replaced but the matrix is not
+    # symmetric, the solution is the same
+    A3, b3 = bc.apply(A.copy(), b.copy(), inplace=True, symmetric=False)
+    x0 = spsolve(A0.tocsc(), b0)
+    x3 = spsolve(A3.tocsc(), b3)
+    assert np.max(np.abs(x0 - x3)) < 1e-10
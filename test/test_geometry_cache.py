@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+maxit = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+for mesh in [CosCosData().init_mesh(3), CosCosCosData().init_mesh(1)]:
+    bcs, ws = mesh.integrator(3).get_quadrature_points_and_weights()
+
+    # the arrays are computed once and shared
+    Dlambda = mesh.grad_lambda()
+    measure = mesh.entity_measure('cell')
+    ps = mesh.bc_to_point(bcs)
+    assert mesh.grad_lambda() is Dlambda
+    assert mesh.entity_measure('cell') is measure
+    assert mesh.bc_to_point(bcs.copy()) is ps
+    assert not Dlambda.flags.writeable
+    assert mesh.geometry_cache_info()['grad_lambda'] == (1, 1)
+
+    # all the spaces on the mesh read the same cell measure
+    space = LagrangeFiniteElementSpace(mesh, 2)
+    other = LagrangeFiniteElementSpace(mesh, 1)
+    assert space.cellmeasure is other.cellmeasure
+
+    # the assignment of the nodes starts a new geometry
+    mesh.node = 2*mesh.node
+    TD = mesh.top_dimension()
+    assert np.allclose(mesh.entity_measure('cell'), 2**TD*measure)
+    assert np.allclose(space.cellmeasure, 2**TD*measure)
+    assert np.allclose(mesh.grad_lambda(), Dlambda/2)
+    u = lambda x: np.ones(x.shape[:-1])
+    vol = space.integralalg.integral(lambda bc: u(mesh.bc_to_point(bc)))
+    assert abs(vol - 2**TD*measure.sum()) < 1e-12*vol
+
+    # the nodes moved in place
+    node = mesh.entity('node')
+    node *= 0.5
+    mesh.node_moved()
+    assert np.allclose(space.cellmeasure, measure)
+    assert np.allclose(mesh.bc_to_point(bcs), ps)
+
+    # a new topology
+    NC = mesh.number_of_cells()
+    mesh.uniform_refine()
+    assert len(mesh.entity_measure('cell')) == 2**TD*NC
+    assert len(mesh.grad_lambda()) == 2**TD*NC
+    assert abs(space.cellmeasure.sum() - measure.sum()) < 1e-12*measure.sum()
+
+# the geometric factors of every step of a transient loop
+pde = CosCosData()
+mesh = pde.init_mesh(n)
+space = LagrangeFiniteElementSpace(mesh, 1)
+uh = space.interpolation(pde.solution)
+for cache in [False, True]:
+    start = timer()
+    for i in range(maxit):
+        if not cache:
+            mesh.node_moved()
+        M = space.mass_matrix()
+        A = space.stiff_matrix()
+        b = space.source_vector(pde.source)
+        e = space.integralalg.L2_error(pde.solution, uh)
+    print("NC: {} cache: {} time: {:.4f}s".format(
+        mesh.number_of_cells(), cache, timer() - start))
+print(mesh.geometry_cache_info())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+#
+# mpirun -n 4 python3 test_halo_exchange.py 20
+#
+# The processes form a ring, every process exchanges `m` doubles with each
+# of its two neighbors. The persistent `HaloExchange` is compared with the
+# exchange which posts one receive after another and allocates the receive
+# buffers every time.
+import sys
+import numpy as np
+from timeit import default_timer as timer
+from mpi4py import MPI
+
+from fealpy.parallel import CommToplogy, HaloExchange
+
+maxk = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+nrepeat = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+size = comm.Get_size()
+left = (rank - 1)%size
+right = (rank + 1)%size
+
+
+def ring_toplogy(m):
+    """ Send the first `m` owned entries to the left and the last `m` to the
+    right, the ghosts from the left come first
+    """
+    NO = 2*m
+    ct = CommToplogy(comm)
+    ct.neighbor = set([left, right]) - set([rank])
+    if left != rank:
+        ct.sds[left] = np.arange(m)
+        ct.rds[left] = NO + np.arange(m)
+    if right != rank:
+        ct.sds[right] = np.arange(NO - m, NO)
+        ct.rds[right] = NO + m + np.arange(m)
+    if left == right != rank:
+        # two processes, the left and the right neighbors are the same
+        ct.sds[left] = np.arange(NO)
+        ct.rds[left] = NO + np.arange(NO)
+    return ct, NO
+
+
+def serial_exchange(ct, array):
+    reqs = []
+    for r in ct.neighbor:
+        reqs.append(comm.Isend(array[ct.sds[r]], dest=r, tag=rank))
+    for r in ct.neighbor:
+        data = np.zeros(len(ct.rds[r]), dtype=array.dtype)
+        req = comm.Irecv(data, source=r, tag=r)
+        req.Wait()
+        array[ct.rds[r]] = data
+    MPI.Request.Waitall(reqs)
+
+
+if rank == 0:
+    print("{:>10} {:>14} {:>14} {:>8}".format(
+        "doubles", "serial (us)", "persistent (us)", "speedup"))
+for k in range(0, maxk + 1, 2):
+    m = 2**k
+    ct, NO = ring_toplogy(m)
+    NG = sum(len(i) for i in ct.rds.values())
+    array = np.zeros(NO + NG, dtype=np.float64)
+    array[:NO] = rank*NO + np.arange(NO)
+
+    halo = HaloExchange(ct)
+    halo.exchange(array)
+    if size > 1:
+        # the ghosts are the owned entries of the neighbors
+        assert np.all(array[ct.rds[left]] == left*NO + ct.sds[right if size > 2 else left])
+    x = array.copy()
+    serial_exchange(ct, x)
+    assert np.all(x == array)
+
+    comm.Barrier()
+    start = timer()
+    for i in range(nrepeat):
+        serial_exchange(ct, array)
+    t0 = comm.allreduce(timer() - start, op=MPI.MAX)/nrepeat
+
+    comm.Barrier()
+    start = timer()
+    for i in range(nrepeat):
+        halo.begin(array)
+        halo.end(array)
+    t1 = comm.allreduce(timer() - start, op=MPI.MAX)/nrepeat
+    halo.free()
+
+    if rank == 0:
+        print("{:>10} {:>14.2f} {:>14.2f} {:>8.2f}".format(
+            m, t0*1e6, t1*1e6, t0/t1))
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+#
+import sys
+import copy
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.mesh.Tritree import Tritree
+from fealpy.mesh.Quadtree import Quadtree
+from fealpy.mesh.TriangleMesh import TriangleMeshDataStructure
+from fealpy.mesh.QuadrangleMesh import QuadrangleMeshDataStructure
+from fealpy.mesh.TetrahedronMesh import TetrahedronMeshDataStructure
+from fealpy.mesh.mesh_tools import entity_key
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+maxit = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+
+def renumber(entity, entity0, NN):
+    """ The map from the numbering of `entity` to the one of `entity0`, the
+    incremental update numbers the new entities in its own way
+    """
+    key = entity_key(entity, NN)
+    key0 = entity_key(entity0, NN)
+    assert len(key) == len(key0)
+    i = np.argsort(key)
+    i0 = np.argsort(key0)
+    assert np.all(key[i] == key0[i0])
+    e2e0 = np.zeros(len(key), dtype=np.int_)
+    e2e0[i] = i0
+    return e2e0
+
+
+def same_entity(entity, entity2cell, cell2entity, ds, name, NN):
+    """ The updated entities are the ones built from scratch up to the
+    numbering
+    """
+    entity0 = getattr(ds, name)
+    e2e0 = renumber(entity, entity0, NN)
+    assert np.all(entity0[e2e0] == entity)
+    if entity2cell is not None:
+        assert np.all(getattr(ds, name + '2cell')[e2e0] == entity2cell)
+    assert np.all(e2e0[cell2entity] == getattr(ds, 'cell_to_' + name)())
+
+
+def local_refine(tree, maxit):
+    """ Refine the leaf cells near the origin again and again, and check the
+    incremental topology against the one built from scratch
+    """
+    for i in range(maxit):
+        NC = tree.number_of_cells()
+        bc = tree.entity_barycenter('cell')
+        isMarkedCell = tree.is_leaf_cell() & (np.sum(bc**2, axis=1) < 0.01)
+
+        ds0 = copy.deepcopy(tree.ds)
+        tree.refine(isMarkedCell)
+        NN = tree.number_of_nodes()
+        cell = tree.entity('cell')
+
+        t0 = timer()
+        ds0.update(NN, cell)
+        t1 = timer()
+        if cell.shape[1] == 3:
+            ds = TriangleMeshDataStructure(NN, cell)
+        else:
+            ds = QuadrangleMeshDataStructure(NN, cell)
+        t2 = timer()
+        print(type(tree).__name__, "NC:", NC, "new cells:", len(cell) - NC,
+                "update time:", t1 - t0, "construct time:", t2 - t1)
+        assert len(cell) > NC
+        # the tables of the edges are kept from the last update
+        if i > 0:
+            assert tree.ds.edgetable is table
+        table = tree.ds.edgetable
+        for ds1 in [ds0, tree.ds]:
+            assert ds1.NE == ds.NE
+            same_entity(ds1.edge, ds1.edge2cell, ds1.cell_to_edge(), ds,
+                    'edge', NN)
+
+
+pde = CosCosData()
+mesh = pde.init_mesh(n)
+local_refine(Tritree(mesh.entity('node'), mesh.entity('cell')), maxit)
+
+node = np.array([(0, 0), (1, 0), (1, 1), (0, 1)], dtype=np.float)
+cell = np.array([(0, 1, 2, 3)], dtype=np.int)
+tree = Quadtree(node, cell)
+tree.uniform_refine(n)
+local_refine(tree, maxit)
+
+pde = CosCosCosData()
+mesh = pde.init_mesh(max(n-3, 1))
+for i in range(maxit):
+    NC = mesh.number_of_cells()
+    bc = mesh.entity_barycenter('cell')
+    isMarkedCell = np.sum(bc**2, axis=1) < 0.1
+    ds0 = copy.deepcopy(mesh.ds)
+    mesh.bisect(isMarkedCell)
+    NN = mesh.number_of_nodes()
+    cell = mesh.entity('cell')
+
+    t0 = timer()
+    ds0.update(NN, cell, np.any(cell[:NC] != ds0.cell, axis=1))
+    t1 = timer()
+    ds = TetrahedronMeshDataStructure(NN, cell)
+    t2 = timer()
+    print("TetrahedronMesh NC:", NC, "new cells:", len(cell) - NC,
+            "update time:", t1 - t0, "construct time:", t2 - t1)
+    assert len(cell) > NC
+    if i > 0:
+        assert mesh.ds.facetable is table
+    table = mesh.ds.facetable
+    for ds1 in [ds0, mesh.ds]:
+        assert (ds1.NF, ds1.NE) == (ds.NF, ds.NE)
+        same_entity(ds1.face, ds1.face2cell, ds1.cell_to_face(), ds,
+                'face', NN)
+        same_entity(ds1.edge, None, ds1.cell_to_edge(), ds, 'edge', NN)
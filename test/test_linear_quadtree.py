@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.mesh import QuadtreeMesh, QuadtreeForest
+from fealpy.mesh.QuadtreeForest import morton_encode, morton_decode
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+maxit = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+
+# Morton codes
+x = np.random.randint(0, 2**31, size=1000)
+y = np.random.randint(0, 2**31, size=1000)
+assert morton_encode(4, 2) == 0b00011000
+x0, y0 = morton_decode(morton_encode(x, y))
+assert np.all(x0 == x) and np.all(y0 == y)
+
+# [0, 2]^2, the trees 1 and 2 are rotated
+node = np.array([
+    (0, 0), (1, 0), (0, 1), (1, 1), (2, 0),
+    (2, 1), (0, 2), (1, 2), (2, 2)], dtype=np.float)
+cell = np.array([
+    (0, 1, 2, 3), (4, 5, 1, 3), (7, 6, 3, 2), (3, 5, 7, 8)], dtype=np.int)
+mesh = QuadtreeMesh(node, cell)
+
+forest = QuadtreeForest(mesh, 16)
+N = 2**forest.maxdepth
+forest.uniform_refine(2)
+assert forest.number_of_leaves() == 64
+assert np.all(np.diff(forest.keys().astype(np.float)) > 0)
+
+
+def center(forest, index=None):
+    x, y, h = forest.octant(index)
+    tree = forest.tree if index is None else forest.tree[index]
+    c = forest.tree_to_point(tree, x + h/2, y + h/2)
+    return c, h/2**forest.maxdepth
+
+
+# refine the first tree to the corner (1, 1) shared by the four trees
+for i in range(maxit):
+    c, h = center(forest)
+    isMarked = (np.max(np.abs(c - 1), axis=1) < h) & (forest.tree == 0)
+    forest.refine(isMarked)
+assert not forest.is_balanced()
+forest.balance()
+assert forest.is_balanced()
+assert np.all(np.diff(forest.keys().astype(np.float)) > 0)
+
+# the face neighbors across the trees
+c, h = center(forest)
+for f in range(4):
+    j = forest.face_neighbor(f)
+    isIn = j >= 0
+    tree, x, y, h0 = forest.neighbor_box(f)
+    c1 = forest.tree_to_point(tree[isIn], x[isIn] + h0[isIn]/2,
+            y[isIn] + h0[isIn]/2)
+    assert np.allclose(np.sum((c1 - c[isIn])**2, axis=1), h[isIn]**2)
+    # the neighbor box is next to the face, and the leaf contains its anchor
+    x1, y1, h1 = forest.octant(j[isIn])
+    assert np.all(forest.tree[j[isIn]] == tree[isIn])
+    assert np.all((x1 <= x[isIn]) & (x[isIn] < x1 + h1))
+    assert np.all((y1 <= y[isIn]) & (y[isIn] < y1 + h1))
+    # the boundary faces
+    d = np.max(np.abs(c[~isIn] - 1), axis=1)
+    assert np.allclose(d, 1 - h[~isIn]/2)
+
+# the conforming meshes of the leaves
+qmesh = forest.to_quadmesh()
+assert qmesh.number_of_cells() == forest.number_of_leaves()
+assert abs(np.sum(qmesh.entity_measure('cell')) - 4) < 1e-12
+pmesh = forest.to_polygonmesh()
+assert pmesh.number_of_nodes() == qmesh.number_of_nodes()
+assert abs(np.sum(pmesh.entity_measure('cell')) - 4) < 1e-12
+assert np.max(np.diff(pmesh.ds.cellLocation)) <= 8
+edge2cell = pmesh.ds.edge_to_cell()
+bc = pmesh.entity_barycenter('edge')[edge2cell[:, 0] == edge2cell[:, 1]]
+assert np.all(np.abs(np.max(np.abs(bc - 1), axis=1) - 1) < 1e-12)
+
+# back to the trees
+while forest.number_of_leaves() > 4:
+    forest.coarsen(np.ones(forest.number_of_leaves(), dtype=np.bool_))
+assert np.all(forest.level == 0) and np.all(forest.tree == np.arange(4))
+
+# a large adaptive forest
+forest = QuadtreeForest(mesh)
+start = timer()
+forest.uniform_refine(n)
+t0 = timer() - start
+for i in range(maxit):
+    c, h = center(forest)
+    isMarked = np.abs(np.sqrt(np.sum((c - 1)**2, axis=1)) - 0.5) < h
+    forest.refine(isMarked)
+t1 = timer() - start
+forest.balance()
+t2 = timer() - start
+pmesh = forest.to_polygonmesh()
+t3 = timer() - start
+nbytes = forest.tree.nbytes + forest.code.nbytes + forest.level.nbytes
+print("NL: {} bytes: {} refine: {:.4f}s adaptive: {:.4f}s balance: {:.4f}s"
+        " polygon mesh: {:.4f}s".format(forest.number_of_leaves(), nbytes,
+            t0, t1 - t0, t2 - t1, t3 - t2))
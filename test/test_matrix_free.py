@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+#
+import sys
+import tracemalloc
+import numpy as np
+from scipy.sparse import spdiags
+from scipy.sparse.linalg import cg
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.boundarycondition import DirichletBC
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+for pde, n in [(CosCosData(), n+1), (CosCosCosData(), n-1)]:
+    mesh = pde.init_mesh(n)
+    for p in range(1, 4):
+        space = LagrangeFiniteElementSpace(mesh, p)
+        gdof = space.number_of_global_dofs()
+        x = np.random.rand(gdof)
+
+        A = space.stiff_matrix()
+        M = space.mass_matrix()
+        for A0 in [space.stiff_operator(), space.stiff_operator(cache=True),
+                space.stiff_operator(blocksize=100),
+                space.stiff_operator(cfun=lambda p: 1.0 + 0*p[..., 0])]:
+            assert np.max(np.abs(A0@x - A@x)) < 1e-10
+            assert np.max(np.abs(A0.diagonal() - A.diagonal())) < 1e-10
+        for M0 in [space.mass_operator(), space.mass_operator(cache=True)]:
+            assert np.max(np.abs(M0@x - M@x)) < 1e-12
+            assert np.max(np.abs(M0.diagonal() - M.diagonal())) < 1e-12
+
+        # cg with the Jacobi preconditioner and without the assembled matrix
+        bc = DirichletBC(space, pde.dirichlet)
+        b = space.source_vector(pde.source)
+        AD, bD = bc.apply(A, b.copy())
+        A0, b0 = bc.apply(space.stiff_operator(), b.copy())
+        t0 = timer()
+        D = AD.diagonal()
+        u, info = cg(AD, bD, tol=1e-10, M=spdiags(1/D, 0, gdof, gdof))
+        t1 = timer()
+        D = A0.diagonal()
+        u0, info0 = cg(A0, b0, tol=1e-10, M=spdiags(1/D, 0, gdof, gdof))
+        t2 = timer()
+        assert np.max(np.abs(u - u0)) < 1e-8
+
+        # the default blocks bound the temporary arrays of a product
+        A0 = space.stiff_operator()
+        tracemalloc.start()
+        A0@x
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        nbytes = A.data.nbytes + A.indices.nbytes + A.indptr.nbytes
+        print("TD:", space.TD, "p:", p, "gdof:", gdof, "CSR bytes:", nbytes,
+                "product peak bytes:", peak,
+                "cg with CSR:", t1 - t0, "cg with operator:", t2 - t1)
+        if (space.TD == 3) and (p > 1):
+            assert peak < nbytes
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.mesh import TriangleMesh
+from fealpy.functionspace import LagrangeFiniteElementSpace, MeshTransfer
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+np.random.seed(0)
+
+
+def perturbed_mesh(n, h):
+    mesh = CosCosData().init_mesh(n)
+    node = mesh.entity('node').copy()
+    isInNode = np.all((node > 0) & (node < 1), axis=1)
+    node[isInNode] += h*(np.random.rand(isInNode.sum(), 2) - 0.5)/2**n
+    return TriangleMesh(node, mesh.entity('cell'))
+
+# two unrelated meshes of [0, 1]^2
+mesh0 = perturbed_mesh(n, 0.5)
+mesh1 = perturbed_mesh(n - 1, 0.5)
+for p0, p1 in [(1, 1), (2, 1), (1, 2), (2, 2), (3, 2)]:
+    space0 = LagrangeFiniteElementSpace(mesh0, p0)
+    space1 = LagrangeFiniteElementSpace(mesh1, p1)
+    p = min(p0, p1)
+    u = lambda x: (x[..., 0] + 2*x[..., 1])**p
+    uh0 = space0.interpolation(u)
+
+    # a polynomial in both spaces is transferred exactly
+    T = MeshTransfer(space0, space1)
+    uh1 = T(uh0)
+    assert np.max(np.abs(uh1 - space1.interpolation(u))) < 1e-12
+
+    P = MeshTransfer(space0, space1, method='projection')
+    uh1 = P(uh0)
+    assert np.max(np.abs(uh1 - space1.interpolation(u))) < 1e-10
+
+    # the integral is kept by the projection on the intersections of cells
+    f = lambda x: np.exp(x[..., 0])*np.sin(4*x[..., 1])
+    uh0 = space0.interpolation(f)
+    M0 = space0.mass_matrix()
+    M1 = space1.mass_matrix()
+    i0 = np.sum(M0@uh0)
+    i1 = np.sum(M1@P(uh0))
+    assert abs(i1 - i0) < 1e-12*abs(i0)
+
+    # many fields, one product each
+    U = np.random.rand(space0.number_of_global_dofs(), 3)
+    V = P(U)
+    assert np.max(np.abs(V[:, 1] - P(U[:, 1]))) < 1e-12
+    V = T(U)
+    assert np.max(np.abs(V[:, 2] - T(U[:, 2]))) < 1e-14
+
+# the quadrature projection on tetrahedron meshes
+mesh0 = CosCosCosData().init_mesh(2)
+mesh1 = CosCosCosData().init_mesh(1)
+space0 = LagrangeFiniteElementSpace(mesh0, 2)
+space1 = LagrangeFiniteElementSpace(mesh1, 1)
+u = lambda x: x[..., 0] + 2*x[..., 1] - x[..., 2]
+for method in ['interpolation', 'projection']:
+    uh1 = MeshTransfer(space0, space1, method=method)(space0.interpolation(u))
+    assert np.max(np.abs(uh1 - space1.interpolation(u))) < 1e-10
+
+# timing
+mesh0 = perturbed_mesh(n + 2, 0.5)
+mesh1 = perturbed_mesh(n + 1, 0.5)
+space0 = LagrangeFiniteElementSpace(mesh0, 1)
+space1 = LagrangeFiniteElementSpace(mesh1, 1)
+start = timer()
+P = MeshTransfer(space0, space1, method='projection')
+t0 = timer() - start
+U = np.random.rand(space0.number_of_global_dofs(), 10)
+start = timer()
+P(U)
+t1 = timer() - start
+print("projection: setup {:.4f}s, transfer of 10 fields {:.4f}s".format(t0, t1))
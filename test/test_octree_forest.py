@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.mesh import OctreeMesh, OctreeForest
+from fealpy.mesh.OctreeForest import morton_encode, morton_decode
+
+nmax = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+maxit = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+# Morton codes
+p = np.random.randint(0, 2**21, size=(1000, 3))
+q = np.stack(morton_decode(morton_encode(p[:, 0], p[:, 1], p[:, 2])), axis=-1)
+assert np.all(p == q)
+
+# [0, 2]^2 x [0, 1], the trees 1 and 2 are rotated
+bits = np.array([(i & 1, (i >> 1) & 1, i >> 2) for i in range(8)])
+cubes = [
+    ((0, 0, 0), np.eye(3)),
+    ((2, 0, 0), np.array([(0, 1, 0), (-1, 0, 0), (0, 0, 1)])),
+    ((0, 2, 0), np.array([(1, 0, 0), (0, 0, 1), (0, -1, 0)])),
+    ((1, 1, 0), np.eye(3))]
+point = np.concatenate([o + bits@A for o, A in cubes])
+node, cell = np.unique(point, axis=0, return_inverse=True)
+mesh = OctreeMesh(node.astype(np.float), cell.reshape(-1, 8))
+
+
+def center(forest, index=None):
+    p, h = forest.octant(index)
+    tree = forest.tree if index is None else forest.tree[index]
+    c = forest.tree_to_point(tree, p + h.reshape(-1, 1)/2)
+    return c, h/2**forest.maxdepth
+
+
+def volume(pmesh):
+    """ The volumes of the cells by the divergence theorem
+    """
+    node = pmesh.node
+    face = pmesh.ds.face
+    faceLocation = pmesh.ds.faceLocation
+    face2cell = pmesh.ds.face2cell
+    NV = np.diff(faceLocation)
+    nxt = np.arange(len(face)) + 1
+    nxt[faceLocation[1:] - 1] = faceLocation[:-1]
+    f = np.repeat(np.arange(len(NV)), NV)
+    s = np.einsum('ij, ij->i', node[face[faceLocation[f]]],
+            np.cross(node[face], node[face[nxt]]))/6
+    s = np.bincount(f, weights=s)
+    vol = np.bincount(face2cell[:, 0], weights=s,
+            minlength=pmesh.number_of_cells())
+    isInFace = face2cell[:, 0] != face2cell[:, 1]
+    vol -= np.bincount(face2cell[isInFace, 1], weights=s[isInFace],
+            minlength=pmesh.number_of_cells())
+    return vol
+
+
+def is_conforming(pmesh):
+    """ No node is in the interior of an edge
+    """
+    node = pmesh.node
+    edge = pmesh.ds.edge
+    nodes = set(map(tuple, np.round(node, 10)))
+    for t in [0.25, 0.5, 0.75]:
+        ps = np.round((1 - t)*node[edge[:, 0]] + t*node[edge[:, 1]], 10)
+        if any(tuple(x) in nodes for x in ps):
+            return False
+    return True
+
+
+forest = OctreeForest(mesh, 10)
+forest.uniform_refine(1)
+# refine the first tree to the edge x = y = 1
+for i in range(maxit):
+    c, h = center(forest)
+    isMarked = (np.max(np.abs(c[:, :2] - 1), axis=1) < h) & (forest.tree == 0)
+    forest.refine(isMarked)
+assert not forest.is_balanced(edge=False)
+forest.balance(edge=False)
+assert forest.is_balanced(edge=False)
+forest.balance()
+assert forest.is_balanced()
+assert np.all(np.diff(forest.keys().astype(np.float)) > 0)
+
+# the face neighbors across the trees
+c, h = center(forest)
+for f in range(6):
+    j = forest.face_neighbor(f)
+    isIn = j >= 0
+    tree, q, h0, _ = forest.neighbor_box(f)
+    c1 = forest.tree_to_point(tree[isIn], q[isIn] + h0[isIn, None]/2)
+    assert np.allclose(np.sum((c1 - c[isIn])**2, axis=1), h[isIn]**2)
+    p1, h1 = forest.octant(j[isIn])
+    assert np.all(forest.tree[j[isIn]] == tree[isIn])
+    assert np.all((p1 <= q[isIn]) & (q[isIn] < p1 + h1[:, None]))
+
+# the edge neighbors
+for f, g in forest.directions()[6:]:
+    tree, q, h0, _ = forest.neighbor_box(f, g=g)
+    isIn = tree >= 0
+    c1 = forest.tree_to_point(tree[isIn], q[isIn] + h0[isIn, None]/2)
+    assert np.allclose(np.sum((c1 - c[isIn])**2, axis=1), 2*h[isIn]**2)
+
+# the polyhedral mesh of the leaves
+pmesh = forest.to_polyhedronmesh()
+NL = forest.number_of_leaves()
+assert pmesh.number_of_cells() == NL
+assert not pmesh.check()
+assert is_conforming(pmesh)
+assert np.allclose(volume(pmesh), h**3)
+
+# back to the trees
+while forest.number_of_leaves() > 4:
+    forest.coarsen(np.ones(forest.number_of_leaves(), dtype=np.bool_))
+assert np.all(forest.level == 0) and np.all(forest.tree == np.arange(4))
+
+# adaptive forests to a sphere
+for n in range(2, nmax + 1):
+    forest = OctreeForest(mesh)
+    start = timer()
+    forest.uniform_refine(n)
+    for i in range(2):
+        c, h = center(forest)
+        r = np.sqrt(np.sum((c - (1, 1, 0.5))**2, axis=1))
+        forest.refine(np.abs(r - 0.4) < h)
+    t0 = timer() - start
+    forest.balance()
+    t1 = timer() - start
+    pmesh = forest.to_polyhedronmesh()
+    t2 = timer() - start
+    nbytes = forest.tree.nbytes + forest.code.nbytes + forest.level.nbytes
+    print("NL: {} bytes: {} refine: {:.4f}s balance: {:.4f}s"
+            " polyhedron mesh: {:.4f}s".format(forest.number_of_leaves(),
+                nbytes, t0, t1 - t0, t2 - t1))
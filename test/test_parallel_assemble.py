@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+#
+import os
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+
+p = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+n = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+pde = CosCosCosData()
+mesh = pde.init_mesh(n)
+space = LagrangeFiniteElementSpace(mesh, p)
+space.assembly_plan()
+print("NC:", mesh.number_of_cells(), "gdof:", space.number_of_global_dofs())
+
+cfun = lambda x: 1 + x[..., 0]**2
+
+# the reference tensor path (cfun is None) and the quadrature path
+for c in [None, cfun]:
+    t0 = timer()
+    A0 = space.stiff_matrix(cfun=c)
+    t1 = timer()
+    B0 = space.stiff_matrix(cfun=c, blocksize=2000)
+    t2 = timer()
+    print("cfun: %s serial: %.3f s, with blocksize 2000: %.3f s"%(
+        c is not None, t1 - t0, t2 - t1))
+    assert abs(B0 - A0).max() < 1e-12*abs(A0).max()
+
+    ncores = os.cpu_count()
+    threads = sorted(set([1, 2, 3, 4] + [2**i for i in range(8) if 2**i <= ncores]))
+    for nthreads in threads:
+        t0 = timer()
+        A = space.stiff_matrix(cfun=c, nthreads=nthreads)
+        t1 = timer()
+        B = space.stiff_matrix(cfun=c, blocksize=2000, nthreads=nthreads)
+        t2 = timer()
+        print("%2d threads: %.3f s, with blocksize 2000: %.3f s"%(
+            nthreads, t1 - t0, t2 - t1))
+        # the blocks do not depend on the threads and are reduced in order
+        assert np.array_equal(A.indices, A0.indices)
+        assert np.array_equal(A.data, A0.data)
+        assert np.array_equal(B.data, B0.data)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#
+# mpirun -n 4 python3 test_parallel_fem.py 6 1 amg
+#
+# Run it with 1, 2, 4 processes to get the strong scaling of the setup, the
+# assembly and the solve.
+import sys
+import numpy as np
+from scipy.sparse.linalg import spsolve
+from timeit import default_timer as timer
+from mpi4py import MPI
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.boundarycondition import DirichletBC
+from fealpy.parallel import ParaMesh, ParaLagrangeFiniteElementSpace
+from fealpy.parallel import ParaAlgorithm
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+p = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+precond = sys.argv[3] if len(sys.argv) > 3 else 'jacobi'
+check = bool(int(sys.argv[4])) if len(sys.argv) > 4 else True
+
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+size = comm.Get_size()
+
+pde = CosCosData()
+mesh = pde.init_mesh(n)
+
+comm.Barrier()
+t0 = timer()
+pmesh = ParaMesh(comm, mesh)
+space = ParaLagrangeFiniteElementSpace(pmesh, p)
+comm.Barrier()
+t1 = timer()
+A = space.stiff_matrix()
+b = space.source_vector(pde.source)
+A, b, x0 = space.set_dirichlet_bc(A, b, pde.dirichlet)
+comm.Barrier()
+t2 = timer()
+if precond == 'jacobi':
+    M = A.jacobi()
+elif precond == 'amg':
+    M = A.block_amg()
+else:
+    M = None
+alg = ParaAlgorithm(comm)
+x, niter = alg.cg(A, b, x0=x0, M=M, tol=1e-10)
+comm.Barrier()
+t3 = timer()
+
+# the distributed matrix is the global one
+y = np.random.rand(space.number_of_owned_dofs())
+Ay = A@y
+ndof = comm.allreduce(space.number_of_owned_dofs())
+assert ndof == space.number_of_global_dofs()
+
+if check:
+    gidx = comm.gather(space.gidx[:space.NO], root=0)
+    gp = comm.gather(space.interpolation_points()[:space.NO], root=0)
+    gx = comm.gather(x, root=0)
+    gy = comm.gather(y, root=0)
+    gAy = comm.gather(Ay, root=0)
+    if rank == 0:
+        # the owned dofs are numbered process by process
+        gidx = np.concatenate(gidx)
+        assert np.all(gidx == np.arange(ndof))
+        S = LagrangeFiniteElementSpace(mesh, p)
+        # the serial dofs of the distributed ones, matched by their points
+        gp = np.round(np.concatenate(gp), 10)
+        sp = np.round(S.interpolation_points(), 10)
+        idx = np.zeros(ndof, dtype=np.int_)
+        idx[np.lexsort(gp.T)] = np.lexsort(sp.T)
+        assert np.all(sp[idx] == gp)
+        bc = DirichletBC(S, pde.dirichlet)
+        A0, b0 = bc.apply(S.stiff_matrix(), S.source_vector(pde.source))
+        x0 = spsolve(A0, b0)
+        y0 = np.zeros(S.number_of_global_dofs())
+        y0[idx] = np.concatenate(gy)
+        Ay0 = A0@y0
+        assert np.max(np.abs(Ay0[idx] - np.concatenate(gAy))) < 1e-10
+        assert np.max(np.abs(x0[idx] - np.concatenate(gx))) < 1e-8
+
+if rank == 0:
+    print("processes: {}, dofs: {}, {} iterations with {}".format(
+        size, space.number_of_global_dofs(), niter, precond))
+    print("setup: {:.4f}s, assembly: {:.4f}s, solve: {:.4f}s".format(
+        t1 - t0, t2 - t1, t3 - t2))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.mesh import PointLocator, PolygonMesh, rectangledomainmesh
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.functionspace.ScaledMonomialSpace2d import ScaledMonomialSpace2d
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+N = int(sys.argv[2]) if len(sys.argv) > 2 else 10**6
+
+np.random.seed(0)
+
+# the simplex meshes of [0, 1]^d, and `uh.probe` of the Lagrange functions
+for mesh in [CosCosData().init_mesh(4), CosCosCosData().init_mesh(2)]:
+    node = mesh.entity('node')
+    cell = mesh.entity('cell')
+    GD = node.shape[1]
+    locator = PointLocator(mesh)
+    points = np.r_[np.random.rand(1000, GD), node, np.full((1, GD), 2.0)]
+    cellidx, bc = locator.locate(points)
+    isFound = cellidx >= 0
+    assert np.all(isFound[:-1]) and (not isFound[-1])
+    assert np.min(bc[isFound]) > -1e-10
+    p = np.einsum('ij, ijk->ik', bc[isFound], node[cell[cellidx[isFound]]])
+    assert np.max(np.abs(p - points[isFound])) < 1e-12
+
+    # walk from random cells
+    start = np.random.randint(0, mesh.number_of_cells(), len(points))
+    cellidx, bc = locator.locate(points, start=start)
+    isFound = cellidx >= 0
+    p = np.einsum('ij, ijk->ik', bc[isFound], node[cell[cellidx[isFound]]])
+    assert np.max(np.abs(p - points[isFound])) < 1e-12
+
+    for p in range(1, 4):
+        space = LagrangeFiniteElementSpace(mesh, p)
+        uh = space.interpolation(lambda x: np.sum(x, axis=-1)**p)
+        val = uh.probe(points)
+        assert np.isnan(val[-1])
+        assert np.max(np.abs(val[:-1] - np.sum(points[:-1], axis=-1)**p)) < 1e-12
+
+# the quadrangle and the polygon meshes
+mesh = rectangledomainmesh([0, 1, 0, 1], 8, 8, meshtype='quad')
+node = mesh.entity('node')
+isInNode = np.all((node > 0) & (node < 1), axis=1)
+node[isInNode] += 0.03*np.random.rand(isInNode.sum(), 2)
+cell = mesh.entity('cell')
+points = np.random.rand(1000, 2)
+locator = PointLocator(mesh)
+for start in [None, np.random.randint(0, mesh.number_of_cells(), len(points))]:
+    cellidx, bc = locator.locate(points, start=start)
+    p = np.einsum('ij, ijk->ik', bc, node[cell[cellidx]])
+    assert np.all(cellidx >= 0)
+    assert np.max(np.abs(p - points)) < 1e-12
+
+qcellidx = cellidx
+mesh = PolygonMesh(node, cell)
+locator = PointLocator(mesh)
+cellidx, bc = locator.locate(points)
+assert np.all(cellidx == qcellidx)
+space = ScaledMonomialSpace2d(mesh, 1)
+uh = space.function()
+uh[:] = np.random.rand(len(uh))
+val = uh.probe(points)
+assert np.max(np.abs(val - space.value(uh, points, cellidx=cellidx))) < 1e-14
+
+# benchmark
+mesh = CosCosData().init_mesh(n)
+NC = mesh.number_of_cells()
+points = np.random.rand(N, 2)
+start = timer()
+locator = PointLocator(mesh)
+t0 = timer() - start
+start = timer()
+cellidx, bc = locator.locate(points)
+t1 = timer() - start
+assert np.all(cellidx >= 0)
+print("{} cells, build: {:.3f}s; {} points, locate: {:.3f}s ({:.2f} us/point)".format(
+    NC, t0, N, t1, t1/N*1e6))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+from fealpy.recovery import FEMFunctionRecoveryAlg
+from fealpy.recovery.FEMFunctionRecoveryAlg import scaleCoor
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+
+
+def fit(x, val, quadratic=False):
+    """ The least squares fit on one patch, in the scaled coordinates
+    """
+    tempx, center, h = scaleCoor(x)
+    X = np.ones((len(x), 6 if quadratic else 3))
+    X[:, 1:3] = tempx
+    if quadratic:
+        X[:, 3] = tempx[:, 0]*tempx[:, 1]
+        X[:, 4:6] = tempx**2
+    return np.linalg.solve(X.T@X, X.T@val), center, h
+
+
+def patches(mesh):
+    """ The dense node-to-cell and node-to-node relations of the old loops
+    """
+    NN = mesh.number_of_nodes()
+    cell = mesh.entity('cell')
+    t2p = np.zeros((len(cell), NN), dtype=np.int)
+    t2p[np.arange(len(cell)).repeat(3), cell.flat] = 1
+    return t2p, t2p.T@t2p
+
+
+def scr_loop(uh):
+    """ The per-node loop of SCR
+    """
+    mesh = uh.space.mesh
+    node = mesh.entity('node')
+    _, p2p = patches(mesh)
+    rguh = np.zeros((len(node), 2))
+    for i in range(len(node)):
+        np1, = np.nonzero(p2p[:, i])
+        c, _, h = fit(node[np1], uh[np1])
+        rguh[i] = c[1:3]/h
+    return rguh
+
+
+def zz_loop(uh):
+    """ The per-node loop of ZZ
+    """
+    mesh = uh.space.mesh
+    node = mesh.entity('node')
+    xnode = mesh.entity_barycenter('cell')
+    isBdNode = mesh.ds.boundary_node_flag()
+    t2p, p2p = patches(mesh)
+    guh = uh.grad_value(np.array([1/3]*3))
+
+    def value(i, ne):
+        c, center, h = fit(xnode[ne], guh[ne])
+        return (node[i] - center)@c[1:3]/h + c[0]
+
+    rguh = np.zeros((len(node), 2))
+    for i in range(len(node)):
+        if isBdNode[i]:
+            np1, = np.nonzero(p2p[:, i])
+            ip = np1[~isBdNode[np1]]
+            if len(ip) == 0:
+                rguh[i] = np.mean(guh[t2p[:, i] > 0], axis=0)
+            else:
+                rguh[i] = np.mean([value(i, np.nonzero(t2p[:, k])[0])
+                    for k in ip], axis=0)
+        else:
+            rguh[i] = value(i, np.nonzero(t2p[:, i])[0])
+    return rguh
+
+
+def ppr_loop(uh):
+    """ The per-node loop of PPR
+    """
+    mesh = uh.space.mesh
+    node = mesh.entity('node')
+    cell = mesh.entity('cell')
+    isBdNode = mesh.ds.boundary_node_flag()
+    neighbor = mesh.ds.cell_to_cell()
+    t2p, p2p = patches(mesh)
+    rguh = np.zeros((len(node), 2))
+    for i in range(len(node)):
+        np1, = np.nonzero(p2p[i, :])
+        if isBdNode[i]:
+            ip = np1[~isBdNode[np1]]
+            if (len(ip) == 0) or (len(np1) < 6):
+                np1 = np.unique(np.nonzero(p2p[np1, :])[1])
+            else:
+                np1 = np.unique(np.r_[np1, np.nonzero(p2p[ip[0], :])[0]])
+        elif len(np1) < 6:
+            ne, = np.nonzero(t2p[:, i])
+            e = np.unique(np.r_[ne, neighbor[ne].flat])
+            np1 = np.unique(cell[e])
+        cc, center, h = fit(node[np1], uh[np1], quadratic=True)
+        x = (node[i] - center)/h
+        rguh[i, 0] = (cc[1] + cc[3]*x[1] + 2*cc[4]*x[0])/h
+        rguh[i, 1] = (cc[2] + cc[3]*x[0] + 2*cc[5]*x[1])/h
+    return rguh
+
+
+pde = CosCosData()
+ralg = FEMFunctionRecoveryAlg()
+
+# the vectorized recovery is the same as the per-node loops
+mesh = pde.init_mesh(3)
+node = mesh.entity('node')
+node[:] += 0.02*np.sin(7*node[:, [1, 0]])*(1 - node**2)
+space = LagrangeFiniteElementSpace(mesh, 1)
+uh = space.interpolation(pde.solution)
+for name, loop in [('SCR', scr_loop), ('ZZ', zz_loop), ('PPR', ppr_loop)]:
+    rguh = getattr(ralg, name)(uh)
+    e = np.max(np.abs(rguh - loop(uh)))
+    print(name, "difference to the loop:", e)
+    assert e < 1e-10
+
+mesh = pde.init_mesh(n)
+space = LagrangeFiniteElementSpace(mesh, 1)
+uh = space.interpolation(pde.solution)
+node = mesh.entity('node')
+gu = pde.gradient(node)
+isBdNode = mesh.ds.boundary_node_flag()
+
+for name in ['SCR', 'ZZ', 'PPR']:
+    t0 = timer()
+    rguh = getattr(ralg, name)(uh)
+    t1 = timer()
+    e = np.max(np.abs(rguh - gu)[~isBdNode])
+    print(name, "NN:", mesh.number_of_nodes(), "time:", t1 - t0,
+            "interior max error:", e)
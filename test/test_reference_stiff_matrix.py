@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.functionspace import LagrangeFiniteElementSpace
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+for pde, n in [(CosCosData(), n), (CosCosCosData(), n-3)]:
+    mesh = pde.init_mesh(n)
+    for p in range(1, 5):
+        space = LagrangeFiniteElementSpace(mesh, p)
+        bcs, ws = space.integrator.get_quadrature_points_and_weights()
+
+        t0 = timer()
+        gphi = space.grad_basis(bcs)
+        A0 = np.einsum('i, ijkm, ijpm, j->jkp', ws, gphi, gphi,
+                space.cellmeasure, optimize=True)
+        A0 = space.assembly_plan().assemble(A0)
+        t1 = timer()
+        A = space.stiff_matrix()
+        t2 = timer()
+
+        print("TD:", space.TD, "p:", p,
+                "grad_basis time:", t1 - t0,
+                "reference tensor time:", t2 - t1)
+        assert abs(A - A0).max() < 1e-10
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+#
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.pde.poisson_3d import CosCosCosData
+
+for mesh in [CosCosData().init_mesh(6), CosCosCosData().init_mesh(3)]:
+    ds = mesh.ds
+    t0 = timer()
+    for i in range(10):
+        cell2cell = ds.cell_to_cell()
+        node2cell = ds.node_to_cell()
+        isBdNode = ds.boundary_node_flag()
+    t1 = timer()
+    print("10 queries:", t1 - t0)
+    print(ds.relation_cache_info())
+    assert ds.relation_cache_info()['cell_to_cell'] == (9, 1)
+
+    # the cached arrays are shared, so they can not be changed
+    try:
+        cell2cell[0, 0] = -1
+        raise AssertionError("the cached relation is writeable!")
+    except ValueError:
+        pass
+
+    # and neither can the cached sparse matrices
+    node2node = ds.node_to_node()
+    nnz = node2node.nnz
+    try:
+        node2node.data[:] = 0
+        raise AssertionError("the cached sparse relation is writeable!")
+    except ValueError:
+        pass
+    node2node.data = np.zeros(nnz, dtype=node2node.dtype)
+    assert ds.node_to_node().count_nonzero() == nnz
+
+    # the same relation with the default arguments written out
+    assert ds.cell_to_cell(return_sparse=False) is cell2cell
+
+    # reinit drops all the cached relations
+    version = ds.relationcache.version
+    NC = mesh.number_of_cells()
+    mesh.uniform_refine()
+    assert ds.relationcache.version > version
+    assert ds.cell_to_cell().shape[0] == mesh.number_of_cells()
+    assert ds.node_to_cell().shape[0] == mesh.number_of_nodes()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.mesh.StructureQuadMesh import StructureQuadMesh
+from fealpy.mesh.StructureHexMesh import StructureHexMesh
+from fealpy.pde.darcy_forchheimer_2d import SinsinData
+from fealpy.fdm.DarcyForchheimerFDMModel import DarcyForchheimerFDMModel
+from fealpy.fdm.DarcyForchheimerFDMModel import diagonal_index
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+maxit = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+mesh = StructureQuadMesh([0, 2, 0, 1], 5, 3)
+ds = mesh.ds
+NC = mesh.number_of_cells()
+NE = mesh.number_of_edges()
+
+# the nodes and the connectivity are built once
+assert mesh.node is mesh.node
+assert ds.cell is ds.cell
+assert not mesh.node.flags.writeable
+assert mesh.geo_dimension() == 2
+x, y = mesh.coordinates()
+assert np.all(ds.node_view(mesh.node)[:, 0, 0] == x)
+assert np.all(ds.node_view(mesh.node)[0, :, 1] == y)
+
+# the index arithmetic is the same as the relations of `edge2cell`
+node = mesh.node
+cell = ds.cell
+edge = ds.edge
+edge2cell = ds.edge2cell
+cell2edge = ds.cell_to_edge()
+cell2cell = ds.cell_to_cell()
+assert np.all(cell2edge[edge2cell[:, 0], edge2cell[:, 2]] == np.arange(NE))
+assert np.all(cell2edge[edge2cell[:, 1], edge2cell[:, 3]] == np.arange(NE))
+assert np.all(cell2cell[edge2cell[:, 0], edge2cell[:, 2]] == edge2cell[:, 1])
+assert np.all(cell2cell[edge2cell[:, 1], edge2cell[:, 3]] == edge2cell[:, 0])
+isBdEdge = ds.boundary_edge_flag()
+assert np.all(isBdEdge == (edge2cell[:, 0] == edge2cell[:, 1]))
+isBdNode = np.zeros(mesh.number_of_nodes(), dtype=np.bool_)
+isBdNode[edge[isBdEdge]] = True
+assert np.all(ds.boundary_node_flag() == isBdNode)
+for t in range(4):
+    assert np.all(ds.boundary_cell_flag(t) == (cell2cell[:, t] == np.arange(NC)))
+
+# the barycenters and the measures by the mesh sizes
+assert np.allclose(mesh.entity_barycenter('cell'), np.mean(node[cell], axis=1))
+assert np.allclose(mesh.entity_barycenter('edge'), np.mean(node[edge], axis=1))
+l = np.sqrt(np.sum((node[edge[:, 1]] - node[edge[:, 0]])**2, axis=1))
+assert np.allclose(mesh.entity_measure('edge'), l)
+assert np.allclose(np.sum(mesh.entity_measure('cell')), 2)
+
+# the edge views are between the cells of the grid
+bc = mesh.entity_barycenter('cell')
+ebc = mesh.entity_barycenter('edge')
+c = ds.cell_view(bc)
+assert np.allclose(ds.y_direction_edge_view(ebc)[1:-1], (c[1:] + c[:-1])/2)
+assert np.allclose(ds.x_direction_edge_view(ebc)[:, 1:-1], (c[:, 1:] + c[:, :-1])/2)
+
+# the hexahedron mesh
+mesh = StructureHexMesh([0, 1, 0, 1, 0, 1], 3, 4, 2)
+ds = mesh.ds
+face2cell = ds.face2cell
+assert mesh.geo_dimension() == 3
+assert ds.cell is ds.cell
+assert np.all(ds.boundary_face_flag() == (face2cell[:, 0] == face2cell[:, 1]))
+isBdNode = np.zeros(mesh.number_of_nodes(), dtype=np.bool_)
+isBdNode[ds.face[ds.boundary_face_flag()]] = True
+assert np.all(ds.boundary_node_flag() == isBdNode)
+
+# the linear system of the Darcy-Forchheimer model on a large grid
+pde = SinsinData([0, 1, 0, 1], 2, 1, 1, 30, 1e-9)
+mesh = pde.init_mesh(n, n)
+start = timer()
+for i in range(maxit):
+    mesh.geo_dimension()
+t0 = timer() - start
+fdm = DarcyForchheimerFDMModel(pde, mesh)
+start = timer()
+A = fdm.get_left_matrix()
+b = fdm.get_right_vector()
+t1 = timer() - start
+print("NC: {} geo_dimension: {:.4f}s linear system: {:.4f}s".format(
+    mesh.number_of_cells(), t0, t1))
+
+# only the diagonal of `A11` changes with the velocity in the nonlinear loop
+NE = mesh.number_of_edges()
+fdm.uh0[:] = np.random.rand(NE)
+A1 = fdm.get_left_matrix()
+idx = diagonal_index(A, NE)
+assert np.all(A1.data[idx] == fdm.get_nonlinear_coef())
+A.data[idx] = fdm.get_nonlinear_coef()
+assert abs(A - A1).max() == 0
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_3d import CosCosCosData
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+maxit = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+mesh = CosCosCosData().init_mesh(n)
+vol = np.sum(mesh.entity_measure('cell'))
+for i in range(maxit):
+    NN = mesh.number_of_nodes()
+    node = mesh.entity('node').copy()
+    bc = mesh.entity_barycenter('cell')
+    isMarkedCell = np.sum(bc**2, axis=1) < 0.3
+    start = timer()
+    IM = mesh.bisect(isMarkedCell, returnim=True)
+    t = timer() - start
+
+    node1 = mesh.entity('node')
+    cell = mesh.entity('cell')
+    # the new nodes are interpolated linearly from the old ones
+    assert np.max(np.abs(IM@node - node1)) < 1e-12
+    # the cells keep the volume of the domain and are not degenerate
+    measure = mesh.entity_measure('cell')
+    assert np.all(np.abs(measure) > 0)
+    assert abs(np.sum(measure) - vol) < 1e-12*vol
+
+    # conforming: the faces in only one cell are on the boundary of the cube
+    face2cell = mesh.ds.face_to_cell()
+    isBdFace = face2cell[:, 0] == face2cell[:, 1]
+    bc = mesh.entity_barycenter('face')[isBdFace]
+    assert np.all(np.abs(np.max(np.abs(bc), axis=1) - 1) < 1e-12)
+    print("NC: {} NN: {} time: {:.4f}s".format(
+        mesh.number_of_cells(), mesh.number_of_nodes(), t))
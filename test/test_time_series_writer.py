@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+#
+import os
+import re
+import sys
+import tempfile
+import numpy as np
+import xml.etree.ElementTree as ET
+from timeit import default_timer as timer
+
+from fealpy.pde.poisson_2d import CosCosData
+from fealpy.writer import TimeSeriesWriter
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+nt = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+
+def read_vtu(fname):
+    """ Read the appended raw arrays of a vtu file in the order of their
+    offsets
+    """
+    with open(fname, 'rb') as f:
+        s = f.read()
+    i = s.index(b'<AppendedData encoding="raw">')
+    head = s[:i].decode()
+    data = s[s.index(b'_', i)+1:]
+    arrays = {}
+    for m in re.finditer(r'<DataArray type="(\w+)"(?: Name="(\w+)")? '
+            r'NumberOfComponents="(\d+)" format="appended" offset="(\d+)"/>', head):
+        dtype, name, ncomp, offset = m.groups()
+        offset = int(offset)
+        nbytes = int(np.frombuffer(data[offset:offset+8], dtype=np.uint64)[0])
+        val = np.frombuffer(data[offset+8:offset+8+nbytes], dtype=dtype.lower())
+        arrays[name] = val
+    return arrays
+
+
+mesh = CosCosData().init_mesh(n)
+node = mesh.entity('node')
+NC = mesh.number_of_cells()
+
+with tempfile.TemporaryDirectory() as d:
+    fname = os.path.join(d, 'heat.pvd')
+    u = np.zeros(len(node))
+    t0 = timer()
+    with TimeSeriesWriter(mesh, fname, maxsize=4) as writer:
+        for i in range(nt):
+            u[:] = np.sin(np.pi*node[:, 0])*np.exp(-i*0.1)
+            writer.write(i*0.1, nodedata={'u': u}, celldata={'id': np.arange(NC)})
+        t1 = timer()
+    t2 = timer()
+    print("solver loop:", t1 - t0, "with the writer closed:", t2 - t0)
+
+    root = ET.parse(fname).getroot()
+    files = [e.get('file') for e in root.iter('DataSet')]
+    assert len(files) == nt
+    for i, f in enumerate(files):
+        arrays = read_vtu(os.path.join(d, f))
+        u = np.sin(np.pi*node[:, 0])*np.exp(-i*0.1)
+        assert np.all(arrays['u'] == u)
+        assert np.all(arrays['id'] == np.arange(NC))
+        assert np.all(arrays['connectivity'] == mesh.entity('cell').flat)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+from fealpy.mesh.simple_mesh_generator import rectangledomainmesh
+from fealpy.pde.poisson_3d import CosCosCosData
+from fealpy.mesh.mesh_tools import unique_entity
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+def old_unique(totalEntity):
+    _, i0, j = np.unique(
+            np.sort(totalEntity, axis=1),
+            return_index=True,
+            return_inverse=True,
+            axis=0)
+    return i0, j
+
+def check(name, totalEntity, NN):
+    t0 = timer()
+    i0, j = old_unique(totalEntity)
+    t1 = timer()
+    i1, j1 = unique_entity(totalEntity, NN)
+    t2 = timer()
+    print("%s with %d rows: np.unique(axis=0) %.3f s, unique_entity %.3f s"%(
+        name, len(totalEntity), t1 - t0, t2 - t1))
+    assert np.all(i0 == i1) and np.all(j == j1)
+
+mesh = rectangledomainmesh([0, 1, 0, 1], nx=10, ny=10, meshtype='tri')
+mesh.uniform_refine(n+4)
+check('triangle edges', mesh.ds.total_edge(), mesh.number_of_nodes())
+
+mesh = CosCosCosData().init_mesh(n+1)
+NN = mesh.number_of_nodes()
+check('tetrahedron faces', mesh.ds.total_face(), NN)
+check('tetrahedron edges', mesh.ds.total_edge(), NN)
+
+# the lexsort path
+totalFace = mesh.ds.total_face()
+i0, j = old_unique(totalFace)
+i1, j1 = unique_entity(totalFace, 2**22)
+assert np.all(i0 == i1) and np.all(j == j1)
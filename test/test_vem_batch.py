@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#
+import sys
+import numpy as np
+from numpy.linalg import inv
+from timeit import default_timer as timer
+
+from fealpy.mesh import PolygonMesh
+from fealpy.mesh.Quadtree import Quadtree
+from fealpy.functionspace import ConformingVirtualElementSpace2d
+
+p = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+n = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+# a polygon mesh with cells of 4 to 8 or more vertices
+np.random.seed(0)
+node = np.array([(0, 0), (1, 0), (1, 1), (0, 1)], dtype=np.float)
+cell = np.array([(0, 1, 2, 3)], dtype=np.int)
+tree = Quadtree(node, cell)
+tree.uniform_refine(n)
+for i in range(3):
+    NC = tree.number_of_cells()
+    tree.refine(tree.is_leaf_cell() & (np.random.rand(NC) < 0.3))
+mesh = tree.to_pmesh()
+NV = mesh.number_of_vertices_of_cells()
+print("NC:", mesh.number_of_cells(), "vertices:", np.unique(NV))
+
+t0 = timer()
+space = ConformingVirtualElementSpace2d(mesh, p)
+A = space.stiff_matrix()
+t1 = timer()
+print("Batched space and stiff matrix time:", t1 - t0)
+
+# the per-cell computation
+t0 = timer()
+cell2dof, cell2dofLocation = space.cell_to_dof()
+BB = np.hsplit(space.B, cell2dofLocation[1:-1])
+DD = np.vsplit(space.D, cell2dofLocation[1:-1])
+for i, (b, d) in enumerate(zip(BB, DD)):
+    G = b@d
+    PI1 = inv(G)@b
+    assert np.allclose(PI1, space.PI1[i])
+    assert np.allclose(space.PI0[i], inv(space.H[i])@space.C[i])
+    if p > 1:
+        assert np.allclose(G, space.G[i])
+t1 = timer()
+print("Per-cell check time:", t1 - t0)
+
+# the constant is in the kernel of the stiffness matrix
+gdof = space.number_of_global_dofs()
+u = space.interpolation(lambda x: np.ones(x.shape[:-1]))
+assert np.abs(A@u).max() < 1e-10
+assert abs(A - A.T).max() < 1e-10
+
+# a single polygon, the mesh has no interior edges
+node = np.array([(-1, -1), (1, -1), (1, 1), (0, 1.5), (-1, 1)], dtype=np.float)
+cell = np.array([0, 1, 2, 3, 4], dtype=np.int)
+cellLocation = np.array([0, 5], dtype=np.int)
+mesh = PolygonMesh(node, cell, cellLocation)
+space = ConformingVirtualElementSpace2d(mesh, p)
+A = space.stiff_matrix()
+b, d = space.B, space.D
+assert np.allclose(space.PI1[0], inv(b@d)@b)
+assert np.allclose(space.PI0[0], inv(space.H[0])@space.C[0])
+u = space.interpolation(lambda x: np.ones(x.shape[:-1]))
+assert np.abs(A@u).max() < 1e-10